@@ -2,22 +2,39 @@
 Pytest fixtures for FastAPI testing
 """
 import pytest
+import httpx
+from contextlib import contextmanager
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, Column, String, DateTime, ForeignKey, Text, Double, JSON
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
+from fastapi.responses import JSONResponse
 from unittest.mock import patch
 import os
 import sys
+import tempfile
 import uuid
 
 # Add backend directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Keep the app's own engine (used by startup diagnostics) off the on-disk demo database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# Tests step the fleet simulator themselves
+os.environ.setdefault("FLEET_SIMULATION", "0")
+# ... and flush the telemetry buffer themselves
+os.environ.setdefault("TELEMETRY_FLUSH_MS", "0")
+# ... and roll up telemetry history themselves, in a scratch store
+os.environ.setdefault("TELEMETRY_ROLLUP_SECONDS", "0")
+os.environ.setdefault("TELEMETRY_STORE_DIR", tempfile.mkdtemp(prefix="telemetry_store_"))
+
 from app import app
 from models import BaseModel
 from dependencies import get_db
-from auth import get_current_user
+from auth import get_current_user, clear_token_cache
+from supabase_admin import SupabaseAdminClient, UserDirectory, get_user_directory
+from query_budget import add_completion_hook, remove_completion_hook
 
 # Use in-memory SQLite for testing (shared across sessions when needed)
 TEST_DATABASE_URL = "sqlite://"
@@ -29,6 +46,13 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+@pytest.fixture(autouse=True)
+def reset_token_cache():
+    """Keep verified tokens from leaking between tests"""
+    clear_token_cache()
+    yield
+    clear_token_cache()
+
 @pytest.fixture(scope="function")
 def db_session():
     """Create a test database session"""
@@ -120,3 +144,88 @@ def client_with_real_db_user(mock_user, real_session_factory):
 
     app.dependency_overrides.clear()
 
+
+@pytest.fixture
+def query_budget():
+    """Fail the test when a request inside the block exceeds its SQL budget
+
+    Usage: `with query_budget(2): client.get(...)`. Repeated statement shapes
+    (N+1 patterns) fail too unless allow_repeats=True.
+    """
+    @contextmanager
+    def budget(max_queries: int, allow_repeats: bool = False):
+        seen = []
+        hook = lambda method, path, stats: seen.append((method, path, stats))
+        add_completion_hook(hook)
+        try:
+            yield seen
+        finally:
+            remove_completion_hook(hook)
+        for method, path, stats in seen:
+            statements = '\n  '.join(f'{n}x {shape}' for shape, n in stats.shapes.most_common())
+            if stats.count > max_queries:
+                pytest.fail(
+                    f"{method} {path} ran {stats.count} statements (budget {max_queries}):\n  {statements}"
+                )
+            if not allow_repeats and stats.repeated():
+                pytest.fail(f"{method} {path} repeated a statement shape (N+1):\n  {statements}")
+    
+    return budget
+
+class SupabaseStub:
+    """In-process stand-in for the Supabase Admin API"""
+
+    service_role = 'test-service-role'
+
+    def __init__(self, user_count=5):
+        self.users = {}
+        for i in range(user_count):
+            user_id = str(uuid.UUID(int=i + 1))
+            self.users[user_id] = {
+                'id': user_id,
+                'email': f'user{i}@example.com',
+                'user_metadata': {'role': 'user'},
+                'created_at': '2024-01-01T00:00:00Z',
+            }
+        self.calls = []
+        self.app = FastAPI()
+
+        @self.app.middleware("http")
+        async def check_key(request: Request, call_next):
+            self.calls.append((request.method, request.url.path))
+            if request.headers.get('apikey') != self.service_role:
+                return JSONResponse(status_code=401, content={'msg': 'invalid apikey'})
+            return await call_next(request)
+
+        @self.app.get("/auth/v1/admin/users")
+        def list_users(page: int = 1, per_page: int = 50):
+            users = list(self.users.values())
+            return {'users': users[(page - 1) * per_page:page * per_page]}
+
+        @self.app.put("/auth/v1/admin/users/{user_id}")
+        async def update_user(user_id: str, request: Request):
+            if user_id not in self.users:
+                raise HTTPException(status_code=404, detail='User not found')
+            body = await request.json()
+            self.users[user_id]['user_metadata'].update(body.get('user_metadata', {}))
+            return self.users[user_id]
+
+    def directory(self, per_page=2, ttl=60):
+        client = SupabaseAdminClient(
+            base_url='http://supabase.local',
+            service_role=self.service_role,
+            transport=httpx.ASGITransport(app=self.app),
+        )
+        return UserDirectory(client, ttl=ttl, per_page=per_page)
+
+@pytest.fixture
+def supabase_stub():
+    """Stub Supabase Admin API seeded with a handful of users"""
+    return SupabaseStub()
+
+@pytest.fixture
+def client_with_supabase_stub(client_with_admin_auth, supabase_stub):
+    """Admin test client whose user directory talks to the Supabase stub"""
+    directory = supabase_stub.directory()
+    app.dependency_overrides[get_user_directory] = lambda: directory
+    yield client_with_admin_auth, supabase_stub, directory
@@ -20,31 +20,88 @@ class TestAdminEndpoints:
         response = client_with_user_auth.get("/api/admin/users")
         assert response.status_code == status.HTTP_403_FORBIDDEN
     
-    def test_get_users_success(self, client_with_admin_auth):
+    def test_get_users_success(self, client_with_supabase_stub):
         """Test GET /admin/users returns users from Supabase"""
-        with patch('routes.admin.requests.get') as mock_get:
-            mock_response = Mock()
-            mock_response.status_code = 200
-            mock_response.json.return_value = {
-                'users': [
-                    {
-                        'id': 'user-123',
-                        'email': 'test@example.com',
-                        'user_metadata': {'role': 'user'},
-                        'created_at': '2024-01-01T00:00:00Z'
-                    }
-                ]
-            }
-            mock_get.return_value = mock_response
-            
+        client, stub, _ = client_with_supabase_stub
+        
+        response = client.get("/api/admin/users")
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert "users" in data
+        assert len(data["users"]) == len(stub.users)
+        assert {u["email"] for u in data["users"]} == {u["email"] for u in stub.users.values()}
+    
+    def test_get_users_served_from_directory_cache(self, client_with_supabase_stub):
+        """Test repeat GET /admin/users calls do not hit Supabase again"""
+        client, stub, _ = client_with_supabase_stub
+        
+        client.get("/api/admin/users")
+        calls_after_first = len(stub.calls)
+        # 5 users at 2 per page → 3 pages
+        assert calls_after_first == 3
+        
+        client.get("/api/admin/users")
+        assert len(stub.calls) == calls_after_first
+    
+    def test_get_users_not_configured(self, client_with_admin_auth):
+        """Test GET /admin/users without a service role configured"""
+        with patch('supabase_admin.admin_client.service_role', ''):
             response = client_with_admin_auth.get("/api/admin/users")
-            # May fail due to missing SUPABASE_URL env var
-            assert response.status_code in [status.HTTP_200_OK, status.HTTP_500_INTERNAL_SERVER_ERROR]
-            if response.status_code == status.HTTP_200_OK:
-                data = response.json()
-                assert "users" in data
-                assert len(data["users"]) == 1
-                assert data["users"][0]["email"] == "test@example.com"
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    
+    def test_update_user_role_updates_directory(self, client_with_supabase_stub):
+        """Test PUT /admin/users/{id}/role updates Supabase and the cached directory"""
+        client, stub, _ = client_with_supabase_stub
+        user_id = next(iter(stub.users))
+        client.get("/api/admin/users")
+        
+        response = client.put(f"/api/admin/users/{user_id}/role", json={"role": "admin"})
+        assert response.status_code == status.HTTP_200_OK
+        assert stub.users[user_id]['user_metadata']['role'] == 'admin'
+        
+        users = client.get("/api/admin/users").json()["users"]
+        assert next(u for u in users if u["id"] == user_id)["role"] == "admin"
+    
+    def test_batch_update_user_roles(self, client_with_supabase_stub):
+        """Test PUT /admin/users/roles applies updates and reports per-item results"""
+        client, stub, _ = client_with_supabase_stub
+        user_ids = list(stub.users)
+        missing_id = str(uuid.uuid4())
+        
+        response = client.put("/api/admin/users/roles", json={"updates": [
+            {"user_id": user_ids[0], "role": "admin"},
+            {"user_id": user_ids[1], "role": "admin"},
+            {"user_id": user_ids[2], "role": "superuser"},
+            {"user_id": missing_id, "role": "admin"},
+        ]})
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()["results"]
+        assert [r["success"] for r in results] == [True, True, False, False]
+        assert stub.users[user_ids[0]]['user_metadata']['role'] == 'admin'
+        assert stub.users[user_ids[1]]['user_metadata']['role'] == 'admin'
+        assert stub.users[user_ids[2]]['user_metadata']['role'] == 'user'
+        # The invalid role never reaches Supabase
+        assert ('PUT', f'/auth/v1/admin/users/{user_ids[2]}') not in stub.calls
+    
+    def test_user_ids_must_be_uuids(self, client_with_supabase_stub):
+        """Ids that aren't UUIDs never reach the Supabase admin API"""
+        client, stub, _ = client_with_supabase_stub
+
+        response = client.put("/api/admin/users/roles", json={"updates": [
+            {"user_id": "../../admin/users", "role": "admin"},
+        ]})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        response = client.put("/api/admin/users/not-a-uuid/role", json={"role": "admin"})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert not [call for call in stub.calls if call[0] == 'PUT']
+    
+    def test_batch_update_requires_admin(self, client_with_user_auth):
+        """Test PUT /admin/users/roles requires admin role"""
+        response = client_with_user_auth.put(
+            "/api/admin/users/roles",
+            json={"updates": [{"user_id": str(uuid.uuid4()), "role": "admin"}]}
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
     
     def test_update_user_role_requires_auth(self, client):
         """Test PUT /admin/users/{id}/role requires authentication"""
@@ -0,0 +1,122 @@
+"""
+Tests for the ASYNC_DB read path (AsyncSession engine and async handlers)
+"""
+import pytest
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from models import BaseModel, Drone, DroneBase, Schedule, get_async_database_url
+from dependencies import get_async_db
+from auth import get_current_user_async
+from routes import drones, bases, schedules, admin
+
+USER_ID = str(uuid.uuid4())
+OTHER_USER_ID = str(uuid.uuid4())
+BASE_ID = str(uuid.uuid4())
+OWN_DRONE_ID = str(uuid.uuid4())
+OTHER_DRONE_ID = str(uuid.uuid4())
+OWN_SCHEDULE_ID = str(uuid.uuid4())
+OTHER_SCHEDULE_ID = str(uuid.uuid4())
+
+@pytest.fixture
+def async_client():
+    """Client for an app serving only the async routers against aiosqlite"""
+    async_engine = create_async_engine(
+        "sqlite+aiosqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    AsyncTestingSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def setup():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(BaseModel.metadata.create_all)
+        async with AsyncTestingSessionLocal() as db:
+            start_time = datetime.utcnow() + timedelta(hours=1)
+            db.add(DroneBase(id=BASE_ID, name='Base', lat=37.77, lng=-122.41))
+            db.add(Drone(id=OWN_DRONE_ID, name='Mine', user_id=USER_ID, base_id=BASE_ID, status='active'))
+            db.add(Drone(id=OTHER_DRONE_ID, name='Theirs', user_id=OTHER_USER_ID, status='charging'))
+            db.add(Schedule(id=OWN_SCHEDULE_ID, drone_id=OWN_DRONE_ID, start_time=start_time))
+            db.add(Schedule(id=OTHER_SCHEDULE_ID, drone_id=OTHER_DRONE_ID, start_time=start_time))
+            await db.commit()
+
+    asyncio.run(setup())
+
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    current = {'user': {'sub': USER_ID, 'user_metadata': {'role': 'user'}}}
+    async_app = FastAPI()
+    for module in (drones, bases, schedules, admin):
+        async_app.include_router(module.async_router, prefix="/api")
+    async_app.dependency_overrides[get_async_db] = override_get_async_db
+    async_app.dependency_overrides[get_current_user_async] = lambda: current['user']
+
+    with TestClient(async_app) as test_client:
+        yield test_client, current
+
+    asyncio.run(async_engine.dispose())
+
+class TestAsyncDatabaseUrl:
+    """Test sync → async driver URL mapping"""
+
+    def test_sqlite_maps_to_aiosqlite(self):
+        assert get_async_database_url('sqlite:///./drone_demo.db') == 'sqlite+aiosqlite:///./drone_demo.db'
+
+    def test_postgres_maps_to_asyncpg(self):
+        assert get_async_database_url('postgresql://u:p@localhost/db') == 'postgresql+asyncpg://u:p@localhost/db'
+        assert get_async_database_url('postgresql+psycopg2://u:p@localhost/db') == 'postgresql+asyncpg://u:p@localhost/db'
+
+class TestAsyncReadEndpoints:
+    """Test the async read handlers"""
+
+    def test_list_drones_scoped_to_user(self, async_client):
+        client, _ = async_client
+        response = client.get("/api/drones")
+        assert response.status_code == status.HTTP_200_OK
+        assert [d['id'] for d in response.json()] == [OWN_DRONE_ID]
+
+    def test_admin_sees_all_drones(self, async_client, mock_admin):
+        client, current = async_client
+        current['user'] = mock_admin
+        response = client.get("/api/drones")
+        assert {d['id'] for d in response.json()} == {OWN_DRONE_ID, OTHER_DRONE_ID}
+
+    def test_get_drone_access_denied(self, async_client):
+        client, _ = async_client
+        assert client.get(f"/api/drones/{OWN_DRONE_ID}").status_code == status.HTTP_200_OK
+        assert client.get(f"/api/drones/{OTHER_DRONE_ID}").status_code == status.HTTP_403_FORBIDDEN
+        assert client.get(f"/api/drones/{uuid.uuid4()}").status_code == status.HTTP_404_NOT_FOUND
+
+    def test_bases(self, async_client):
+        client, _ = async_client
+        assert [b['id'] for b in client.get("/api/bases").json()] == [BASE_ID]
+        assert client.get(f"/api/bases/{BASE_ID}").json()['name'] == 'Base'
+        assert client.get(f"/api/bases/{uuid.uuid4()}").status_code == status.HTTP_404_NOT_FOUND
+
+    def test_schedules_scoped_to_user(self, async_client):
+        client, _ = async_client
+        assert [s['id'] for s in client.get("/api/schedules").json()] == [OWN_SCHEDULE_ID]
+        assert client.get(f"/api/schedules/{OWN_SCHEDULE_ID}").status_code == status.HTTP_200_OK
+        assert client.get(f"/api/schedules/{OTHER_SCHEDULE_ID}").status_code == status.HTTP_403_FORBIDDEN
+        assert client.get(f"/api/schedules/{uuid.uuid4()}").status_code == status.HTTP_404_NOT_FOUND
+
+    def test_stats_requires_admin(self, async_client, mock_admin):
+        client, current = async_client
+        assert client.get("/api/admin/stats").status_code == status.HTTP_403_FORBIDDEN
+
+        current['user'] = mock_admin
+        data = client.get("/api/admin/stats").json()
+        assert data['total_drones'] == 2
+        assert data['total_bases'] == 1
+        assert data['total_schedules'] == 2
+        assert data['drones_by_status'] == {'active': 1, 'charging': 1}
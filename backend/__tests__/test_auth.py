@@ -6,6 +6,7 @@ Run with: pytest backend/__tests__/backend-auth.test.py -v
 """
 import pytest
 import jwt
+import time
 from unittest.mock import patch, Mock
 from fastapi import HTTPException
 
@@ -13,7 +14,7 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from auth import verify_token, get_current_user, require_auth
+from auth import verify_token, get_current_user, require_auth, TokenCache, token_cache, invalidate_token
 
 class TestTokenVerification:
     """Test JWT token verification"""
@@ -132,3 +133,88 @@ class TestRoleBasedAccess:
         result = auth_dep(user_payload)
         assert result == user_payload
 
+
+class TestTokenCache:
+    """Test the verified-token cache"""
+
+    def test_repeat_verification_is_cached(self):
+        """Second verification of the same token does not decode again"""
+        with patch('auth.jwt.decode') as mock_decode:
+            mock_decode.return_value = {'sub': 'user-123', 'exp': time.time() + 60}
+
+            with patch('auth.SUPABASE_JWT_SECRET', ''):
+                first = verify_token('cached-token')
+                second = verify_token('cached-token')
+
+            assert first == second
+            assert mock_decode.call_count == 1
+            stats = token_cache.stats()
+            assert stats['hits'] == 1
+            assert stats['misses'] == 1
+
+    def test_cached_payload_is_not_shared(self):
+        """Editing a returned payload doesn't change the cached one"""
+        with patch('auth.jwt.decode') as mock_decode:
+            mock_decode.return_value = {'sub': 'user-123', 'user_metadata': {'role': 'user'}}
+
+            with patch('auth.SUPABASE_JWT_SECRET', ''):
+                first = verify_token('shared-token')
+                first['user_metadata']['role'] = 'admin'
+                second = verify_token('shared-token')
+                second['sub'] = 'someone-else'
+                third = verify_token('shared-token')
+
+            assert mock_decode.call_count == 1
+            assert third == {'sub': 'user-123', 'user_metadata': {'role': 'user'}}
+
+    def test_entry_expires_at_token_exp(self):
+        """Cached payloads are dropped once the token's exp has passed"""
+        cache = TokenCache(maxsize=4, default_ttl=300)
+        cache.put('short-lived', {'sub': 'user-123', 'exp': time.time() + 0.05})
+        assert cache.get('short-lived') is not None
+
+        time.sleep(0.1)
+        assert cache.get('short-lived') is None
+        assert cache.stats()['size'] == 0
+
+    def test_expired_payload_not_cached(self):
+        """Payloads whose exp is already in the past are never stored"""
+        cache = TokenCache(maxsize=4)
+        cache.put('expired', {'sub': 'user-123', 'exp': time.time() - 1})
+        assert cache.stats()['size'] == 0
+
+    def test_lru_eviction(self):
+        """Least recently used tokens are evicted when the cache is full"""
+        cache = TokenCache(maxsize=2)
+        cache.put('a', {'sub': 'a'})
+        cache.put('b', {'sub': 'b'})
+        cache.get('a')
+        cache.put('c', {'sub': 'c'})
+
+        assert cache.get('a') is not None
+        assert cache.get('b') is None
+        assert cache.get('c') is not None
+
+    def test_invalidate_token(self):
+        """Invalidated tokens are verified again on next use"""
+        with patch('auth.jwt.decode') as mock_decode:
+            mock_decode.return_value = {'sub': 'user-123'}
+
+            with patch('auth.SUPABASE_JWT_SECRET', ''):
+                verify_token('revoked-token')
+                assert invalidate_token('revoked-token') is True
+                verify_token('revoked-token')
+
+            assert mock_decode.call_count == 2
+
+    def test_failed_verification_not_cached(self):
+        """Rejected tokens are not cached"""
+        with patch('auth.jwt.decode') as mock_decode:
+            mock_decode.side_effect = jwt.InvalidTokenError('Invalid token')
+
+            for _ in range(2):
+                with pytest.raises(HTTPException):
+                    verify_token('bad-token')
+
+            assert mock_decode.call_count == 2
+            assert token_cache.stats()['size'] == 0
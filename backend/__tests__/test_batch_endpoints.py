@@ -0,0 +1,147 @@
+"""
+Tests for the transactional batch endpoint
+"""
+import pytest
+import uuid
+from datetime import datetime, timedelta
+from fastapi import status
+
+from models import Drone, DroneBase, Schedule
+
+def _start(hours=1):
+    return (datetime.utcnow() + timedelta(hours=hours)).isoformat()
+
+@pytest.fixture
+def seeded(client_with_real_db_user, mock_user):
+    """Real-DB client with one base, one owned drone and one foreign drone"""
+    client, SessionLocal = client_with_real_db_user
+    ids = {
+        'base': str(uuid.uuid4()),
+        'drone': str(uuid.uuid4()),
+        'other_drone': str(uuid.uuid4()),
+    }
+    with SessionLocal() as db:
+        db.add(DroneBase(id=ids['base'], name="HQ", lat=37.79, lng=-122.4))
+        db.add(Drone(id=ids['drone'], name="Mine", user_id=mock_user['sub'], base_id=ids['base']))
+        db.add(Drone(id=ids['other_drone'], name="Theirs", user_id="someone-else"))
+        db.commit()
+    return client, SessionLocal, ids
+
+class TestBatchEndpoint:
+    """Test POST /api/batch"""
+
+    def test_provisioning_batch_commits(self, seeded, mock_user):
+        client, SessionLocal, ids = seeded
+        base_id = str(uuid.uuid4())
+        drone_id = str(uuid.uuid4())
+        operations = [
+            {"op": "create", "entity": "base", "id": base_id, "data": {"name": "Site", "lat": 37.7, "lng": -122.3}},
+            {"op": "create", "entity": "drone", "id": drone_id, "data": {"name": "New", "base_id": base_id}},
+            {"op": "create", "entity": "schedule", "data": {"drone_id": drone_id, "start_time": _start()}},
+            {"op": "update", "entity": "drone", "id": ids['drone'], "data": {"status": "active"}},
+        ]
+
+        response = client.post("/api/batch", json={"operations": operations})
+
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body['committed'] is True
+        assert [r['status'] for r in body['results']] == ['created', 'created', 'created', 'updated']
+        assert body['results'][2]['id']
+        with SessionLocal() as db:
+            drone = db.get(Drone, drone_id)
+            assert drone.user_id == mock_user['sub']
+            assert drone.base_id == base_id
+            assert drone.created_at is not None
+            assert db.get(Drone, ids['drone']).status == "active"
+            assert db.get(Schedule, body['results'][2]['id']).drone_id == drone_id
+
+    def test_any_invalid_item_rolls_back_everything(self, seeded):
+        client, SessionLocal, ids = seeded
+        operations = [
+            {"op": "create", "entity": "drone", "data": {"name": "Valid"}},
+            {"op": "update", "entity": "drone", "id": ids['other_drone'], "data": {"name": "Hijack"}},
+            {"op": "create", "entity": "drone", "data": {"name": "Bad base", "base_id": str(uuid.uuid4())}},
+            {"op": "create", "entity": "base", "data": {"name": "Bad lat", "lat": 120, "lng": 0}},
+        ]
+
+        response = client.post("/api/batch", json={"operations": operations})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        body = response.json()
+        assert body['committed'] is False
+        results = body['results']
+        assert results[0]['status'] == 'not_applied'
+        assert results[1]['detail'] == 'Access denied'
+        assert results[2]['detail'] == 'Base not found'
+        assert results[3]['status'] == 'error'
+        with SessionLocal() as db:
+            assert db.query(Drone).count() == 2
+            assert db.get(Drone, ids['other_drone']).name == "Theirs"
+
+    def test_duplicate_targets_rejected(self, seeded):
+        client, _, ids = seeded
+        operations = [
+            {"op": "update", "entity": "drone", "id": ids['drone'], "data": {"name": "A"}},
+            {"op": "delete", "entity": "drone", "id": ids['drone']},
+        ]
+
+        response = client.post("/api/batch", json={"operations": operations})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'Duplicate' in response.json()['results'][1]['detail']
+
+    def test_base_delete_requires_unassigned_drones(self, seeded):
+        client, SessionLocal, ids = seeded
+
+        blocked = client.post("/api/batch", json={"operations": [
+            {"op": "delete", "entity": "base", "id": ids['base']},
+        ]})
+        assert blocked.status_code == status.HTTP_400_BAD_REQUEST
+
+        # Deleting the assigned drone in the same batch unblocks the base
+        allowed = client.post("/api/batch", json={"operations": [
+            {"op": "delete", "entity": "base", "id": ids['base']},
+            {"op": "delete", "entity": "drone", "id": ids['drone']},
+        ]})
+        assert allowed.status_code == status.HTTP_200_OK
+        with SessionLocal() as db:
+            assert db.get(DroneBase, ids['base']) is None
+
+    def test_drone_delete_removes_its_schedules(self, seeded):
+        client, SessionLocal, ids = seeded
+        with SessionLocal() as db:
+            db.add(Schedule(id=str(uuid.uuid4()), drone_id=ids['drone'], start_time=datetime.utcnow()))
+            db.commit()
+
+        response = client.post("/api/batch", json={"operations": [
+            {"op": "delete", "entity": "drone", "id": ids['drone']},
+        ]})
+
+        assert response.status_code == status.HTTP_200_OK
+        with SessionLocal() as db:
+            assert db.query(Schedule).count() == 0
+
+    def test_statement_count_independent_of_batch_size(self, seeded, query_budget):
+        client, _, ids = seeded
+        operations = [
+            {"op": "create", "entity": "schedule", "data": {"drone_id": ids['drone'], "start_time": _start(i)}}
+            for i in range(200)
+        ] + [
+            {"op": "create", "entity": "drone", "data": {"name": f"Drone {i}", "base_id": ids['base']}}
+            for i in range(200)
+        ]
+
+        # Reference lookups + schedule overlap check + two executemany inserts
+        # + commit bookkeeping (table and map tile counters)
+        with query_budget(8):
+            response = client.post("/api/batch", json={"operations": operations})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['results']) == 400
+
+    def test_requires_auth(self, client):
+        response = client.post("/api/batch", json={"operations": [
+            {"op": "create", "entity": "base", "data": {"name": "X", "lat": 0, "lng": 0}},
+        ]})
+        assert response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN)
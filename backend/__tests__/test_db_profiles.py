@@ -0,0 +1,76 @@
+"""
+Tests for the database engine profiles
+"""
+import pytest
+from sqlalchemy import text
+
+from db_profiles import (
+    resolve_profile, create_profiled_engine, engine_diagnostics, profile_warnings,
+    BASIC, BASIC_SQLITE, SQLITE_PRODUCTION, SQLITE_BUSY_TIMEOUT_MS
+)
+
+class TestResolveProfile:
+    """Test profile selection"""
+
+    def test_auto_picks_production_for_sqlite_files(self):
+        assert resolve_profile('sqlite:///./drone_demo.db') is SQLITE_PRODUCTION
+
+    @pytest.mark.parametrize("url", ['sqlite://', 'sqlite:///:memory:'])
+    def test_auto_keeps_memory_databases_basic(self, url):
+        assert resolve_profile(url) is BASIC_SQLITE
+
+    def test_auto_on_postgres_is_basic(self):
+        assert resolve_profile('postgresql://u:p@localhost/db') is BASIC
+
+    def test_explicit_basic(self):
+        assert resolve_profile('sqlite:///x.db', 'basic') is BASIC_SQLITE
+
+    def test_unknown_or_mismatched_profile_rejected(self):
+        with pytest.raises(ValueError):
+            resolve_profile('sqlite:///x.db', 'turbo')
+        with pytest.raises(ValueError):
+            resolve_profile('postgresql://u:p@localhost/db', 'sqlite-production')
+
+class TestSqliteProduction:
+    """Test the pragmas and diagnostics of the production profile"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        engine = create_profiled_engine(f'sqlite:///{tmp_path / "profile.db"}', SQLITE_PRODUCTION)
+        yield engine
+        engine.dispose()
+
+    def test_pragmas_applied_on_every_connection(self, engine):
+        connections = [engine.connect() for _ in range(3)]
+        try:
+            for conn in connections:
+                assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+                assert conn.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+                assert conn.execute(text('PRAGMA busy_timeout')).scalar() == SQLITE_BUSY_TIMEOUT_MS
+                assert conn.execute(text('PRAGMA temp_store')).scalar() == 2  # MEMORY
+        finally:
+            for conn in connections:
+                conn.close()
+
+    def test_reader_not_blocked_by_open_write(self, engine):
+        with engine.connect() as setup:
+            setup.execute(text('CREATE TABLE t (x INTEGER)'))
+            setup.execute(text('INSERT INTO t VALUES (1)'))
+            setup.commit()
+
+        with engine.connect() as writer, engine.connect() as reader:
+            writer.execute(text('INSERT INTO t VALUES (2)'))  # transaction left open
+            assert reader.execute(text('SELECT count(*) FROM t')).scalar() == 1
+            writer.commit()
+
+    def test_diagnostics(self, engine):
+        info = engine_diagnostics(engine, SQLITE_PRODUCTION)
+
+        assert info['profile'] == 'sqlite-production'
+        assert info['journal_mode'] == 'wal'
+        assert info['pool_size'] == SQLITE_PRODUCTION.engine_kwargs['pool_size']
+        assert info['sqlite_version']
+        assert profile_warnings(info, SQLITE_PRODUCTION) == []
+
+    def test_warns_when_wal_refused(self):
+        assert profile_warnings({'journal_mode': 'delete'}, SQLITE_PRODUCTION)
@@ -0,0 +1,147 @@
+"""
+Tests for ETags, conditional GETs and the per-table change counters
+"""
+import pytest
+import uuid
+from datetime import datetime, timedelta
+from fastapi import status
+from starlette.requests import Request
+
+from app import app
+from auth import get_current_user
+from etags import etag_matches, make_etag
+from models import Drone, DroneBase, Schedule, TableVersion
+
+USER_ID = str(uuid.uuid4())
+
+@pytest.fixture
+def seeded(client_with_real_db_user):
+    """Real-DB client (UUID user) with one base, one drone and one schedule"""
+    client, SessionLocal = client_with_real_db_user
+    app.dependency_overrides[get_current_user] = lambda: {'sub': USER_ID, 'user_metadata': {'role': 'user'}}
+    ids = {'base': str(uuid.uuid4()), 'drone': str(uuid.uuid4()), 'schedule': str(uuid.uuid4())}
+    with SessionLocal() as db:
+        db.add(DroneBase(id=ids['base'], name="HQ", lat=37.79, lng=-122.4))
+        db.add(Drone(id=ids['drone'], name="Etag Drone", user_id=USER_ID))
+        db.add(Schedule(id=ids['schedule'], drone_id=ids['drone'], start_time=datetime.utcnow() + timedelta(hours=1)))
+        db.commit()
+    return client, SessionLocal, ids
+
+def _version(SessionLocal, table):
+    with SessionLocal() as db:
+        return db.get(TableVersion, table).version
+
+def _revalidate(client, path):
+    first = client.get(path)
+    assert first.status_code == status.HTTP_200_OK
+    etag = first.headers['etag']
+    return etag, client.get(path, headers={'If-None-Match': etag})
+
+class TestEtagMatching:
+    """Test If-None-Match parsing"""
+
+    def _request(self, header):
+        return Request({'type': 'http', 'headers': [(b'if-none-match', header.encode())]})
+
+    def test_list_and_weak_tags(self):
+        etag = make_etag('x')
+        assert etag_matches(self._request(f'"other", W/{etag}'), etag)
+        assert etag_matches(self._request('*'), etag)
+        assert not etag_matches(self._request('"other"'), etag)
+
+class TestConditionalGets:
+    """Test 304 responses on list and detail endpoints"""
+
+    @pytest.mark.parametrize("path", ["/api/drones", "/api/bases", "/api/schedules"])
+    def test_list_not_modified(self, seeded, path, query_budget):
+        client, _, _ = seeded
+        etag = client.get(path).headers['etag']
+
+        # Only the state query runs; no rows are loaded
+        with query_budget(1):
+            response = client.get(path, headers={'If-None-Match': etag})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers['etag'] == etag
+        assert response.content == b''
+
+    @pytest.mark.parametrize("kind", ["drones", "bases", "schedules"])
+    def test_detail_not_modified(self, seeded, kind):
+        client, _, ids = seeded
+        _, response = _revalidate(client, f"/api/{kind}/{ids[kind.rstrip('s')]}")
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_write_changes_list_etag(self, seeded):
+        client, _, ids = seeded
+        etag = client.get("/api/drones").headers['etag']
+
+        client.put(f"/api/drones/{ids['drone']}", json={"status": "active"})
+
+        response = client.get("/api/drones", headers={'If-None-Match': etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['etag'] != etag
+
+    def test_schedule_update_changes_detail_etag(self, seeded):
+        client, _, ids = seeded
+        path = f"/api/schedules/{ids['schedule']}"
+        etag = client.get(path).headers['etag']
+
+        end_time = (datetime.utcnow() + timedelta(hours=5)).isoformat()
+        assert client.put(path, json={"end_time": end_time}).status_code == status.HTTP_200_OK
+
+        response = client.get(path, headers={'If-None-Match': etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['end_time'].startswith(end_time[:16])
+
+    def test_page_params_change_etag(self, seeded):
+        client, _, _ = seeded
+        assert client.get("/api/drones").headers['etag'] != client.get("/api/drones?limit=5").headers['etag']
+
+    def test_forbidden_detail_never_304(self, seeded):
+        client, SessionLocal, _ = seeded
+        other_id = str(uuid.uuid4())
+        with SessionLocal() as db:
+            db.add(Drone(id=other_id, name="Theirs", user_id=str(uuid.uuid4())))
+            db.commit()
+
+        response = client.get(f"/api/drones/{other_id}", headers={'If-None-Match': '*'})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+class TestChangeCounters:
+    """Test table_versions bookkeeping"""
+
+    def test_orm_writes_bump_counter(self, seeded):
+        client, SessionLocal, ids = seeded
+        before = _version(SessionLocal, 'schedules')
+
+        client.delete(f"/api/schedules/{ids['schedule']}")
+
+        assert _version(SessionLocal, 'schedules') == before + 1
+
+    def test_bulk_writes_bump_counter(self, seeded):
+        client, SessionLocal, ids = seeded
+        before = _version(SessionLocal, 'bases')
+
+        response = client.post("/api/batch", json={"operations": [
+            {"op": "update", "entity": "base", "id": ids['base'], "data": {"name": "Renamed"}},
+        ]})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert _version(SessionLocal, 'bases') == before + 1
+
+    def test_cascade_bumps_child_table(self, seeded):
+        client, SessionLocal, ids = seeded
+        before = _version(SessionLocal, 'schedules')
+
+        client.delete(f"/api/drones/{ids['drone']}")
+
+        assert _version(SessionLocal, 'schedules') > before
+
+    def test_rollback_discards_bump(self, seeded):
+        _, SessionLocal, _ = seeded
+        before = _version(SessionLocal, 'bases')
+        with SessionLocal() as db:
+            db.add(DroneBase(id=str(uuid.uuid4()), name="Temp", lat=0, lng=0))
+            db.flush()
+            db.rollback()
+        assert _version(SessionLocal, 'bases') == before
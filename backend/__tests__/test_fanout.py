@@ -0,0 +1,143 @@
+"""
+Tests for the /ws/telemetry fan-out
+"""
+import asyncio
+import base64
+import json
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import fanout
+from app import app
+from fleet import FleetState
+
+def token(sub, role='user'):
+    payload = base64.b64encode(json.dumps({'sub': sub, 'user_metadata': {'role': role}}).encode()).decode()
+    return f'demo.{payload}.demo'
+
+def row(drone_id, owner_id, lng, lat, base_id=None):
+    return {
+        'drone_id': drone_id, 'schedule_id': f's-{drone_id}', 'owner_id': owner_id, 'base_id': base_id,
+        'lng': lng, 'lat': lat, 'progress': 0.5, 'speed_mps': 12.0, 'eta_seconds': 60.0, 'paused': False,
+        'telemetry': {'battery_level': 85.0, 'altitude_m': 110.0, 'heading_deg': 90.0, 'signal_strength': 90.0},
+    }
+
+STATE = FleetState(7, 1700000000.0, [
+    row('d1', 'alice', 10.0, 10.0, base_id='b1'),
+    row('d2', 'alice', 50.0, 50.0, base_id='b1'),
+    row('d3', 'bob', 10.5, 10.5, base_id='b1'),
+])
+
+@pytest.fixture
+def hub(monkeypatch):
+    hub = fanout.TelemetryHub()
+    monkeypatch.setattr(fanout, 'hub', hub)
+    monkeypatch.setattr('routes.telemetry.hub', hub)
+    return hub
+
+def receive_tick(ws):
+    frame = ws.receive_json()
+    assert frame['type'] == 'tick'
+    return frame
+
+class TestTelemetrySocket:
+    """Test subscriptions over /ws/telemetry"""
+
+    def test_viewport_subscription(self, hub):
+        with TestClient(app).websocket_connect(f"/ws/telemetry?token={token('alice')}") as ws:
+            ws.send_json({'bbox': '0,0,20,20'})
+            assert ws.receive_json()['type'] == 'subscribed'
+            hub.publish(STATE)
+            frame = receive_tick(ws)
+        assert frame['tick'] == 7 and frame['time'] == 1700000000.0
+        # d2 is outside the viewport and d3 is bob's
+        assert [drone['drone_id'] for drone in frame['drones']] == ['d1']
+        assert 'owner_id' not in frame['drones'][0]
+        assert frame['drones'][0]['telemetry']['heading_deg'] == 90.0
+
+    def test_admin_sees_every_drone_of_a_base(self, hub):
+        with TestClient(app).websocket_connect(f"/ws/telemetry?token={token('root', 'admin')}") as ws:
+            ws.send_json({'base_id': 'b1'})
+            ws.receive_json()
+            hub.publish(STATE)
+            assert [drone['drone_id'] for drone in receive_tick(ws)['drones']] == ['d1', 'd2', 'd3']
+
+            # Resubscribing replaces the subscription
+            ws.send_json({'drones': ['d3', 'missing']})
+            assert ws.receive_json()['type'] == 'subscribed'
+            hub.publish(STATE)
+            assert [drone['drone_id'] for drone in receive_tick(ws)['drones']] == ['d3']
+        assert hub.clients == 0
+
+    def test_invalid_subscriptions(self, hub):
+        with TestClient(app).websocket_connect("/ws/telemetry", headers={'Authorization': f"Bearer {token('alice')}"}) as ws:
+            for message in ({}, {'drones': ['d1'], 'base_id': 'b1'}, {'bbox': '1,2,3'}, {'drones': 'd1'}):
+                ws.send_json(message)
+                assert ws.receive_json()['type'] == 'error'
+            ws.send_text('not json')
+            assert ws.receive_json()['type'] == 'error'
+        assert hub.clients == 0
+
+    def test_requires_token(self, hub):
+        with pytest.raises(WebSocketDisconnect) as disconnect:
+            with TestClient(app).websocket_connect("/ws/telemetry") as ws:
+                ws.receive_text()
+        assert disconnect.value.code == 1008
+
+class TestFanOut:
+    """Test frame sharing and backpressure"""
+
+    def test_one_frame_per_group(self, hub):
+        async def scenario():
+            clients = [hub.connect({'sub': 'alice'}) for _ in range(3)]
+            for client in clients[:2]:
+                hub.subscribe(client, fanout.parse_subscription({'base_id': 'b1'}, client.current_user))
+            hub.subscribe(clients[2], fanout.parse_subscription({'drones': ['d1', 'd2']}, clients[2].current_user))
+            hub.publish(STATE)
+            return [await client.queue.get() for client in clients]
+
+        first, second, third = asyncio.run(scenario())
+        # Same subscription, same string; an equal view from another subscription is built separately
+        assert first is second
+        assert first == third and first is not third
+        assert hub.frames_built == 2
+
+    def test_empty_frames_sent_once(self, hub):
+        async def scenario():
+            client = hub.connect({'sub': 'carol'})
+            hub.subscribe(client, fanout.parse_subscription({'bbox': '-180,-90,180,90'}, client.current_user))
+            for _ in range(3):
+                hub.publish(STATE)
+            return client.queue
+
+        queue = asyncio.run(scenario())
+        assert len(queue._frames) == 1
+
+    def test_client_joining_an_empty_group_gets_a_frame(self, hub):
+        async def scenario():
+            subscription = {'bbox': '-180,-90,180,90'}
+            first, second = hub.connect({'sub': 'carol'}), hub.connect({'sub': 'carol'})
+            hub.subscribe(first, fanout.parse_subscription(subscription, first.current_user))
+            hub.publish(STATE)
+            hub.subscribe(second, fanout.parse_subscription(subscription, second.current_user))
+            hub.publish(STATE)
+            hub.publish(STATE)
+            return first.queue, second.queue
+
+        first, second = asyncio.run(scenario())
+        assert len(first._frames) == 1
+        assert len(second._frames) == 1
+        assert json.loads(second._frames[0])['drones'] == []
+
+    def test_slow_client_keeps_latest_frames(self):
+        async def scenario():
+            queue = fanout.FrameQueue(maxsize=2)
+            for tick in range(5):
+                queue.put(f'frame {tick}')
+            queue.put_control('ack')
+            return queue, [await queue.get() for _ in range(3)]
+
+        queue, received = asyncio.run(scenario())
+        assert received == ['ack', 'frame 3', 'frame 4']
+        assert queue.dropped == 3
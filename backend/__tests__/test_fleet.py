@@ -0,0 +1,146 @@
+"""
+Tests for the server-side fleet simulator and GET /fleet/live
+"""
+import pytest
+import uuid
+from datetime import datetime, timedelta
+from fastapi import status
+
+import fleet
+import geodesy
+from models import Drone, Schedule
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+T0 = fleet._epoch(START)
+
+PATH = [[0, 0], [1, 0], [1, 1]]
+
+def add_flight(db, user_id, path=PATH, minutes=10, end=True, drone_status='active'):
+    drone = Drone(id=str(uuid.uuid4()), name="Flyer", user_id=user_id, status=drone_status)
+    schedule = Schedule(
+        id=str(uuid.uuid4()), drone_id=drone.id, start_time=START,
+        end_time=START + timedelta(minutes=minutes) if end else None,
+        path_json={'type': 'LineString', 'coordinates': path},
+    )
+    db.add_all([drone, schedule])
+    db.commit()
+    return drone.id
+
+@pytest.fixture
+def simulator(real_session_factory):
+    return fleet.FleetSimulator(real_session_factory)
+
+class TestFleetSimulator:
+    """Test loading flights and stepping them"""
+
+    def test_positions_follow_the_path(self, simulator, real_session_factory):
+        with real_session_factory() as db:
+            drone_id = add_flight(db, 'u1')
+
+        assert simulator.refresh(T0)
+        length = geodesy.path_length_m(PATH)
+        for fraction in (0.0, 0.25, 0.5, 0.75):
+            state = simulator.tick(T0 + fraction * 600)
+            drone, = state.rows
+            assert drone['drone_id'] == drone_id
+            assert drone['progress'] == pytest.approx(fraction)
+            expected, = geodesy.interpolate(PATH, [fraction * length])
+            assert [drone['lng'], drone['lat']] == pytest.approx(expected.tolist(), abs=1e-9)
+            assert drone['eta_seconds'] == pytest.approx((1 - fraction) * 600)
+            assert drone['speed_mps'] == pytest.approx(length / 600)
+
+        # First leg heads east, second north
+        assert simulator.tick(T0 + 60).rows[0]['telemetry']['heading_deg'] == pytest.approx(90)
+        assert simulator.tick(T0 + 500).rows[0]['telemetry']['heading_deg'] == pytest.approx(0)
+        # Landed
+        assert simulator.tick(T0 + 600).rows == []
+        assert simulator.state.tick == 7
+
+    def test_many_flights_in_one_step(self, simulator, real_session_factory):
+        paths = [[[i, 10], [i + 0.5, 10.5], [i + 1, 10]] for i in range(30)]
+        with real_session_factory() as db:
+            ids = [add_flight(db, 'u1', path=path, minutes=5 + i) for i, path in enumerate(paths)]
+        simulator.refresh(T0)
+
+        state = simulator.tick(T0 + 150)
+
+        by_drone = {row['drone_id']: row for row in state.rows}
+        assert len(by_drone) == 30
+        for i, (drone_id, path) in enumerate(zip(ids, paths)):
+            fraction = 150 / ((5 + i) * 60)
+            expected, = geodesy.interpolate(path, [fraction * geodesy.path_length_m(path)])
+            assert [by_drone[drone_id]['lng'], by_drone[drone_id]['lat']] == pytest.approx(expected.tolist(), abs=1e-9)
+
+    def test_open_ended_flight_cruises(self, simulator, real_session_factory):
+        with real_session_factory() as db:
+            add_flight(db, 'u1', path=[[0, 0], [0.01, 0]], end=False)
+        simulator.refresh(T0)
+        drone, = simulator.tick(T0 + 10).rows
+        assert drone['speed_mps'] == pytest.approx(fleet.DEFAULT_SPEED_MPS)
+        assert drone['lng'] == pytest.approx(120 / 111195, rel=1e-3)
+
+    def test_reloads_on_changes_only(self, simulator, real_session_factory):
+        with real_session_factory() as db:
+            drone_id = add_flight(db, 'u1')
+        assert simulator.refresh(T0)
+        assert not simulator.refresh(T0 + 1)
+
+        with real_session_factory() as db:
+            db.get(Drone, drone_id).status = 'completed'
+            db.commit()
+        assert simulator.refresh(T0 + 2)
+        assert simulator.tick(T0 + 3).rows == []
+
+    def test_pause_holds_position(self, simulator, real_session_factory):
+        with real_session_factory() as db:
+            drone_id = add_flight(db, 'u1')
+        simulator.refresh(T0)
+
+        def set_status(value):
+            with real_session_factory() as db:
+                db.get(Drone, drone_id).status = value
+                db.commit()
+
+        set_status('paused')
+        simulator.refresh(T0 + 60)
+        held = simulator.tick(T0 + 200).rows[0]
+        assert held['paused'] and held['speed_mps'] == 0
+        assert held['progress'] == pytest.approx(0.1)
+
+        set_status('active')
+        simulator.refresh(T0 + 300)
+        # 240 seconds paused: at 360 s the flight is 120 s in
+        assert simulator.tick(T0 + 360).rows[0]['progress'] == pytest.approx(0.2)
+
+    def test_skips_paths_without_legs(self, simulator, real_session_factory):
+        with real_session_factory() as db:
+            add_flight(db, 'u1', path=[[0, 0]])
+        simulator.refresh(T0)
+        assert simulator.flights == []
+        assert simulator.tick(T0 + 1).rows == []
+
+class TestFleetLive:
+    """Test GET /fleet/live"""
+
+    def test_returns_own_drones(self, client_with_real_db_user, mock_user, monkeypatch):
+        client, SessionLocal = client_with_real_db_user
+        with SessionLocal() as db:
+            mine = add_flight(db, mock_user['sub'])
+            add_flight(db, str(uuid.uuid4()))
+        simulator = fleet.FleetSimulator(SessionLocal)
+        simulator.refresh(T0)
+        simulator.tick(T0 + 60)
+        monkeypatch.setattr(fleet, 'simulator', simulator)
+
+        response = client.get('/api/fleet/live')
+
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body['tick'] == 1 and body['time'] == T0 + 60
+        assert [drone['drone_id'] for drone in body['drones']] == [mine]
+        assert 'owner_id' not in body['drones'][0]
+
+    def test_empty_before_first_tick(self, client_with_real_db_user, monkeypatch):
+        client, _ = client_with_real_db_user
+        monkeypatch.setattr(fleet, 'simulator', None)
+        assert client.get('/api/fleet/live').json() == {'tick': 0, 'time': 0.0, 'drones': []}
@@ -0,0 +1,104 @@
+"""
+Tests for the geodesy module against reference values
+"""
+import math
+import pytest
+import uuid
+import numpy as np
+from fastapi import status
+
+import geodesy
+from models import Drone
+
+R = geodesy.EARTH_RADIUS_M
+
+# Aviation Formulary worked example: LAX (33°57'N 118°24'W) to JFK (40°38'N 73°47'W)
+LAX = [-(118 + 24 / 60), 33 + 57 / 60]
+JFK = [-(73 + 47 / 60), 40 + 38 / 60]
+
+class TestGeodesy:
+    """Test distances, bearings and interpolation"""
+
+    def test_reference_distances(self):
+        assert geodesy.path_length_m([[0, 0], [0, 90]]) == pytest.approx(math.pi / 2 * R)
+        assert geodesy.path_length_m([[10, 0], [11, 0]]) == pytest.approx(R * math.pi / 180)
+        # 0.623585 rad in the worked example
+        assert geodesy.path_length_m([LAX, JFK]) == pytest.approx(0.623585 * R, rel=1e-5)
+
+    def test_longitude_degrees_shrink_with_latitude(self):
+        # The old flat-earth formula gave 111 km here
+        assert geodesy.path_length_m([[0, 60], [1, 60]]) == pytest.approx(55597, rel=1e-3)
+
+    def test_matches_scalar_haversine(self):
+        rng = np.random.default_rng(5)
+        points = np.column_stack((rng.uniform(-180, 180, 200), rng.uniform(-89, 89, 200)))
+        legs = geodesy.segment_lengths_m(points)
+        expected = [geodesy.haversine_m(a[1], a[0], b[1], b[0]) for a, b in zip(points, points[1:])]
+        assert legs == pytest.approx(expected, rel=1e-9)
+
+    def test_bearings(self):
+        bearings = geodesy.bearings_deg([[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]])
+        assert bearings[0] == pytest.approx(0)
+        assert bearings[1] == pytest.approx(90, abs=0.01)
+        assert bearings[2] == pytest.approx(180)
+        assert bearings[3] == pytest.approx(270)
+        # 66 degrees (65.89) in the worked example
+        assert geodesy.bearings_deg([LAX, JFK])[0] == pytest.approx(65.892, abs=0.01)
+
+    def test_cumulative(self):
+        path = [[0, 0], [1, 0], [1, 1], [1, 1]]
+        cumulative = geodesy.cumulative_m(path)
+        assert cumulative[0] == 0 and len(cumulative) == 4
+        assert cumulative[-1] == pytest.approx(geodesy.path_length_m(path))
+        assert cumulative[-1] == cumulative[-2]
+
+    def test_interpolate(self):
+        length = geodesy.path_length_m([LAX, JFK])
+        (lng, lat), = geodesy.interpolate([LAX, JFK], [0.4 * length])
+        # 38°40.167'N 101°37.570'W in the worked example
+        assert lat == pytest.approx(38 + 40.167 / 60, abs=1e-3)
+        assert lng == pytest.approx(-(101 + 37.570 / 60), abs=1e-3)
+
+    def test_interpolate_multi_leg_and_clamped(self):
+        path = [[0, 0], [1, 0], [1, 1], [1, 1]]
+        leg = geodesy.path_length_m(path[:2])
+        positions = geodesy.interpolate(path, [-5, 0.5 * leg, 1.5 * leg, 10 * leg])
+        assert positions.tolist()[0] == pytest.approx([0, 0])
+        assert positions[1] == pytest.approx([0.5, 0], abs=1e-9)
+        assert positions[2] == pytest.approx([1, 0.5], abs=1e-4)
+        assert positions[3] == pytest.approx([1, 1])
+
+    def test_rejects_non_points(self):
+        with pytest.raises(ValueError):
+            geodesy.as_points([[1, 2], [3]])
+        with pytest.raises(ValueError):
+            geodesy.as_points([1, 2])
+
+class TestSimulatePath:
+    """Test simulate_path on the geodesy module"""
+
+    def test_distance_and_heading(self, client_with_real_db_user, mock_user):
+        client, SessionLocal = client_with_real_db_user
+        drone_id = str(uuid.uuid4())
+        with SessionLocal() as db:
+            db.add(Drone(id=drone_id, name="Sim", user_id=mock_user['sub']))
+            db.commit()
+
+        response = client.post(f"/api/drones/{drone_id}/simulate_path", json={"path": [[0, 60], [1, 60]]})
+
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body['distance_m'] == pytest.approx(55597, rel=1e-3)
+        assert body['telemetry']['heading_deg'] == pytest.approx(89.57, abs=0.01)
+        # speed_mps is rounded to 2 decimals, eta_seconds truncated
+        assert body['eta_seconds'] == pytest.approx(body['distance_m'] / body['speed_mps'], rel=1e-3, abs=1)
+
+    def test_malformed_path(self, client_with_real_db_user, mock_user):
+        client, SessionLocal = client_with_real_db_user
+        drone_id = str(uuid.uuid4())
+        with SessionLocal() as db:
+            db.add(Drone(id=drone_id, name="Sim", user_id=mock_user['sub']))
+            db.commit()
+
+        response = client.post(f"/api/drones/{drone_id}/simulate_path", json={"path": [[0, 60], [1]]})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
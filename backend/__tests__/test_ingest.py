@@ -0,0 +1,161 @@
+"""
+Tests for POST /telemetry/ingest and the telemetry buffer
+"""
+import json
+import pytest
+import time
+import uuid
+from datetime import timezone
+from fastapi import status
+from sqlalchemy import func, select
+
+import ingest
+from models import Drone, TelemetryRecord
+
+def ndjson(samples):
+    return '\n'.join(json.dumps(sample) for sample in samples).encode()
+
+def sample(drone_id, **fields):
+    return {'drone_id': drone_id, 'ts': time.time() - 5, 'lng': -122.4, 'lat': 37.79,
+            'altitude_m': 110.0, 'heading_deg': 90.0, 'battery_level': 85.0, 'signal_strength': 92.0, **fields}
+
+@pytest.fixture
+def drones(client_with_real_db_user, mock_user):
+    client, SessionLocal = client_with_real_db_user
+    ids = {'mine': str(uuid.uuid4()), 'theirs': str(uuid.uuid4())}
+    with SessionLocal() as db:
+        db.add(Drone(id=ids['mine'], name="Mine", user_id=mock_user['sub']))
+        db.add(Drone(id=ids['theirs'], name="Theirs", user_id=str(uuid.uuid4())))
+        db.commit()
+    yield client, SessionLocal, ids
+    ingest.stop_buffers()
+
+def post(client, body, content_type='application/x-ndjson'):
+    return client.post('/api/telemetry/ingest', content=body, headers={'Content-Type': content_type})
+
+def buffered(SessionLocal):
+    with SessionLocal() as db:
+        buffer = ingest.buffer_for(db.get_bind())
+        return buffer, db.get_bind()
+
+class TestIngest:
+    """Test decoding, validation and authorization"""
+
+    def test_accepts_and_flushes(self, drones, query_budget):
+        client, SessionLocal, ids = drones
+        samples = [sample(ids['mine'], ts=1767268800 + i) for i in range(500)]
+
+        # One query authorizes the batch; nothing is written yet
+        with query_budget(1):
+            response = post(client, ndjson(samples))
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json() == {'accepted': 500, 'rejected': 0, 'errors': []}
+        buffer, _ = buffered(SessionLocal)
+        assert len(buffer) == 500
+        assert buffer.flush() == 500
+        with SessionLocal() as db:
+            assert db.scalar(select(func.count()).select_from(TelemetryRecord)) == 500
+            first = db.scalars(select(TelemetryRecord).order_by(TelemetryRecord.recorded_at)).first()
+        assert first.drone_id == ids['mine'] and first.heading_deg == 90.0
+        assert first.recorded_at.replace(tzinfo=None).isoformat() == '2026-01-01T12:00:00'
+
+    def test_rejects_samples_one_by_one(self, drones):
+        client, SessionLocal, ids = drones
+        samples = [
+            sample(ids['mine']),
+            sample(ids['theirs']),
+            sample(str(uuid.uuid4())),
+            sample(ids['mine'], lat=91),
+            sample(ids['mine'], lng=None),
+            sample(ids['mine'], battery_level='full'),
+            sample(ids['mine'], ts=time.time() + 3600),
+            sample(None),
+            [1, 2],
+            {'drone_id': ids['mine'], 'lng': 1.5, 'lat': 2.5},
+        ]
+
+        body = post(client, ndjson(samples)).json()
+
+        assert body['accepted'] == 2 and body['rejected'] == 8
+        assert [(error['index'], error['detail']) for error in body['errors']] == [
+            (1, "Access denied"),
+            (2, "Drone not found"),
+            (3, "lat is out of range"),
+            (4, "lng is required"),
+            (5, "battery_level must be a number"),
+            (6, "ts is out of range"),
+            (7, "drone_id must be a non-empty string"),
+            (8, "Sample must be an object"),
+        ]
+        buffer, _ = buffered(SessionLocal)
+        buffer.flush()
+        with SessionLocal() as db:
+            bare = db.scalars(select(TelemetryRecord).where(TelemetryRecord.lng == 1.5)).one()
+        # Readings are optional and ts defaults to the arrival time
+        assert bare.battery_level is None
+        assert abs(bare.recorded_at.replace(tzinfo=timezone.utc).timestamp() - time.time()) < 60
+
+    def test_malformed_batches(self, drones, monkeypatch):
+        client, _, ids = drones
+        response = post(client, b'{"drone_id": "x"}\n{oops\n')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()['detail'] == "Line 2 is not valid JSON"
+        # Exactly one value per line
+        for extra in (b'1,2', b'{"drone_id": "x"},{"drone_id": "y"}'):
+            response = post(client, b'{"drone_id": "x"}\n' + extra + b'\n')
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert response.json()['detail'] == "Line 2 is not valid JSON"
+
+        assert post(client, b'{}', content_type='text/plain').status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+        monkeypatch.setattr(ingest, 'MAX_TELEMETRY_BATCH', 2)
+        assert post(client, ndjson([sample(ids['mine'])] * 3)).status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_full_buffer_answers_503(self, drones):
+        client, SessionLocal, ids = drones
+        buffer, _ = buffered(SessionLocal)
+        buffer.max_buffered = 3
+        assert post(client, ndjson([sample(ids['mine'])] * 2)).status_code == status.HTTP_202_ACCEPTED
+        response = post(client, ndjson([sample(ids['mine'])] * 2))
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers['Retry-After'] == '1'
+        assert len(buffer) == 2
+
+    def test_msgpack(self, drones):
+        msgpack = pytest.importorskip('msgpack')
+        client, SessionLocal, ids = drones
+        body = msgpack.packb([sample(ids['mine']) for _ in range(3)]) + msgpack.packb(sample(ids['mine']))
+        response = post(client, body, content_type='application/msgpack')
+        assert response.json()['accepted'] == 4
+        assert post(client, body[:-3], content_type='application/msgpack').status_code == status.HTTP_400_BAD_REQUEST
+
+class TestTelemetryBuffer:
+    """Test flushing"""
+
+    def test_flushes_inline_at_threshold_without_thread(self, real_session_factory):
+        engine = real_session_factory.kw['bind']
+        buffer = ingest.TelemetryBuffer(engine, interval=0, flush_rows=3)
+        row = ('d1', 1767268800.0, 1.0, 2.0, None, None, None, None)
+        buffer.add([row] * 2)
+        assert buffer.flushed == 0
+        buffer.add([row])
+        assert buffer.flushed == 3 and len(buffer) == 0
+
+    def test_flusher_thread(self, real_session_factory):
+        engine = real_session_factory.kw['bind']
+        buffer = ingest.TelemetryBuffer(engine, interval=0.01)
+        buffer.add([('d1', 1767268800.0, 1.0, 2.0, None, None, None, None)])
+        deadline = time.time() + 5
+        while buffer.flushed == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        buffer.stop()
+        assert buffer.flushed == 1
+
+    def test_failed_flush_keeps_rows(self, real_session_factory):
+        engine = real_session_factory.kw['bind']
+        buffer = ingest.TelemetryBuffer(engine, interval=0)
+        # lng is NOT NULL
+        buffer.add([('d1', 1767268800.0, None, 2.0, None, None, None, None)])
+        assert buffer.flush() == 0
+        assert len(buffer) == 1 and buffer.dropped == 0
@@ -0,0 +1,74 @@
+"""
+Tests for request metrics and the /metrics endpoint
+"""
+import pytest
+from fastapi import status
+
+from metrics import Histogram, MetricsRegistry, registry, LATENCY_BUCKETS
+
+@pytest.fixture
+def fresh_registry():
+    """Start each test from an empty metrics registry"""
+    registry.reset()
+    yield registry
+    registry.reset()
+
+class TestHistogram:
+    """Test fixed-bucket histograms"""
+
+    def test_observations_land_in_inclusive_buckets(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 1, 1]
+        assert list(histogram.cumulative()) == [('0.1', 2), ('1', 3), ('+Inf', 4)]
+        assert histogram.sum == pytest.approx(2.65)
+
+class TestRegistry:
+    """Test exposition rendering"""
+
+    def test_render_prometheus_text(self):
+        metrics = MetricsRegistry()
+        metrics.observe('GET', '/api/drones/{drone_id}', 200, 0.003, 0, 512)
+        metrics.observe('GET', '/api/drones/{drone_id}', 404, 0.002, 0, 30)
+
+        text = metrics.render()
+        assert 'http_requests_total{method="GET",route="/api/drones/{drone_id}",status="200"} 1' in text
+        assert 'http_requests_total{method="GET",route="/api/drones/{drone_id}",status="404"} 1' in text
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/api/drones/{drone_id}",le="0.0025"} 1' in text
+        assert 'http_request_duration_seconds_count{method="GET",route="/api/drones/{drone_id}"} 2' in text
+        assert len([line for line in text.splitlines() if line.startswith('http_request_duration_seconds_bucket')]) == len(LATENCY_BUCKETS) + 1
+
+class TestMetricsEndpoint:
+    """Test the middleware through the app"""
+
+    def test_requests_recorded_by_route_template(self, client_with_real_db_user, fresh_registry):
+        client, _ = client_with_real_db_user
+        client.get("/")
+        client.get("/api/bases/some-id")
+        client.get("/api/bases/other-id")
+
+        response = client.get("/metrics")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['content-type'].startswith('text/plain')
+        body = response.text
+        assert 'http_requests_total{method="GET",route="/api/bases/{base_id}",status="404"} 2' in body
+        assert 'http_request_duration_seconds_count{method="GET",route="/api/bases/{base_id}"} 2' in body
+        assert 'route="/"' in body
+        # The scrape itself is not recorded
+        assert 'route="/metrics"' not in body
+
+    def test_unmatched_paths_share_one_label(self, client, fresh_registry):
+        client.get("/no/such/path")
+        client.get("/another/missing/path")
+
+        body = client.get("/metrics").text
+        assert 'route="__unmatched__",status="404"} 2' in body
+
+    def test_request_size_recorded(self, client, fresh_registry):
+        client.post("/api/bases", json={"name": "x" * 300, "lat": 1.0, "lng": 2.0})
+
+        stats = fresh_registry.routes[('POST', '/api/bases')]
+        assert stats.request_size.sum > 300
+        assert fresh_registry.in_flight == 0
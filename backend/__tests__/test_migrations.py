@@ -0,0 +1,180 @@
+"""
+Tests for the versioned migration engine
+"""
+import pytest
+import uuid
+from types import SimpleNamespace
+from sqlalchemy import Column, Index, Integer, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from migrations import (
+    Backfill, MigrationError, Revision, backfill_status, chain, current_revision, downgrade,
+    load_revisions, migration_engine, run_backfill, upgrade,
+)
+from migrations import r001_baseline
+from models import BaseModel, Drone
+
+def revision(rev, down, upgrade_fn=lambda op: None, downgrade_fn=lambda op: None, backfills=()):
+    return Revision(SimpleNamespace(
+        revision=rev, down_revision=down, __doc__=f"Revision {rev}",
+        upgrade=upgrade_fn, downgrade=downgrade_fn, backfills=backfills,
+    ))
+
+HEAD = load_revisions()[-1].revision
+
+def quiet(message):
+    pass
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = migration_engine(f'sqlite:///{tmp_path / "migrations.db"}')
+    yield engine
+    engine.dispose()
+
+def add_name_length(op):
+    op.add_column('drones', Column('name_length', Integer))
+
+def drop_name_length(op):
+    op.drop_column('drones', 'name_length')
+
+NAME_LENGTH = Backfill(
+    'drones.name_length', 'drones', columns=('name',), where='name_length IS NULL',
+    update=lambda rows: [{'_key': row[0], 'name_length': len(row[1])} for row in rows],
+)
+
+class TestRevisions:
+    """Test loading and ordering revisions"""
+
+    def test_package_starts_at_baseline(self):
+        revisions = load_revisions()
+        assert revisions[0].revision == '001'
+        assert revisions[0].down_revision is None
+
+    def test_chain_orders_by_down_revision(self):
+        ordered = chain([revision('003', '002'), revision('001', None), revision('002', '001')])
+        assert [r.revision for r in ordered] == ['001', '002', '003']
+
+    def test_forks_and_orphans_rejected(self):
+        with pytest.raises(MigrationError):
+            chain([revision('001', None), revision('002', '001'), revision('003', '001')])
+        with pytest.raises(MigrationError):
+            chain([revision('001', None), revision('003', '002')])
+
+class TestUpgrade:
+    """Test upgrading and downgrading a database"""
+
+    def test_fresh_database(self, engine):
+        assert upgrade(engine, log=quiet) == [r.revision for r in load_revisions()]
+        assert current_revision(engine) == HEAD
+        tables = set(inspect(engine).get_table_names())
+        assert {'drones', 'bases', 'schedules', 'table_versions', 'schema_revisions'} <= tables
+        assert upgrade(engine, log=quiet) == []
+
+    def test_database_from_create_all_before_migrations(self, engine):
+        # The baseline schema, as create_all made it, without the indexes added last
+        r001_baseline.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text('DROP INDEX idx_drone_user_created'))
+            conn.execute(text("INSERT INTO bases (id, name, lat, lng) VALUES ('b', 'Old', 37.77, -122.42)"))
+            conn.execute(text("INSERT INTO drones (id, name, user_id, base_id) VALUES ('d', 'Old', 'u', 'b')"))
+
+        upgrade(engine, log=quiet)
+
+        indexes = {index['name'] for index in inspect(engine).get_indexes('drones')}
+        assert {'idx_drone_user_created', 'idx_drone_geohash'} <= indexes
+        with sessionmaker(bind=engine)() as db:
+            drone = db.get(Drone, 'd')
+        assert (drone.last_lat, drone.last_lng) == (37.77, -122.42) and drone.geohash
+
+    def test_upgraded_schema_matches_models(self, engine, tmp_path):
+        upgrade(engine, log=quiet)
+        reference = migration_engine(f'sqlite:///{tmp_path / "create_all.db"}')
+        BaseModel.metadata.create_all(bind=reference)
+
+        def schema(bind):
+            inspector = inspect(bind)
+            return {name: ({c['name'] for c in inspector.get_columns(name)},
+                           {i['name'] for i in inspector.get_indexes(name)})
+                    for name in BaseModel.metadata.tables}
+
+        try:
+            assert schema(engine) == schema(reference)
+        finally:
+            reference.dispose()
+
+    def test_failed_revision_leaves_nothing_behind(self, engine):
+        def broken(op):
+            op.execute('CREATE TABLE half_done (x INTEGER)')
+            raise RuntimeError("boom")
+
+        revisions = [revision('001', None), revision('002', '001', broken)]
+        with pytest.raises(RuntimeError):
+            upgrade(engine, revisions=revisions, log=quiet)
+
+        assert current_revision(engine, revisions) == '001'
+        assert not inspect(engine).has_table('half_done')
+
+    def test_downgrade(self, engine):
+        revisions = load_revisions() + [revision('900', HEAD, add_name_length, drop_name_length)]
+        upgrade(engine, revisions=revisions, log=quiet)
+        assert 'name_length' in {c['name'] for c in inspect(engine).get_columns('drones')}
+
+        assert downgrade(engine, HEAD, revisions=revisions, log=quiet) == ['900']
+        assert 'name_length' not in {c['name'] for c in inspect(engine).get_columns('drones')}
+        assert current_revision(engine, revisions) == HEAD
+
+    def test_unknown_target(self, engine):
+        with pytest.raises(MigrationError):
+            upgrade(engine, target='999', log=quiet)
+
+    def test_index_revision(self, engine):
+        index = Index('idx_test_drone_name', BaseModel.metadata.tables['drones'].c.name)
+        BaseModel.metadata.tables['drones'].indexes.discard(index)
+        revisions = load_revisions() + [revision('900', HEAD, lambda op: op.create_index(index, online=True))]
+
+        upgrade(engine, revisions=revisions, log=quiet)
+
+        assert 'idx_test_drone_name' in {i['name'] for i in inspect(engine).get_indexes('drones')}
+
+class TestBackfill:
+    """Test resumable batched backfills"""
+
+    @pytest.fixture
+    def seeded(self, engine):
+        upgrade(engine, log=quiet)
+        with sessionmaker(bind=engine)() as db:
+            db.add_all([Drone(name='x' * (i + 1), user_id=str(uuid.uuid4())) for i in range(25)])
+            db.commit()
+        return load_revisions() + [revision('900', HEAD, add_name_length, drop_name_length, (NAME_LENGTH,))]
+
+    def progress(self, engine):
+        return {state['name']: state for state in backfill_status(engine)}.get(NAME_LENGTH.name)
+
+    def name_lengths(self, engine):
+        with engine.connect() as conn:
+            return conn.execute(text('SELECT name, name_length FROM drones')).all()
+
+    def test_runs_in_batches_and_resumes(self, engine, seeded):
+        upgrade(engine, revisions=seeded, run_backfills=False, log=quiet)
+
+        assert run_backfill(engine, NAME_LENGTH, batch_size=10, pause=0, max_batches=1) is False
+        assert sum(length is not None for _, length in self.name_lengths(engine)) == 10
+        assert self.progress(engine)['rows_done'] == 10
+
+        assert run_backfill(engine, NAME_LENGTH, batch_size=10, pause=0) is True
+        assert all(length == len(name) for name, length in self.name_lengths(engine))
+        state = self.progress(engine)
+        assert state['rows_done'] == 25 and state['completed_at'] is not None
+
+    def test_sql_backfill_during_upgrade(self, engine, seeded):
+        fill = Backfill('drones.name_length.sql', 'drones', update='name_length = length(name)')
+        revisions = seeded[:-1] + [revision('900', HEAD, add_name_length, drop_name_length, (fill,))]
+
+        upgrade(engine, revisions=revisions, log=quiet)
+
+        assert all(length == len(name) for name, length in self.name_lengths(engine))
+
+    def test_downgrade_forgets_backfill_progress(self, engine, seeded):
+        upgrade(engine, revisions=seeded, log=quiet)
+        downgrade(engine, HEAD, revisions=seeded, log=quiet)
+        assert self.progress(engine) is None
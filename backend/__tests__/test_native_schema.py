@@ -0,0 +1,103 @@
+"""
+Tests for the native PostgreSQL schema mode
+"""
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+import models
+from db_profiles import resolve_profile, POSTGRES_PRODUCTION
+from migrate_native_pg import migration_statements
+from migrations import r008_drop_path_gin
+from models import BaseModel, Drone, Schedule
+
+PG = postgresql.dialect()
+
+@pytest.fixture
+def native(monkeypatch):
+    monkeypatch.setattr(models, 'NATIVE_SCHEMA', True)
+
+def ddl(table, dialect=PG) -> str:
+    return str(CreateTable(table).compile(dialect=dialect))
+
+class TestSchemaTypes:
+    """Test the column types chosen per schema mode"""
+
+    def test_portable_schema_by_default(self):
+        assert 'id VARCHAR(36)' in ddl(Drone.__table__)
+        assert 'path_json JSON' in ddl(Schedule.__table__)
+
+    def test_native_schema_on_postgres(self, native):
+        assert 'id UUID' in ddl(Drone.__table__)
+        assert 'user_id UUID' in ddl(Drone.__table__)
+        assert 'drone_id UUID' in ddl(Schedule.__table__)
+        assert 'path_json JSONB' in ddl(Schedule.__table__)
+
+    def test_native_flag_ignored_on_sqlite(self, native):
+        assert 'id VARCHAR(36)' in ddl(Drone.__table__, sqlite.dialect())
+
+    def test_no_gin_index_on_path_documents(self, native):
+        # Coordinates live in path_data; path_json is too small to index
+        assert 'idx_schedule_path_gin' not in {index.name for index in Schedule.__table__.indexes}
+        # Revision 008 drops the one earlier native databases were given
+        assert str(CreateIndex(r008_drop_path_gin.PATH_GIN_INDEX).compile(dialect=PG)) == \
+            'CREATE INDEX idx_schedule_path_gin ON schedules USING gin (path_json jsonb_path_ops)'
+
+    def test_sqlite_skips_native_ddl(self, native):
+        engine = create_engine('sqlite://')
+        BaseModel.metadata.create_all(bind=engine)
+        indexes = {index['name'] for index in inspect(engine).get_indexes('schedules')}
+        assert 'idx_schedule_start_id' in indexes
+
+    def test_malformed_key_binds_as_null(self, native):
+        key = Drone.__table__.c.id.type
+        assert key.process_bind_param('not-a-uuid', PG) is None
+        assert key.process_bind_param('A1B2C3D4-1111-1111-1111-000000000001', PG) == \
+            'a1b2c3d4-1111-1111-1111-000000000001'
+        assert key.process_bind_param('not-a-uuid', sqlite.dialect()) == 'not-a-uuid'
+
+class TestProfile:
+    """Test the postgres-production profile"""
+
+    def test_resolve(self):
+        assert resolve_profile('postgresql://u:p@localhost/db', 'postgres-production') is POSTGRES_PRODUCTION
+        assert resolve_profile('postgres://u:p@localhost/db', 'postgres-production') is POSTGRES_PRODUCTION
+        assert POSTGRES_PRODUCTION.native_schema
+
+    def test_rejected_on_sqlite(self):
+        with pytest.raises(ValueError):
+            resolve_profile('sqlite:///x.db', 'postgres-production')
+
+class TestMigrationPlan:
+    """Test the DDL that converts a portable database"""
+
+    FKS = [
+        {'table': 'drones', 'name': 'drones_base_id_fkey', 'constrained_columns': ['base_id'],
+         'referred_table': 'bases', 'referred_columns': ['id'], 'options': {'ondelete': 'SET NULL'}},
+        {'table': 'schedules', 'name': 'schedules_drone_id_fkey', 'constrained_columns': ['drone_id'],
+         'referred_table': 'drones', 'referred_columns': ['id'], 'options': {'ondelete': 'CASCADE'}},
+    ]
+
+    def test_portable_database(self):
+        statements = migration_statements({}, self.FKS)
+
+        assert statements[:2] == [
+            'ALTER TABLE drones DROP CONSTRAINT drones_base_id_fkey',
+            'ALTER TABLE schedules DROP CONSTRAINT schedules_drone_id_fkey',
+        ]
+        assert ('ALTER TABLE drones ALTER COLUMN id TYPE uuid USING id::uuid, '
+                'ALTER COLUMN user_id TYPE uuid USING user_id::uuid, '
+                'ALTER COLUMN base_id TYPE uuid USING base_id::uuid') in statements
+        assert any('path_json TYPE jsonb USING path_json::jsonb' in s for s in statements)
+        assert ('ALTER TABLE drones ADD CONSTRAINT drones_base_id_fkey FOREIGN KEY (base_id) '
+                'REFERENCES bases (id) ON DELETE SET NULL') in statements
+        assert 'ALTER TABLE drones ALTER COLUMN id SET DEFAULT gen_random_uuid()' in statements
+        assert not any(s.startswith('CREATE INDEX') for s in statements)
+
+    def test_converted_database_is_left_alone(self):
+        types = {(table, column): 'uuid' for table, columns in
+                 {'bases': ('id',), 'drones': ('id', 'user_id', 'base_id'), 'schedules': ('id', 'drone_id')}.items()
+                 for column in columns}
+        types[('schedules', 'path_json')] = 'jsonb'
+        assert migration_statements(types, self.FKS) == []
@@ -0,0 +1,110 @@
+"""
+Tests for keyset (cursor) pagination of listing endpoints
+"""
+import pytest
+import uuid
+from datetime import datetime, timedelta
+from fastapi import HTTPException, status
+
+from app import app
+from auth import get_current_user
+from models import Drone, Schedule
+from pagination import encode_cursor, decode_cursor, PAGE_SIZE_MAX, NEXT_CURSOR_HEADER
+
+USER_ID = str(uuid.uuid4())
+
+@pytest.fixture
+def fleet(client_with_real_db_user):
+    """Real-DB client with 25 owned drones (5 sharing one created_at), 5 foreign ones and 12 schedules"""
+    client, SessionLocal = client_with_real_db_user
+    # DroneResponse.user_id is a UUID
+    app.dependency_overrides[get_current_user] = lambda: {'sub': USER_ID, 'user_metadata': {'role': 'user'}}
+    created = datetime(2024, 1, 1)
+    with SessionLocal() as db:
+        for i in range(25):
+            db.add(Drone(
+                id=str(uuid.uuid4()), name=f"Drone {i}", user_id=USER_ID,
+                created_at=created + timedelta(minutes=max(i, 5)),
+            ))
+        for i in range(5):
+            db.add(Drone(id=str(uuid.uuid4()), name=f"Other {i}", user_id=str(uuid.uuid4()), created_at=created))
+        drone_id = str(uuid.uuid4())
+        db.add(Drone(id=drone_id, name="Scheduled", user_id=USER_ID, created_at=created + timedelta(days=1)))
+        for i in range(12):
+            db.add(Schedule(id=str(uuid.uuid4()), drone_id=drone_id, start_time=created + timedelta(hours=12 - i)))
+        db.commit()
+    return client
+
+def _walk(client, path, limit):
+    pages, items, cursor = 0, [], None
+    while True:
+        params = {'limit': limit}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get(path, params=params)
+        assert response.status_code == status.HTTP_200_OK
+        pages += 1
+        items.extend(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return pages, items
+
+class TestCursor:
+    """Test cursor encoding"""
+
+    def test_round_trip(self):
+        columns = (Drone.created_at, Drone.id)
+        values = [datetime(2024, 1, 1, 12, 30, 5, 123), "abc"]
+        assert decode_cursor(encode_cursor(values), columns) == values
+
+    @pytest.mark.parametrize("token", ["not-a-cursor", encode_cursor(["only-one"]), "%%%"])
+    def test_invalid_cursor_rejected(self, token):
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor(token, (Drone.created_at, Drone.id))
+        assert exc.value.status_code == status.HTTP_400_BAD_REQUEST
+
+class TestListingPagination:
+    """Test paging through listings"""
+
+    def test_drone_pages_cover_every_row_once(self, fleet):
+        pages, items = _walk(fleet, "/api/drones", limit=10)
+
+        assert pages == 3
+        assert len(items) == 26
+        assert len({d['id'] for d in items}) == 26
+        assert all(d['name'] != 'Other 0' for d in items)
+        keys = [(d['created_at'], d['id']) for d in items]
+        assert keys == sorted(keys)
+
+    def test_schedules_ordered_by_start_time(self, fleet):
+        pages, items = _walk(fleet, "/api/schedules", limit=5)
+
+        assert pages == 3
+        starts = [s['start_time'] for s in items]
+        assert starts == sorted(starts)
+        assert len(items) == 12
+
+    def test_last_page_has_no_cursor(self, fleet):
+        response = fleet.get("/api/drones", params={'limit': 100})
+        assert NEXT_CURSOR_HEADER not in response.headers
+        assert len(response.json()) == 26
+
+    def test_link_header_points_at_next_page(self, fleet):
+        response = fleet.get("/api/drones", params={'limit': 10})
+        cursor = response.headers[NEXT_CURSOR_HEADER]
+        assert f"cursor={cursor}" in response.headers['link']
+        assert 'rel="next"' in response.headers['link']
+
+    def test_page_cost_independent_of_depth(self, fleet, query_budget):
+        first = fleet.get("/api/drones", params={'limit': 10})
+        # ETag state query + the page itself
+        with query_budget(2):
+            fleet.get("/api/drones", params={'limit': 10, 'cursor': first.headers[NEXT_CURSOR_HEADER]})
+
+    def test_limit_bounds(self, fleet):
+        assert fleet.get("/api/bases", params={'limit': 0}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert fleet.get("/api/bases", params={'limit': PAGE_SIZE_MAX + 1}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_bad_cursor_is_400(self, fleet):
+        response = fleet.get("/api/bases", params={'cursor': 'garbage'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
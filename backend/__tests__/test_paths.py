@@ -0,0 +1,235 @@
+"""
+Tests for packed schedule paths and their simplification
+"""
+import json
+import math
+import pytest
+import random
+import uuid
+from datetime import datetime, timedelta
+from fastapi import status
+from sqlalchemy import inspect, text
+
+import geodesy
+import paths
+from migrations import downgrade, migration_engine, upgrade
+from models import Drone, Schedule
+
+def wiggly_path(count, seed=7):
+    """A patrol line with sub-metre jitter: almost every point is redundant"""
+    rng = random.Random(seed)
+    return [[-122.4 + i * 1e-4 + rng.uniform(-2e-6, 2e-6), 37.79 + rng.uniform(-2e-6, 2e-6)] for i in range(count)]
+
+def offset_m(point, a, b):
+    """Distance in metres from point to segment ab (equirectangular)"""
+    scale = math.radians(1) * paths.EARTH_RADIUS_M
+    x_scale = scale * math.cos(math.radians(point[1]))
+    px, py = (point[0] - a[0]) * x_scale, (point[1] - a[1]) * scale
+    dx, dy = (b[0] - a[0]) * x_scale, (b[1] - a[1]) * scale
+    t = max(0.0, min(1.0, (px * dx + py * dy) / (dx * dx + dy * dy or 1)))
+    return math.hypot(px - t * dx, py - t * dy)
+
+class TestCodec:
+    """Test packing and Douglas-Peucker"""
+
+    def test_round_trip(self):
+        coordinates = wiggly_path(500) + [[179.9999999, -89.5]]
+        decoded = paths.decode(paths.encode(coordinates))
+        assert len(decoded) == len(coordinates)
+        assert all(abs(a - b) <= 1e-7 for p, q in zip(coordinates, decoded) for a, b in zip(p, q))
+
+    def test_round_trip_with_altitude(self):
+        coordinates = [[-122.4, 37.79, 120.5], [-122.41, 37.8, 80.0]]
+        assert paths.decode(paths.encode(coordinates)) == coordinates
+
+    def test_packed_is_smaller_than_json(self):
+        coordinates = wiggly_path(1000)
+        assert len(paths.encode(coordinates)) * 4 < len(json.dumps(coordinates))
+
+    def test_simplify_stays_within_tolerance(self):
+        coordinates = wiggly_path(300) + [[-122.37, 37.80], [-122.36, 37.79]]
+        simplified = paths.simplify(coordinates, 5)
+
+        assert len(simplified) < 10
+        assert simplified[0] == coordinates[0] and simplified[-1] == coordinates[-1]
+        assert [-122.37, 37.80] in simplified
+        for point in coordinates:
+            assert min(offset_m(point, a, b) for a, b in zip(simplified, simplified[1:])) <= 5.01
+
+    def test_unpackable_documents_kept_as_they_are(self):
+        for document in ({'coordinates': [[1, 2], [3]]}, {'coordinates': 'n/a'}, {'type': 'Point'}, None):
+            packed = paths.pack_document(document)
+            assert packed['path_data'] is None
+            assert paths.unpack_document(packed['path_document'], None, None) == document
+            assert all(packed[name] is None for name in paths.METRICS)
+
+    def test_metrics(self):
+        coordinates = [[0, 60, 100], [1, 60, 120], [1, 61, 90]]
+        metrics = paths.pack_document({'coordinates': coordinates})
+
+        length = geodesy.haversine_m(60, 0, 60, 1) + geodesy.haversine_m(60, 1, 61, 1)
+        assert metrics['path_length_m'] == pytest.approx(length)
+        assert metrics['path_duration_s'] == pytest.approx(length / paths.CRUISE_SPEED_MPS)
+        assert [metrics[name] for name in ('path_west', 'path_south', 'path_east', 'path_north')] == [0, 60, 1, 61]
+        assert paths.metrics([[5, 5]])['path_length_m'] == 0
+        assert paths.metrics([]) == dict.fromkeys(paths.METRICS)
+
+@pytest.fixture
+def patrol(client_with_real_db_user, mock_user):
+    """A drone of the mock user and one schedule with a 400-point path"""
+    client, SessionLocal = client_with_real_db_user
+    drone_id = str(uuid.uuid4())
+    with SessionLocal() as db:
+        db.add(Drone(id=drone_id, name="Patrol", user_id=mock_user['sub']))
+        db.commit()
+    payload = {
+        'drone_id': drone_id,
+        'start_time': (datetime.utcnow() + timedelta(hours=1)).isoformat(),
+        'path_json': {'type': 'LineString', 'coordinates': wiggly_path(400)},
+    }
+    created = client.post('/api/schedules', json=payload)
+    assert created.status_code == status.HTTP_201_CREATED
+    return client, SessionLocal, drone_id, created.json()
+
+class TestScheduleEndpoints:
+    """Test the packed storage behind path_json"""
+
+    def test_full_path_by_default(self, patrol):
+        client, _, _, created = patrol
+        body = client.get(f"/api/schedules/{created['id']}").json()
+        assert body['path_points'] == 400
+        assert body['path_json']['type'] == 'LineString'
+        assert len(body['path_json']['coordinates']) == 400
+
+    def test_simplified_and_no_path(self, patrol):
+        client, _, _, created = patrol
+        simplified = client.get(f"/api/schedules/{created['id']}", params={'path': 'simplified'}).json()
+        listed = client.get('/api/schedules', params={'path': 'none'}).json()
+
+        assert 2 <= len(simplified['path_json']['coordinates']) < 10
+        assert listed[0]['path_json'] is None and listed[0]['path_points'] == 400
+
+    def test_unknown_detail_rejected(self, patrol):
+        client, _, _, created = patrol
+        response = client.get(f"/api/schedules/{created['id']}", params={'path': 'tiny'})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_coordinates_stored_packed(self, patrol):
+        _, SessionLocal, _, created = patrol
+        with SessionLocal() as db:
+            stored = db.execute(text('SELECT path_json, path_data FROM schedules WHERE id = :id'),
+                                {'id': created['id']}).one()
+        assert json.loads(stored.path_json) == {'type': 'LineString'}
+        assert len(stored.path_data) < 400 * 8
+
+    def test_update_and_batch_create_are_packed(self, patrol):
+        client, SessionLocal, drone_id, created = patrol
+        client.put(f"/api/schedules/{created['id']}", json={'path_json': {'coordinates': [[1.0, 2.0], [1.5, 2.5]]}})
+        response = client.post('/api/batch', json={'operations': [{'op': 'create', 'entity': 'schedule', 'data': {
+            'drone_id': drone_id, 'start_time': (datetime.utcnow() + timedelta(days=1)).isoformat(),
+            'path_json': {'coordinates': wiggly_path(50)},
+        }}]})
+
+        assert response.status_code == status.HTTP_200_OK
+        with SessionLocal() as db:
+            updated = db.get(Schedule, created['id'])
+            batched = db.get(Schedule, response.json()['results'][0]['id'])
+            assert updated.path_json == {'coordinates': [[1.0, 2.0], [1.5, 2.5]]}
+            assert batched.path_points == 50 and batched.path_simplified is not None
+            assert updated.path_length_m == pytest.approx(geodesy.haversine_m(2.0, 1.0, 2.5, 1.5))
+            assert batched.path_length_m == pytest.approx(geodesy.path_length_m(wiggly_path(50)))
+
+class TestPathMetrics:
+    """Test the metrics stored with each path"""
+
+    def test_returned_with_schedules(self, patrol):
+        client, _, _, created = patrol
+        length = geodesy.path_length_m(wiggly_path(400))
+        listed = client.get('/api/schedules', params={'path': 'none'}).json()[0]
+
+        for body in (created, listed):
+            assert body['path_length_m'] == pytest.approx(length)
+            assert body['path_duration_s'] == pytest.approx(length / paths.CRUISE_SPEED_MPS)
+            west, south, east, north = body['path_bbox']
+            assert west == pytest.approx(-122.4, abs=1e-5) and east == pytest.approx(-122.4 + 399e-4, abs=1e-5)
+            assert south < 37.79 < north
+
+    def test_recomputed_only_with_the_path(self, patrol):
+        client, SessionLocal, _, created = patrol
+        later = (datetime.utcnow() + timedelta(hours=2)).isoformat()
+        moved = client.put(f"/api/schedules/{created['id']}", json={'start_time': later}).json()
+        assert moved['path_length_m'] == created['path_length_m']
+
+        body = client.put(f"/api/schedules/{created['id']}", json={'path_json': {'coordinates': [[0, 0], [0, 1]]}}).json()
+        assert body['path_length_m'] == pytest.approx(geodesy.haversine_m(0, 0, 1, 0))
+        assert body['path_bbox'] == [0, 0, 0, 1]
+
+        body = client.put(f"/api/schedules/{created['id']}", json={'path_json': {'type': 'Point'}}).json()
+        assert body['path_length_m'] is None and body['path_bbox'] is None
+
+    def test_length_filter(self, patrol):
+        client, _, drone_id, created = patrol
+        short = client.post('/api/schedules', json={
+            'drone_id': drone_id, 'start_time': (datetime.utcnow() + timedelta(days=1)).isoformat(),
+            'path_json': {'coordinates': [[0, 0], [0, 0.001]]},
+        }).json()
+
+        def listed(**params):
+            return [body['id'] for body in client.get('/api/schedules', params={'path': 'none', **params}).json()]
+
+        assert listed(min_length_m=1000) == [created['id']]
+        assert listed(max_length_m=1000) == [short['id']]
+        assert listed(min_length_m=100, max_length_m=200) == [short['id']]
+        assert client.get('/api/schedules', params={'min_length_m': -1}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+class TestPackedPathsMigration:
+    """Test converting stored documents and back"""
+
+    def test_backfill_and_downgrade(self, tmp_path):
+        engine = migration_engine(f'sqlite:///{tmp_path / "paths.db"}')
+        upgrade(engine, target='004', log=lambda message: None)
+        documents = {
+            str(uuid.uuid4()): {'type': 'LineString', 'coordinates': [[-122.4, 37.79], [-122.41, 37.8]]},
+            str(uuid.uuid4()): {'coordinates': 'unknown'},
+        }
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO drones (id, name, user_id) VALUES ('d', 'Old', 'u')"))
+            for key, document in documents.items():
+                conn.execute(text("INSERT INTO schedules (id, drone_id, start_time, path_json) "
+                                  "VALUES (:id, 'd', '2030-01-01 08:00:00', :path)"),
+                             {'id': key, 'path': json.dumps(document)})
+
+        upgrade(engine, log=lambda message: None)
+        with engine.connect() as conn:
+            stored = dict(conn.execute(text('SELECT id, path_points FROM schedules')).all())
+            lengths = dict(conn.execute(text('SELECT id, path_length_m FROM schedules')).all())
+        downgrade(engine, target='004', log=lambda message: None)
+        with engine.connect() as conn:
+            restored = {key: json.loads(path) for key, path in conn.execute(text('SELECT id, path_json FROM schedules'))}
+        engine.dispose()
+
+        assert sorted(stored.values(), key=str) == [2, None]
+        assert sorted(lengths.values(), key=str) == [pytest.approx(geodesy.haversine_m(37.79, -122.4, 37.8, -122.41)), None]
+        assert restored == documents
+
+    def test_metrics_revision_on_packed_paths(self, tmp_path):
+        engine = migration_engine(f'sqlite:///{tmp_path / "metrics.db"}')
+        upgrade(engine, target='004', log=lambda message: None)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO drones (id, name, user_id) VALUES ('d', 'Old', 'u')"))
+            conn.execute(text("INSERT INTO schedules (id, drone_id, start_time, path_json) "
+                              "VALUES ('s', 'd', '2030-01-01 08:00:00', :path)"),
+                         {'path': json.dumps({'coordinates': [[0, 0], [0, 1]]})})
+
+        # 005 and its backfill run before the metric columns exist
+        upgrade(engine, target='005', log=lambda message: None)
+        with engine.connect() as conn:
+            assert 'path_length_m' not in {c['name'] for c in inspect(conn).get_columns('schedules')}
+        upgrade(engine, log=lambda message: None)
+        with engine.connect() as conn:
+            length = conn.execute(text('SELECT path_length_m FROM schedules')).scalar()
+            indexes = {index['name'] for index in inspect(conn).get_indexes('schedules')}
+        engine.dispose()
+
+        assert length == pytest.approx(geodesy.haversine_m(0, 0, 1, 0))
+        assert 'idx_schedule_path_length' in indexes
@@ -0,0 +1,135 @@
+"""
+Tests for per-request SQL accounting, N+1 detection and endpoint query budgets
+"""
+import pytest
+import uuid
+from datetime import datetime, timedelta
+from fastapi import FastAPI, Depends, status
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from models import Drone, DroneBase, Schedule
+from query_budget import QueryBudgetMiddleware, statement_shape, start_collecting, stop_collecting
+
+@pytest.fixture
+def seeded_schedule(client_with_real_db_user, mock_user):
+    """Real-DB client with one drone (owned by the mock user) and one schedule"""
+    client, SessionLocal = client_with_real_db_user
+    drone_id = str(uuid.uuid4())
+    schedule_id = str(uuid.uuid4())
+    with SessionLocal() as db:
+        db.add(Drone(id=drone_id, name="Budget Drone", user_id=mock_user['sub'], status="active"))
+        db.add(Schedule(
+            id=schedule_id,
+            drone_id=drone_id,
+            start_time=datetime.utcnow() + timedelta(hours=1),
+            path_json={"coordinates": [[-122.4, 37.79], [-122.41, 37.8]]},
+        ))
+        db.commit()
+    return client, drone_id, schedule_id
+
+class TestStatementShape:
+    """Test statement normalization"""
+
+    def test_in_lists_collapse(self):
+        assert statement_shape("SELECT * FROM t WHERE id IN (?, ?, ?)") == statement_shape("SELECT * FROM t WHERE id IN (?)")
+
+    def test_whitespace_normalized(self):
+        assert statement_shape("SELECT 1\n   FROM t") == "SELECT 1 FROM t"
+
+class TestCollector:
+    """Test statement collection against a real engine"""
+
+    def test_repeated_shapes_flagged(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        stats, token = start_collecting()
+        try:
+            with engine.connect() as conn:
+                for i in range(4):
+                    conn.execute(text("SELECT :i"), {"i": i})
+                conn.execute(text("SELECT 'other'"))
+        finally:
+            stop_collecting(token)
+
+        assert stats.count == 5
+        assert stats.total_time > 0
+        assert stats.repeated(3) == [("SELECT ?", 4)]
+
+    def test_nothing_collected_outside_requests(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        stats, token = start_collecting()
+        stop_collecting(token)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        assert stats.count == 0
+
+class TestDebugHeaders:
+    """Test X-DB-* headers in debug mode"""
+
+    def test_headers_report_counts_and_n_plus_one(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        debug_app = FastAPI()
+        debug_app.add_middleware(QueryBudgetMiddleware, debug=True, threshold=3)
+
+        @debug_app.get("/n-plus-one")
+        def n_plus_one():
+            with engine.connect() as conn:
+                for i in range(3):
+                    conn.execute(text("SELECT :i"), {"i": i})
+            return {}
+
+        response = TestClient(debug_app).get("/n-plus-one")
+        assert response.headers['x-db-query-count'] == '3'
+        assert float(response.headers['x-db-query-time-ms']) >= 0
+        assert response.headers['x-db-n-plus-one'] == '3'
+
+class TestEndpointBudgets:
+    """Declared SQL budgets for the schedule endpoints
+
+    Reads include one ETag state query; writes include one table_versions bump.
+    """
+
+    def test_get_schedule_budget(self, seeded_schedule, query_budget):
+        client, _, schedule_id = seeded_schedule
+        with query_budget(2):
+            response = client.get(f"/api/schedules/{schedule_id}")
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_list_schedules_budget(self, seeded_schedule, query_budget):
+        client, _, _ = seeded_schedule
+        with query_budget(2):
+            response = client.get("/api/schedules")
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_update_schedule_budget(self, seeded_schedule, query_budget):
+        client, _, schedule_id = seeded_schedule
+        end_time = (datetime.utcnow() + timedelta(hours=3)).isoformat()
+        # + one index seek for an overlapping booking of the drone
+        with query_budget(5):
+            response = client.put(f"/api/schedules/{schedule_id}", json={"end_time": end_time})
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_delete_schedule_budget(self, seeded_schedule, query_budget):
+        client, _, schedule_id = seeded_schedule
+        with query_budget(3):
+            response = client.delete(f"/api/schedules/{schedule_id}")
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_create_schedule_budget(self, seeded_schedule, query_budget):
+        client, drone_id, _ = seeded_schedule
+        payload = {
+            "drone_id": drone_id,
+            "start_time": (datetime.utcnow() + timedelta(hours=4)).isoformat(),
+            "path_json": {"coordinates": [[-122.4, 37.79]]},
+        }
+        # + one index seek for an overlapping booking of the drone
+        with query_budget(5):
+            response = client.post("/api/schedules", json=payload)
+        assert response.status_code == status.HTTP_201_CREATED
+
+    def test_budget_violation_fails(self, seeded_schedule, query_budget):
+        client, _, schedule_id = seeded_schedule
+        with pytest.raises(pytest.fail.Exception):
+            with query_budget(0):
+                client.get(f"/api/schedules/{schedule_id}")
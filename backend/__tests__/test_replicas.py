@@ -0,0 +1,126 @@
+"""
+Tests for read-replica routing, using two SQLite files as primary and replica
+"""
+import pytest
+import uuid
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+import dependencies
+from app import app
+from auth import get_current_user
+from db_profiles import create_profiled_engine, BASIC_SQLITE
+from models import BaseModel, Drone
+from replicas import Replica, SessionRouter
+
+USER_ID = str(uuid.uuid4())
+PRIMARY_DRONE = str(uuid.uuid4())
+REPLICA_DRONE = str(uuid.uuid4())
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def seeded_database(path, drone_id, name):
+    engine = create_profiled_engine(f'sqlite:///{path}', BASIC_SQLITE)
+    BaseModel.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(Drone(id=drone_id, name=name, user_id=USER_ID))
+        db.commit()
+    return engine
+
+@pytest.fixture
+def databases(tmp_path):
+    """Primary and replica files holding different drones, so responses show where reads went"""
+    primary = seeded_database(tmp_path / 'primary.db', PRIMARY_DRONE, 'On primary')
+    replica_engine = seeded_database(tmp_path / 'replica.db', REPLICA_DRONE, 'On replica')
+    replica_engine.dispose()
+    yield primary, Replica(f'sqlite:///{tmp_path / "replica.db"}', BASIC_SQLITE)
+    primary.dispose()
+
+@pytest.fixture
+def routed(databases, monkeypatch):
+    primary, replica = databases
+    clock = FakeClock()
+    router = SessionRouter([replica], sticky_seconds=5, check_interval=5, retry_seconds=30, clock=clock)
+    monkeypatch.setattr(dependencies, 'SessionLocal', sessionmaker(bind=primary, autoflush=False))
+    monkeypatch.setattr(dependencies, 'session_router', router)
+    app.dependency_overrides[get_current_user] = lambda: {'sub': USER_ID, 'user_metadata': {'role': 'user'}}
+    with TestClient(app) as client:
+        yield client, router, replica, clock
+    app.dependency_overrides.clear()
+
+def names(response):
+    return [drone['name'] for drone in response.json()]
+
+def auth(token):
+    return {'Authorization': f'Bearer {token}'}
+
+class TestReadRouting:
+    """Test which database serves each request"""
+
+    def test_reads_go_to_replica(self, routed):
+        client, *_ = routed
+        assert names(client.get('/api/drones', headers=auth('a'))) == ['On replica']
+
+    def test_writes_go_to_primary(self, routed):
+        client, *_ = routed
+        response = client.put(f'/api/drones/{PRIMARY_DRONE}', json={'name': 'Renamed'}, headers=auth('a'))
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_read_your_writes_window(self, routed):
+        client, _, _, clock = routed
+        client.put(f'/api/drones/{PRIMARY_DRONE}', json={'name': 'Renamed'}, headers=auth('writer'))
+
+        assert names(client.get('/api/drones', headers=auth('writer'))) == ['Renamed']
+        assert names(client.get('/api/drones', headers=auth('someone-else'))) == ['On replica']
+
+        clock.now += 6
+        assert names(client.get('/api/drones', headers=auth('writer'))) == ['On replica']
+
+    def test_failed_write_still_sticks(self, routed):
+        client, *_ = routed
+        response = client.put(f'/api/drones/{uuid.uuid4()}', json={'name': 'Ghost'}, headers=auth('writer'))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert names(client.get('/api/drones', headers=auth('writer'))) == ['On primary']
+
+class TestReplicaHealth:
+    """Test fallback to the primary"""
+
+    def test_unhealthy_replica_falls_back_to_primary(self, routed, tmp_path):
+        client, router, _, clock = routed
+        broken = Replica(f'sqlite:///{tmp_path / "missing" / "replica.db"}', BASIC_SQLITE)
+        router.replicas = [broken]
+
+        assert names(client.get('/api/drones', headers=auth('a'))) == ['On primary']
+        assert not broken.healthy
+
+        # Skipped without another check until the retry window has passed
+        checks = []
+        broken.check = lambda max_lag: checks.append(1)
+        client.get('/api/drones', headers=auth('a'))
+        assert checks == []
+        clock.now += 31
+        assert router.pick_replica() is broken
+        assert checks == [1] and broken.healthy
+
+    def test_round_robin_skips_down_replicas(self, databases):
+        _, replica = databases
+        other = Replica(replica.url, BASIC_SQLITE)
+        clock = FakeClock()
+        router = SessionRouter([replica, other], clock=clock)
+
+        assert {id(router.pick_replica()) for _ in range(4)} == {id(replica), id(other)}
+        router.mark_down(other)
+        assert {id(router.pick_replica()) for _ in range(4)} == {id(replica)}
+        router.mark_down(replica)
+        assert router.pick_replica() is None
+
+    def test_no_replicas_means_primary(self):
+        router = SessionRouter([])
+        request = type('Request', (), {'method': 'GET', 'headers': {}})()
+        assert router.route(request) is None
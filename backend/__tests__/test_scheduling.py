@@ -0,0 +1,183 @@
+"""
+Tests for schedule time windows and per-drone overlap detection
+"""
+import pytest
+import uuid
+from datetime import datetime, timedelta
+from fastapi import status
+from sqlalchemy import inspect
+
+from migrations import migration_engine, upgrade
+from models import Drone, Schedule
+
+T0 = datetime(2030, 1, 1, 8, 0)
+PATH = {"coordinates": [[-122.4, 37.79], [-122.41, 37.8]]}
+
+def at(hours):
+    return (T0 + timedelta(hours=hours)).isoformat()
+
+@pytest.fixture
+def booked(client_with_real_db_user, mock_user):
+    """Two drones of the mock user: the first booked 8-10 and 12-13, the second 9-17"""
+    client, SessionLocal = client_with_real_db_user
+    drones = [str(uuid.uuid4()), str(uuid.uuid4())]
+    with SessionLocal() as db:
+        db.add_all([Drone(id=drone_id, name=f"Drone {i}", user_id=mock_user['sub']) for i, drone_id in enumerate(drones)])
+        db.flush()
+        for drone_id, start, end in ((drones[0], 0, 2), (drones[0], 4, 5), (drones[1], 1, 9)):
+            db.add(Schedule(drone_id=drone_id, start_time=T0 + timedelta(hours=start),
+                            end_time=T0 + timedelta(hours=end), path_json=PATH))
+        db.commit()
+    return client, drones
+
+def starts(response):
+    return sorted(schedule['start_time'][11:16] for schedule in response.json())
+
+class TestWindowQueries:
+    """Test ?from / ?to / ?drone_id on GET /schedules"""
+
+    def test_window_includes_schedule_spanning_from(self, booked):
+        client, _ = booked
+        response = client.get('/api/schedules', params={'from': at(1.5), 'to': at(4)})
+        assert response.status_code == status.HTTP_200_OK
+        # 8-10 runs past 9:30 and 9-17 too; 12-13 starts at the window's end
+        assert starts(response) == ['08:00', '09:00']
+
+    def test_ended_schedules_are_excluded(self, booked):
+        client, drones = booked
+        response = client.get('/api/schedules', params={'from': at(3), 'drone_id': drones[0]})
+        assert starts(response) == ['12:00']
+
+    def test_to_only(self, booked):
+        client, _ = booked
+        assert starts(client.get('/api/schedules', params={'to': at(1)})) == ['08:00']
+
+    def test_empty_window_rejected(self, booked):
+        client, _ = booked
+        response = client.get('/api/schedules', params={'from': at(2), 'to': at(2)})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+class TestOverlapDetection:
+    """Test that a drone can't be booked twice"""
+
+    def test_overlapping_create_rejected(self, booked):
+        client, drones = booked
+        payload = {'drone_id': drones[0], 'start_time': at(1), 'end_time': at(3), 'path_json': PATH}
+        response = client.post('/api/schedules', json=payload)
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert 'already scheduled' in response.json()['detail']
+
+    def test_adjacent_create_allowed(self, booked):
+        client, drones = booked
+        payload = {'drone_id': drones[0], 'start_time': at(2), 'end_time': at(4), 'path_json': PATH}
+        assert client.post('/api/schedules', json=payload).status_code == status.HTTP_201_CREATED
+
+    def test_point_booking_inside_range_rejected(self, booked):
+        client, drones = booked
+        payload = {'drone_id': drones[1], 'start_time': at(3), 'path_json': PATH}
+        assert client.post('/api/schedules', json=payload).status_code == status.HTTP_409_CONFLICT
+
+    def test_update_may_overlap_itself_but_not_others(self, booked):
+        client, drones = booked
+        schedule = client.get('/api/schedules', params={'drone_id': drones[0], 'to': at(1)}).json()[0]
+
+        assert client.put(f"/api/schedules/{schedule['id']}", json={'end_time': at(3)}).status_code == status.HTTP_200_OK
+        response = client.put(f"/api/schedules/{schedule['id']}", json={'end_time': at(4.5)})
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+    def test_batch_conflicts_fail_their_items(self, booked):
+        client, drones = booked
+        response = client.post('/api/batch', json={'operations': [
+            {'op': 'create', 'entity': 'schedule',
+             'data': {'drone_id': drones[0], 'start_time': at(6), 'end_time': at(8), 'path_json': PATH}},
+            {'op': 'create', 'entity': 'schedule',
+             'data': {'drone_id': drones[0], 'start_time': at(7), 'end_time': at(9), 'path_json': PATH}},
+            {'op': 'create', 'entity': 'schedule',
+             'data': {'drone_id': drones[1], 'start_time': at(3), 'path_json': PATH}},
+        ]})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        results = response.json()['results']
+        assert results[0]['status'] == 'not_applied'
+        assert results[1]['detail'] == 'Overlaps item 0'
+        assert results[2]['detail'] == 'Drone is already scheduled at that time'
+
+class TestBackwardWindows:
+    """Test that a schedule must end after it starts"""
+
+    def test_create_rejected(self, booked):
+        client, drones = booked
+        payload = {'drone_id': drones[0], 'start_time': at(10), 'end_time': at(8), 'path_json': PATH}
+        response = client.post('/api/schedules', json=payload)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        payload['end_time'] = at(10)
+        assert client.post('/api/schedules', json=payload).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_update_checked_against_stored_times(self, booked):
+        client, drones = booked
+        schedule = client.get('/api/schedules', params={'drone_id': drones[0], 'to': at(1)}).json()[0]
+
+        # Stored 8-10: ending at 7 would end before it starts
+        response = client.put(f"/api/schedules/{schedule['id']}", json={'end_time': at(-1)})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()['detail'] == "end_time must be after start_time"
+        response = client.put(f"/api/schedules/{schedule['id']}", json={'start_time': at(2)})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = client.put(f"/api/schedules/{schedule['id']}", json={'start_time': at(3), 'end_time': at(2.5)})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert client.get(f"/api/schedules/{schedule['id']}").json()['end_time'].startswith('2030-01-01T10:00')
+
+    def test_batch_items_fail(self, booked):
+        client, drones = booked
+        schedule = client.get('/api/schedules', params={'drone_id': drones[0], 'to': at(1)}).json()[0]
+        response = client.post('/api/batch', json={'operations': [
+            {'op': 'create', 'entity': 'schedule',
+             'data': {'drone_id': drones[0], 'start_time': at(8), 'end_time': at(6), 'path_json': PATH}},
+            {'op': 'update', 'entity': 'schedule', 'id': schedule['id'], 'data': {'start_time': at(2)}},
+        ]})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        results = response.json()['results']
+        assert results[0]['detail'] == "Invalid data: Value error, end_time must be after start_time"
+        assert results[1]['detail'] == "end_time must be after start_time"
+
+class TestTimeZones:
+    """Test that offsets are honoured: times are compared as UTC instants"""
+
+    def test_bookings_with_offsets(self, client_with_real_db_user, mock_user):
+        client, SessionLocal = client_with_real_db_user
+        drone_id = str(uuid.uuid4())
+        with SessionLocal() as db:
+            db.add(Drone(id=drone_id, name="Zoned", user_id=mock_user['sub']))
+            db.commit()
+
+        def book(start, end):
+            return client.post('/api/schedules', json={'drone_id': drone_id, 'start_time': start, 'end_time': end})
+
+        first = book('2030-01-01T10:00:00+02:00', '2030-01-01T11:00:00+02:00')
+        assert first.status_code == status.HTTP_201_CREATED
+        assert first.json()['start_time'].startswith('2030-01-01T08:00:00')
+        # Later the same morning, in the same zone
+        assert book('2030-01-01T11:30:00+02:00', '2030-01-01T12:00:00+02:00').status_code == status.HTTP_201_CREATED
+        # 08:30-09:30 UTC, written in another zone, overlaps the first
+        response = book('2030-01-01T03:30:00-05:00', '2030-01-01T04:30:00-05:00')
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert '2030-01-01T08:00:00 to 2030-01-01T09:00:00' in response.json()['detail']
+        # Right after it, in UTC
+        assert book('2030-01-01T09:00:00Z', '2030-01-01T09:15:00Z').status_code == status.HTTP_201_CREATED
+
+        listed = client.get('/api/schedules', params={'from': '2030-01-01T11:10:00+02:00', 'to': '2030-01-01T11:20:00+02:00'})
+        assert starts(listed) == ['09:00']
+
+class TestScheduleWindowsMigration:
+    """Test the index swap"""
+
+    def test_window_index_replaces_drone_index(self, tmp_path):
+        engine = migration_engine(f'sqlite:///{tmp_path / "windows.db"}')
+        upgrade(engine, target='003', log=lambda message: None)
+        upgrade(engine, log=lambda message: None)
+
+        indexes = {index['name']: index['column_names'] for index in inspect(engine).get_indexes('schedules')}
+        engine.dispose()
+        assert indexes['idx_schedule_drone_window'] == ['drone_id', 'start_time', 'end_time']
+        assert 'idx_schedule_drone_id' not in indexes
@@ -0,0 +1,69 @@
+"""
+Tests for POST /drones/simulate_batch and the simulation worker pool
+"""
+import json
+import pytest
+import uuid
+from fastapi import status
+
+import simulation
+from models import Drone
+
+@pytest.fixture
+def fleet(client_with_real_db_user, mock_user, monkeypatch):
+    """Two drones of the mock user and one of someone else; a two-worker pool"""
+    client, SessionLocal = client_with_real_db_user
+    monkeypatch.setattr(simulation, 'SIMULATION_WORKERS', 2)
+    ids = {'mine': str(uuid.uuid4()), 'also_mine': str(uuid.uuid4()), 'theirs': str(uuid.uuid4())}
+    with SessionLocal() as db:
+        db.add(Drone(id=ids['mine'], name="Mine", user_id=mock_user['sub']))
+        db.add(Drone(id=ids['also_mine'], name="Also mine", user_id=mock_user['sub']))
+        db.add(Drone(id=ids['theirs'], name="Theirs", user_id=str(uuid.uuid4())))
+        db.commit()
+    yield client, ids
+    simulation.shutdown_pool()
+
+def stream(response):
+    return sorted((json.loads(line) for line in response.text.splitlines()), key=lambda line: line['index'])
+
+class TestSimulateBatch:
+    """Test authorization and streamed results"""
+
+    def test_streams_one_line_per_item(self, fleet, query_budget):
+        client, ids = fleet
+        items = [{'drone_id': ids['mine'], 'path': [[0, 60], [1, 60]]} for _ in range(20)]
+        items += [
+            {'drone_id': ids['also_mine']},
+            {'drone_id': ids['theirs'], 'path': [[0, 0], [1, 1]]},
+            {'drone_id': str(uuid.uuid4())},
+            {'drone_id': ids['mine'], 'path': [[0, 0], [1]]},
+        ]
+
+        # One authorization query for the whole batch
+        with query_budget(1):
+            response = client.post('/api/drones/simulate_batch', json={'items': items})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['content-type'].startswith('application/x-ndjson')
+        lines = stream(response)
+        assert [line['index'] for line in lines] == list(range(len(items)))
+        assert all(line['result']['distance_m'] == pytest.approx(55597, rel=1e-3) for line in lines[:20])
+        # Workers draw their own speeds
+        assert len({line['result']['speed_mps'] for line in lines[:20]}) > 1
+        assert lines[20]['status'] == 200 and lines[20]['result']['distance_m'] > 0
+        assert [line['status'] for line in lines[21:]] == [403, 404, 400]
+        assert lines[21]['result'] is None and lines[21]['detail'] == "Access denied"
+
+    def test_oversized_batch_rejected(self, fleet, monkeypatch):
+        client, ids = fleet
+        monkeypatch.setattr(simulation, 'MAX_SIMULATION_BATCH', 2)
+        response = client.post('/api/drones/simulate_batch', json={'items': [{'drone_id': ids['mine']}] * 3})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_matches_single_simulation(self, fleet):
+        client, ids = fleet
+        path = [[-122.4, 37.79], [-122.39, 37.8], [-122.38, 37.79]]
+        single = client.post(f"/api/drones/{ids['mine']}/simulate_path", json={'path': path}).json()
+        batched, = stream(client.post('/api/drones/simulate_batch', json={'items': [{'drone_id': ids['mine'], 'path': path}]}))
+        assert batched['result']['distance_m'] == single['distance_m']
+        assert batched['result']['telemetry']['heading_deg'] == single['telemetry']['heading_deg']
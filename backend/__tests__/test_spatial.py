@@ -0,0 +1,136 @@
+"""
+Tests for the base spatial index and the /bases/near and /bases/within endpoints
+"""
+import pytest
+import random
+import uuid
+from fastapi import status
+
+import spatial
+from models import DroneBase
+from spatial import PackedRTree, drop_rtree, haversine_m, install_rtree, radius_boxes, split_bbox, uses_rtree
+
+BASES = {
+    'San Francisco': (37.7749, -122.4194),
+    'Oakland': (37.8044, -122.2712),
+    'San Jose': (37.3382, -121.8863),
+    'Austin': (30.2672, -97.7431),
+    'New York': (40.7128, -74.0060),
+    'Fiji West': (-17.7134, 179.9),
+    'Samoa East': (-13.7590, -179.9),
+}
+
+@pytest.fixture(params=['rtree', 'memory'])
+def spatial_client(request, client_with_real_db_user):
+    """Client over a database with the given spatial index, seeded with BASES"""
+    client, SessionLocal = client_with_real_db_user
+    with SessionLocal() as db:
+        if request.param == 'memory':
+            drop_rtree(db.connection())
+        db.add_all([DroneBase(id=str(uuid.uuid4()), name=name, lat=lat, lng=lng) for name, (lat, lng) in BASES.items()])
+        db.commit()
+        spatial._has_rtree.pop(db.get_bind(), None)
+        assert uses_rtree(db) == (request.param == 'rtree')
+    yield client, SessionLocal
+    with SessionLocal() as db:
+        spatial._has_rtree.pop(db.get_bind(), None)
+
+def names(response):
+    return [base['name'] for base in response.json()]
+
+class TestGeometry:
+    """Test the box helpers and the in-memory tree"""
+
+    def test_packed_tree_matches_brute_force(self):
+        rng = random.Random(7)
+        points = [(str(i), rng.uniform(-90, 90), rng.uniform(-180, 180)) for i in range(5000)]
+        tree = PackedRTree(points)
+        for _ in range(20):
+            south, north = sorted(rng.uniform(-90, 90) for _ in range(2))
+            west, east = sorted(rng.uniform(-180, 180) for _ in range(2))
+            expected = {p[0] for p in points if south <= p[1] <= north and west <= p[2] <= east}
+            assert set(tree.search((south, west, north, east))) == expected
+
+    def test_antimeridian_bbox_splits(self):
+        assert split_bbox(170, -20, -170, -10) == [(-20, 170, -10, 180.0), (-20, -180.0, -10, -170)]
+
+    def test_radius_box_covers_circle(self):
+        (south, west, north, east), = radius_boxes(60.0, 10.0, 50_000)
+        assert haversine_m(60.0, 10.0, north, 10.0) == pytest.approx(50_000, rel=1e-6)
+        assert west < 10.0 - 0.8 and east > 10.0 + 0.8  # a degree of longitude is ~55 km at 60°N
+
+    def test_radius_box_near_pole_spans_all_longitudes(self):
+        assert radius_boxes(89.5, 0.0, 100_000) == [(pytest.approx(88.6, abs=0.1), -180.0, 90.0, 180.0)]
+
+class TestSpatialEndpoints:
+    """Test the endpoints against both index implementations"""
+
+    def test_near(self, spatial_client):
+        client, _ = spatial_client
+        response = client.get('/api/bases/near', params={'lat': 37.78, 'lng': -122.41, 'k': 3})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert names(response) == ['San Francisco', 'Oakland', 'San Jose']
+        distances = [base['distance_m'] for base in response.json()]
+        assert distances == sorted(distances) and distances[0] < 2_000
+
+    def test_near_expands_until_k_found(self, spatial_client):
+        client, _ = spatial_client
+        response = client.get('/api/bases/near', params={'lat': 0, 'lng': 0, 'k': len(BASES) + 5})
+        assert len(response.json()) == len(BASES)
+
+    def test_near_across_antimeridian(self, spatial_client):
+        client, _ = spatial_client
+        response = client.get('/api/bases/near', params={'lat': -15, 'lng': 179.99, 'k': 2})
+        assert set(names(response)) == {'Fiji West', 'Samoa East'}
+
+    def test_within(self, spatial_client):
+        client, _ = spatial_client
+        response = client.get('/api/bases/within', params={'bbox': '-123,37,-121,38'})
+        assert sorted(names(response)) == ['Oakland', 'San Francisco', 'San Jose']
+
+    def test_within_across_antimeridian_and_limit(self, spatial_client):
+        client, _ = spatial_client
+        response = client.get('/api/bases/within', params={'bbox': '179,-20,-179,-10'})
+        assert sorted(names(response)) == ['Fiji West', 'Samoa East']
+        limited = client.get('/api/bases/within', params={'bbox': '-180,-90,180,90', 'limit': 2})
+        assert len(limited.json()) == 2
+
+    def test_index_follows_writes(self, spatial_client):
+        client, _ = spatial_client
+        created = client.post('/api/bases', json={'name': 'Reno', 'lat': 39.5296, 'lng': -119.8138}).json()
+        assert names(client.get('/api/bases/near', params={'lat': 39.5, 'lng': -119.8, 'k': 1})) == ['Reno']
+
+        client.put(f"/api/bases/{created['id']}", json={'lat': 47.6062, 'lng': -122.3321})
+        assert names(client.get('/api/bases/within', params={'bbox': '-123,47,-122,48'})) == ['Reno']
+        assert names(client.get('/api/bases/within', params={'bbox': '-120,39,-119,40'})) == []
+
+        client.delete(f"/api/bases/{created['id']}")
+        assert names(client.get('/api/bases/within', params={'bbox': '-123,47,-122,48'})) == []
+
+    @pytest.mark.parametrize('bbox', ['1,2,3', 'a,b,c,d', '0,10,1,5', '0,0,200,1'])
+    def test_invalid_bbox(self, client_with_real_db_user, bbox):
+        client, _ = client_with_real_db_user
+        response = client.get('/api/bases/within', params={'bbox': bbox})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_near_requires_coordinates(self, client_with_real_db_user):
+        client, _ = client_with_real_db_user
+        response = client.get('/api/bases/near', params={'lat': 95, 'lng': 0})
+        assert response.status_code == 422
+
+class TestRTreeMigration:
+    """Test indexing bases that predate the R*Tree"""
+
+    def test_install_indexes_existing_bases(self, real_session_factory):
+        with real_session_factory() as db:
+            drop_rtree(db.connection())
+            db.add(DroneBase(id=str(uuid.uuid4()), name='Old', lat=10.0, lng=20.0))
+            db.commit()
+
+            assert install_rtree(db.connection())
+            db.commit()
+            spatial._has_rtree.pop(db.get_bind(), None)
+            found = spatial.bases_within(db, [(9.0, 19.0, 11.0, 21.0)], 10)
+            spatial._has_rtree.pop(db.get_bind(), None)
+        assert [base.name for base in found] == ['Old']
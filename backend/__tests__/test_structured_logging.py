@@ -0,0 +1,95 @@
+"""
+Tests for the structured, queue-based logger
+"""
+import pytest
+import json
+import logging
+import queue
+import uuid
+from datetime import datetime
+from unittest.mock import patch
+
+from structured_logging import (
+    truncate, JsonFormatter, NonBlockingQueueHandler, parse_category_levels,
+    get_logger, log_event
+)
+
+class TestFieldCaps:
+    """Test payload size caps"""
+
+    def test_short_values_pass_through(self):
+        assert truncate('abc', 10) == 'abc'
+        assert truncate(42, 10) == 42
+        assert truncate(None, 10) is None
+
+    def test_long_string_truncated(self):
+        result = truncate('x' * 100, 10)
+        assert result.startswith('x' * 10)
+        assert result.endswith('(+90 chars)')
+
+    def test_structures_serialized_then_truncated(self):
+        path = [[-122.4 + i * 0.001, 37.79] for i in range(2000)]
+        assert len(truncate(path, 64)) < 100
+
+class TestJsonFormatter:
+    """Test record rendering"""
+
+    def test_fields_rendered_as_json(self):
+        record = logging.LogRecord('drone_api.schedules', logging.INFO, __file__, 1, 'Schedule created', None, None)
+        record.fields = {'schedule_id': 'abc', 'waypoints': 3, 'path': 'y' * 50}
+
+        entry = json.loads(JsonFormatter(max_field_chars=10).format(record))
+        assert entry['category'] == 'schedules'
+        assert entry['msg'] == 'Schedule created'
+        assert entry['waypoints'] == 3
+        assert entry['path'].startswith('y' * 10)
+        assert len(entry['path']) < 50
+
+    def test_dates_and_structures_stay_plain_json(self):
+        record = logging.LogRecord('drone_api.validation', logging.WARNING, __file__, 1, 'Request failed', None, None)
+        record.fields = {
+            'start_time': datetime(2026, 1, 1, 10, 0),
+            'errors': [{'loc': ('body', 'end_time'), 'msg': 'Invalid', 'at': datetime(2026, 1, 1, 8, 0)}],
+            'body': {'drone_id': 'abc', 'waypoints': 3},
+            'drone_id': uuid.UUID(int=1),
+        }
+
+        entry = json.loads(JsonFormatter(max_field_chars=512).format(record))
+        assert entry['start_time'] == '2026-01-01T10:00:00'
+        assert entry['errors'] == [{'loc': ['body', 'end_time'], 'msg': 'Invalid', 'at': '2026-01-01T08:00:00'}]
+        assert entry['body'] == {'drone_id': 'abc', 'waypoints': 3}
+        assert entry['drone_id'] == '00000000-0000-0000-0000-000000000001'
+
+class TestQueueHandler:
+    """Test the non-blocking queue handler"""
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        record = logging.LogRecord('drone_api.test', logging.INFO, __file__, 1, 'msg', None, None)
+
+        handler.handle(record)
+        handler.handle(record)
+        assert handler.dropped == 1
+
+class TestLevelsAndSampling:
+    """Test per-category levels and sampling"""
+
+    def test_parse_category_levels(self):
+        levels = parse_category_levels('auth=warning, schedules=DEBUG,bogus')
+        assert levels == {'auth': logging.WARNING, 'schedules': logging.DEBUG}
+
+    def test_disabled_level_skips_logging(self):
+        logger = get_logger('test-disabled')
+        logger.setLevel(logging.WARNING)
+        with patch.object(logger, 'log') as mock_log:
+            log_event(logger, logging.DEBUG, 'noisy', payload='x')
+        mock_log.assert_not_called()
+
+    def test_sampling_drops_fraction(self):
+        logger = get_logger('test-sampled')
+        logger.setLevel(logging.DEBUG)
+        with patch.object(logger, 'log') as mock_log, patch('structured_logging.random.random', side_effect=[0.5, 0.005]):
+            log_event(logger, logging.DEBUG, 'sampled', sample=0.01)
+            log_event(logger, logging.DEBUG, 'sampled', sample=0.01)
+        assert mock_log.call_count == 1
+        assert mock_log.call_args.kwargs['extra']['fields']['sample'] == 0.01
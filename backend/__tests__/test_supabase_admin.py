@@ -0,0 +1,125 @@
+"""
+Unit tests for the async Supabase admin client and user directory
+"""
+import pytest
+import asyncio
+
+import supabase_admin
+from supabase_admin import SupabaseAdminError, format_user
+
+class TestUserDirectory:
+    """Test the cached user directory against the Supabase stub"""
+
+    def test_refresh_walks_every_page(self, supabase_stub):
+        """All pages are fetched until a short page is returned"""
+        directory = supabase_stub.directory(per_page=2)
+
+        users = asyncio.run(directory.list_users())
+        assert len(users) == 5
+        assert [path for _, path in supabase_stub.calls].count('/auth/v1/admin/users') == 3
+
+    def test_stale_directory_served_while_refreshing(self, supabase_stub):
+        """A stale directory is returned immediately and refreshed in the background"""
+        directory = supabase_stub.directory(per_page=10, ttl=0)
+
+        async def scenario():
+            await directory.list_users()
+            supabase_stub.users.pop(next(iter(supabase_stub.users)))
+            stale = await directory.list_users()
+            await directory._refresh_task
+            fresh = await directory.list_users()
+            return stale, fresh
+
+        stale, fresh = asyncio.run(scenario())
+        assert len(stale) == 5
+        assert len(fresh) == 4
+
+    def test_concurrent_cold_reads_share_one_load(self, supabase_stub):
+        """Reads arriving before the first load completes wait for the same load"""
+        directory = supabase_stub.directory(per_page=2)
+
+        async def scenario():
+            return await asyncio.gather(*(directory.list_users() for _ in range(5)))
+
+        assert [len(users) for users in asyncio.run(scenario())] == [5] * 5
+        assert [path for _, path in supabase_stub.calls].count('/auth/v1/admin/users') == 3
+
+    def test_refresh_fetches_the_next_page(self, supabase_stub):
+        """Each refresh fetches one page; deletions show once the sweep completes"""
+        directory = supabase_stub.directory(per_page=2)
+
+        async def scenario():
+            await directory.list_users()
+            supabase_stub.users.pop(list(supabase_stub.users)[-1])
+            supabase_stub.calls.clear()
+            counts = []
+            for _ in range(3):
+                await directory.refresh()
+                counts.append(len(await directory.list_users()))
+            return counts
+
+        assert asyncio.run(scenario()) == [5, 5, 4]
+        # Pages 1, 2 and the (now empty) page 3
+        assert len(supabase_stub.calls) == 3
+
+    def test_role_patch_survives_inflight_refresh(self, supabase_stub):
+        """A page requested before a role update doesn't undo the patch"""
+        directory = supabase_stub.directory(per_page=10)
+        user_id = next(iter(supabase_stub.users))
+
+        async def scenario():
+            await directory.list_users()
+            refreshing = asyncio.create_task(directory.refresh())
+            await asyncio.sleep(0)
+            directory.apply_role(user_id, 'admin')
+            await refreshing
+            patched = {user['id']: user['role'] for user in await directory.list_users()}
+            # Pages requested after the update are authoritative again
+            supabase_stub.users[user_id]['user_metadata']['role'] = 'operator'
+            await directory.refresh()
+            refreshed = {user['id']: user['role'] for user in await directory.list_users()}
+            return patched, refreshed
+
+        patched, refreshed = asyncio.run(scenario())
+        assert patched[user_id] == 'admin'
+        assert refreshed[user_id] == 'operator'
+
+    def test_background_refresh_failure_is_logged(self, supabase_stub, monkeypatch):
+        """A failed background refresh keeps the snapshot and is logged"""
+        events = []
+        monkeypatch.setattr(supabase_admin, 'log_event',
+                            lambda logger, level, msg, **fields: events.append((msg, fields)))
+        directory = supabase_stub.directory(per_page=10, ttl=0)
+
+        async def scenario():
+            await directory.list_users()
+            supabase_stub.service_role = 'rotated-key'
+            users = await directory.list_users()
+            await directory._refresh_task
+            return users
+
+        assert len(asyncio.run(scenario())) == 5
+        assert events == [("User directory refresh failed",
+                           {'page': 1, 'status_code': 401, 'error': "Failed to fetch users from Supabase"})]
+
+    def test_upstream_error_raises(self, supabase_stub):
+        """Upstream failures surface as SupabaseAdminError on first load"""
+        directory = supabase_stub.directory()
+        directory.client.service_role = 'wrong-key'
+
+        with pytest.raises(SupabaseAdminError) as exc_info:
+            asyncio.run(directory.list_users())
+        assert exc_info.value.status_code == 401
+
+    def test_update_rejects_non_uuid_ids(self, supabase_stub):
+        """The client itself refuses ids that would change the request path"""
+        client = supabase_stub.directory().client
+
+        with pytest.raises(SupabaseAdminError) as exc_info:
+            asyncio.run(client.update_user_role('../../settings', 'admin'))
+        assert exc_info.value.status_code == 400
+        assert supabase_stub.calls == []
+
+    def test_format_user_defaults_role(self):
+        """Users without a role in user_metadata default to 'user'"""
+        assert format_user({'id': 'u1', 'email': 'a@b.c'})['role'] == 'user'
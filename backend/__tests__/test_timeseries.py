@@ -0,0 +1,190 @@
+"""
+Tests for the telemetry history store and GET /drones/{id}/telemetry
+"""
+import json
+import pytest
+import threading
+import time
+import uuid
+import numpy as np
+from datetime import datetime, timezone
+from fastapi import status
+
+import ingest
+import timeseries
+from models import Drone
+from timeseries import Resolution, TelemetryStore
+
+T0 = 1767268800.0  # 2026-01-01T12:00:00Z
+
+def raw(ts, altitude=None):
+    ts = np.asarray(ts, dtype=np.float64)
+    altitude = np.full(len(ts), 100.0) if altitude is None else np.asarray(altitude, dtype=np.float64)
+    return {'ts': ts, 'lng': ts - T0, 'lat': np.full(len(ts), 37.0), 'altitude_m': altitude,
+            'heading_deg': np.full(len(ts), 90.0), 'battery_level': np.full(len(ts), np.nan),
+            'signal_strength': np.full(len(ts), 90.0)}
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(timeseries, 'INITIAL_CAPACITY', 8)
+    monkeypatch.setattr(timeseries, 'TELEMETRY_ROLLUP_LAG_SECONDS', 0)
+    # Short raw segments so ranges cross them
+    resolutions = dict(timeseries.RESOLUTIONS, raw=Resolution('raw', 0, None, 60, 1))
+    return TelemetryStore(str(tmp_path), resolutions)
+
+class TestSegments:
+    """Test appends and range reads"""
+
+    def test_range_within_one_segment_is_a_view(self, store):
+        store.append('raw', 'd1', raw(T0 + np.arange(20)))
+        columns = store.query('d1', T0 + 5, T0 + 10)
+        assert columns['ts'].tolist() == (T0 + np.arange(5, 10)).tolist()
+        assert columns['lng'].tolist() == [5, 6, 7, 8, 9]
+        # No copy: slices of the segment's memory map
+        assert not columns['ts'].flags.owndata
+        assert np.isnan(columns['battery_level']).all()
+
+    def test_ranges_across_segments(self, store):
+        store.append('raw', 'd1', raw(T0 + np.arange(0, 200, 0.5)))
+        assert len(store._windows(store.resolutions['raw'], 'd1')) == 4
+        columns = store.query('d1', T0 + 50, T0 + 130)
+        assert columns['ts'][0] == T0 + 50 and columns['ts'][-1] == T0 + 129.5
+        assert len(columns['ts']) == 160 == store.count('d1', T0 + 50, T0 + 130)
+        assert len(store.query('d1', T0, T0 + 200, limit=30)['ts']) == 30
+
+    def test_appends_grow_and_merge_late_rows(self, store):
+        # Capacity 8: grows twice
+        for start in range(0, 30, 3):
+            store.append('raw', 'd1', raw(T0 + np.arange(start, start + 3)))
+        # Late rows are merged in time order
+        store.append('raw', 'd1', raw([T0 + 10.5, T0 + 0.5]))
+        ts = store.query('d1', T0, T0 + 60)['ts']
+        assert len(ts) == 32
+        assert (np.diff(ts) > 0).all()
+
+    def test_unknown_drone_is_empty(self, store):
+        assert len(store.query('nobody', T0, T0 + 60)['ts']) == 0
+
+class TestRollups:
+    """Test 1s/1m/1h rollups and retention"""
+
+    def test_rolls_up_each_level(self, store):
+        # 10 Hz for three minutes; altitude climbs 1 m per second
+        ts = T0 + np.arange(0, 180, 0.1)
+        store.append('raw', 'd1', raw(ts, altitude=100 + (ts - T0)))
+
+        store.roll_up(T0 + 200)
+
+        seconds = store.query('d1', T0, T0 + 180, '1s')
+        assert len(seconds['ts']) == 180
+        assert (seconds['count'] == 10).all()
+        assert seconds['altitude_min'][5] == pytest.approx(105)
+        assert seconds['altitude_max'][5] == pytest.approx(105.9)
+        assert seconds['altitude_mean'][5] == pytest.approx(105.45)
+        assert seconds['lng'][5] == pytest.approx(5.9)
+        assert np.isnan(seconds['battery_mean']).all()
+
+        minutes = store.query('d1', T0, T0 + 180, '1m')
+        assert minutes['count'].tolist() == [600, 600, 600]
+        assert minutes['altitude_min'][1] == pytest.approx(160)
+        assert minutes['altitude_max'][1] == pytest.approx(219.9)
+        assert minutes['altitude_mean'][1] == pytest.approx(189.95, rel=1e-5)
+        # The hour isn't over
+        assert len(store.query('d1', T0, T0 + 3600, '1h')['ts']) == 0
+
+    def test_rollups_are_incremental(self, store):
+        store.append('raw', 'd1', raw(T0 + np.arange(0, 90)))
+        store.roll_up(T0 + 60)
+        assert len(store.query('d1', T0, T0 + 90, '1s')['ts']) == 60
+        store.append('raw', 'd1', raw(T0 + np.arange(90, 120)))
+        store.roll_up(T0 + 120)
+        seconds = store.query('d1', T0, T0 + 120, '1s')
+        assert seconds['ts'].tolist() == (T0 + np.arange(120)).tolist()
+        assert store.query('d1', T0, T0 + 120, '1m')['count'].tolist() == [60, 60]
+
+    def test_concurrent_rollups_write_each_bucket_once(self, store, monkeypatch):
+        """Workers rolling up at the same time don't append the same buckets"""
+        store.append('raw', 'd1', raw(T0 + np.arange(0, 180, 0.5)))
+        last_ts = store._last_ts
+
+        def slow_last_ts(level, drone_id):
+            # Widen the gap between reading the last bucket and appending
+            rolled = last_ts(level, drone_id)
+            time.sleep(0.05)
+            return rolled
+
+        monkeypatch.setattr(store, '_last_ts', slow_last_ts)
+        workers = [threading.Thread(target=store.roll_up, args=(T0 + 200,)) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        assert store.query('d1', T0, T0 + 180, '1s')['ts'].tolist() == (T0 + np.arange(180)).tolist()
+        assert store.query('d1', T0, T0 + 180, '1m')['count'].tolist() == [120, 120, 120]
+
+    def test_retention_removes_old_segments(self, store):
+        store.append('raw', 'd1', raw(T0 + np.arange(0, 180)))
+        # Raw keeps one day
+        assert store.enforce_retention(T0 + 86400 + 90) == 1
+        assert store.query('d1', T0, T0 + 180)['ts'][0] == T0 + 60
+        assert store.enforce_retention(T0 + 10 * 86400) == 2
+        assert store.drones() == []
+
+class TestTelemetryHistory:
+    """Test the history endpoint on ingested telemetry"""
+
+    @pytest.fixture
+    def drones(self, client_with_real_db_user, mock_user, tmp_path, monkeypatch):
+        client, SessionLocal = client_with_real_db_user
+        store = TelemetryStore(str(tmp_path))
+        monkeypatch.setattr(timeseries, '_store', store)
+        ids = {'mine': str(uuid.uuid4()), 'theirs': str(uuid.uuid4())}
+        with SessionLocal() as db:
+            db.add(Drone(id=ids['mine'], name="Mine", user_id=mock_user['sub']))
+            db.add(Drone(id=ids['theirs'], name="Theirs", user_id=str(uuid.uuid4())))
+            db.commit()
+        yield client, SessionLocal, ids, store
+        ingest.stop_buffers()
+
+    def test_ingested_samples_reach_history(self, drones, query_budget):
+        client, SessionLocal, ids, store = drones
+        now = time.time()
+        start = int(now) - 600
+        samples = [{'drone_id': ids['mine'], 'ts': start + i, 'lng': 1.0, 'lat': 2.0, 'altitude_m': 100 + i}
+                   for i in range(600)]
+        client.post('/api/telemetry/ingest', content='\n'.join(map(json.dumps, samples)),
+                    headers={'Content-Type': 'application/x-ndjson'})
+        with SessionLocal() as db:
+            ingest.buffer_for(db.get_bind()).flush()
+        # Late enough that the last minute is complete
+        store.roll_up(now + 120)
+
+        since = datetime.fromtimestamp(start, timezone.utc).isoformat()
+        # Only the access check touches the database
+        with query_budget(1):
+            response = client.get(f"/api/drones/{ids['mine']}/telemetry", params={'start': since})
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body['resolution'] == 'raw' and not body['truncated']
+        assert body['columns']['altitude_m'][:3] == [100, 101, 102]
+        assert body['columns']['battery_level'][0] is None
+
+        # Too many raw points for the limit: the finest rollup that fits
+        body = client.get(f"/api/drones/{ids['mine']}/telemetry", params={'start': since, 'limit': 20}).json()
+        assert body['resolution'] == '1m'
+        assert sum(body['columns']['count']) == 600
+
+        body = client.get(f"/api/drones/{ids['mine']}/telemetry",
+                          params={'start': since, 'limit': 20, 'resolution': 'raw'}).json()
+        assert body['truncated'] and len(body['columns']['ts']) == 20
+
+    def test_access_and_range_checks(self, drones):
+        client, _, ids, _ = drones
+        params = {'start': '2026-01-01T00:00:00Z', 'end': '2026-01-02T00:00:00Z'}
+        assert client.get(f"/api/drones/{ids['theirs']}/telemetry", params=params).status_code == status.HTTP_403_FORBIDDEN
+        assert client.get(f"/api/drones/{uuid.uuid4()}/telemetry", params=params).status_code == status.HTTP_404_NOT_FOUND
+        backwards = {'start': params['end'], 'end': params['start']}
+        assert client.get(f"/api/drones/{ids['mine']}/telemetry", params=backwards).status_code == status.HTTP_400_BAD_REQUEST
+        empty = client.get(f"/api/drones/{ids['mine']}/telemetry", params=params).json()
+        assert empty['columns']['ts'] == []
@@ -0,0 +1,211 @@
+"""
+Tests for geohash tiles and the /map/viewport endpoint
+"""
+import pytest
+import random
+import uuid
+from fastapi import status
+from sqlalchemy import inspect, text
+
+import geotiles
+import viewport
+from app import app
+from auth import get_current_user
+from migrations import downgrade, load_revisions, migration_engine, r001_baseline, upgrade
+from models import Drone, DroneBase
+
+USER_ID = str(uuid.uuid4())
+
+BASES = {
+    'San Francisco': (37.7749, -122.4194),
+    'Oakland': (37.8044, -122.2712),
+    'Austin': (30.2672, -97.7431),
+    'Fiji West': (-17.7134, 179.9),
+}
+
+BAY_AREA = {'bbox': '-123,37,-121,38', 'zoom': 9}
+
+@pytest.fixture
+def map_client(client_with_real_db_user):
+    """Bases from BASES, plus a drone at Oakland for the user and one for someone else"""
+    client, SessionLocal = client_with_real_db_user
+    app.dependency_overrides[get_current_user] = lambda: {'sub': USER_ID, 'user_metadata': {'role': 'user'}}
+    with SessionLocal() as db:
+        bases = {name: DroneBase(id=str(uuid.uuid4()), name=name, lat=lat, lng=lng) for name, (lat, lng) in BASES.items()}
+        db.add_all(bases.values())
+        db.flush()
+        db.add_all([
+            Drone(name='Mine', user_id=USER_ID, base_id=bases['Oakland'].id, last_lat=37.80, last_lng=-122.27),
+            Drone(name='Theirs', user_id=str(uuid.uuid4()), last_lat=37.79, last_lng=-122.40),
+        ])
+        db.commit()
+    yield client, SessionLocal
+
+def names(entities):
+    return sorted(entity['name'] for entity in entities)
+
+class TestGeotiles:
+    """Test geohash encoding and tile coverings"""
+
+    def test_encode_known_hash(self):
+        assert geotiles.encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+        south, west, north, east = geotiles.decode_box('u4pruydqqvj')
+        assert south <= 57.64911 <= north and west <= 10.40744 <= east
+
+    def test_cover_holds_every_point_in_box(self):
+        rng = random.Random(3)
+        for precision in (2, 3, 4):
+            box = (rng.uniform(-60, 50), rng.uniform(-170, 150), 0, 0)
+            box = (box[0], box[1], box[0] + rng.uniform(0, 10), box[1] + rng.uniform(0, 20))
+            tiles = set(geotiles.cover([box], precision))
+            for _ in range(500):
+                lat, lng = rng.uniform(box[0], box[2]), rng.uniform(box[1], box[3])
+                assert geotiles.encode(lat, lng, precision) in tiles
+
+    def test_precision_capped_by_tile_count(self):
+        world = [(-90.0, -180.0, 90.0, 180.0)]
+        assert geotiles.viewport_precision(world, 18, 64) == 1
+        assert len(geotiles.cover(world, 1)) == 32
+        street = [(37.77, -122.42, 37.79, -122.40)]
+        assert geotiles.viewport_precision(street, 14, 64) == 6
+        assert geotiles.viewport_precision(street, 18, 64) == 6
+
+class TestViewport:
+    """Test the endpoint and its per-tile cache"""
+
+    def test_returns_entities_in_view(self, map_client):
+        client, _ = map_client
+        response = client.get('/api/map/viewport', params=BAY_AREA)
+
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert names(body['bases']) == ['Oakland', 'San Francisco']
+        assert names(body['drones']) == ['Mine']
+        assert body['clusters'] == []
+
+    def test_across_antimeridian(self, map_client):
+        client, _ = map_client
+        response = client.get('/api/map/viewport', params={'bbox': '179,-20,-179,-10', 'zoom': 6})
+        assert names(response.json()['bases']) == ['Fiji West']
+
+    def test_drone_without_position_is_placed_at_its_base(self, map_client):
+        client, SessionLocal = map_client
+        with SessionLocal() as db:
+            austin = db.query(DroneBase).filter(DroneBase.name == 'Austin').one()
+        created = client.post('/api/drones', json={'name': 'Parked', 'base_id': austin.id}).json()
+
+        assert (created['last_lat'], created['last_lng']) == (austin.lat, austin.lng)
+        response = client.get('/api/map/viewport', params={'bbox': '-98,30,-97,31', 'zoom': 10})
+        assert names(response.json()['drones']) == ['Parked']
+
+    def test_cached_tiles_skip_the_database(self, map_client, query_budget):
+        client, _ = map_client
+        client.get('/api/map/viewport', params=BAY_AREA)
+        with query_budget(1):
+            client.get('/api/map/viewport', params=BAY_AREA)
+
+    def test_move_invalidates_old_and_new_tiles(self, map_client):
+        client, SessionLocal = map_client
+        client.get('/api/map/viewport', params=BAY_AREA)
+        with SessionLocal() as db:
+            drone = db.query(Drone).filter(Drone.name == 'Mine').one()
+            drone_id = drone.id
+
+        client.put(f'/api/drones/{drone_id}', json={'last_lat': 30.27, 'last_lng': -97.74})
+
+        assert names(client.get('/api/map/viewport', params=BAY_AREA).json()['drones']) == []
+        texas = client.get('/api/map/viewport', params={'bbox': '-98,30,-97,31', 'zoom': 10}).json()
+        assert names(texas['drones']) == ['Mine']
+
+    def test_unrelated_write_keeps_cached_tiles(self, map_client):
+        client, SessionLocal = map_client
+        view = {'bbox': '-98,30,-97,31', 'zoom': 10}
+        client.get('/api/map/viewport', params=view)
+        client.post('/api/bases', json={'name': 'Reno', 'lat': 39.5296, 'lng': -119.8138})
+
+        with SessionLocal() as db:
+            plan = viewport.Viewport(db, [(30.0, -98.0, 31.0, -97.0)], 10)
+            cache = viewport.tile_cache
+            bind = db.get_bind()
+            assert all(cache.get(bind, ('bases', '*', tile), plan.versions[('bases', tile)]) is not None
+                       for tile in plan.tiles)
+
+    def test_batch_moves_are_rehashed(self, map_client):
+        client, SessionLocal = map_client
+        with SessionLocal() as db:
+            austin = db.query(DroneBase).filter(DroneBase.name == 'Austin').one()
+        client.get('/api/map/viewport', params=BAY_AREA)
+
+        response = client.post('/api/batch', json={'operations': [
+            {'op': 'update', 'entity': 'base', 'id': austin.id, 'data': {'lat': 37.5, 'lng': -122.0}},
+        ]})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'Austin' in names(client.get('/api/map/viewport', params=BAY_AREA).json()['bases'])
+
+    def test_crowded_tiles_are_clustered(self, map_client, monkeypatch):
+        client, _ = map_client
+        monkeypatch.setattr(viewport, 'MAP_TILE_LIMIT', 1)
+        body = client.get('/api/map/viewport', params={'bbox': '-123,37,-122,38', 'zoom': 3}).json()
+
+        # One precision-1 tile: the whole tile is counted, Austin included
+        assert body['precision'] == 1 and body['bases'] == []
+        cluster, = [c for c in body['clusters'] if c['kind'] == 'bases']
+        assert cluster['count'] == 3
+        assert cluster['lat'] == pytest.approx(sum(BASES[n][0] for n in ('San Francisco', 'Oakland', 'Austin')) / 3)
+
+    def test_not_modified_until_something_in_view_changes(self, map_client):
+        client, _ = map_client
+        etag = client.get('/api/map/viewport', params=BAY_AREA).headers['etag']
+
+        assert client.get('/api/map/viewport', params=BAY_AREA, headers={'If-None-Match': etag}).status_code == 304
+        client.post('/api/bases', json={'name': 'Berkeley', 'lat': 37.8715, 'lng': -122.2730})
+        response = client.get('/api/map/viewport', params=BAY_AREA, headers={'If-None-Match': etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert 'Berkeley' in names(response.json()['bases'])
+
+    def test_invalid_bbox(self, map_client):
+        client, _ = map_client
+        assert client.get('/api/map/viewport', params={'bbox': '1,2,3', 'zoom': 5}).status_code == 400
+
+class TestMapTilesMigration:
+    """Test keying rows that predate the geohash columns"""
+
+    def test_backfill_keys_existing_rows(self, tmp_path):
+        engine = migration_engine(f'sqlite:///{tmp_path / "tiles.db"}')
+        upgrade(engine, target='002', log=lambda message: None)
+        base_id = str(uuid.uuid4())
+        with engine.begin() as conn:
+            conn.execute(text('INSERT INTO bases (id, name, lat, lng) VALUES (:id, :name, 37.77, -122.42)'),
+                         {'id': base_id, 'name': 'Old base'})
+            conn.execute(text('INSERT INTO drones (id, name, user_id, base_id) VALUES (:id, :name, :user, :base)'),
+                         {'id': str(uuid.uuid4()), 'name': 'Old drone', 'user': USER_ID, 'base': base_id})
+
+        upgrade(engine, log=lambda message: None)
+
+        with engine.connect() as conn:
+            base_hash = conn.execute(text('SELECT geohash FROM bases')).scalar()
+            drone = conn.execute(text('SELECT last_lat, last_lng, geohash FROM drones')).one()
+        engine.dispose()
+        assert base_hash == geotiles.encode(37.77, -122.42)
+        assert drone == (37.77, -122.42, base_hash)
+        assert '003' in [revision.revision for revision in load_revisions()]
+
+    def test_upgrades_baseline_schema_through_003(self, tmp_path):
+        engine = migration_engine(f'sqlite:///{tmp_path / "baseline.db"}')
+        # A database create_all made before migrations existed
+        r001_baseline.metadata.create_all(bind=engine)
+
+        upgrade(engine, target='003', log=lambda message: None)
+        inspector = inspect(engine)
+        drone_columns = {column['name'] for column in inspector.get_columns('drones')}
+        assert {'last_lat', 'last_lng', 'geohash'} <= drone_columns
+        assert 'idx_base_geohash' in {index['name'] for index in inspector.get_indexes('bases')}
+        assert 'idx_drone_geohash' in {index['name'] for index in inspector.get_indexes('drones')}
+        assert inspector.has_table('tile_versions')
+
+        downgrade(engine, target='002', log=lambda message: None)
+        inspector = inspect(engine)
+        assert 'geohash' not in {column['name'] for column in inspector.get_columns('bases')}
+        assert not inspector.has_table('tile_versions')
+        engine.dispose()
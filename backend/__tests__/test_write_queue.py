@@ -0,0 +1,179 @@
+"""
+Tests for the single-writer queue
+"""
+import pytest
+import threading
+import uuid
+from fastapi import HTTPException, status
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+import ingest
+import write_queue
+from app import app
+from auth import get_current_user
+from db_profiles import create_profiled_engine, SQLITE_PRODUCTION
+from dependencies import get_db
+from models import BaseModel, Drone, DroneBase, TelemetryRecord
+from write_queue import WriteQueue, enable_sqlite_savepoints, run_write, start_write_queue, stop_write_queue
+
+USER_ID = str(uuid.uuid4())
+
+@pytest.fixture
+def file_db(tmp_path):
+    """WAL database file plus a request session factory and a writer session factory"""
+    url = f'sqlite:///{tmp_path / "writes.db"}'
+    engine = create_profiled_engine(url, SQLITE_PRODUCTION)
+    BaseModel.metadata.create_all(bind=engine)
+    writer_engine = create_profiled_engine(url, SQLITE_PRODUCTION)
+    enable_sqlite_savepoints(writer_engine)
+    yield (
+        sessionmaker(bind=engine, autoflush=False),
+        sessionmaker(bind=writer_engine, autoflush=False, expire_on_commit=False),
+    )
+    engine.dispose()
+    writer_engine.dispose()
+
+@pytest.fixture
+def writer(file_db):
+    _, WriterSession = file_db
+    queue = WriteQueue(WriterSession).start()
+    yield queue
+    queue.stop(timeout=5)
+
+class TestWriteQueue:
+    """Test group commit and per-unit isolation"""
+
+    def test_concurrent_units_group_committed(self, file_db, writer):
+        SessionLocal, _ = file_db
+
+        def add(i):
+            def unit(session):
+                drone = Drone(name=f"Drone {i}", user_id=USER_ID)
+                session.add(drone)
+                return drone
+            return unit
+
+        futures = []
+        barrier = threading.Barrier(8)
+
+        def submit_many(offset):
+            barrier.wait()
+            for i in range(25):
+                futures.append(writer.submit(add(offset * 100 + i)))
+
+        threads = [threading.Thread(target=submit_many, args=(t,)) for t in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        drones = [future.result(timeout=10) for future in futures]
+
+        assert all(drone.id and drone.created_at for drone in drones)
+        with SessionLocal() as db:
+            assert db.query(Drone).count() == 200
+        assert writer.units == 200
+        assert writer.batches < 200
+
+    def test_failing_unit_rolled_back_alone(self, file_db, writer):
+        SessionLocal, _ = file_db
+        base_id = str(uuid.uuid4())
+
+        def good(session):
+            session.add(DroneBase(id=base_id, name="Kept", lat=1, lng=2))
+
+        def bad(session):
+            session.add(Drone(name="Discarded", user_id=USER_ID))
+            session.flush()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="nope")
+
+        # Hold the writer so both units land in one batch
+        gate = threading.Event()
+        blocker = writer.submit(lambda session: gate.wait(5))
+        first, second = writer.submit(good), writer.submit(bad)
+        gate.set()
+
+        blocker.result(timeout=5)
+        first.result(timeout=5)
+        with pytest.raises(HTTPException) as exc:
+            second.result(timeout=5)
+        assert exc.value.status_code == status.HTTP_409_CONFLICT
+        with SessionLocal() as db:
+            assert db.get(DroneBase, base_id).name == "Kept"
+            assert db.query(Drone).count() == 0
+
+    def test_run_write_without_queue_commits_on_request_session(self, file_db):
+        SessionLocal, _ = file_db
+        drone_id = str(uuid.uuid4())
+        with SessionLocal() as db:
+            run_write(db, lambda session: session.add(Drone(id=drone_id, name="Inline", user_id=USER_ID)))
+        with SessionLocal() as db:
+            assert db.get(Drone, drone_id) is not None
+
+class TestWriteQueueEndpoints:
+    """Test write handlers routed through the writer thread"""
+
+    @pytest.fixture
+    def client(self, file_db):
+        SessionLocal, WriterSession = file_db
+        with SessionLocal() as db:
+            db.add(Drone(id="11111111-1111-1111-1111-111111111111", name="Queued", user_id=USER_ID))
+            db.commit()
+
+        def override_get_db():
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_current_user] = lambda: {'sub': USER_ID, 'user_metadata': {'role': 'user'}}
+        start_write_queue(WriterSession)
+        try:
+            with TestClient(app) as test_client:
+                yield test_client, SessionLocal
+        finally:
+            stop_write_queue()
+            app.dependency_overrides.clear()
+
+    def test_update_and_action_go_through_writer(self, client):
+        test_client, SessionLocal = client
+        drone_id = "11111111-1111-1111-1111-111111111111"
+
+        updated = test_client.put(f"/api/drones/{drone_id}", json={"name": "Renamed"})
+        action = test_client.post(f"/api/drones/{drone_id}/action", json={"action": "pause"})
+
+        assert updated.status_code == status.HTTP_200_OK
+        assert updated.json()['name'] == "Renamed"
+        assert action.json()['drone_status'] == "paused"
+        with SessionLocal() as db:
+            drone = db.get(Drone, drone_id)
+            assert (drone.name, drone.status) == ("Renamed", "paused")
+
+    def test_bases_batch_and_telemetry_go_through_writer(self, client):
+        test_client, SessionLocal = client
+        writer = write_queue._writer
+
+        base_id = test_client.post('/api/bases', json={"name": "Dock", "lat": 37.7, "lng": -122.4}).json()['id']
+        updated = test_client.put(f'/api/bases/{base_id}', json={"name": "Moved"})
+        batch = test_client.post('/api/batch', json={'operations': [
+            {'op': 'create', 'entity': 'base', 'data': {"name": "Pad", "lat": 37.8, "lng": -122.3}},
+        ]})
+        deleted = test_client.delete(f'/api/bases/{base_id}')
+        buffer = ingest.TelemetryBuffer(SessionLocal.kw['bind'], interval=0)
+        buffer.add([("11111111-1111-1111-1111-111111111111", 1767268800.0, -122.4, 37.7, 100.0, 90.0, 80.0, 95.0)])
+        buffer.flush()
+
+        assert updated.json()['name'] == "Moved"
+        assert batch.json()['committed']
+        assert deleted.status_code == status.HTTP_200_OK
+        assert writer.units == 5
+        with SessionLocal() as db:
+            assert [base.name for base in db.query(DroneBase)] == ["Pad"]
+            assert db.query(TelemetryRecord).count() == 1
+
+    def test_errors_from_units_reach_the_client(self, client):
+        test_client, _ = client
+        response = test_client.put(f"/api/drones/{uuid.uuid4()}", json={"name": "Ghost"})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -1,12 +1,19 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, JSONResponse
+from fastapi.responses import Response, JSONResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from dotenv import load_dotenv
+import logging
 import os
 
 load_dotenv()
 
+from structured_logging import configure_logging, shutdown_logging, get_logger, log_event
+
+configure_logging()
+logger = get_logger('validation')
+
 app = FastAPI(
     title="Drone Management System API",
     description="API for managing drones, bases, and schedules",
@@ -16,19 +23,20 @@ app = FastAPI(
 # Custom exception handler for validation errors
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    """Handle validation errors with detailed logging"""
-    print(f"[VALIDATION] ❌ Request validation failed for {request.method} {request.url.path}")
-    print(f"[VALIDATION] Errors: {exc.errors()}")
-    
-    # Try to log body, but don't fail if already consumed
-    try:
-        body = await request.body()
-        print(f"[VALIDATION] Body: {body.decode('utf-8')}")
-    except Exception:
-        print("[VALIDATION] Body: (already consumed or unavailable)")
+    """Handle validation errors with structured (size-capped) logging"""
+    # Validator errors carry the raised exception in ctx: send its message
+    errors = jsonable_encoder(exc.errors(), custom_encoder={Exception: str})
+    # exc.body is the already-parsed payload; re-reading the request stream
+    # here would block once FastAPI has consumed it
+    log_event(
+        logger, logging.WARNING, "Request validation failed",
+        method=request.method,
+        path=request.url.path,
+        errors=errors,
+        body=exc.body,
+    )
     
     # Return a more helpful error message
-    errors = exc.errors()
     return JSONResponse(
         status_code=422,
         content={
@@ -48,8 +56,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods including OPTIONS
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Next-Cursor", "Link", "ETag"],  # Pagination cursors, validators
 )
 
+# Per-request SQL statement accounting / N+1 detection (X-DB-* headers when
+# QUERY_DEBUG=1)
+from query_budget import QueryBudgetMiddleware
+
+app.add_middleware(QueryBudgetMiddleware)
+
+# Request metrics - added last so it is the outermost middleware and times
+# everything, including CORS preflights
+from metrics import MetricsMiddleware, registry as metrics_registry
+
+app.add_middleware(MetricsMiddleware, registry=metrics_registry)
+
 # Explicit OPTIONS handler for all API routes - bypasses all dependencies
 # This ensures OPTIONS requests succeed even if CORS middleware doesn't catch them
 @app.options("/api/{full_path:path}")
@@ -79,12 +100,122 @@ async def options_handler(request: Request, full_path: str):
         return Response(status_code=403)
 
 # Import and register routers
-from routes import drones, bases, admin, schedules
+from routes import drones, bases, admin, schedules, batch, fleet as fleet_routes, map as map_routes, telemetry
+from models import ASYNC_DB
+
+# In async mode the AsyncSession read endpoints are registered first so they
+# take precedence over the threadpool handlers for the same paths
+if ASYNC_DB:
+    app.include_router(drones.async_router, prefix="/api", tags=["drones"])
+    app.include_router(bases.async_router, prefix="/api", tags=["bases"])
+    app.include_router(schedules.async_router, prefix="/api", tags=["schedules"])
+    app.include_router(admin.async_router, prefix="/api", tags=["admin"])
+    app.include_router(map_routes.async_router, prefix="/api", tags=["map"])
 
 app.include_router(drones.router, prefix="/api", tags=["drones"])
 app.include_router(bases.router, prefix="/api", tags=["bases"])
 app.include_router(schedules.router, prefix="/api", tags=["schedules"])
 app.include_router(admin.router, prefix="/api", tags=["admin"])
+app.include_router(batch.router, prefix="/api", tags=["batch"])
+app.include_router(map_routes.router, prefix="/api", tags=["map"])
+app.include_router(fleet_routes.router, prefix="/api", tags=["fleet"])
+app.include_router(telemetry.router, prefix="/api", tags=["telemetry"])
+# WebSockets live outside /api
+app.include_router(telemetry.socket_router, tags=["telemetry"])
+
+@app.on_event("shutdown")
+async def close_supabase_admin():
+    """Close the pooled Supabase admin HTTP client"""
+    from supabase_admin import admin_client
+    await admin_client.aclose()
+
+@app.on_event("startup")
+def start_logging():
+    """(Re)start the log listener thread"""
+    configure_logging()
+
+@app.on_event("startup")
+def log_database_profile():
+    """Log the effective engine settings (and any the database refused)"""
+    from models import engine, DB_PROFILE
+    from db_profiles import engine_diagnostics, profile_warnings
+    from replicas import session_router
+    db_logger = get_logger('db')
+    try:
+        info = engine_diagnostics(engine, DB_PROFILE)
+        info['replicas'] = [replica.name for replica in session_router.replicas]
+    except Exception as e:
+        log_event(db_logger, logging.WARNING, "Database diagnostics unavailable", profile=DB_PROFILE.name, error=str(e))
+        return
+    log_event(db_logger, logging.INFO, "Database engine ready", **info)
+    for warning in profile_warnings(info, DB_PROFILE):
+        log_event(db_logger, logging.WARNING, "Database profile setting not applied", profile=DB_PROFILE.name, detail=warning)
+
+@app.on_event("startup")
+def start_writer():
+    """Start the single-writer queue when WRITE_QUEUE is set"""
+    from write_queue import WRITE_QUEUE, start_write_queue
+    if WRITE_QUEUE:
+        start_write_queue()
+
+@app.on_event("shutdown")
+def stop_simulation_workers():
+    """Stop the simulate_batch worker processes, if any were started"""
+    from simulation import shutdown_pool
+    shutdown_pool()
+
+@app.on_event("startup")
+async def start_fleet_simulation():
+    """Start ticking the fleet when FLEET_SIMULATION is on, publishing to /ws/telemetry"""
+    from fleet import FLEET_SIMULATION, start_fleet
+    from models import SessionLocal
+    from fanout import hub
+    if FLEET_SIMULATION:
+        start_fleet(SessionLocal).listeners.append(hub.publish)
+
+@app.on_event("shutdown")
+async def stop_fleet_simulation():
+    """Cancel the fleet tick task"""
+    from fleet import stop_fleet
+    await stop_fleet()
+
+@app.on_event("startup")
+def start_telemetry_maintenance():
+    """Start the telemetry history rollup and retention job"""
+    from timeseries import start_maintenance
+    start_maintenance()
+
+@app.on_event("shutdown")
+def flush_telemetry():
+    """Write buffered telemetry samples and stop the flusher threads"""
+    from ingest import stop_buffers
+    stop_buffers()
+
+@app.on_event("shutdown")
+def stop_telemetry_maintenance():
+    """Stop the telemetry rollup job"""
+    from timeseries import stop_maintenance
+    stop_maintenance()
+
+@app.on_event("shutdown")
+def stop_writer():
+    """Commit any queued writes and stop the writer thread"""
+    # Registered after flush_telemetry: the last flush is a writer unit too
+    from write_queue import stop_write_queue
+    stop_write_queue()
+
+@app.on_event("shutdown")
+def flush_logs():
+    """Drain queued log records before exit"""
+    shutdown_logging()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus-style request metrics"""
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4"
+    )
 
 @app.get("/")
 def health():
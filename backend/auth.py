@@ -4,17 +4,126 @@ Authentication dependencies for FastAPI
 import jwt
 from fastapi import Depends, HTTPException, status, Header, Request
 from typing import Optional, Dict, Any
+from collections import OrderedDict
+import copy
+import hashlib
+import threading
+import time
+import logging
 import os
 
+from structured_logging import get_logger, log_event
+
+logger = get_logger('auth')
+
 SUPABASE_URL = os.getenv('SUPABASE_PROJECT_URL', '')
 SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET', '')
 
+# Verified-token cache settings. Entries live until the token's `exp` claim;
+# tokens without one (e.g. demo tokens) fall back to the default TTL.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '1024'))
+TOKEN_CACHE_DEFAULT_TTL = float(os.getenv('TOKEN_CACHE_DEFAULT_TTL', '300'))
+
+class TokenCache:
+    """Bounded, thread-safe LRU cache of verified token payloads
+
+    Payloads are copied in and out, so a caller editing the dict it was handed
+    (e.g. its user_metadata) doesn't change what later requests see.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, default_ttl: float = TOKEN_CACHE_DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Mix the configured secret into the digest so rotating it invalidates
+        # every payload that was verified against the old one
+        return hashlib.sha256(f"{SUPABASE_JWT_SECRET}\0{token}".encode('utf-8')).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached payload for a token, or None on miss/expiry"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(payload)
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, payload: Dict[str, Any]) -> None:
+        """Cache a verified payload until its `exp` claim (or the default TTL)"""
+        if self.maxsize <= 0:
+            return
+        now = time.time()
+        exp = payload.get('exp')
+        expires_at = float(exp) if isinstance(exp, (int, float)) else now + self.default_ttl
+        if expires_at <= now:
+            return
+        key = self._key(token)
+        payload = copy.deepcopy(payload)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str) -> bool:
+        """Drop a single token (e.g. on logout or role change)"""
+        with self._lock:
+            return self._entries.pop(self._key(token), None) is not None
+
+    def clear(self) -> None:
+        """Drop every cached payload and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+token_cache = TokenCache()
+
+def invalidate_token(token: str) -> bool:
+    """Remove a token from the verified-token cache"""
+    return token_cache.invalidate(token)
+
+def clear_token_cache() -> None:
+    """Remove every token from the verified-token cache"""
+    token_cache.clear()
+
 def verify_token(token: str) -> Dict[str, Any]:
+    """Verify JWT token from Supabase, serving repeat calls from the token cache"""
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+    payload = _verify_token_uncached(token)
+    token_cache.put(token, payload)
+    return payload
+
+def _verify_token_uncached(token: str) -> Dict[str, Any]:
     """Verify JWT token from Supabase"""
     try:
         # Check for demo token (format: "demo.{base64_payload}.demo")
         if token.startswith('demo.') and token.endswith('.demo'):
-            print("[AUTH] Using demo token for local development")
+            log_event(logger, logging.DEBUG, "Using demo token for local development", sample=0.01)
             # Extract and decode the payload
             import base64
             import json
@@ -35,7 +144,8 @@ def verify_token(token: str) -> Dict[str, Any]:
         # Development mode: if no JWT secret is configured, trust the token structure
         # This allows the demo to work without full Supabase backend configuration
         if not SUPABASE_JWT_SECRET:
-            print("[AUTH] Running in development mode - trusting token structure without signature verification")
+            log_event(logger, logging.DEBUG, "Development mode - trusting token structure without signature verification",
+                      sample=0.01)
             # Basic validation: check if it looks like a Supabase token
             if 'sub' in unverified:  # sub (subject) is required in JWT
                 return unverified
@@ -103,6 +213,13 @@ def get_current_user(
     payload = verify_token(token)
     return payload
 
+async def get_current_user_async(
+    request: Request,
+    authorization: Optional[str] = Header(None)
+) -> Dict[str, Any]:
+    """Async variant of get_current_user so async handlers stay off the threadpool"""
+    return get_current_user(request, authorization)
+
 def require_auth(roles: Optional[list] = None):
     """Dependency factory for role-based access control"""
     def get_authenticated_user(
@@ -122,3 +239,22 @@ def require_auth(roles: Optional[list] = None):
         return current_user
     
     return get_authenticated_user
+
+def require_auth_async(roles: Optional[list] = None):
+    """Async variant of require_auth for handlers served in ASYNC_DB mode"""
+    async def get_authenticated_user(
+        current_user: Dict[str, Any] = Depends(get_current_user_async)
+    ) -> Dict[str, Any]:
+        if not current_user:
+            return current_user
+        
+        if roles:
+            user_role = current_user.get("user_metadata", {}).get("role", "user")
+            if user_role not in roles:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Insufficient permissions"
+                )
+        return current_user
+    
+    return get_authenticated_user
@@ -0,0 +1,123 @@
+"""
+Benchmark the threadpool (sync) read path against the ASYNC_DB read path
+Run with: python benchmarks/bench_async_mode.py [--clients 500] [--requests 4]
+
+Each mode runs in its own interpreter (the mode is chosen at import time)
+against a fresh SQLite file, with N concurrent clients polling GET /api/drones.
+Both modes get the same connection pool. In sync mode every request holds its
+connection until the get_db teardown gets a threadpool token back, so once
+concurrency exceeds the pool, handlers blocked on checkout starve the teardowns
+and requests fail with pool timeouts; the async mode has no such coupling.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_worker(clients: int, requests_per_client: int, drones: int, pool_size: int, pool_timeout: float):
+    """Seed the database and drive the app in-process (child process)"""
+    sys.path.insert(0, BACKEND_DIR)
+    import httpx
+    from sqlalchemy import create_engine
+    from app import app
+    from auth import get_current_user, get_current_user_async
+    import models
+    from models import SessionLocal, Drone, ASYNC_DB, DATABASE_URL
+
+    pool_args = {'pool_size': pool_size, 'max_overflow': 0, 'pool_timeout': pool_timeout}
+    SessionLocal.configure(bind=create_engine(
+        DATABASE_URL, connect_args={"check_same_thread": False}, **pool_args
+    ))
+    if ASYNC_DB:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+        models.AsyncSessionLocal.configure(bind=create_async_engine(
+            models.get_async_database_url(), poolclass=AsyncAdaptedQueuePool, **pool_args
+        ))
+
+    models.BaseModel.metadata.create_all(bind=SessionLocal.kw['bind'])
+    with SessionLocal() as db:
+        db.add_all([
+            Drone(name=f'Bench-{i}', model='Bench', user_id='00000000-0000-0000-0000-000000000001', status='active')
+            for i in range(drones)
+        ])
+        db.commit()
+
+    admin = {'sub': '00000000-0000-0000-0000-000000000001', 'user_metadata': {'role': 'admin'}}
+    app.dependency_overrides[get_current_user] = lambda: admin
+    app.dependency_overrides[get_current_user_async] = lambda: admin
+
+    latencies = []
+    errors = []
+
+    async def client_loop(client):
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            try:
+                response = await client.get('/api/drones')
+                response.raise_for_status()
+            except Exception as e:
+                # e.g. QueuePool exhaustion in the threadpool mode
+                errors.append(type(e).__name__)
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+            return time.perf_counter() - started
+
+    elapsed = asyncio.run(main())
+    latencies.sort()
+    print(json.dumps({
+        'mode': 'async' if ASYNC_DB else 'sync',
+        'requests': len(latencies),
+        'errors': len(errors),
+        'elapsed_s': elapsed,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+        'p99_ms': latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000 if latencies else 0.0,
+    }))
+
+def run_mode(mode: str, args) -> dict:
+    """Run one mode in a subprocess and return its result row"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        env['ASYNC_DB'] = '1' if mode == 'async' else '0'
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker',
+             '--clients', str(args.clients), '--requests', str(args.requests),
+             '--drones', str(args.drones), '--pool-size', str(args.pool_size),
+             '--pool-timeout', str(args.pool_timeout)],
+            env=env, cwd=BACKEND_DIR, check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=4, help='requests per client')
+    parser.add_argument('--drones', type=int, default=20)
+    parser.add_argument('--pool-size', type=int, default=40)
+    parser.add_argument('--pool-timeout', type=float, default=5.0)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.clients, args.requests, args.drones, args.pool_size, args.pool_timeout)
+    else:
+        print(f"{args.clients} concurrent clients x {args.requests} requests, {args.drones} drones")
+        print(f"{'mode':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for mode in ('sync', 'async'):
+            row = run_mode(mode, args)
+            print(f"{row['mode']:<8}{row['rps']:>10.0f}{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['errors']:>8}")
@@ -0,0 +1,73 @@
+"""
+Benchmark one /ws/telemetry fan-out
+Run with: python benchmarks/bench_fanout.py [--clients 5000] [--views 50] [--drones 2000] [--repeat 20]
+
+Times TelemetryHub.publish() for --clients subscribers spread over --views
+distinct viewports, against serializing each client's frame separately with
+json.dumps (what a per-connection push would do).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import fanout
+from fleet import FleetState
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies) * 1000
+
+async def run(args):
+    rng = np.random.default_rng(1)
+    rows = [{
+        'drone_id': str(i), 'schedule_id': str(i), 'owner_id': 'owner', 'base_id': None,
+        'lng': float(lng), 'lat': float(lat), 'progress': 0.5, 'speed_mps': 12.0, 'eta_seconds': 60.0,
+        'paused': False,
+        'telemetry': {'battery_level': 85.0, 'altitude_m': 110.0, 'heading_deg': 90.0, 'signal_strength': 90.0},
+    } for i, (lng, lat) in enumerate(rng.uniform(-1, 1, (args.drones, 2)))]
+    state = FleetState(1, time.time(), rows)
+    corners = rng.uniform(-1, 0.5, (args.views, 2))
+    views = [f'{west},{south},{west + 0.5},{south + 0.5}' for west, south in corners]
+
+    hub = fanout.TelemetryHub()
+    user = {'sub': 'owner', 'user_metadata': {'role': 'admin'}}
+    clients = []
+    for i in range(args.clients):
+        client = hub.connect(user)
+        hub.subscribe(client, fanout.parse_subscription({'bbox': views[i % args.views]}, user))
+        clients.append(client)
+
+    def per_client():
+        for client in clients:
+            boxes = client.subscription.boxes
+            drones = [{key: value for key, value in row.items() if key != 'owner_id'} for row in rows
+                      if any(s <= row['lat'] <= n and w <= row['lng'] <= e for s, w, n, e in boxes)]
+            client.queue.put(json.dumps({'type': 'tick', 'tick': state.tick, 'time': state.at, 'drones': drones}))
+
+    print(f'{args.clients} clients, {args.views} viewports, {args.drones} drones in flight')
+    print(f'{"fan-out":<28} {"p50 ms":>10}')
+    print(f'{"per client json.dumps":<28} {timed(per_client, max(1, args.repeat // 10)):>10.3f}')
+    print(f'{"TelemetryHub.publish":<28} {timed(lambda: hub.publish(state), args.repeat):>10.3f}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--views', type=int, default=50)
+    parser.add_argument('--drones', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark one fleet simulation tick
+Run with: python benchmarks/bench_fleet_tick.py [--flights 1000] [--points 200] [--repeat 20]
+
+Times FleetSimulator.tick() (one vectorized step over every flight) against
+stepping the flights one by one with geodesy.interpolate, the way a
+per-flight timer would, for --flights random-walk paths of --points points.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import fleet
+import geodesy
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--flights', type=int, default=1000)
+    parser.add_argument('--points', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    start = datetime(2026, 1, 1)
+    simulator = fleet.FleetSimulator(session_factory=None)
+    for i in range(args.flights):
+        path = np.cumsum(rng.normal(0, 1e-3, (args.points, 2)), axis=0) + [-122.4, 47.6]
+        schedule = SimpleNamespace(
+            id=str(i), drone_id=str(i), start_time=start, end_time=start + timedelta(minutes=int(rng.integers(10, 60))),
+            path_json={'coordinates': path.tolist()},
+        )
+        simulator.flights.append(fleet.Flight(schedule, 'owner', 'active'))
+    simulator._pauses = {flight.schedule_id: [None, 0.0] for flight in simulator.flights}
+    simulator._arrays = simulator._concatenate()
+    now = fleet._epoch(start) + 300
+
+    def per_flight():
+        for flight in simulator.flights:
+            progress = min(max((now - flight.start) / flight.duration, 0.0), 1.0)
+            geodesy.interpolate(flight.points, [progress * flight.length])
+            geodesy.bearings_deg(flight.points)
+
+    print(f'{args.flights} flights of {args.points} points')
+    print(f'{"step":<28} {"p50 ms":>10}')
+    print(f'{"per flight (interpolate)":<28} {timed(per_flight, args.repeat):>10.3f}')
+    print(f'{"FleetSimulator.tick":<28} {timed(lambda: simulator.tick(now), args.repeat):>10.3f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark path geometry on long paths
+Run with: python benchmarks/bench_geodesy.py [--points 10000] [--repeat 50]
+
+Times the per-waypoint Python loop simulate_path used to run (flat-earth and
+with math.* haversine) against the vectorized geodesy functions, on a random
+walk of --points waypoints, and reports how far the flat-earth length was off.
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import geodesy
+
+def flat_earth_m(path):
+    total = 0
+    for i in range(len(path) - 1):
+        lat1, lng1 = path[i][1], path[i][0]
+        lat2, lng2 = path[i + 1][1], path[i + 1][0]
+        total += math.sqrt((lat2 - lat1) ** 2 + (lng2 - lng1) ** 2) * 111000
+    return total
+
+def haversine_loop_m(path):
+    return sum(geodesy.haversine_m(a[1], a[0], b[1], b[0]) for a, b in zip(path, path[1:]))
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--points', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    steps = rng.normal(0, 1e-3, (args.points, 2))
+    array = np.cumsum(steps, axis=0) + [-122.4, 47.6]
+    path = array.tolist()
+    along = np.linspace(0, geodesy.path_length_m(array), args.points)
+
+    rows = (
+        ('python loop, flat earth', lambda: flat_earth_m(path)),
+        ('python loop, haversine', lambda: haversine_loop_m(path)),
+        ('numpy path_length_m (list in)', lambda: geodesy.path_length_m(path)),
+        ('numpy path_length_m', lambda: geodesy.path_length_m(array)),
+        ('numpy bearings_deg', lambda: geodesy.bearings_deg(array)),
+        ('numpy cumulative_m', lambda: geodesy.cumulative_m(array)),
+        (f'numpy interpolate x{args.points}', lambda: geodesy.interpolate(array, along)),
+    )
+    print(f'{"operation":<32} {"p50 ms":>10}')
+    for label, fn in rows:
+        print(f'{label:<32} {timed(fn, args.repeat):>10.3f}')
+    error = flat_earth_m(path) / geodesy.path_length_m(array) - 1
+    print(f'flat-earth length error at {array[0][1]:.0f} deg latitude: {error:+.1%}')
+
+if __name__ == '__main__':
+    main()
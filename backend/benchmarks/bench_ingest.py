@@ -0,0 +1,73 @@
+"""
+Benchmark telemetry ingest throughput
+Run with: python benchmarks/bench_ingest.py [--samples 50000] [--batch 5000]
+
+Times the stages of POST /telemetry/ingest on --samples samples sent in
+batches of --batch: NDJSON decoding, column-wise validation, and the buffer's
+multi-row INSERT into a fresh SQLite database, against inserting each sample
+with its own ORM add and commit (what drone_action does per write).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import ingest
+from models import BaseModel, TelemetryRecord
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--samples', type=int, default=50_000)
+    parser.add_argument('--batch', type=int, default=5_000)
+    args = parser.parse_args()
+
+    now = time.time()
+    samples = [{'drone_id': f'drone-{i % 100}', 'ts': now - i * 0.01, 'lng': -122.4 + i * 1e-6, 'lat': 37.79,
+                'altitude_m': 110.0, 'heading_deg': 90.0, 'battery_level': 85.0, 'signal_strength': 92.0}
+               for i in range(args.samples)]
+    bodies = [b'\n'.join(json.dumps(sample).encode() for sample in samples[start:start + args.batch])
+              for start in range(0, args.samples, args.batch)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f'sqlite:///{directory}/ingest.db')
+        BaseModel.metadata.create_all(engine, tables=[TelemetryRecord.__table__])
+
+        started = time.perf_counter()
+        decoded = [ingest.decode('application/x-ndjson', body) for body in bodies]
+        decoding = time.perf_counter() - started
+
+        started = time.perf_counter()
+        rows = [row for batch in decoded for row in ingest.validate(batch, now)[1]]
+        validation = time.perf_counter() - started
+
+        buffer = ingest.TelemetryBuffer(engine, interval=0, flush_rows=len(rows) + 1, max_buffered=len(rows))
+        started = time.perf_counter()
+        buffer.add(rows)
+        buffer.flush()
+        flushing = time.perf_counter() - started
+
+        per_row = min(2000, args.samples)
+        Session = sessionmaker(bind=engine)
+        started = time.perf_counter()
+        for record in map(ingest._record, rows[:per_row]):
+            with Session() as db:
+                db.add(TelemetryRecord(**record))
+                db.commit()
+        per_commit = (time.perf_counter() - started) / per_row
+
+    print(f'{args.samples} samples in batches of {args.batch}')
+    print(f'{"stage":<28} {"samples/s":>12}')
+    for label, seconds in (('decode (NDJSON)', decoding), ('validate', validation), ('buffered bulk insert', flushing),
+                           ('all three', decoding + validation + flushing)):
+        print(f'{label:<28} {args.samples / seconds:>12,.0f}')
+    print(f'{"ORM add + commit per row":<28} {1 / per_commit:>12,.0f}')
+
+if __name__ == '__main__':
+    main()
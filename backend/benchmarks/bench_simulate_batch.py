@@ -0,0 +1,57 @@
+"""
+Benchmark batch simulation throughput against worker count
+Run with: python benchmarks/bench_simulate_batch.py [--paths 64] [--points 10000] [--workers 1,2,4]
+
+Times the simulations of --paths paths of --points waypoints each, run inline
+(as one simulate_path request after another would) and through
+simulation.simulate_many on pools of each worker count (pool start-up
+excluded). Throughput should grow with workers up to the number of cores.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import simulation
+
+def make_paths(count, points):
+    rng = np.random.default_rng(1)
+    return [(np.cumsum(rng.normal(0, 1e-3, (points, 2)), axis=0) + [-122.4, 47.6]).tolist() for _ in range(count)]
+
+async def drain(items):
+    return [outcome async for outcome in simulation.simulate_many(items)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--paths', type=int, default=64)
+    parser.add_argument('--points', type=int, default=10_000)
+    parser.add_argument('--workers', default=','.join(str(n) for n in (1, 2, 4, os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    paths = make_paths(args.paths, args.points)
+    items = list(enumerate(paths))
+    print(f'{os.cpu_count()} CPUs, {args.paths} paths x {args.points} points')
+    print(f'{"mode":<12} {"seconds":>8} {"paths/s":>8}')
+
+    started = time.perf_counter()
+    for path in paths:
+        simulation.simulate(path)
+    elapsed = time.perf_counter() - started
+    print(f'{"inline":<12} {elapsed:>8.2f} {args.paths / elapsed:>8.1f}')
+
+    for workers in sorted({int(n) for n in args.workers.split(',')}):
+        simulation.SIMULATION_WORKERS = workers
+        asyncio.run(drain(items[:workers]))  # start the workers
+        started = time.perf_counter()
+        asyncio.run(drain(items))
+        elapsed = time.perf_counter() - started
+        print(f'{f"{workers} workers":<12} {elapsed:>8.2f} {args.paths / elapsed:>8.1f}')
+        simulation.shutdown_pool()
+
+if __name__ == '__main__':
+    main()
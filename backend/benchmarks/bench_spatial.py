@@ -0,0 +1,86 @@
+"""
+Benchmark nearest-base and bounding-box lookups at fleet scale
+Run with: python benchmarks/bench_spatial.py [--bases 100000] [--queries 2000]
+
+Compares the SQLite R*Tree and the in-memory packed R-tree (the fallback)
+with what idx_base_location allows: a (lat, lng) B-tree range scan, which can
+only narrow on latitude. Box timings are for the lookup alone (keys of the
+matching bases); the last rows time the k-nearest search behind
+GET /bases/near, without and with loading the k bases through the ORM.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import sessionmaker
+
+from db_profiles import create_profiled_engine, SQLITE_PRODUCTION
+from models import BaseModel, DroneBase
+import spatial
+
+def timed(fn, args_list):
+    latencies = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--bases', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    url = f'sqlite:///{os.path.join(tempfile.mkdtemp(prefix="bench-spatial-"), "bench.db")}'
+    engine = create_profiled_engine(url, SQLITE_PRODUCTION)
+    BaseModel.metadata.create_all(bind=engine)
+    rng = random.Random(1)
+    rows = [{'id': str(uuid.uuid4()), 'name': f'Base {i}', 'lat': rng.uniform(-60, 70), 'lng': rng.uniform(-180, 180)}
+            for i in range(args.bases)]
+    with engine.begin() as conn:
+        conn.execute(insert(DroneBase), rows)
+
+    db = sessionmaker(bind=engine)()
+    conn = db.connection()
+    tree = spatial.memory_index.tree(db)
+
+    # ~20 km boxes (what a k=10 search needs at this density) and 2° viewports
+    points = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(args.queries)]
+    small = [spatial.radius_boxes(lat, lng, 20_000)[0] for lat, lng in points]
+    viewport = [(lat, lng, lat + 2, lng + 2) for lat, lng in points]
+
+    rtree_sql = text(
+        'SELECT k.base_id FROM bases_rtree r JOIN bases_rtree_keys k ON k.key = r.key '
+        'WHERE r.max_lat >= :s AND r.min_lat <= :n AND r.max_lng >= :w AND r.min_lng <= :e'
+    )
+    btree_sql = text('SELECT id FROM bases WHERE lat BETWEEN :s AND :n AND lng BETWEEN :w AND :e')
+
+    def sql(statement):
+        return lambda box: conn.execute(statement, dict(zip('swne', box))).all()
+
+    print(f'{args.bases} bases, {args.queries} queries per row')
+    print(f'{"index":<22} {"box":<10} {"p50 ms":>8} {"p99 ms":>8}')
+    for name, fn in (('B-tree (lat, lng)', sql(btree_sql)), ('SQLite R*Tree', sql(rtree_sql)),
+                     ('in-memory R-tree', tree.search)):
+        for label, boxes in (('20 km', small), ('2 degrees', viewport)):
+            p50, p99 = timed(fn, [(box,) for box in boxes])
+            print(f'{name:<22} {label:<10} {p50:>8.3f} {p99:>8.3f}')
+
+    for name, fn in (('nearest k=10', spatial.nearest), ('nearest k=10 + load', spatial.bases_near)):
+        p50, p99 = timed(lambda lat, lng: fn(db, lat, lng, 10), points[:500])
+        print(f'{name:<22} {"R*Tree":<10} {p50:>8.3f} {p99:>8.3f}')
+    db.close()
+    engine.dispose()
+
+if __name__ == '__main__':
+    main()
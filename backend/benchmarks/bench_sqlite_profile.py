@@ -0,0 +1,109 @@
+"""
+Benchmark concurrent reads and writes under the SQLite engine profiles
+Run with: python benchmarks/bench_sqlite_profile.py [--readers 12] [--writers 4] [--seconds 5]
+
+Each profile gets a fresh database file seeded with drones. Reader threads list
+drones through the ORM while writer threads update a drone and commit, which is
+what GET /drones and PUT /drones/{id} do. In the rollback-journal default a
+commit locks readers out; under WAL they keep reading from a snapshot.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from db_profiles import resolve_profile, create_profiled_engine
+from models import BaseModel, Drone
+
+def run_profile(name: str, readers: int, writers: int, seconds: float, drones: int) -> dict:
+    directory = tempfile.mkdtemp(prefix='bench-sqlite-')
+    url = f'sqlite:///{os.path.join(directory, "bench.db")}'
+    profile = resolve_profile(url, name)
+    engine = create_profiled_engine(url, profile)
+    BaseModel.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+
+    with SessionLocal() as db:
+        db.add_all([Drone(name=f'Bench-{i}', user_id='bench', status='active') for i in range(drones)])
+        db.commit()
+        ids = list(db.execute(select(Drone.id)).scalars())
+
+    stats = {'read': [], 'write': []}
+    errors = {'read': 0, 'write': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def reader():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with SessionLocal() as db:
+                    db.execute(select(Drone).limit(100)).scalars().all()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    stats['read'].append(elapsed)
+            except Exception:
+                with lock:
+                    errors['read'] += 1
+
+    def writer():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with SessionLocal() as db:
+                    drone = db.get(Drone, random.choice(ids))
+                    drone.status = random.choice(('active', 'idle', 'charging'))
+                    db.commit()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    stats['write'].append(elapsed)
+            except Exception:
+                with lock:
+                    errors['write'] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    result = {'profile': profile.name}
+    for kind in ('read', 'write'):
+        latencies = sorted(stats[kind])
+        result[kind] = {
+            'ops': len(latencies) / seconds,
+            'p50': statistics.median(latencies) * 1000 if latencies else float('nan'),
+            'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float('nan'),
+            'errors': errors[kind],
+        }
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--readers', type=int, default=12)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--drones', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{args.readers} readers + {args.writers} writers for {args.seconds:g}s, {args.drones} drones')
+    print(f'{"profile":<18} {"kind":<6} {"ops/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for name in ('basic', 'sqlite-production'):
+        result = run_profile(name, args.readers, args.writers, args.seconds, args.drones)
+        for kind in ('read', 'write'):
+            r = result[kind]
+            print(f'{result["profile"]:<18} {kind:<6} {r["ops"]:>8.0f} {r["p50"]:>8.2f} {r["p99"]:>8.2f} {r["errors"]:>7}')
+
+if __name__ == '__main__':
+    main()
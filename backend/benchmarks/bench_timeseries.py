@@ -0,0 +1,86 @@
+"""
+Benchmark telemetry history range queries
+Run with: python benchmarks/bench_timeseries.py [--hours 24] [--hz 1]
+
+Stores --hours of one drone's samples at --hz in a fresh history store and in
+the telemetry table of a fresh SQLite database, then times range queries of
+increasing width: the store's raw segments (memory-mapped column slices), its
+1m rollups, and the equivalent indexed SELECT on the table.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import create_engine, select
+
+import ingest
+from models import BaseModel, TelemetryRecord
+from timeseries import TelemetryStore
+
+REPEATS = 20
+
+def timed(query) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        query()
+    return (time.perf_counter() - started) / REPEATS * 1000
+
+def naive(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--hz', type=float, default=1)
+    args = parser.parse_args()
+
+    end = float(int(time.time()))
+    ts = np.arange(end - args.hours * 3600, end, 1 / args.hz)
+    rows = [('drone-1', t, -122.4, 37.79, 110.0, 90.0, 85.0, 92.0) for t in ts.tolist()]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = TelemetryStore(os.path.join(directory, 'store'))
+        started = time.perf_counter()
+        store.append_samples(rows)
+        appending = time.perf_counter() - started
+        started = time.perf_counter()
+        store.roll_up(end + 3600)
+        rolling = time.perf_counter() - started
+
+        engine = create_engine(f'sqlite:///{directory}/telemetry.db')
+        BaseModel.metadata.create_all(engine, tables=[TelemetryRecord.__table__])
+        buffer = ingest.TelemetryBuffer(engine, interval=0, max_buffered=len(rows))
+        buffer.add(rows)
+        buffer.flush()
+
+        print(f'{len(rows):,} samples over {args.hours:g} h: appended in {appending:.2f} s, '
+              f'rolled up in {rolling:.2f} s')
+        print(f'{"range":>8} {"rows":>8} {"store raw ms":>13} {"store 1m ms":>12} {"SQL ms":>9}')
+        with engine.connect() as conn:
+            for minutes in (1, 10, 60, 360, 1440):
+                if minutes * 60 > args.hours * 3600:
+                    break
+                start = end - minutes * 60
+                statement = (select(TelemetryRecord.recorded_at, TelemetryRecord.lng, TelemetryRecord.lat,
+                                    TelemetryRecord.altitude_m, TelemetryRecord.heading_deg,
+                                    TelemetryRecord.battery_level, TelemetryRecord.signal_strength)
+                             .where(TelemetryRecord.drone_id == 'drone-1',
+                                    TelemetryRecord.recorded_at >= naive(start),
+                                    TelemetryRecord.recorded_at < naive(end))
+                             .order_by(TelemetryRecord.recorded_at))
+                count = len(store.query('drone-1', start, end)['ts'])
+                # Materialize as the endpoint does
+                raw = timed(lambda: {name: values.tolist() for name, values in store.query('drone-1', start, end).items()})
+                minute = timed(lambda: {name: values.tolist()
+                                        for name, values in store.query('drone-1', start, end, '1m').items()})
+                sql = timed(lambda: conn.execute(statement).all())
+                print(f'{minutes:>6} m {count:>8,} {raw:>13.2f} {minute:>12.2f} {sql:>9.2f}')
+
+if __name__ == '__main__':
+    main()
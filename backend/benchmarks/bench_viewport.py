@@ -0,0 +1,76 @@
+"""
+Benchmark GET /map/viewport work at growing fleet sizes
+Run with: python benchmarks/bench_viewport.py [--sizes 10000,100000] [--queries 300]
+
+Times Viewport planning plus reading (cold: empty tile cache, warm: every tile
+cached at its current version) for a city-sized view at zoom 12 and a
+region-sized view at zoom 7, with bases and drones spread over the same area.
+Times should track the viewport, not the fleet size.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from db_profiles import create_profiled_engine, SQLITE_PRODUCTION
+from models import BaseModel, Drone, DroneBase
+import viewport
+
+ADMIN = {'sub': str(uuid.uuid4()), 'user_metadata': {'role': 'admin'}}
+
+def seed(engine, size, rng):
+    bases = [{'id': str(uuid.uuid4()), 'name': f'Base {i}', 'lat': rng.uniform(25, 50), 'lng': rng.uniform(-125, -70)}
+             for i in range(size)]
+    drones = [{'id': str(uuid.uuid4()), 'name': f'Drone {i}', 'user_id': ADMIN['sub'],
+               'last_lat': rng.uniform(25, 50), 'last_lng': rng.uniform(-125, -70)} for i in range(size)]
+    with engine.begin() as conn:
+        conn.execute(insert(DroneBase), bases)
+        conn.execute(insert(Drone), drones)
+
+def run(db, boxes, zoom, cold):
+    if cold:
+        viewport.tile_cache.clear()
+    started = time.perf_counter()
+    viewport.Viewport(db, boxes, zoom).read(db, ADMIN)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--queries', type=int, default=300)
+    args = parser.parse_args()
+
+    print(f'{"fleet":>8} {"view":<12} {"cold p50 ms":>12} {"warm p50 ms":>12} {"markers":>8}')
+    for size in (int(s) for s in args.sizes.split(',')):
+        url = f'sqlite:///{os.path.join(tempfile.mkdtemp(prefix="bench-viewport-"), "bench.db")}'
+        engine = create_profiled_engine(url, SQLITE_PRODUCTION)
+        BaseModel.metadata.create_all(bind=engine)
+        rng = random.Random(1)
+        seed(engine, size, rng)
+        db = sessionmaker(bind=engine)()
+        for label, span, zoom in (('city z12', 0.2, 12), ('region z7', 4.0, 7)):
+            views = []
+            for _ in range(args.queries):
+                lat, lng = rng.uniform(26, 48), rng.uniform(-124, -75)
+                views.append([(lat, lng, lat + span / 2, lng + span)])
+            cold = statistics.median(run(db, boxes, zoom, True) for boxes in views) * 1000
+            for boxes in views:
+                run(db, boxes, zoom, False)
+            warm = statistics.median(run(db, boxes, zoom, False) for boxes in views) * 1000
+            result = viewport.Viewport(db, views[0], zoom).read(db, ADMIN)
+            markers = len(result['bases']) + len(result['drones']) + len(result['clusters'])
+            print(f'{size:>8} {label:<12} {cold:>12.2f} {warm:>12.2f} {markers:>8}')
+        db.close()
+        engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark write latency under contention, with and without the write queue
+Run with: python benchmarks/bench_write_queue.py [--writers 32] [--readers 4] [--seconds 5]
+
+Both runs use the sqlite-production profile on a fresh database file. Writer
+threads (standing in for threadpool workers running drone_action or
+update_drone) load a drone, change its status and commit, either each on its
+own session or through a WriteQueue that group-commits them on one connection.
+Reader threads keep listing drones throughout.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from db_profiles import create_profiled_engine, SQLITE_PRODUCTION
+from models import BaseModel, Drone
+from write_queue import WriteQueue, enable_sqlite_savepoints, run_write
+
+def percentile(values, fraction):
+    return values[max(0, int(len(values) * fraction) - 1)] * 1000 if values else float('nan')
+
+def run(mode: str, writers: int, readers: int, seconds: float, drones: int) -> dict:
+    directory = tempfile.mkdtemp(prefix='bench-writes-')
+    url = f'sqlite:///{os.path.join(directory, "bench.db")}'
+    engine = create_profiled_engine(url, SQLITE_PRODUCTION)
+    BaseModel.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+    with SessionLocal() as db:
+        db.add_all([Drone(name=f'Bench-{i}', user_id='bench', status='active') for i in range(drones)])
+        db.commit()
+        ids = list(db.execute(select(Drone.id)).scalars())
+
+    queue = None
+    if mode == 'queue':
+        writer_engine = create_profiled_engine(url, SQLITE_PRODUCTION)
+        enable_sqlite_savepoints(writer_engine)
+        queue = WriteQueue(sessionmaker(bind=writer_engine, autoflush=False, expire_on_commit=False)).start()
+
+    latencies, reads = [], []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def unit(session):
+        drone = session.get(Drone, random.choice(ids))
+        drone.status = random.choice(('active', 'paused', 'returning'))
+        return drone.status
+
+    def writer():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if queue is None:
+                    with SessionLocal() as db:
+                        run_write(db, unit)
+                else:
+                    queue.submit(unit).result()
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+            except Exception:
+                with lock:
+                    errors += 1
+
+    def reader():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            with SessionLocal() as db:
+                db.execute(select(Drone).limit(50)).scalars().all()
+            with lock:
+                reads.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batches = None
+    if queue is not None:
+        queue.stop()
+        batches = queue.batches
+    engine.dispose()
+
+    latencies.sort()
+    reads.sort()
+    return {
+        'mode': mode,
+        'writes': len(latencies) / seconds,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'errors': errors,
+        'read_p99': percentile(reads, 0.99),
+        'units_per_commit': len(latencies) / batches if batches else 1.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, default=32)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--drones', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{args.writers} writers + {args.readers} readers for {args.seconds:g}s')
+    print(f'{"mode":<8} {"writes/s":>9} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7} {"read p99":>9} {"per commit":>11}')
+    for mode in ('direct', 'queue'):
+        r = run(mode, args.writers, args.readers, args.seconds, args.drones)
+        print(f'{r["mode"]:<8} {r["writes"]:>9.0f} {r["p50"]:>8.2f} {r["p99"]:>8.2f} {r["errors"]:>7} '
+              f'{r["read_p99"]:>9.2f} {r["units_per_commit"]:>11.1f}')
+
+if __name__ == '__main__':
+    main()
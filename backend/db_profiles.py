@@ -0,0 +1,162 @@
+"""
+Named database engine profiles
+
+A profile bundles create_engine() options, pool sizing and the PRAGMAs run on
+every new connection. DB_PROFILE selects one:
+
+    auto               sqlite-production for SQLite files, basic otherwise (default)
+    basic              the original settings: plain SQLite connections, or
+                       pool_pre_ping on server databases
+    sqlite-production  WAL journal, synchronous=NORMAL, a busy timeout, a larger
+                       page cache, memory-mapped reads and in-memory temp tables
+    postgres-production
+                       pool sizing and pre-ping, plus the native schema: UUID
+                       keys, JSONB path documents and server-side defaults
+                       (see models.py; convert an existing database with
+                       migrate_native_pg.py first)
+
+With WAL, readers work from a snapshot and no longer block behind a writer.
+Writers still take turns; busy_timeout makes a writer wait for the lock instead
+of failing with "database is locked" straight away. pysqlite only opens a
+transaction at the first INSERT/UPDATE/DELETE, so a request's reads never hold
+a snapshot that would have to be upgraded to a write lock (an upgrade fails
+immediately, whatever the timeout).
+
+Environment:
+    DB_POOL_SIZE            persistent connections (16)
+    DB_MAX_OVERFLOW         extra connections under load (24)
+    DB_POOL_TIMEOUT         seconds to wait for a free connection (10)
+    SQLITE_BUSY_TIMEOUT_MS  how long a writer waits for the lock (5000)
+"""
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+# Together the pool and overflow match anyio's default of 40 threadpool
+# workers, so sync handlers don't queue on connection checkout
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '16'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '24'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+class EngineProfile:
+    """Engine options and per-connection PRAGMAs for one kind of deployment"""
+
+    def __init__(self, name: str, dialect: Optional[str], engine_kwargs: Dict[str, Any],
+                 pragmas: Tuple[Tuple[str, Any], ...] = (), native_schema: bool = False):
+        self.name = name
+        self.dialect = dialect  # None: any database
+        self.engine_kwargs = engine_kwargs
+        self.pragmas = pragmas
+        self.native_schema = native_schema
+
+    def __repr__(self):
+        return f'EngineProfile({self.name!r})'
+
+BASIC_SQLITE = EngineProfile('basic', 'sqlite', {'connect_args': {'check_same_thread': False}})
+BASIC = EngineProfile('basic', None, {'pool_pre_ping': True})
+
+SQLITE_PRODUCTION = EngineProfile(
+    'sqlite-production', 'sqlite',
+    {
+        'connect_args': {'check_same_thread': False},
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+    },
+    pragmas=(
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', SQLITE_BUSY_TIMEOUT_MS),
+        ('cache_size', -64 * 1024),        # KiB, i.e. 64 MiB per connection
+        ('mmap_size', 256 * 1024 * 1024),
+        ('temp_store', 'MEMORY'),
+    ),
+)
+
+POSTGRES_PRODUCTION = EngineProfile(
+    'postgres-production', 'postgresql',
+    {
+        'pool_pre_ping': True,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+    },
+    native_schema=True,
+)
+
+PROFILES = {profile.name: profile for profile in (SQLITE_PRODUCTION, POSTGRES_PRODUCTION)}
+
+def _dialect(url: str) -> str:
+    dialect = url.split(':', 1)[0].split('+', 1)[0]
+    return 'postgresql' if dialect == 'postgres' else dialect
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in url
+
+def resolve_profile(url: str, name: str = 'auto') -> EngineProfile:
+    """Pick the profile for a database URL; raises ValueError on a mismatch"""
+    dialect = _dialect(url)
+    if name == 'auto':
+        name = 'sqlite-production' if dialect == 'sqlite' and not _is_memory_sqlite(url) else 'basic'
+    if name == 'basic':
+        return BASIC_SQLITE if dialect == 'sqlite' else BASIC
+    if name not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {name!r} (choose from auto, basic, {', '.join(PROFILES)})")
+    profile = PROFILES[name]
+    if profile.dialect not in (None, dialect):
+        raise ValueError(f"DB_PROFILE {name!r} needs a {profile.dialect} DATABASE_URL, got {dialect}")
+    return profile
+
+def install_pragmas(engine: Engine, profile: EngineProfile) -> None:
+    """Run the profile's PRAGMAs on every new DBAPI connection of `engine`"""
+    if not profile.pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in profile.pragmas:
+                cursor.execute(f'PRAGMA {pragma}={value}')
+        finally:
+            cursor.close()
+
+def create_profiled_engine(url: str, profile: EngineProfile) -> Engine:
+    engine = create_engine(url, **profile.engine_kwargs)
+    install_pragmas(engine, profile)
+    return engine
+
+def engine_diagnostics(engine: Engine, profile: EngineProfile) -> Dict[str, Any]:
+    """Effective settings of a live engine, for the startup log"""
+    info: Dict[str, Any] = {
+        'profile': profile.name,
+        'schema': 'native' if profile.native_schema else 'portable',
+        'dialect': engine.dialect.name,
+        'driver': engine.dialect.driver,
+        'pool': type(engine.pool).__name__,
+    }
+    if isinstance(engine.pool, QueuePool):
+        info['pool_size'] = engine.pool.size()
+        info['max_overflow'] = engine.pool._max_overflow
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            info['sqlite_version'] = conn.exec_driver_sql('select sqlite_version()').scalar()
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size',
+                           'mmap_size', 'temp_store', 'page_size', 'wal_autocheckpoint'):
+                info[pragma] = conn.exec_driver_sql(f'PRAGMA {pragma}').scalar()
+        else:
+            info['server_version'] = '.'.join(map(str, engine.dialect.server_version_info or ()))
+    return info
+
+def profile_warnings(info: Dict[str, Any], profile: EngineProfile) -> list:
+    """Settings the profile asked for but the database did not apply"""
+    warnings = []
+    requested = dict(profile.pragmas)
+    if 'journal_mode' in requested and str(info.get('journal_mode', '')).lower() != str(requested['journal_mode']).lower():
+        # e.g. network filesystems, where SQLite refuses WAL
+        warnings.append(f"journal_mode is {info.get('journal_mode')}, expected {requested['journal_mode']}")
+    return warnings
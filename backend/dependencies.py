@@ -1,13 +1,39 @@
 """
 Database dependency injection for FastAPI
 """
+from fastapi import Request
+from sqlalchemy.exc import OperationalError
+from starlette.concurrency import run_in_threadpool
+
+import models
 from models import SessionLocal
+from replicas import session_router
 
-def get_db():
-    """Dependency to get database session"""
-    db = SessionLocal()
+def get_db(request: Request):
+    """Dependency to get database session (on a read replica for GET/HEAD when configured)"""
+    replica = session_router.route(request)
+    db = replica.session_factory() if replica else SessionLocal()
     try:
         yield db
+    except OperationalError:
+        if replica:
+            session_router.mark_down(replica)
+        raise
     finally:
         db.close()
+        session_router.finish(request)
 
+async def get_async_db(request: Request):
+    """Dependency to get an async database session (ASYNC_DB mode)"""
+    if models.AsyncSessionLocal is None:
+        raise RuntimeError("Async database mode is not enabled (set ASYNC_DB=1)")
+    # Routing may ping a replica, which blocks
+    replica = await run_in_threadpool(session_router.route, request) if session_router.replicas else None
+    factory = replica.async_session_factory if replica else models.AsyncSessionLocal
+    try:
+        async with factory() as db:
+            yield db
+    except OperationalError:
+        if replica:
+            session_router.mark_down(replica)
+        raise
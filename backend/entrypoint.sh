@@ -1,9 +1,10 @@
 #!/bin/sh
 set -e
 
-# Initialize database if it doesn't exist
+# Create the database or apply pending migrations (both are idempotent); a
+# failure stops the container rather than serving an outdated schema
 echo "Initializing database..."
-python init_db.py || echo "Database initialization skipped (may already exist)"
+python init_db.py
 
 # Use PORT environment variable if provided (for Render), otherwise default to 8000
 PORT=${PORT:-8000}
@@ -0,0 +1,104 @@
+"""
+Strong ETags and conditional GETs for the read endpoints
+
+An ETag is a hash of cheap state read with one small query, never of the
+serialized payload:
+
+    listings   row count, max(updated_at or created_at) and the table's change
+               counter, over the same filtered rows the listing would return
+    details    the row's updated_at (schedules: created_at plus the counter)
+
+plus the caller's identity and the query string. If the request's
+If-None-Match matches, the endpoint answers 304 before any ORM object is loaded.
+
+The change counters live in the table_versions table. Session events bump them
+in the same transaction as every ORM flush and ORM-enabled bulk statement, so
+they are shared by all workers and roll back with the write.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response, status
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from models import TableVersion, VERSIONED_TABLES
+
+# Browsers may keep the response but must revalidate it on every use
+CACHE_CONTROL = 'private, no-cache'
+
+_PENDING = 'etag_changed_tables'
+
+def _bump(connection, tables) -> None:
+    tables = sorted(set(tables) & set(VERSIONED_TABLES))
+    if tables:
+        connection.execute(
+            update(TableVersion.__table__)
+            .where(TableVersion.__table__.c.table_name.in_(tables))
+            .values(version=TableVersion.__table__.c.version + 1)
+        )
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    # flush_context.mappers also covers rows reached through cascades
+    tables = {mapper.persist_selectable.name for mapper, states in flush_context.mappers.items() if states}
+    _bump(session.connection(), tables)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _do_orm_execute(orm_execute_state):
+    # Bulk insert/update/delete statements skip the flush; bump once at commit
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info.setdefault(_PENDING, set()).add(orm_execute_state.statement.table.name)
+
+@event.listens_for(Session, 'before_commit')
+def _before_commit(session):
+    tables = session.info.pop(_PENDING, None)
+    if tables:
+        _bump(session.connection(), tables)
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+def table_version(table_name: str):
+    """Scalar subquery reading a table's change counter"""
+    return (
+        select(TableVersion.version)
+        .where(TableVersion.table_name == table_name)
+        .scalar_subquery()
+    )
+
+def collection_state(query: Select, changed_column, table_name: str) -> Select:
+    """(count, max(changed_column), version) over the rows `query` selects"""
+    return query.with_only_columns(
+        func.count(), func.max(changed_column), table_version(table_name),
+        maintain_column_froms=True,
+    )
+
+def make_etag(*parts) -> str:
+    return '"' + hashlib.sha256(repr(parts).encode()).hexdigest()[:32] + '"'
+
+def request_etag(request: Request, current_user: dict, *state) -> str:
+    """ETag for what `current_user` sees at this URL given the current state"""
+    role = current_user.get('user_metadata', {}).get('role', 'user')
+    return make_etag(request.url.path, str(request.url.query), current_user.get('sub'), role, *map(str, state))
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 specifies for GET)"""
+    header: Optional[str] = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={'ETag': etag, 'Cache-Control': CACHE_CONTROL},
+    )
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = CACHE_CONTROL
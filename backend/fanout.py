@@ -0,0 +1,261 @@
+"""
+Telemetry fan-out to WebSocket clients
+
+Clients of /ws/telemetry subscribe to a set of drones, a base or a viewport.
+Clients with the same subscription (and visibility: admins see every drone,
+users their own) share a group, and each tick the hub builds one frame per
+group: every drone's entry is serialized once and the group's frame is the
+join of its entries, so a thousand viewers of one base cost one frame, not a
+thousand.
+
+Each client has a bounded queue of frames drained by its own sender task.
+Frames are full snapshots, so when a slow client falls behind the oldest
+frame is dropped: the client skips ticks rather than buffering them, and
+memory per client stays at WS_SEND_QUEUE frames. A client whose sends stall
+for WS_SEND_TIMEOUT_SECONDS is disconnected. Control messages (subscription
+acks and errors) are queued separately and never dropped.
+
+publish() normally runs on the event loop (it is a FleetSimulator listener);
+it may also be called from other threads.
+
+Environment:
+    WS_SEND_QUEUE            frames queued per client before dropping the oldest (2)
+    WS_SEND_TIMEOUT_SECONDS  how long one send may block before disconnecting (10)
+    WS_MAX_SUBSCRIBED_DRONES drones one subscription may list (1000)
+"""
+import asyncio
+import json
+import os
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Hashable, List, Optional, Set
+
+import numpy as np
+
+from fleet import FleetState
+from geotiles import Box
+from schemas import TelemetrySubscription
+import spatial
+
+WS_SEND_QUEUE = int(os.getenv('WS_SEND_QUEUE', '2'))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv('WS_SEND_TIMEOUT_SECONDS', '10'))
+WS_MAX_SUBSCRIBED_DRONES = int(os.getenv('WS_MAX_SUBSCRIBED_DRONES', '1000'))
+
+# Fleet row fields sent to clients (owner_id stays on the server)
+PUBLIC_FIELDS = ('drone_id', 'schedule_id', 'base_id', 'lng', 'lat', 'progress',
+                 'speed_mps', 'eta_seconds', 'paused', 'telemetry')
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+class FrameQueue:
+    """Latest-frames queue: put() never blocks and drops the oldest frame when full
+
+    Created on the loop that consumes it; put() may be called from any thread.
+    """
+
+    def __init__(self, maxsize: int = WS_SEND_QUEUE):
+        self.maxsize = max(1, maxsize)
+        self.dropped = 0
+        self._frames = deque()
+        self._control = deque()
+        self._lock = threading.Lock()
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+
+    def _wake(self) -> None:
+        if _running_loop() is self._loop:
+            self._ready.set()
+        else:
+            self._loop.call_soon_threadsafe(self._ready.set)
+
+    def put(self, frame: str) -> None:
+        with self._lock:
+            if len(self._frames) >= self.maxsize:
+                self._frames.popleft()
+                self.dropped += 1
+            self._frames.append(frame)
+        self._wake()
+
+    def put_control(self, message: str) -> None:
+        with self._lock:
+            self._control.append(message)
+        self._wake()
+
+    async def get(self) -> str:
+        """The next control message, else the oldest queued frame"""
+        while True:
+            with self._lock:
+                if self._control:
+                    return self._control.popleft()
+                if self._frames:
+                    return self._frames.popleft()
+                self._ready.clear()
+            await self._ready.wait()
+
+class Subscription:
+    """What a client watches: drones, a base or a viewport, limited to what it may see"""
+
+    def __init__(self, owner_id: Optional[str], drones: Optional[List[str]] = None,
+                 base_id: Optional[str] = None, boxes: Optional[List[Box]] = None):
+        self.owner_id = owner_id
+        self.drones = drones
+        self.base_id = base_id
+        self.boxes = boxes
+        if drones is not None:
+            self.key = (owner_id, 'drones', tuple(sorted(set(drones))))
+        elif base_id is not None:
+            self.key = (owner_id, 'base', base_id)
+        else:
+            self.key = (owner_id, 'bbox', tuple(boxes))
+
+    def select(self, index: 'TickIndex') -> np.ndarray:
+        """Row numbers of the tick's drones this subscription receives"""
+        if self.drones is not None:
+            rows = np.array(sorted({index.by_drone[d] for d in self.drones if d in index.by_drone}), dtype=np.intp)
+        elif self.base_id is not None:
+            rows = np.array(index.by_base.get(self.base_id, ()), dtype=np.intp)
+        else:
+            inside = np.zeros(len(index.rows), dtype=bool)
+            for south, west, north, east in self.boxes:
+                inside |= (index.lat >= south) & (index.lat <= north) & (index.lng >= west) & (index.lng <= east)
+            rows = np.flatnonzero(inside)
+        if self.owner_id is not None:
+            rows = rows[index.owned_by(self.owner_id)[rows]]
+        return rows
+
+def parse_subscription(message: dict, current_user: dict) -> Subscription:
+    """A subscribe message: exactly one of drones, base_id or bbox (ValueError otherwise)"""
+    request = TelemetrySubscription.model_validate(message)
+    chosen = [name for name in ('drones', 'base_id', 'bbox') if getattr(request, name) is not None]
+    if len(chosen) != 1:
+        raise ValueError("Subscribe to exactly one of drones, base_id or bbox")
+    if request.drones is not None and len(request.drones) > WS_MAX_SUBSCRIBED_DRONES:
+        raise ValueError(f"At most {WS_MAX_SUBSCRIBED_DRONES} drones per subscription")
+    is_admin = current_user.get('user_metadata', {}).get('role', 'user') == 'admin'
+    owner_id = None if is_admin else current_user.get('sub')
+    if request.bbox is not None:
+        try:
+            boxes = spatial.parse_bbox(request.bbox)
+        except Exception as e:
+            raise ValueError(getattr(e, 'detail', str(e)))
+        return Subscription(owner_id, boxes=boxes)
+    return Subscription(owner_id, drones=request.drones, base_id=request.base_id)
+
+class TickIndex:
+    """Lookups over one tick's rows, built once per publish and shared by every group"""
+
+    def __init__(self, state: FleetState):
+        self.state = state
+        self.rows = state.rows
+        self.by_drone = {row['drone_id']: i for i, row in enumerate(self.rows)}
+        self.by_base: Dict[str, List[int]] = defaultdict(list)
+        for i, row in enumerate(self.rows):
+            if row.get('base_id') is not None:
+                self.by_base[row['base_id']].append(i)
+        self.lng = np.array([row['lng'] for row in self.rows], dtype=np.float64)
+        self.lat = np.array([row['lat'] for row in self.rows], dtype=np.float64)
+        self._owners = np.array([row['owner_id'] for row in self.rows], dtype=object)
+        self._owned: Dict[str, np.ndarray] = {}
+        self._encoded: List[Optional[str]] = [None] * len(self.rows)
+        self.header = f'{{"type":"tick","tick":{state.tick},"time":{json.dumps(state.at)},"drones":['
+
+    def owned_by(self, owner_id: str) -> np.ndarray:
+        if owner_id not in self._owned:
+            self._owned[owner_id] = self._owners == owner_id
+        return self._owned[owner_id]
+
+    def encoded(self, i: int) -> str:
+        """Row i as JSON, serialized on first use"""
+        if self._encoded[i] is None:
+            row = self.rows[i]
+            self._encoded[i] = json.dumps({field: row[field] for field in PUBLIC_FIELDS}, separators=(',', ':'))
+        return self._encoded[i]
+
+    def frame(self, rows: np.ndarray) -> str:
+        return self.header + ','.join(self.encoded(i) for i in rows) + ']}'
+
+class Client:
+    """One WebSocket connection: its user, subscription and send queue"""
+
+    def __init__(self, current_user: dict):
+        self.current_user = current_user
+        self.subscription: Optional[Subscription] = None
+        self.queue = FrameQueue()
+        # Empty frames are sent once, not every tick; per client, so one
+        # joining a group that is already empty still gets its first frame
+        self.sent_empty = False
+
+class _Group:
+    __slots__ = ('subscription', 'clients')
+
+    def __init__(self, subscription: Subscription):
+        self.subscription = subscription
+        self.clients: Set[Client] = set()
+
+class TelemetryHub:
+    """Subscriptions of the connected clients and the per-tick fan-out"""
+
+    def __init__(self):
+        self._groups: Dict[Hashable, _Group] = {}
+        self._lock = threading.Lock()
+        self.frames_built = 0
+
+    def connect(self, current_user: dict) -> Client:
+        return Client(current_user)
+
+    def subscribe(self, client: Client, subscription: Subscription) -> None:
+        """Move the client to the subscription's group"""
+        with self._lock:
+            self._leave(client)
+            group = self._groups.get(subscription.key)
+            if group is None:
+                group = self._groups[subscription.key] = _Group(subscription)
+            group.clients.add(client)
+            client.subscription = group.subscription
+            client.sent_empty = False
+
+    def disconnect(self, client: Client) -> None:
+        with self._lock:
+            self._leave(client)
+
+    def _leave(self, client: Client) -> None:
+        if client.subscription is None:
+            return
+        group = self._groups.get(client.subscription.key)
+        if group is not None:
+            group.clients.discard(client)
+            if not group.clients:
+                del self._groups[client.subscription.key]
+        client.subscription = None
+
+    @property
+    def clients(self) -> int:
+        with self._lock:
+            return sum(len(group.clients) for group in self._groups.values())
+
+    def publish(self, state: FleetState) -> None:
+        """Queue the tick's frame for every subscribed client"""
+        with self._lock:
+            groups = [(group, list(group.clients)) for group in self._groups.values()]
+        if not groups:
+            return
+        index = TickIndex(state)
+        for group, clients in groups:
+            rows = group.subscription.select(index)
+            empty = not len(rows)
+            if empty:
+                clients = [client for client in clients if not client.sent_empty]
+                if not clients:
+                    continue
+            for client in clients:
+                client.sent_empty = empty
+            frame = index.frame(rows)
+            self.frames_built += 1
+            for client in clients:
+                client.queue.put(frame)
+
+hub = TelemetryHub()
@@ -0,0 +1,265 @@
+"""
+Server-side fleet simulation
+
+One asyncio task per API process ticks every drone flying a schedule and keeps
+the fleet's live state in memory; GET /fleet/live (and any other reader)
+serves that state, so positions are computed once per tick however many
+clients watch.
+
+A flight is a schedule whose window contains now and whose path has at least
+two points. It covers its path at constant speed: from start_time to
+end_time, or at DEFAULT_SPEED_MPS when it has no end. Every flight's path is
+concatenated into one array, with cumulative distances offset so they keep
+increasing from one flight to the next; a tick is then a single vectorized
+step over the whole fleet (one searchsorted for the current legs, one slerp
+for the positions, and array arithmetic for the telemetry) whatever the number
+of flights.
+
+Flights are reloaded from the database when the schedules or drones change
+(their table_versions counters, polled every FLEET_RELOAD_SECONDS) and as the
+lookahead window runs out. A drone whose status is 'paused' holds its position
+and resumes from it; 'completed' drones (end_early) stop flying.
+
+Environment:
+    FLEET_SIMULATION      run the engine (on; 0 disables it)
+    FLEET_TICK_MS         time between ticks (1000)
+    FLEET_RELOAD_SECONDS  how often schedule and drone changes are checked for (2)
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import geodesy
+import paths
+from models import Drone, Schedule, TableVersion
+from scheduling import apply_window
+from structured_logging import get_logger, log_event
+
+FLEET_SIMULATION = os.getenv('FLEET_SIMULATION', '1').lower() in ('1', 'true', 'yes')
+FLEET_TICK_MS = float(os.getenv('FLEET_TICK_MS', '1000'))
+FLEET_RELOAD_SECONDS = float(os.getenv('FLEET_RELOAD_SECONDS', '2'))
+
+# Cruise speed of flights without an end_time (the dashboard's, and the one
+# schedules' path_duration_s assumes)
+DEFAULT_SPEED_MPS = paths.CRUISE_SPEED_MPS
+# Flights starting this soon are loaded ahead, so they take off on time
+LOOKAHEAD = timedelta(minutes=2)
+
+logger = get_logger('fleet')
+
+def _epoch(value: datetime) -> float:
+    """Seconds since the epoch; naive times (SQLite) are UTC"""
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+class Flight:
+    """A schedule being flown: its path and timing"""
+
+    def __init__(self, schedule: Schedule, owner_id: str, status: Optional[str], base_id: Optional[str] = None):
+        self.schedule_id = str(schedule.id)
+        self.drone_id = str(schedule.drone_id)
+        self.owner_id = str(owner_id)
+        self.base_id = str(base_id) if base_id is not None else None
+        self.paused = status == 'paused'
+        self.points = geodesy.as_points(schedule.path_json['coordinates'])
+        self.cumulative = geodesy.cumulative_m(self.points)
+        self.length = float(self.cumulative[-1])
+        self.start = _epoch(schedule.start_time)
+        if schedule.end_time is not None and schedule.end_time > schedule.start_time:
+            self.duration = _epoch(schedule.end_time) - self.start
+        else:
+            self.duration = max(self.length / DEFAULT_SPEED_MPS, 1.0)
+
+class FleetState:
+    """The fleet's positions and telemetry at one tick (read-only)"""
+
+    def __init__(self, tick: int, at: float, rows: List[dict]):
+        self.tick = tick
+        self.at = at
+        self.rows = rows
+
+    def visible_to(self, current_user: dict) -> List[dict]:
+        """The drones current_user may see (all for admins)"""
+        if current_user.get('user_metadata', {}).get('role', 'user') == 'admin':
+            return self.rows
+        user_id = current_user.get('sub')
+        return [row for row in self.rows if row['owner_id'] == user_id]
+
+EMPTY = FleetState(0, 0.0, [])
+
+class FleetSimulator:
+    """Loads flights and steps them; tick() is the vectorized step"""
+
+    def __init__(self, session_factory: Callable[[], Session]):
+        self.session_factory = session_factory
+        self.flights: List[Flight] = []
+        self.state = EMPTY
+        self._versions = None
+        self._loaded_until = 0.0
+        # schedule id -> [paused since (or None), seconds paused so far]
+        self._pauses: Dict[str, list] = {}
+        self._arrays = None
+        # Called with each tick's state on the event loop (e.g. the WebSocket fan-out)
+        self.listeners: List[Callable[[FleetState], None]] = []
+
+    def _table_versions(self, db: Session) -> tuple:
+        return tuple(db.execute(
+            select(TableVersion.table_name, TableVersion.version)
+            .where(TableVersion.table_name.in_(('drones', 'schedules')))
+            .order_by(TableVersion.table_name)
+        ).all())
+
+    def refresh(self, now: Optional[float] = None) -> bool:
+        """Reload the flights if schedules or drones changed or the lookahead ran out; True if reloaded"""
+        now = time.time() if now is None else now
+        with self.session_factory() as db:
+            versions = self._table_versions(db)
+            if versions == self._versions and now < self._loaded_until:
+                return False
+            self._load(db, now)
+            self._versions = versions
+        return True
+
+    def _load(self, db: Session, now: float) -> None:
+        start = datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None)
+        rows = db.execute(
+            apply_window(
+                select(Schedule, Drone.user_id, Drone.status, Drone.base_id).join(Drone, Drone.id == Schedule.drone_id),
+                start, start + LOOKAHEAD,
+            ).where(Schedule.path_data.is_not(None), Schedule.path_points >= 2)
+        ).all()
+        flights = [Flight(schedule, owner_id, status, base_id)
+                   for schedule, owner_id, status, base_id in rows if status != 'completed']
+        # Open-ended flights outlast their window query when slow; drop the finished ones here
+        self.flights = [flight for flight in flights if flight.start + flight.duration > now]
+        self._loaded_until = now + LOOKAHEAD.total_seconds() / 2
+        self._pauses = {flight.schedule_id: self._pauses.get(flight.schedule_id, [None, 0.0])
+                        for flight in self.flights}
+        for flight in self.flights:
+            pause = self._pauses[flight.schedule_id]
+            if flight.paused and pause[0] is None:
+                pause[0] = now
+            elif not flight.paused and pause[0] is not None:
+                pause[1] += now - pause[0]
+                pause[0] = None
+        self._arrays = self._concatenate()
+        log_event(logger, logging.DEBUG, "Fleet flights loaded", flights=len(self.flights))
+
+    def _concatenate(self) -> Optional[dict]:
+        """The flights' paths as one array, distances offset per flight so they keep increasing"""
+        if not self.flights:
+            return None
+        offsets = np.cumsum([0] + [len(flight.points) for flight in self.flights])
+        # Each flight starts 1 m past the previous one's end
+        base = np.cumsum([0.0] + [flight.length + 1.0 for flight in self.flights[:-1]])
+        bearings = [np.append(geodesy.bearings_deg(flight.points), 0.0) for flight in self.flights]
+        return {
+            'points': np.concatenate([flight.points for flight in self.flights]),
+            'cumulative': np.concatenate([flight.cumulative + b for flight, b in zip(self.flights, base)]),
+            'bearings': np.concatenate(bearings),
+            'first': offsets[:-1],
+            'last_leg': offsets[1:] - 2,
+            'base': base,
+            'length': np.array([flight.length for flight in self.flights]),
+            'start': np.array([flight.start for flight in self.flights]),
+            'duration': np.array([flight.duration for flight in self.flights]),
+        }
+
+    def tick(self, now: Optional[float] = None) -> FleetState:
+        """Advance every flight to `now` in one vectorized step and publish the state"""
+        now = time.time() if now is None else now
+        arrays = self._arrays
+        if arrays is None:
+            self.state = FleetState(self.state.tick + 1, now, [])
+            return self.state
+
+        # Paused flights are held where the pause began
+        pauses = [self._pauses[flight.schedule_id] for flight in self.flights]
+        clock = np.array([now if since is None else min(now, since) for since, _ in pauses])
+        elapsed = clock - arrays['start'] - np.array([paused for _, paused in pauses])
+        progress = np.clip(elapsed / arrays['duration'], 0.0, 1.0)
+        flying = (elapsed >= 0) & (elapsed < arrays['duration'])
+
+        target = arrays['base'] + progress * arrays['length']
+        cumulative = arrays['cumulative']
+        leg = np.clip(np.searchsorted(cumulative, target, side='right') - 1, arrays['first'], arrays['last_leg'])
+        leg_length = cumulative[leg + 1] - cumulative[leg]
+        fraction = np.divide(target - cumulative[leg], leg_length, out=np.zeros_like(target), where=leg_length > 0)
+        positions = geodesy.slerp(arrays['points'][leg], arrays['points'][leg + 1], fraction, leg_length)
+
+        # Telemetry follows the dashboard's flight model
+        speed = np.where(flying & (clock == now), arrays['length'] / arrays['duration'], 0.0)
+        battery = np.maximum(70.0, 100.0 - 30.0 * progress)
+        altitude = 100.0 + 20.0 * np.sin(progress * 5.0)
+        signal = np.maximum(75.0, 95.0 - 5.0 * np.sin(progress * 100.0 / 15.0))
+        remaining = (1.0 - progress) * arrays['duration']
+
+        rows = []
+        for i in np.flatnonzero(flying):
+            flight = self.flights[i]
+            rows.append({
+                'drone_id': flight.drone_id,
+                'schedule_id': flight.schedule_id,
+                'owner_id': flight.owner_id,
+                'base_id': flight.base_id,
+                'lng': float(positions[i, 0]),
+                'lat': float(positions[i, 1]),
+                'progress': float(progress[i]),
+                'speed_mps': float(speed[i]),
+                'eta_seconds': float(remaining[i]),
+                'paused': pauses[i][0] is not None,
+                'telemetry': {
+                    'battery_level': float(battery[i]),
+                    'altitude_m': float(altitude[i]),
+                    'heading_deg': float(arrays['bearings'][leg[i]]),
+                    'signal_strength': float(signal[i]),
+                },
+            })
+        self.state = FleetState(self.state.tick + 1, now, rows)
+        return self.state
+
+    async def run(self) -> None:
+        """Tick forever; database reloads run on a worker thread"""
+        next_refresh = 0.0
+        while True:
+            started = time.monotonic()
+            try:
+                if started >= next_refresh:
+                    next_refresh = started + FLEET_RELOAD_SECONDS
+                    await asyncio.to_thread(self.refresh)
+                state = self.tick()
+                for listener in self.listeners:
+                    listener(state)
+            except Exception as e:
+                log_event(logger, logging.ERROR, "Fleet tick failed", exc_info=True, error_type=type(e).__name__)
+            await asyncio.sleep(max(0.0, FLEET_TICK_MS / 1000 - (time.monotonic() - started)))
+
+_task: Optional[asyncio.Task] = None
+simulator: Optional[FleetSimulator] = None
+
+def start_fleet(session_factory: Callable[[], Session]) -> FleetSimulator:
+    """Start the tick task on the running loop"""
+    global _task, simulator
+    simulator = FleetSimulator(session_factory)
+    _task = asyncio.get_running_loop().create_task(simulator.run())
+    return simulator
+
+async def stop_fleet() -> None:
+    global _task
+    task, _task = _task, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+def current_state() -> FleetState:
+    """The latest tick's state (empty while the engine isn't running)"""
+    return simulator.state if simulator is not None else EMPTY
@@ -0,0 +1,101 @@
+"""
+Great-circle geometry over whole paths
+
+Paths are arrays of [lng, lat] points in degrees, the order path documents use
+(extra components such as altitude are ignored). Everything is computed on a
+sphere of the mean Earth radius with NumPy, one vectorized pass per path:
+haversine distances, initial bearings, cumulative distance and positions at
+given distances along the path. The spherical model is within 0.5% of the
+ellipsoid everywhere, far better than the degrees x 111 km approximation it
+replaces, which is off by half at 60 degrees of latitude.
+"""
+import math
+from typing import Sequence
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in meters between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+def as_points(coordinates) -> np.ndarray:
+    """(n, 2) float array of [lng, lat] from a coordinate list or array"""
+    points = np.asarray(coordinates, dtype=np.float64)
+    if points.size == 0:
+        return points.reshape(0, 2)
+    if points.ndim != 2 or points.shape[1] < 2:
+        raise ValueError("Coordinates must be [lng, lat] points")
+    return points[:, :2]
+
+def distances_m(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Element-wise great-circle distances in meters (arrays broadcast)"""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(np.subtract(lng2, lng1)) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def segment_lengths_m(coordinates) -> np.ndarray:
+    """Length of each of the path's n - 1 legs"""
+    points = as_points(coordinates)
+    return distances_m(points[:-1, 1], points[:-1, 0], points[1:, 1], points[1:, 0])
+
+def path_length_m(coordinates) -> float:
+    return float(segment_lengths_m(coordinates).sum())
+
+def cumulative_m(coordinates) -> np.ndarray:
+    """Distance along the path at each of its n points (0 at the first)"""
+    return np.concatenate(([0.0], np.cumsum(segment_lengths_m(coordinates))))
+
+def bearings_deg(coordinates) -> np.ndarray:
+    """Initial bearing of each leg, degrees clockwise from north in [0, 360)"""
+    points = as_points(coordinates)
+    phi1, phi2 = np.radians(points[:-1, 1]), np.radians(points[1:, 1])
+    dlambda = np.radians(points[1:, 0] - points[:-1, 0])
+    y = np.sin(dlambda) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlambda)
+    return np.degrees(np.arctan2(y, x)) % 360.0
+
+def _unit_vectors(points: np.ndarray) -> np.ndarray:
+    lam, phi = np.radians(points[:, 0]), np.radians(points[:, 1])
+    return np.stack((np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)), axis=-1)
+
+def interpolate(coordinates, along_m: Sequence[float]) -> np.ndarray:
+    """[lng, lat] of the points at the given distances along the path
+
+    Distances are clamped to the path; within a leg the position follows the
+    great circle between its ends.
+    """
+    points = as_points(coordinates)
+    along = np.asarray(along_m, dtype=np.float64)
+    if len(points) < 2:
+        return np.repeat(points[:1], along.size, axis=0)
+    cumulative = cumulative_m(points)
+    along = np.clip(along, 0.0, cumulative[-1])
+    leg = np.clip(np.searchsorted(cumulative, along, side='right') - 1, 0, len(points) - 2)
+    length = cumulative[leg + 1] - cumulative[leg]
+    fraction = np.divide(along - cumulative[leg], length, out=np.zeros_like(along), where=length > 0)
+    return slerp(points[leg], points[leg + 1], fraction, length)
+
+def slerp(start, end, fraction, length_m=None) -> np.ndarray:
+    """[lng, lat] at `fraction` of the way along the great circles from start to end (row-wise)
+
+    length_m, the start-end distances, may be passed when already known.
+    """
+    start, end = as_points(start), as_points(end)
+    fraction = np.asarray(fraction, dtype=np.float64)
+    if length_m is None:
+        length_m = distances_m(start[:, 1], start[:, 0], end[:, 1], end[:, 0])
+    angle = np.asarray(length_m) / EARTH_RADIUS_M
+    sin_angle = np.sin(angle)
+    # Legs too short for the sine ratio to be stable fall back to linear weights
+    stable = sin_angle > 1e-12
+    safe = np.where(stable, sin_angle, 1.0)
+    a = np.where(stable, np.sin((1 - fraction) * angle) / safe, 1 - fraction)
+    b = np.where(stable, np.sin(fraction * angle) / safe, fraction)
+    x, y, z = (a[:, None] * _unit_vectors(start) + b[:, None] * _unit_vectors(end)).T
+    return np.stack((np.degrees(np.arctan2(y, x)), np.degrees(np.arctan2(z, np.hypot(x, y)))), axis=-1)
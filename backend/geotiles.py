@@ -0,0 +1,103 @@
+"""
+Geohash keys and tile coverings for map viewports
+
+A geohash interleaves longitude and latitude bits (longitude first) and writes
+them five at a time in base 32, so every prefix of a hash is the cell that
+contains it. Cells sort together as strings: the entities inside a tile are
+exactly those whose key is in [tile, tile + '~'), a range scan on an ordinary
+index (with byte-order comparison; see models.GEOHASH).
+"""
+import math
+from typing import Iterable, List, Tuple
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: value for value, char in enumerate(BASE32)}
+
+# Precision stored on rows: 9 characters is a cell of about 5 x 5 m
+GEOHASH_PRECISION = 9
+
+# Upper bound of a tile's key range; sorts after every base-32 character
+RANGE_END = '~'
+
+# Tile precision per map zoom level: (highest zoom, precision). A viewport of
+# about 1000 px at that zoom is then covered by a few tiles across.
+ZOOM_PRECISION = ((3, 1), (5, 2), (8, 3), (10, 4), (13, 5), (15, 6), (18, 7))
+MAX_PRECISION = 8
+
+# Lat/lng box: (south, west, north, east), west <= east
+Box = Tuple[float, float, float, float]
+
+def encode(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Geohash of a point"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        if coord >= mid:
+            value = value * 2 + 1
+            interval[0] = mid
+        else:
+            value *= 2
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            value, bits = 0, 0
+    return ''.join(chars)
+
+def decode_box(geohash: str) -> Box:
+    """The cell a geohash names"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            interval = lng_range if even else lat_range
+            mid = (interval[0] + interval[1]) / 2
+            interval[0 if (value >> shift) & 1 else 1] = mid
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a cell at this precision"""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+def _steps(low: float, high: float, origin: float, step: float, cells: int) -> range:
+    first = min(int(math.floor((low - origin) / step)), cells - 1)
+    last = min(int(math.floor((high - origin) / step)), cells - 1)
+    return range(max(first, 0), max(last, 0) + 1)
+
+def _grid(box: Box, precision: int) -> Tuple[range, range, float, float]:
+    height, width = cell_size(precision)
+    south, west, north, east = box
+    rows = _steps(south, north, -90.0, height, round(180.0 / height))
+    columns = _steps(west, east, -180.0, width, round(360.0 / width))
+    return rows, columns, height, width
+
+def cover_count(boxes: Iterable[Box], precision: int) -> int:
+    total = 0
+    for box in boxes:
+        rows, columns, _, _ = _grid(box, precision)
+        total += len(rows) * len(columns)
+    return total
+
+def cover(boxes: Iterable[Box], precision: int) -> List[str]:
+    """The tiles at this precision intersecting any of the boxes, sorted"""
+    tiles = set()
+    for box in boxes:
+        rows, columns, height, width = _grid(box, precision)
+        for row in rows:
+            for col in columns:
+                tiles.add(encode(-90.0 + (row + 0.5) * height, -180.0 + (col + 0.5) * width, precision))
+    return sorted(tiles)
+
+def viewport_precision(boxes: List[Box], zoom: int, max_tiles: int) -> int:
+    """Tile precision for a zoom level, lowered until the boxes need at most max_tiles tiles"""
+    precision = next((p for highest, p in ZOOM_PRECISION if zoom <= highest), MAX_PRECISION)
+    while precision > 1 and cover_count(boxes, precision) > max_tiles:
+        precision -= 1
+    return precision
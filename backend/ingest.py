@@ -0,0 +1,311 @@
+"""
+Buffered telemetry ingest
+
+POST /telemetry/ingest takes batches of samples as NDJSON (one JSON object per
+line) or MessagePack (an array of maps, or a stream of maps):
+
+    {"drone_id": "...", "ts": 1767268800.5, "lng": -122.4, "lat": 37.79,
+     "altitude_m": 110, "heading_deg": 90, "battery_level": 85, "signal_strength": 92}
+
+ts (seconds since the epoch, default: when the batch arrived) and the four
+readings are optional. A batch is decoded in one call and validated a column
+at a time with NumPy, and its drones are authorized with one query. Accepted
+samples go to an in-memory buffer; the request never waits for the database.
+
+A flusher thread per database drains the buffer every TELEMETRY_FLUSH_MS, or
+as soon as TELEMETRY_FLUSH_ROWS samples are waiting, with one multi-row INSERT
+transaction into the telemetry table (a unit of the writer thread when the
+write queue is running, see write_queue.py). When the database falls behind and
+TELEMETRY_MAX_BUFFERED samples are waiting, ingest answers 503 so senders back
+off instead of the process growing without bound. The buffer is flushed when
+the app shuts down; a crash loses at most the samples of one interval.
+After each committed flush the same samples are appended to the on-disk
+history store (see timeseries.py), which GET /drones/{id}/telemetry reads.
+
+MessagePack needs the msgpack package; without it those batches get 415.
+
+Environment:
+    TELEMETRY_FLUSH_MS      time between flushes (500; 0: no thread, flush inline
+                            whenever TELEMETRY_FLUSH_ROWS are waiting)
+    TELEMETRY_FLUSH_ROWS    samples that trigger a flush before the interval ends (5000)
+    TELEMETRY_MAX_BUFFERED  samples waiting before ingest answers 503 (500000)
+    MAX_TELEMETRY_BATCH     samples accepted by one request (50000)
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from models import TelemetryRecord
+from timeseries import TelemetryStore, default_store
+from structured_logging import get_logger, log_event
+from write_queue import run_write
+
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack batches are refused
+    msgpack = None
+
+TELEMETRY_FLUSH_MS = float(os.getenv('TELEMETRY_FLUSH_MS', '500'))
+TELEMETRY_FLUSH_ROWS = int(os.getenv('TELEMETRY_FLUSH_ROWS', '5000'))
+TELEMETRY_MAX_BUFFERED = int(os.getenv('TELEMETRY_MAX_BUFFERED', '500000'))
+MAX_TELEMETRY_BATCH = int(os.getenv('MAX_TELEMETRY_BATCH', '50000'))
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+# Samples passed to one INSERT
+INSERT_CHUNK = 10_000
+# Clocks this far ahead of ours are still trusted
+MAX_CLOCK_SKEW_SECONDS = 300
+
+# Numeric fields: (name, lowest, highest, required); None bounds only require a finite value
+FIELDS = (
+    ('lng', -180.0, 180.0, True),
+    ('lat', -90.0, 90.0, True),
+    ('altitude_m', None, None, False),
+    ('heading_deg', 0.0, 360.0, False),
+    ('battery_level', 0.0, 100.0, False),
+    ('signal_strength', 0.0, 100.0, False),
+)
+
+# Buffered row: (drone_id, ts, lng, lat, altitude_m, heading_deg, battery_level, signal_strength)
+Row = Tuple[str, float, float, float, Optional[float], Optional[float], Optional[float], Optional[float]]
+COLUMNS = ('drone_id', 'recorded_at') + tuple(name for name, *_ in FIELDS)
+
+logger = get_logger('telemetry')
+
+class UnsupportedMediaType(Exception):
+    pass
+
+def decode(media_type: str, body: bytes) -> list:
+    """The batch's samples (ValueError if malformed, UnsupportedMediaType for other formats)"""
+    if media_type in NDJSON_TYPES:
+        return _decode_ndjson(body)
+    if media_type in MSGPACK_TYPES:
+        if msgpack is None:
+            raise UnsupportedMediaType("MessagePack is not available on this server; send NDJSON")
+        return _decode_msgpack(body)
+    raise UnsupportedMediaType("Send application/x-ndjson or application/msgpack")
+
+def _decode_ndjson(body: bytes) -> list:
+    lines = body.splitlines()
+    nonblank = [line for line in lines if line.strip()]
+    try:
+        # One parse for the whole batch
+        samples = json.loads(b'[' + b','.join(nonblank) + b']')
+    except ValueError:
+        pass
+    else:
+        # A line holding several values ("1,2") parses too: it adds elements
+        if len(samples) == len(nonblank):
+            return samples
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                json.loads(line)
+            except ValueError:
+                raise ValueError(f"Line {number} is not valid JSON")
+    raise ValueError("Body is not valid NDJSON")
+
+def _decode_msgpack(body: bytes) -> list:
+    unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+    unpacker.feed(body)
+    samples = []
+    try:
+        for item in unpacker:
+            if isinstance(item, list):
+                samples.extend(item)
+            else:
+                samples.append(item)
+    except (ValueError, msgpack.UnpackException):
+        raise ValueError("Body is not valid MessagePack")
+    if unpacker.tell() != len(body):
+        raise ValueError("Body ends inside a MessagePack value")
+    return samples
+
+def _column(samples: Sequence[dict], name: str) -> Tuple[np.ndarray, np.ndarray]:
+    """The field as floats (NaN where missing) and where it isn't a number"""
+    values = [sample.get(name) for sample in samples]
+    try:
+        return np.array(values, dtype=np.float64), np.zeros(len(values), dtype=bool)
+    except (TypeError, ValueError):
+        pass
+    column = np.full(len(values), np.nan)
+    wrong_type = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            column[i] = value
+        elif value is not None:
+            wrong_type[i] = True
+    return column, wrong_type
+
+def _optional(column: np.ndarray) -> list:
+    return [None if value != value else value for value in column.tolist()]
+
+def validate(samples: list, now: float) -> Tuple[List[int], List[Row], List[Tuple[int, str]]]:
+    """Check a batch column by column
+
+    Returns the indexes and rows of the valid samples, and (index, reason) for
+    the others.
+    """
+    count = len(samples)
+    reasons = np.full(count, None, dtype=object)
+
+    def reject(mask: np.ndarray, reason: str) -> None:
+        reasons[mask & (reasons == None)] = reason  # noqa: E711 (element-wise)
+
+    is_object = np.fromiter((isinstance(sample, dict) for sample in samples), dtype=bool, count=count)
+    reject(~is_object, "Sample must be an object")
+    samples = [sample if isinstance(sample, dict) else {} for sample in samples]
+
+    drone_ids = [sample.get('drone_id') for sample in samples]
+    reject(np.fromiter((not isinstance(d, str) or not d for d in drone_ids), dtype=bool, count=count),
+           "drone_id must be a non-empty string")
+
+    ts, wrong_type = _column(samples, 'ts')
+    reject(wrong_type, "ts must be a number")
+    missing = np.isnan(ts)
+    ts[missing] = now
+    reject(~np.isfinite(ts) | (ts <= 0) | (ts > now + MAX_CLOCK_SKEW_SECONDS), "ts is out of range")
+
+    columns = []
+    for name, lowest, highest, required in FIELDS:
+        column, wrong_type = _column(samples, name)
+        reject(wrong_type, f"{name} must be a number")
+        missing = np.isnan(column)
+        if required:
+            reject(missing, f"{name} is required")
+        present = ~missing
+        out_of_range = present & ~np.isfinite(column)
+        if lowest is not None:
+            out_of_range |= present & ((column < lowest) | (column > highest))
+        reject(out_of_range, f"{name} is out of range")
+        columns.append(column)
+
+    valid = np.flatnonzero(reasons == None)  # noqa: E711
+    lng, lat = (column[valid].tolist() for column in columns[:2])
+    readings = [_optional(column[valid]) for column in columns[2:]]
+    rows = list(zip([drone_ids[i] for i in valid], ts[valid].tolist(), lng, lat, *readings))
+    errors = [(int(i), reasons[i]) for i in np.flatnonzero(reasons != None)]  # noqa: E711
+    return valid.tolist(), rows, errors
+
+def _record(row: Row) -> dict:
+    record = dict(zip(COLUMNS, row))
+    # Naive UTC, as the ORM writes timestamps
+    record['recorded_at'] = datetime.fromtimestamp(row[1], timezone.utc).replace(tzinfo=None)
+    return record
+
+class TelemetryBuffer:
+    """Samples waiting to be inserted into one database, and the thread that inserts them"""
+
+    def __init__(self, bind: Engine, interval: float = TELEMETRY_FLUSH_MS / 1000,
+                 flush_rows: int = TELEMETRY_FLUSH_ROWS, max_buffered: int = TELEMETRY_MAX_BUFFERED,
+                 store: Optional[TelemetryStore] = None):
+        self.bind = bind
+        self.store = store
+        self.interval = interval
+        self.flush_rows = flush_rows
+        self.max_buffered = max_buffered
+        self.flushed = 0
+        self.dropped = 0
+        self._rows: List[Row] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def add(self, rows: List[Row]) -> bool:
+        """Queue rows for the next flush; False (nothing queued) when the buffer is full"""
+        with self._lock:
+            if len(self._rows) + len(rows) > self.max_buffered:
+                return False
+            self._rows.extend(rows)
+            due = len(self._rows) >= self.flush_rows
+            if self.interval > 0 and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='telemetry-flusher', daemon=True)
+                self._thread.start()
+        if due:
+            if self.interval > 0:
+                self._wake.set()
+            else:
+                self.flush()
+        return True
+
+    def flush(self) -> int:
+        """Insert everything buffered in one transaction; the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            def write(session: Session) -> None:
+                for start in range(0, len(rows), INSERT_CHUNK):
+                    session.execute(insert(TelemetryRecord.__table__),
+                                    [_record(row) for row in rows[start:start + INSERT_CHUNK]])
+
+            try:
+                with Session(self.bind) as session:
+                    run_write(session, write)
+            except Exception as e:
+                # Keep the rows for the next flush, as far as the buffer has room
+                with self._lock:
+                    kept = rows[:max(0, self.max_buffered - len(self._rows))]
+                    self._rows[:0] = kept
+                    self.dropped += len(rows) - len(kept)
+                log_event(logger, logging.ERROR, "Telemetry flush failed", rows=len(rows),
+                          dropped=len(rows) - len(kept), error_type=type(e).__name__, error=str(e))
+                return 0
+            self.flushed += len(rows)
+            if self.store is not None:
+                try:
+                    self.store.append_samples(rows)
+                except Exception as e:
+                    # The rows are committed; only their history is lost
+                    log_event(logger, logging.ERROR, "Telemetry store append failed", rows=len(rows),
+                              exc_info=True, error_type=type(e).__name__)
+            return len(rows)
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def stop(self) -> None:
+        """Stop the flusher thread and flush what is left"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+_buffers: Dict[Engine, TelemetryBuffer] = {}
+_buffers_lock = threading.Lock()
+
+def buffer_for(bind: Engine) -> TelemetryBuffer:
+    """The buffer writing to `bind`, created on first use"""
+    with _buffers_lock:
+        if bind not in _buffers:
+            _buffers[bind] = TelemetryBuffer(bind, store=default_store())
+        return _buffers[bind]
+
+def stop_buffers() -> None:
+    """Flush and stop every buffer (app shutdown)"""
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+        _buffers.clear()
+    for buffer in buffers:
+        buffer.stop()
@@ -2,14 +2,14 @@
 Initialize SQLite database with demo data
 Run this once to create tables and seed data
 """
-from models import BaseModel, engine, SessionLocal, Drone, DroneBase, Schedule
+from models import init_db, SessionLocal, Drone, DroneBase, Schedule
 from datetime import datetime, timedelta
 
 def init_database():
-    """Create all tables"""
-    print("Creating database tables...")
-    BaseModel.metadata.create_all(bind=engine)
-    print("✅ Tables created!")
+    """Create or upgrade the tables"""
+    print("Migrating database tables...")
+    init_db()
+    print("✅ Tables up to date!")
 
 def seed_data():
     """Add demo data"""
@@ -0,0 +1,178 @@
+"""
+Per-route request metrics exposed in Prometheus text format
+
+MetricsMiddleware is a plain ASGI middleware that records, per route template
+(e.g. /api/drones/{drone_id}) and method: a latency histogram, request and
+response size histograms and status code counts, plus a global in-flight gauge.
+
+All updates happen on the event loop thread, so the counters are plain ints and
+lists with no locking; bucket boundaries are fixed tuples and each observation
+is a single bisect. Each worker process keeps its own registry.
+"""
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Upper bounds in seconds / bytes; +Inf is implicit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+UNMATCHED_ROUTE = '__unmatched__'
+
+class Histogram:
+    """Fixed-bucket histogram; counts are per bucket and made cumulative on export"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterable[Tuple[str, int]]:
+        running = 0
+        for bound, count in zip(self.bounds, self.counts):
+            running += count
+            yield _format_number(bound), running
+        yield '+Inf', self.count
+
+class RouteStats:
+    """Everything recorded for one (method, route template) pair"""
+
+    __slots__ = ('latency', 'request_size', 'response_size', 'statuses')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.request_size = Histogram(SIZE_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+
+class MetricsRegistry:
+    """Process-wide request metrics"""
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteStats] = {}
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status_code: int, duration: float,
+                request_bytes: int, response_bytes: int) -> None:
+        key = (method, route)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats()
+        stats.latency.observe(duration)
+        stats.request_size.observe(request_bytes)
+        stats.response_size.observe(response_bytes)
+        stats.statuses[status_code] = stats.statuses.get(status_code, 0) + 1
+
+    def reset(self) -> None:
+        self.routes.clear()
+        self.in_flight = 0
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines: List[str] = [
+            '# HELP http_requests_in_flight Requests currently being served.',
+            '# TYPE http_requests_in_flight gauge',
+            f'http_requests_in_flight {self.in_flight}',
+            '# HELP http_requests_total Requests served, by route template and status code.',
+            '# TYPE http_requests_total counter',
+        ]
+        routes = sorted(self.routes.items())
+        for (method, route), stats in routes:
+            for status_code, count in sorted(stats.statuses.items()):
+                lines.append(
+                    f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status_code}"}} {count}'
+                )
+        for name, attr, help_text in (
+            ('http_request_duration_seconds', 'latency', 'Request latency by route template.'),
+            ('http_request_size_bytes', 'request_size', 'Request body size by route template.'),
+            ('http_response_size_bytes', 'response_size', 'Response body size by route template.'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (method, route), stats in routes:
+                histogram: Histogram = getattr(stats, attr)
+                labels = f'method="{method}",route="{_escape(route)}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{{labels}}} {_format_number(histogram.sum)}')
+                lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+def _format_number(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+registry = MetricsRegistry()
+
+class MetricsMiddleware:
+    """ASGI middleware feeding a MetricsRegistry"""
+
+    def __init__(self, app, registry: MetricsRegistry = registry, exclude_paths: Tuple[str, ...] = ('/metrics',)):
+        self.app = app
+        self.registry = registry
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        started = time.perf_counter()
+        status_code = 500
+        response_bytes = 0
+        request_bytes = _content_length(scope)
+
+        if request_bytes is None:
+            request_bytes = 0
+            inner_receive = receive
+
+            async def receive():
+                nonlocal request_bytes
+                message = await inner_receive()
+                if message['type'] == 'http.request':
+                    request_bytes += len(message.get('body', b''))
+                return message
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_bytes
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            elif message['type'] == 'http.response.body':
+                response_bytes += len(message.get('body', b''))
+            await send(message)
+
+        registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            registry.in_flight -= 1
+            route = scope.get('route')
+            registry.observe(
+                scope['method'],
+                getattr(route, 'path_format', None) or UNMATCHED_ROUTE,
+                status_code,
+                time.perf_counter() - started,
+                request_bytes,
+                response_bytes,
+            )
+
+def _content_length(scope) -> Optional[int]:
+    for name, value in scope.get('headers', ()):
+        if name == b'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
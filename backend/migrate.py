@@ -1,21 +1,68 @@
 """
-Database migration script to create all tables
-Run with: python migrate.py
+Apply, revert and inspect schema migrations (see migrations/__init__.py)
+Run with: python migrate.py [command]
+
+    upgrade [REV] [--no-backfill]   apply revisions up to REV (default: head)
+    downgrade REV                   revert the revisions after REV ('base': all)
+    backfill                        run or resume unfinished backfills
+    current                         show the applied revision
+    history                         list the revisions
 """
-from models import BaseModel, engine, init_db
+import argparse
 import sys
 
-def migrate():
-    """Create all database tables"""
+from migrations import (
+    MigrationError, backfill_status, current_revision, downgrade, load_revisions,
+    migration_engine, run_pending_backfills, upgrade,
+)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command')
+    up = commands.add_parser('upgrade')
+    up.add_argument('target', nargs='?', default='head')
+    up.add_argument('--no-backfill', action='store_true', help='leave backfills for `migrate.py backfill`')
+    down = commands.add_parser('downgrade')
+    down.add_argument('target')
+    fill = commands.add_parser('backfill')
+    fill.add_argument('--batch-size', type=int)
+    fill.add_argument('--pause-ms', type=float)
+    commands.add_parser('current')
+    commands.add_parser('history')
+    args = parser.parse_args(argv)
+
+    engine = migration_engine()
     try:
-        print("Creating database tables...")
-        init_db()
-        print("✅ Database tables created successfully!")
-        return True
-    except Exception as e:
-        print(f"❌ Error creating tables: {e}")
-        sys.exit(1)
+        if args.command in (None, 'upgrade'):
+            target = getattr(args, 'target', 'head')
+            upgrade(engine, target, run_backfills=not getattr(args, 'no_backfill', False))
+            print(f"✅ Database at revision {current_revision(engine)}")
+        elif args.command == 'downgrade':
+            downgrade(engine, args.target)
+            print(f"✅ Database at revision {current_revision(engine) or 'base'}")
+        elif args.command == 'backfill':
+            options = {}
+            if args.batch_size:
+                options['batch_size'] = args.batch_size
+            if args.pause_ms is not None:
+                options['pause'] = args.pause_ms / 1000
+            run_pending_backfills(engine, **options)
+            for state in backfill_status(engine):
+                print(f"{state['name']:<40} {state['rows_done']:>10} rows  "
+                      f"{'done' if state['completed_at'] else 'pending'}")
+        elif args.command == 'current':
+            print(current_revision(engine) or 'base')
+        elif args.command == 'history':
+            current = current_revision(engine)
+            for revision in load_revisions():
+                marker = ' (current)' if revision.revision == current else ''
+                print(f"{revision.revision}  {revision.description}{marker}")
+    except MigrationError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        engine.dispose()
+    return 0
 
 if __name__ == '__main__':
-    migrate()
-
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Convert a PostgreSQL database from the portable schema to the native schema
+Run with: python migrate_native_pg.py [--dry-run]
+
+Key columns go from VARCHAR(36) to UUID, schedules.path_json from JSON to
+JSONB; then the server-side defaults are added and the tables analyzed. Each
+table is rewritten once (all of its columns in one ALTER TABLE) inside a single
+transaction, so either everything converts or nothing does. The rewrite holds an exclusive lock on the table: run it during
+a maintenance window, then restart the API with DB_PROFILE=postgres-production.
+
+The conversion is refused while any key is not a well-formed UUID (e.g. demo
+user ids such as 'demo-user-1'); the offending columns are listed. Columns
+already converted are skipped, so the script can be re-run safely.
+gen_random_uuid() needs PostgreSQL 13 or later (or the pgcrypto extension).
+"""
+import argparse
+import sys
+from typing import Dict, List
+
+from sqlalchemy import inspect, text
+
+from models import engine, server_default_statements
+
+KEY_COLUMNS = {
+    'bases': ('id',),
+    'drones': ('id', 'user_id', 'base_id'),
+    'schedules': ('id', 'drone_id'),
+}
+DOCUMENT_COLUMNS = {'schedules': ('path_json',)}
+UUID_PATTERN = '^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'
+
+def column_types(conn) -> Dict[tuple, str]:
+    rows = conn.execute(text(
+        "SELECT table_name, column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name IN ('bases', 'drones', 'schedules')"
+    ))
+    return {(table, column): data_type for table, column, data_type in rows}
+
+def invalid_keys(conn, types: Dict[tuple, str]) -> Dict[str, int]:
+    """Count the values per unconverted key column that are not UUIDs"""
+    counts = {}
+    for table, columns in KEY_COLUMNS.items():
+        for column in columns:
+            if types.get((table, column)) == 'uuid':
+                continue
+            count = conn.execute(text(
+                f"SELECT count(*) FROM {table} WHERE {column} IS NOT NULL AND {column} !~ :pattern"
+            ), {'pattern': UUID_PATTERN}).scalar()
+            if count:
+                counts[f'{table}.{column}'] = count
+    return counts
+
+def index_sizes(conn) -> Dict[str, int]:
+    rows = conn.execute(text(
+        "SELECT indexrelname, pg_relation_size(indexrelid) FROM pg_stat_user_indexes "
+        "WHERE relname IN ('bases', 'drones', 'schedules')"
+    ))
+    return dict(rows.all())
+
+def foreign_keys(conn) -> List[dict]:
+    inspector = inspect(conn)
+    return [dict(fk, table=table) for table in KEY_COLUMNS for fk in inspector.get_foreign_keys(table)]
+
+def migration_statements(types: Dict[tuple, str], fks: List[dict]) -> List[str]:
+    """DDL converting whatever is still portable; empty once fully converted"""
+    alters = {}
+    for table, columns in KEY_COLUMNS.items():
+        for column in columns:
+            if types.get((table, column)) != 'uuid':
+                alters.setdefault(table, []).append(f'ALTER COLUMN {column} TYPE uuid USING {column}::uuid')
+    for table, columns in DOCUMENT_COLUMNS.items():
+        for column in columns:
+            if types.get((table, column)) != 'jsonb':
+                alters.setdefault(table, []).append(f'ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb')
+    if not alters:
+        return []
+
+    # Both sides of a foreign key must change type together
+    statements = [f'ALTER TABLE {fk["table"]} DROP CONSTRAINT {fk["name"]}' for fk in fks]
+    statements += [f'ALTER TABLE {table} ' + ', '.join(clauses) for table, clauses in alters.items()]
+    for fk in fks:
+        ondelete = fk.get('options', {}).get('ondelete')
+        statements.append(
+            f'ALTER TABLE {fk["table"]} ADD CONSTRAINT {fk["name"]} '
+            f'FOREIGN KEY ({", ".join(fk["constrained_columns"])}) '
+            f'REFERENCES {fk["referred_table"]} ({", ".join(fk["referred_columns"])})'
+            + (f' ON DELETE {ondelete}' if ondelete else '')
+        )
+    for table in KEY_COLUMNS:
+        statements += server_default_statements(table)
+    statements += [f'ANALYZE {table}' for table in KEY_COLUMNS]
+    return statements
+
+def migrate(dry_run: bool = False) -> bool:
+    if engine.dialect.name != 'postgresql':
+        print(f"❌ The native schema is PostgreSQL only (DATABASE_URL is {engine.dialect.name})")
+        return False
+
+    with engine.begin() as conn:
+        types = column_types(conn)
+        invalid = invalid_keys(conn, types)
+        if invalid:
+            print("❌ These columns hold values that are not UUIDs; fix or remove them first:")
+            for column, count in invalid.items():
+                print(f"   {column}: {count} rows")
+            return False
+
+        statements = migration_statements(types, foreign_keys(conn))
+        if not statements:
+            print("✅ Already on the native schema")
+            return True
+        for statement in statements:
+            print(f"   {statement};")
+        if dry_run:
+            print("Dry run: nothing changed")
+            return True
+
+        before = index_sizes(conn)
+        for statement in statements:
+            conn.execute(text(statement))
+        after = index_sizes(conn)
+
+    print(f"{'index':<28} {'before':>10} {'after':>10}")
+    for name in sorted(set(before) | set(after)):
+        print(f"{name:<28} {before.get(name, 0):>10} {after.get(name, 0):>10}")
+    print(f"{'total':<28} {sum(before.values()):>10} {sum(after.values()):>10}")
+    print("✅ Converted; set DB_PROFILE=postgres-production and restart the API")
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--dry-run', action='store_true', help='print the DDL without running it')
+    args = parser.parse_args()
+    sys.exit(0 if migrate(args.dry_run) else 1)
@@ -0,0 +1,348 @@
+"""
+Versioned schema migrations
+
+Revisions are the modules of this package named rNNN_*.py, chained through
+their `down_revision`:
+
+    \"\"\"Add drones.battery_level\"\"\"
+    revision = '002'
+    down_revision = '001'
+
+    def upgrade(op): ...
+    def downgrade(op): ...
+
+    backfills = (Backfill(...),)   # optional
+
+A revision spells out the tables, columns and indexes it creates instead of
+taking them from models.py, whose metadata is the head schema: DDL built from
+it would change as later revisions change the models.
+
+Each revision's upgrade() or downgrade() runs in one transaction together with
+its row in schema_revisions, on SQLite as well (see migration_engine()), so a
+failing revision leaves nothing behind. Operations skip what already exists:
+r001_baseline builds the current models on a fresh database, and later
+revisions then find their columns and indexes already in place.
+
+Backfills run after the schema change has committed, a batch of rows per short
+transaction in primary-key order, pausing between batches so the API's writes
+get the lock in between. Progress is kept in schema_backfills: an interrupted
+backfill resumes after the last key it committed.
+
+Indexes created with online=True are built with CREATE INDEX CONCURRENTLY on
+PostgreSQL, after the revision commits, so they don't block writes.
+
+Environment:
+    BACKFILL_BATCH_SIZE  rows per backfill transaction (500)
+    BACKFILL_PAUSE_MS    pause between backfill batches (50)
+"""
+import importlib
+import os
+import pkgutil
+import re
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from sqlalchemy import (
+    bindparam, column, inspect, select, table, text, update,
+    Column, DateTime, Integer, MetaData, String, Table, Text
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn, CreateIndex, Index
+
+BACKFILL_BATCH_SIZE = int(os.getenv('BACKFILL_BATCH_SIZE', '500'))
+BACKFILL_PAUSE_MS = float(os.getenv('BACKFILL_PAUSE_MS', '50'))
+
+class MigrationError(Exception):
+    """Broken revision chain or an unknown target revision"""
+
+_metadata = MetaData()
+
+schema_revisions = Table(
+    'schema_revisions', _metadata,
+    Column('revision', String(32), primary_key=True),
+    Column('description', Text),
+    Column('applied_at', DateTime(timezone=True), nullable=False),
+)
+
+schema_backfills = Table(
+    'schema_backfills', _metadata,
+    Column('name', String(128), primary_key=True),
+    Column('revision', String(32), nullable=False),
+    Column('last_key', String(64)),
+    Column('rows_done', Integer, nullable=False, default=0),
+    Column('completed_at', DateTime(timezone=True)),
+)
+
+class Backfill:
+    """Fill a column for existing rows, in batches ordered by primary key
+
+    `update` is either a SQL SET clause (e.g. "status = 'simulated'") applied to
+    each batch of keys, or a function taking the batch's rows (key first, then
+    `columns`) and returning one dict of new values per row, keyed by column
+    name plus '_key'. `where` (SQL) limits the rows visited, e.g. to those
+    still NULL.
+    """
+
+    def __init__(self, name: str, table_name: str, update: Union[str, Callable[[list], List[dict]]],
+                 columns: Sequence[str] = (), where: Optional[str] = None, key: str = 'id'):
+        self.name = name
+        self.table_name = table_name
+        self.update = update
+        self.columns = tuple(columns)
+        self.where = where
+        self.key = key
+
+    def _apply(self, conn: Connection, rows: list) -> None:
+        keys = [row[0] for row in rows]
+        if isinstance(self.update, str):
+            conn.execute(
+                text(f'UPDATE {self.table_name} SET {self.update} WHERE {self.key} IN :keys')
+                .bindparams(bindparam('keys', expanding=True)),
+                {'keys': keys},
+            )
+            return
+        values = self.update(rows)
+        if values:
+            target = table(self.table_name, column(self.key), *(column(name) for name in values[0] if name != '_key'))
+            conn.execute(update(target).where(target.c[self.key] == bindparam('_key')), values)
+
+class Revision:
+    def __init__(self, module):
+        self.revision = module.revision
+        self.down_revision = module.down_revision
+        self.description = (module.__doc__ or '').strip().split('\n')[0]
+        self.upgrade = module.upgrade
+        self.downgrade = module.downgrade
+        self.backfills = tuple(getattr(module, 'backfills', ()))
+
+    def __repr__(self):
+        return f'Revision({self.revision!r})'
+
+class Operations:
+    """Schema operations available to a revision, bound to its transaction"""
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+        self.dialect = conn.dialect.name
+        self.deferred: List[str] = []
+
+    def execute(self, sql: str, params: Optional[dict] = None):
+        return self.conn.execute(text(sql), params or {})
+
+    def has_table(self, table_name: str) -> bool:
+        return inspect(self.conn).has_table(table_name)
+
+    def has_column(self, table_name: str, column_name: str) -> bool:
+        return any(c['name'] == column_name for c in inspect(self.conn).get_columns(table_name))
+
+    def has_index(self, table_name: str, index_name: str) -> bool:
+        return any(i['name'] == index_name for i in inspect(self.conn).get_indexes(table_name))
+
+    def create_table(self, table_obj: Table) -> None:
+        """Create a table (with its indexes) unless it exists"""
+        table_obj.create(self.conn, checkfirst=True)
+
+    def drop_table(self, table_obj: Table) -> None:
+        table_obj.drop(self.conn, checkfirst=True)
+
+    def add_column(self, table_name: str, column_obj: Column) -> None:
+        """Add a column unless it exists; keep it nullable (or give it a server default)"""
+        if self.has_column(table_name, column_obj.name):
+            return
+        if column_obj.table is None:
+            Table(table_name, MetaData(), column_obj)
+        ddl = CreateColumn(column_obj).compile(dialect=self.conn.dialect)
+        self.execute(f'ALTER TABLE {table_name} ADD COLUMN {ddl}')
+
+    def drop_column(self, table_name: str, column_name: str) -> None:
+        if self.has_column(table_name, column_name):
+            self.execute(f'ALTER TABLE {table_name} DROP COLUMN {column_name}')
+
+    def create_index(self, index: Index, online: bool = False) -> None:
+        """Create an index unless it exists
+
+        online=True builds it with CREATE INDEX CONCURRENTLY on PostgreSQL once
+        the revision has committed (a failed concurrent build leaves an
+        INVALID index that must be dropped before retrying).
+        """
+        if online and self.dialect == 'postgresql':
+            ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=self.conn.dialect))
+            self.deferred.append(re.sub(r'^CREATE (UNIQUE )?INDEX', r'CREATE \1INDEX CONCURRENTLY', ddl))
+        else:
+            index.create(self.conn, checkfirst=True)
+
+    def drop_index(self, index: Index) -> None:
+        index.drop(self.conn, checkfirst=True)
+
+def load_revisions(package: str = __name__) -> List[Revision]:
+    """The package's revisions, oldest first"""
+    path = importlib.import_module(package).__path__
+    return chain([Revision(importlib.import_module(f'{package}.{info.name}'))
+                  for info in pkgutil.iter_modules(path) if re.match(r'r\d+_', info.name)])
+
+def chain(revisions: List[Revision]) -> List[Revision]:
+    """Order revisions by down_revision; raises MigrationError unless they form one line"""
+    by_id = {revision.revision: revision for revision in revisions}
+    children = {}
+    for revision in revisions:
+        if revision.down_revision in children:
+            raise MigrationError(f"Revisions {children[revision.down_revision]} and {revision.revision} "
+                                 f"both follow {revision.down_revision}")
+        children[revision.down_revision] = revision.revision
+
+    ordered, current = [], children.get(None)
+    while current is not None:
+        ordered.append(by_id[current])
+        current = children.get(current)
+    if len(ordered) != len(by_id):
+        orphans = sorted(set(by_id) - {r.revision for r in ordered})
+        raise MigrationError(f"Revisions not reachable from the baseline: {', '.join(orphans)}")
+    return ordered
+
+def migration_engine(url: Optional[str] = None) -> Engine:
+    """An engine whose transactions also cover DDL on SQLite
+
+    pysqlite runs DDL outside any transaction; with the driver in autocommit and
+    an explicit BEGIN IMMEDIATE, a revision's statements commit or roll back
+    together, and backfill batches take the write lock up front.
+    """
+    from db_profiles import create_profiled_engine
+    from models import DATABASE_URL, DB_PROFILE
+    from write_queue import enable_sqlite_savepoints
+
+    engine = create_profiled_engine(url or DATABASE_URL, DB_PROFILE)
+    if engine.dialect.name == 'sqlite':
+        enable_sqlite_savepoints(engine)
+    return engine
+
+def applied_revisions(engine: Engine) -> List[str]:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table('schema_revisions'):
+            return []
+        return list(conn.execute(select(schema_revisions.c.revision)).scalars())
+
+def current_revision(engine: Engine, revisions: Optional[List[Revision]] = None) -> Optional[str]:
+    applied = set(applied_revisions(engine))
+    revisions = load_revisions() if revisions is None else revisions
+    return next((r.revision for r in reversed(revisions) if r.revision in applied), None)
+
+def _index_of(revisions: List[Revision], target: str) -> int:
+    if target == 'head':
+        return len(revisions) - 1
+    if target == 'base':
+        return -1
+    for i, revision in enumerate(revisions):
+        if revision.revision == target:
+            return i
+    raise MigrationError(f"Unknown revision {target!r}")
+
+def _run_deferred(engine: Engine, statements: List[str]) -> None:
+    if not statements:
+        return
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+
+def upgrade(engine: Engine, target: str = 'head', revisions: Optional[List[Revision]] = None,
+            run_backfills: bool = True, log: Callable[[str], None] = print) -> List[str]:
+    """Apply the pending revisions up to `target`; returns the revisions applied"""
+    revisions = load_revisions() if revisions is None else revisions
+    _metadata.create_all(bind=engine)
+    applied = set(applied_revisions(engine))
+    done = []
+    for revision in revisions[:_index_of(revisions, target) + 1]:
+        if revision.revision in applied:
+            continue
+        with engine.begin() as conn:
+            op = Operations(conn)
+            revision.upgrade(op)
+            conn.execute(schema_revisions.insert().values(
+                revision=revision.revision, description=revision.description, applied_at=datetime.utcnow()))
+            for backfill in revision.backfills:
+                conn.execute(schema_backfills.insert().values(name=backfill.name, revision=revision.revision, rows_done=0))
+        _run_deferred(engine, op.deferred)
+        log(f"Applied {revision.revision}: {revision.description}")
+        done.append(revision.revision)
+
+    if run_backfills:
+        run_pending_backfills(engine, revisions, log=log)
+    return done
+
+def downgrade(engine: Engine, target: str, revisions: Optional[List[Revision]] = None,
+              log: Callable[[str], None] = print) -> List[str]:
+    """Revert the applied revisions after `target` ('base' reverts them all)"""
+    revisions = load_revisions() if revisions is None else revisions
+    applied = set(applied_revisions(engine))
+    undone = []
+    for revision in reversed(revisions[_index_of(revisions, target) + 1:]):
+        if revision.revision not in applied:
+            continue
+        with engine.begin() as conn:
+            revision.downgrade(Operations(conn))
+            conn.execute(schema_revisions.delete().where(schema_revisions.c.revision == revision.revision))
+            conn.execute(schema_backfills.delete().where(schema_backfills.c.revision == revision.revision))
+        log(f"Reverted {revision.revision}: {revision.description}")
+        undone.append(revision.revision)
+    return undone
+
+def run_backfill(engine: Engine, backfill: Backfill, batch_size: int = BACKFILL_BATCH_SIZE,
+                 pause: float = BACKFILL_PAUSE_MS / 1000, max_batches: Optional[int] = None) -> bool:
+    """Run (or resume) one backfill; returns True once it has completed"""
+    state = schema_backfills.c
+    with engine.connect() as conn:
+        last_key, completed = conn.execute(
+            select(state.last_key, state.completed_at).where(state.name == backfill.name)
+        ).one()
+    if completed is not None:
+        return True
+
+    def next_batch(conn, last_key):
+        conditions = [f'{backfill.key} > :last_key'] if last_key is not None else []
+        if backfill.where:
+            conditions.append(f'({backfill.where})')
+        query = text(
+            f'SELECT {", ".join((backfill.key,) + backfill.columns)} FROM {backfill.table_name}'
+            + (f' WHERE {" AND ".join(conditions)}' if conditions else '')
+            + f' ORDER BY {backfill.key} LIMIT :limit'
+        )
+        return conn.execute(query, {'last_key': last_key, 'limit': batch_size}).all()
+
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with engine.begin() as conn:
+            rows = next_batch(conn, last_key)
+            if not rows:
+                conn.execute(schema_backfills.update().where(state.name == backfill.name)
+                             .values(completed_at=datetime.utcnow()))
+                return True
+            backfill._apply(conn, rows)
+            last_key = str(rows[-1][0])
+            conn.execute(schema_backfills.update().where(state.name == backfill.name)
+                         .values(last_key=last_key, rows_done=state.rows_done + len(rows)))
+        batches += 1
+        if pause:
+            time.sleep(pause)
+    return False
+
+def run_pending_backfills(engine: Engine, revisions: Optional[List[Revision]] = None,
+                          log: Callable[[str], None] = print, **kwargs) -> bool:
+    """Run every unfinished backfill of the applied revisions; True when none is left"""
+    revisions = load_revisions() if revisions is None else revisions
+    applied = set(applied_revisions(engine))
+    finished = True
+    for revision in revisions:
+        if revision.revision not in applied:
+            continue
+        for backfill in revision.backfills:
+            if run_backfill(engine, backfill, **kwargs):
+                log(f"Backfill {backfill.name} complete")
+            else:
+                finished = False
+    return finished
+
+def backfill_status(engine: Engine) -> List[Dict]:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table('schema_backfills'):
+            return []
+        return [dict(row._mapping) for row in conn.execute(select(schema_backfills))]
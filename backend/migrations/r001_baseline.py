@@ -0,0 +1,95 @@
+"""Baseline: drones, bases, schedules and table_versions with their indexes
+
+The schema as it stood when versioned migrations were introduced, spelled out
+here rather than taken from models.py: later revisions add their own columns
+and indexes on top of it, so it must not change as the models do. Databases
+created by create_all before then get only what they are missing (e.g. the
+keyset pagination indexes).
+"""
+from sqlalchemy import (
+    event, insert, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text, Double, DDL
+)
+
+from models import Document, Key, _native_ddl
+
+revision = '001'
+down_revision = None
+
+metadata = MetaData()
+
+bases = Table(
+    'bases', metadata,
+    Column('id', Key, primary_key=True),
+    Column('name', Text, nullable=False),
+    Column('lat', Double, nullable=False),
+    Column('lng', Double, nullable=False),
+    Column('created_at', DateTime(timezone=True)),
+    Column('updated_at', DateTime(timezone=True)),
+    Index('idx_base_location', 'lat', 'lng'),
+    Index('idx_base_created', 'created_at', 'id'),
+)
+
+drones = Table(
+    'drones', metadata,
+    Column('id', Key, primary_key=True),
+    Column('name', Text, nullable=False),
+    Column('model', Text),
+    Column('user_id', Key, nullable=False, index=True),
+    Column('base_id', Key, ForeignKey('bases.id', ondelete='SET NULL')),
+    Column('status', Text, index=True),
+    Column('last_check_in', DateTime(timezone=True)),
+    Column('created_at', DateTime(timezone=True)),
+    Column('updated_at', DateTime(timezone=True)),
+    Index('idx_drone_user_id', 'user_id'),
+    Index('idx_drone_status', 'status'),
+    Index('idx_drone_created', 'created_at', 'id'),
+    Index('idx_drone_user_created', 'user_id', 'created_at', 'id'),
+)
+
+schedules = Table(
+    'schedules', metadata,
+    Column('id', Key, primary_key=True),
+    Column('drone_id', Key, ForeignKey('drones.id', ondelete='CASCADE'), nullable=False, index=True),
+    Column('start_time', DateTime(timezone=True), nullable=False),
+    Column('end_time', DateTime(timezone=True)),
+    Column('path_json', Document),
+    Column('created_at', DateTime(timezone=True)),
+    Index('idx_schedule_drone_id', 'drone_id'),
+    Index('idx_schedule_start_time', 'start_time'),
+    Index('idx_schedule_start_id', 'start_time', 'id'),
+    Index('idx_schedule_path_gin', 'path_json', postgresql_using='gin',
+          postgresql_ops={'path_json': 'jsonb_path_ops'}).ddl_if(dialect='postgresql', callable_=_native_ddl),
+)
+
+table_versions = Table(
+    'table_versions', metadata,
+    Column('table_name', String(64), primary_key=True),
+    Column('version', Integer, nullable=False),
+)
+
+@event.listens_for(table_versions, 'after_create')
+def _seed_table_versions(target, connection, **kw):
+    connection.execute(insert(target), [{'table_name': name, 'version': 0} for name in ('drones', 'bases', 'schedules')])
+
+# Server-side defaults of the native schema
+SERVER_DEFAULTS = {
+    bases: {'id': 'gen_random_uuid()', 'created_at': 'now()', 'updated_at': 'now()'},
+    drones: {'id': 'gen_random_uuid()', 'status': "'simulated'", 'created_at': 'now()', 'updated_at': 'now()'},
+    schedules: {'id': 'gen_random_uuid()', 'created_at': 'now()'},
+}
+
+for _table, _defaults in SERVER_DEFAULTS.items():
+    for _column, _default in _defaults.items():
+        event.listen(_table, 'after_create', DDL(
+            f'ALTER TABLE {_table.name} ALTER COLUMN {_column} SET DEFAULT {_default}'
+        ).execute_if(dialect='postgresql', callable_=_native_ddl))
+
+def upgrade(op):
+    for table in metadata.sorted_tables:
+        op.create_table(table)
+        for index in table.indexes:
+            op.create_index(index)
+
+def downgrade(op):
+    for table in reversed(metadata.sorted_tables):
+        op.drop_table(table)
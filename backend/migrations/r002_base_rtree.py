@@ -0,0 +1,15 @@
+"""Spatial index on base locations (SQLite R*Tree kept in sync by triggers)
+
+Other databases answer spatial queries from an in-memory index instead, so
+there is nothing to create for them (see spatial.py).
+"""
+from spatial import install_rtree, drop_rtree
+
+revision = '002'
+down_revision = '001'
+
+def upgrade(op):
+    install_rtree(op.conn)
+
+def downgrade(op):
+    drop_rtree(op.conn)
@@ -0,0 +1,62 @@
+"""Geohash tile keys on bases and drones, drone positions and tile_versions
+
+Existing drones start at their base's location.
+"""
+from sqlalchemy import Column, Double, Index, Integer, MetaData, String, Table
+
+import geotiles
+from migrations import Backfill
+from models import GEOHASH
+
+revision = '003'
+down_revision = '002'
+
+metadata = MetaData()
+
+bases = Table('bases', metadata, Column('geohash', GEOHASH))
+drones = Table(
+    'drones', metadata,
+    Column('last_lat', Double),
+    Column('last_lng', Double),
+    Column('geohash', GEOHASH),
+)
+tile_versions = Table(
+    'tile_versions', metadata,
+    Column('tile', GEOHASH, primary_key=True),
+    Column('kind', String(16), primary_key=True),
+    Column('version', Integer, nullable=False),
+)
+
+BASE_INDEX = Index('idx_base_geohash', bases.c.geohash)
+DRONE_INDEX = Index('idx_drone_geohash', drones.c.geohash)
+
+def upgrade(op):
+    for table in (bases, drones):
+        for column in table.columns:
+            op.add_column(table.name, column)
+    op.create_index(BASE_INDEX, online=True)
+    op.create_index(DRONE_INDEX, online=True)
+    op.create_table(tile_versions)
+
+def downgrade(op):
+    op.drop_table(tile_versions)
+    op.drop_index(DRONE_INDEX)
+    op.drop_index(BASE_INDEX)
+    for name in ('geohash', 'last_lng', 'last_lat'):
+        op.drop_column('drones', name)
+    op.drop_column('bases', 'geohash')
+
+def _geohashes(rows):
+    return [{'_key': key, 'geohash': geotiles.encode(lat, lng)} for key, lat, lng in rows]
+
+backfills = (
+    Backfill('bases.geohash', 'bases', _geohashes, columns=('lat', 'lng'), where='geohash IS NULL'),
+    Backfill(
+        'drones.last_position', 'drones',
+        'last_lat = (SELECT lat FROM bases WHERE bases.id = drones.base_id), '
+        'last_lng = (SELECT lng FROM bases WHERE bases.id = drones.base_id)',
+        where='last_lat IS NULL AND base_id IS NOT NULL',
+    ),
+    Backfill('drones.geohash', 'drones', _geohashes, columns=('last_lat', 'last_lng'),
+             where='geohash IS NULL AND last_lat IS NOT NULL'),
+)
@@ -0,0 +1,31 @@
+"""Composite (drone_id, start_time, end_time) index for schedule windows
+
+It replaces the single-column drone_id indexes, which are its prefix. It is
+built inside the revision's transaction (not online) so those are only dropped
+once it exists.
+"""
+from sqlalchemy import Column, DateTime, Index, MetaData, Table
+
+from models import Key
+
+revision = '004'
+down_revision = '003'
+
+schedules = Table(
+    'schedules', MetaData(),
+    Column('drone_id', Key),
+    Column('start_time', DateTime(timezone=True)),
+    Column('end_time', DateTime(timezone=True)),
+)
+
+WINDOW_INDEX = Index('idx_schedule_drone_window', schedules.c.drone_id, schedules.c.start_time, schedules.c.end_time)
+
+def upgrade(op):
+    op.create_index(WINDOW_INDEX)
+    op.execute('DROP INDEX IF EXISTS idx_schedule_drone_id')
+    op.execute('DROP INDEX IF EXISTS ix_schedules_drone_id')
+
+def downgrade(op):
+    op.execute('CREATE INDEX IF NOT EXISTS idx_schedule_drone_id ON schedules (drone_id)')
+    op.execute('CREATE INDEX IF NOT EXISTS ix_schedules_drone_id ON schedules (drone_id)')
+    op.drop_index(WINDOW_INDEX)
@@ -0,0 +1,60 @@
+"""Packed full and simplified schedule paths
+
+Coordinates move out of path_json into path_data (see paths.py); the backfill
+converts existing rows, and downgrade puts them back.
+"""
+import json
+
+from sqlalchemy import Column, Integer, LargeBinary, MetaData, Table, select, update
+
+import paths
+from migrations import Backfill
+from models import Document, Key
+
+revision = '005'
+down_revision = '004'
+
+COLUMNS = ('path_data', 'path_simplified', 'path_points')
+
+schedules = Table(
+    'schedules', MetaData(),
+    Column('id', Key, primary_key=True),
+    Column('path_json', Document),
+    Column('path_data', LargeBinary),
+)
+
+def upgrade(op):
+    op.add_column('schedules', Column('path_data', LargeBinary))
+    op.add_column('schedules', Column('path_simplified', LargeBinary))
+    op.add_column('schedules', Column('path_points', Integer))
+
+def downgrade(op):
+    rows = op.conn.execute(
+        select(schedules.c.id, schedules.c.path_json, schedules.c.path_data)
+        .where(schedules.c.path_data.is_not(None))
+    ).all()
+    for key, document, data in rows:
+        op.conn.execute(
+            update(schedules).where(schedules.c.id == key)
+            .values(path_json=paths.unpack_document(document, data, None))
+        )
+    for name in reversed(COLUMNS):
+        op.drop_column('schedules', name)
+
+def _pack(rows):
+    values = []
+    for key, document in rows:
+        # Untyped reads return the driver's JSON: text on SQLite
+        if isinstance(document, str):
+            document = json.loads(document)
+        packed = paths.pack_document(document)
+        if packed['path_data'] is not None:
+            # Only this revision's columns: later ones may not exist yet
+            values.append({'_key': key, 'path_json': json.dumps(packed['path_document']),
+                           **{name: packed[name] for name in COLUMNS}})
+    return values
+
+backfills = (
+    Backfill('schedules.path_data', 'schedules', _pack, columns=('path_json',),
+             where='path_data IS NULL AND path_json IS NOT NULL'),
+)
@@ -0,0 +1,27 @@
+"""Append-only telemetry table for ingested samples"""
+from sqlalchemy import BigInteger, Column, DateTime, Double, Index, Integer, MetaData, Table
+
+from models import Key
+
+revision = '006'
+down_revision = '005'
+
+telemetry = Table(
+    'telemetry', MetaData(),
+    Column('id', BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True),
+    Column('drone_id', Key, nullable=False),
+    Column('recorded_at', DateTime(timezone=True), nullable=False),
+    Column('lng', Double, nullable=False),
+    Column('lat', Double, nullable=False),
+    Column('altitude_m', Double),
+    Column('heading_deg', Double),
+    Column('battery_level', Double),
+    Column('signal_strength', Double),
+    Index('idx_telemetry_drone_time', 'drone_id', 'recorded_at'),
+)
+
+def upgrade(op):
+    op.create_table(telemetry)
+
+def downgrade(op):
+    op.drop_table(telemetry)
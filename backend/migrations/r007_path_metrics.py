@@ -0,0 +1,41 @@
+"""Path metrics on schedules
+
+Length, duration at cruise speed and bounding box of each packed path (see
+paths.metrics), indexed by length; the backfill computes them for existing
+rows from path_data.
+"""
+from sqlalchemy import Column, Double, Index, MetaData, Table
+
+import paths
+from migrations import Backfill
+
+revision = '007'
+down_revision = '006'
+
+COLUMNS = ('path_length_m', 'path_duration_s', 'path_west', 'path_south', 'path_east', 'path_north')
+
+schedules = Table('schedules', MetaData(), *(Column(name, Double) for name in COLUMNS))
+
+LENGTH_INDEX = Index('idx_schedule_path_length', schedules.c.path_length_m)
+
+def upgrade(op):
+    for column in schedules.columns:
+        op.add_column('schedules', column)
+    op.create_index(LENGTH_INDEX, online=True)
+
+def downgrade(op):
+    op.drop_index(LENGTH_INDEX)
+    for name in reversed(COLUMNS):
+        op.drop_column('schedules', name)
+
+def _measure(rows):
+    values = []
+    for key, data in rows:
+        metrics = paths.metrics(paths.decode(data))
+        values.append({'_key': key, **{name: metrics[name] for name in COLUMNS}})
+    return values
+
+backfills = (
+    Backfill('schedules.path_length_m', 'schedules', _measure, columns=('path_data',),
+             where='path_length_m IS NULL AND path_data IS NOT NULL'),
+)
@@ -0,0 +1,24 @@
+"""Drop the GIN index on schedules.path_json (native schema)
+
+Since revision 005 the coordinates are stored packed in path_data and
+path_json keeps only the rest of the document (e.g. {"type": ...}), so the
+index no longer serves containment queries into paths; it only cost writes.
+Such queries are no longer supported.
+"""
+from sqlalchemy import Column, Index, MetaData, Table
+
+from models import Document, _native_ddl
+
+revision = '008'
+down_revision = '007'
+
+schedules = Table('schedules', MetaData(), Column('path_json', Document))
+
+PATH_GIN_INDEX = Index('idx_schedule_path_gin', schedules.c.path_json, postgresql_using='gin',
+                       postgresql_ops={'path_json': 'jsonb_path_ops'}).ddl_if(dialect='postgresql', callable_=_native_ddl)
+
+def upgrade(op):
+    op.drop_index(PATH_GIN_INDEX)
+
+def downgrade(op):
+    op.create_index(PATH_GIN_INDEX)
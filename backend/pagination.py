@@ -0,0 +1,81 @@
+"""
+Keyset (cursor) pagination for listing endpoints
+
+Listings are ordered by a unique key: (created_at, id) for drones and bases,
+(start_time, id) for schedules. A page is fetched with
+`WHERE (key) > (last key seen) ORDER BY key LIMIT n + 1`, which walks the
+matching composite index, so a page costs the same however deep the client
+pages. The last key is returned as an opaque cursor in the X-Next-Cursor header
+(plus a Link rel="next" header); response bodies stay plain JSON arrays.
+
+Environment:
+    PAGE_SIZE_DEFAULT  rows per page when ?limit is not given (100)
+    PAGE_SIZE_MAX      largest accepted ?limit (1000)
+"""
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+from typing import Optional, Sequence
+
+from fastapi import HTTPException, Query, Request, Response, status
+from sqlalchemy import DateTime, tuple_
+from sqlalchemy.sql import Select
+
+PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', '100'))
+PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', '1000'))
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+class PageParams:
+    """?limit and ?cursor for a listing request"""
+
+    def __init__(
+        self,
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX, description="Rows per page"),
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+def encode_cursor(values: Sequence) -> str:
+    """Pack a row's key values into an opaque, URL-safe token"""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token: str, columns: Sequence) -> list:
+    """Unpack a cursor produced by encode_cursor for the same key columns"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) and value is not None else value
+            for column, value in zip(columns, values)
+        ]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def paginate(query: Select, columns: Sequence, page: PageParams) -> Select:
+    """Restrict a listing query to the page after page.cursor"""
+    if page.cursor:
+        query = query.where(tuple_(*columns) > tuple_(*decode_cursor(page.cursor, columns)))
+    # One extra row tells us whether another page exists
+    return query.order_by(*columns).limit(page.limit + 1)
+
+def page_items(rows: Sequence, columns: Sequence, page: PageParams,
+               request: Request, response: Response) -> list:
+    """Trim the lookahead row and advertise the next cursor, if any"""
+    rows = list(rows)
+    if len(rows) <= page.limit:
+        return rows
+    rows = rows[:page.limit]
+    token = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    response.headers[NEXT_CURSOR_HEADER] = token
+    response.headers['Link'] = f'<{request.url.include_query_params(cursor=token)}>; rel="next"'
+    return rows
@@ -0,0 +1,175 @@
+"""
+Packed schedule paths and Douglas-Peucker simplification
+
+A path document is GeoJSON-like: {"coordinates": [[lng, lat], ...], ...}.
+Its coordinates are stored packed rather than as JSON text: a format byte,
+the number of components per point (2, or 3 with altitude), the point count,
+then each component as the zigzag varint of its delta from the previous
+point, in units of 1e-7 (about 1 cm). Neighbouring waypoints differ by a
+few thousand units, so a point takes 4-8 bytes instead of the ~40 of its
+JSON. The rest of the document stays in path_json.
+
+A simplified copy (Douglas-Peucker, PATH_SIMPLIFY_TOLERANCE_M metres) is
+computed once, when the path is written. Responses pick a variant with
+?path=full|simplified|none and only that one is decoded.
+
+The path's metrics are computed at the same time and stored alongside, so
+listings can return, filter and sort on them without decoding anything:
+great-circle length, bounding box (west <= east; paths across the
+antimeridian get a box spanning the globe) and the duration of flying it at
+CRUISE_SPEED_MPS, the speed the fleet simulation gives open-ended flights.
+The point count is path_points.
+
+Documents whose coordinates aren't a list of 2- or 3-number points are
+stored as they are.
+
+Environment:
+    PATH_SIMPLIFY_TOLERANCE_M  largest deviation of the simplified path (5)
+"""
+import math
+import os
+from typing import List, Optional, Sequence
+
+import geodesy
+from geodesy import EARTH_RADIUS_M
+
+PATH_SIMPLIFY_TOLERANCE_M = float(os.getenv('PATH_SIMPLIFY_TOLERANCE_M', '5'))
+
+# Speed path_duration_s assumes (m/s)
+CRUISE_SPEED_MPS = 12.0
+
+FORMAT = 1
+SCALE = 10 ** 7
+
+Point = Sequence[float]
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def packable(coordinates) -> bool:
+    """Whether coordinates are points of 2 or 3 numbers, all of one size"""
+    if not isinstance(coordinates, list):
+        return False
+    dims = len(coordinates[0]) if coordinates and isinstance(coordinates[0], list) else 2
+    return dims in (2, 3) and all(
+        isinstance(point, list) and len(point) == dims and all(map(_is_number, point))
+        for point in coordinates
+    )
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def encode(coordinates: List[Point]) -> bytes:
+    """Pack points (see packable)"""
+    dims = len(coordinates[0]) if coordinates else 2
+    out = bytearray((FORMAT, dims))
+    _write_varint(out, len(coordinates))
+    previous = [0] * dims
+    for point in coordinates:
+        for i, value in enumerate(point):
+            scaled = round(value * SCALE)
+            delta = scaled - previous[i]
+            _write_varint(out, (delta << 1) ^ (delta >> 63))
+            previous[i] = scaled
+    return bytes(out)
+
+def decode(data: bytes) -> List[List[float]]:
+    """Points of a packed path"""
+    if data[0] != FORMAT:
+        raise ValueError(f"Unknown path format {data[0]}")
+    dims, position = data[1], 2
+    values, value, shift = [], 0, 0
+    for byte in memoryview(data)[position:]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(value)
+        value, shift = 0, 0
+    count, deltas = values[0], values[1:]
+    points, current = [], [0] * dims
+    for start in range(0, count * dims, dims):
+        for i in range(dims):
+            raw = deltas[start + i]
+            current[i] += (raw >> 1) ^ -(raw & 1)
+        points.append([component / SCALE for component in current])
+    return points
+
+def simplify(coordinates: List[Point], tolerance_m: float = PATH_SIMPLIFY_TOLERANCE_M) -> List[Point]:
+    """Douglas-Peucker: the fewest points keeping every dropped one within tolerance_m of the path
+
+    Distances are measured on a local equirectangular projection, which is
+    accurate to well under a percent over patrol-sized paths.
+    """
+    if len(coordinates) < 3:
+        return list(coordinates)
+    mean_lat = math.radians(sum(point[1] for point in coordinates) / len(coordinates))
+    x_scale = math.radians(1) * EARTH_RADIUS_M * math.cos(mean_lat)
+    y_scale = math.radians(1) * EARTH_RADIUS_M
+    xy = [(point[0] * x_scale, point[1] * y_scale) for point in coordinates]
+
+    keep = [False] * len(coordinates)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(coordinates) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = xy[first], xy[last]
+        dx, dy = x2 - x1, y2 - y1
+        length_sq = dx * dx + dy * dy
+        farthest, worst = None, tolerance_m * tolerance_m
+        for i in range(first + 1, last):
+            px, py = xy[i][0] - x1, xy[i][1] - y1
+            t = 0.0 if length_sq == 0 else max(0.0, min(1.0, (px * dx + py * dy) / length_sq))
+            ex, ey = px - t * dx, py - t * dy
+            distance_sq = ex * ex + ey * ey
+            if distance_sq > worst:
+                farthest, worst = i, distance_sq
+        if farthest is not None:
+            keep[farthest] = True
+            stack += [(first, farthest), (farthest, last)]
+    return [point for point, kept in zip(coordinates, keep) if kept]
+
+METRICS = ('path_length_m', 'path_duration_s', 'path_west', 'path_south', 'path_east', 'path_north')
+
+def metrics(coordinates: List[Point]) -> dict:
+    """Schedule metric columns for packable coordinates (all None for an empty path)"""
+    if not coordinates:
+        return dict.fromkeys(METRICS)
+    points = geodesy.as_points(coordinates)
+    length = geodesy.path_length_m(points)
+    (west, south), (east, north) = points.min(axis=0).tolist(), points.max(axis=0).tolist()
+    return {
+        'path_length_m': length,
+        'path_duration_s': length / CRUISE_SPEED_MPS,
+        'path_west': west,
+        'path_south': south,
+        'path_east': east,
+        'path_north': north,
+    }
+
+def pack_document(document: Optional[dict]) -> dict:
+    """Schedule column values for a path document, metrics included"""
+    coordinates = document.get('coordinates') if isinstance(document, dict) else None
+    if not packable(coordinates):
+        return {'path_document': document, 'path_data': None, 'path_simplified': None, 'path_points': None,
+                **dict.fromkeys(METRICS)}
+    simplified = simplify(coordinates)
+    return {
+        'path_document': {key: value for key, value in document.items() if key != 'coordinates'},
+        'path_data': encode(coordinates),
+        # Left NULL when nothing could be dropped
+        'path_simplified': encode(simplified) if len(simplified) < len(coordinates) else None,
+        'path_points': len(coordinates),
+        **metrics(coordinates),
+    }
+
+def unpack_document(document: Optional[dict], data: Optional[bytes], simplified: Optional[bytes],
+                    detail: str = 'full') -> Optional[dict]:
+    """The path document stored by pack_document, with the coordinates of `detail`"""
+    if detail == 'none' or data is None:
+        return None if detail == 'none' else document
+    packed = simplified if detail == 'simplified' and simplified is not None else data
+    return {**(document or {}), 'coordinates': decode(packed)}
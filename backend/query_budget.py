@@ -0,0 +1,126 @@
+"""
+Per-request SQL statement accounting and N+1 detection
+
+Cursor-execute events on every SQLAlchemy Engine are attributed to the current
+request through a ContextVar (copied into threadpool workers, so sync handlers
+are covered). For each request we keep the statement count, total DB time and
+how often each statement shape ran; a shape repeated N_PLUS_ONE_THRESHOLD or
+more times is flagged as a likely N+1.
+
+QueryBudgetMiddleware installs the per-request collector. With QUERY_DEBUG=1
+the numbers are also returned as X-DB-* response headers. Tests can register a
+completion hook (see the `query_budget` fixture) to enforce a per-endpoint
+statement budget.
+"""
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from structured_logging import get_logger, log_event
+
+QUERY_DEBUG = os.getenv('QUERY_DEBUG', '').lower() in ('1', 'true', 'yes')
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '3'))
+
+logger = get_logger('queries')
+
+# Expanded IN lists vary in length per call; treat them as one shape
+_IN_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)|\((?:\s*%\(\w+\)s\s*,)+\s*%\(\w+\)s\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so repeats with different parameters compare equal"""
+    return _IN_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+class QueryStats:
+    """Statements executed while serving one request"""
+
+    __slots__ = ('count', 'total_time', 'shapes', '_started')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes: Counter = Counter()
+        self._started: List[float] = []
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[tuple]:
+        """Statement shapes executed at least `threshold` times"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar('query_stats', default=None)
+_completion_hooks: List[Callable[[str, str, QueryStats], None]] = []
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats._started.append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None and stats._started:
+        stats.total_time += time.perf_counter() - stats._started.pop()
+        stats.count += 1
+        stats.shapes[statement_shape(statement)] += 1
+
+def start_collecting() -> tuple:
+    """Attach a fresh QueryStats to the current context; returns (stats, token)"""
+    stats = QueryStats()
+    return stats, _current.set(stats)
+
+def stop_collecting(token) -> None:
+    _current.reset(token)
+
+def add_completion_hook(hook: Callable[[str, str, QueryStats], None]) -> None:
+    """Call hook(method, path, stats) after every request"""
+    _completion_hooks.append(hook)
+
+def remove_completion_hook(hook: Callable[[str, str, QueryStats], None]) -> None:
+    _completion_hooks.remove(hook)
+
+class QueryBudgetMiddleware:
+    """ASGI middleware collecting per-request SQL statistics"""
+
+    def __init__(self, app, debug: bool = QUERY_DEBUG, threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.debug = debug
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats, token = start_collecting()
+
+        async def send_wrapper(message):
+            if self.debug and message['type'] == 'http.response.start':
+                repeated = stats.repeated(self.threshold)
+                headers = list(message.get('headers', []))
+                headers.append((b'x-db-query-count', str(stats.count).encode()))
+                headers.append((b'x-db-query-time-ms', f'{stats.total_time * 1000:.2f}'.encode()))
+                if repeated:
+                    headers.append((b'x-db-n-plus-one', str(max(n for _, n in repeated)).encode()))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stop_collecting(token)
+            repeated = stats.repeated(self.threshold)
+            if repeated:
+                log_event(
+                    logger, logging.WARNING, "Repeated statement shape (possible N+1)",
+                    method=scope['method'], path=scope['path'],
+                    queries=stats.count, repeats=repeated[0][1], statement=repeated[0][0],
+                )
+            for hook in list(_completion_hooks):
+                hook(scope['method'], scope['path'], stats)
@@ -0,0 +1,190 @@
+"""
+Read-replica routing
+
+With DATABASE_REPLICA_URLS set, get_db() and get_async_db() hand GET and HEAD
+requests a session on one of the replicas (round robin) and everything else a
+session on the primary. The GET handlers of drones, bases, schedules and admin
+therefore read from replicas without knowing about them.
+
+Read-your-writes: once a caller (identified by their bearer token) sends a
+write, their reads stay on the primary for READ_YOUR_WRITES_SECONDS, long
+enough for the replicas to catch up. The window is kept per worker process,
+so a caller whose requests are spread over several workers can still read
+from a replica on another worker.
+
+A replica is pinged at most every REPLICA_CHECK_SECONDS when picked (on
+Postgres its replay lag is checked too); one that fails, lags too far behind
+or raises a connection error while serving a request is skipped for
+REPLICA_RETRY_SECONDS, and reads fall back to the primary when none is left.
+
+Try it locally with two SQLite files:
+
+    DATABASE_URL=sqlite:///./drone_demo.db
+    DATABASE_REPLICA_URLS=sqlite:///./drone_replica.db
+
+(copy the primary file to create the replica; SQLite has no replication, so
+the copy only sees writes made before it was taken.)
+
+Environment:
+    DATABASE_REPLICA_URLS     comma-separated replica URLs (none)
+    READ_YOUR_WRITES_SECONDS  reads kept on the primary after a write (5)
+    REPLICA_CHECK_SECONDS     health check interval per replica (5)
+    REPLICA_RETRY_SECONDS     how long an unhealthy replica is skipped (30)
+    REPLICA_MAX_LAG_SECONDS   replay lag beyond which a Postgres replica is skipped (10)
+"""
+import hashlib
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from db_profiles import resolve_profile, create_profiled_engine
+from structured_logging import get_logger, log_event
+
+READ_METHODS = ('GET', 'HEAD')
+REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+REPLICA_CHECK_SECONDS = float(os.getenv('REPLICA_CHECK_SECONDS', '5'))
+REPLICA_RETRY_SECONDS = float(os.getenv('REPLICA_RETRY_SECONDS', '30'))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '10'))
+
+# Zero when caught up; replay_timestamp alone keeps growing while the primary is idle
+_PG_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+    "THEN 0 ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+logger = get_logger('db')
+
+class Replica:
+    """One replica database: its engine, session factories and health"""
+
+    def __init__(self, url: str, profile=None):
+        self.url = url
+        self.profile = profile or resolve_profile(url, os.getenv('DB_PROFILE', 'auto'))
+        self.engine = create_profiled_engine(url, self.profile)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self._async_session_factory = None
+        self.healthy = True
+        self.checked_at: Optional[float] = None
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def async_session_factory(self):
+        if self._async_session_factory is None:
+            from models import create_async_session_factory
+            _, self._async_session_factory = create_async_session_factory(self.url, self.profile)
+        return self._async_session_factory
+
+    @property
+    def name(self) -> str:
+        return self.engine.url.render_as_string(hide_password=True)
+
+    def check(self, max_lag: float) -> Optional[str]:
+        """Ping the replica; returns why it is unusable, or None"""
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == 'postgresql':
+                    lag = float(conn.execute(_PG_LAG).scalar() or 0)
+                    if lag > max_lag:
+                        return f"replay lag {lag:.1f}s"
+                else:
+                    conn.execute(text('SELECT 1'))
+        except Exception as e:
+            return str(e).splitlines()[0]
+        return None
+
+def caller_key(request) -> Optional[str]:
+    authorization = request.headers.get('authorization')
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()[:32]
+
+class SessionRouter:
+    """Chooses the database for a request: a healthy replica for reads, else the primary"""
+
+    def __init__(self, replicas: List[Replica], sticky_seconds: float = READ_YOUR_WRITES_SECONDS,
+                 check_interval: float = REPLICA_CHECK_SECONDS, retry_seconds: float = REPLICA_RETRY_SECONDS,
+                 max_lag: float = REPLICA_MAX_LAG_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.replicas = replicas
+        self.sticky_seconds = sticky_seconds
+        self.check_interval = check_interval
+        self.retry_seconds = retry_seconds
+        self.max_lag = max_lag
+        self.clock = clock
+        self._sticky_until: Dict[str, float] = {}
+        self._turn = itertools.count()
+
+    def note_write(self, key: Optional[str]) -> None:
+        if key is None or not self.replicas:
+            return
+        now = self.clock()
+        if len(self._sticky_until) > 4096:
+            self._sticky_until = {k: until for k, until in self._sticky_until.items() if until > now}
+        self._sticky_until[key] = now + self.sticky_seconds
+
+    def is_sticky(self, key: Optional[str]) -> bool:
+        return key is not None and self._sticky_until.get(key, 0) > self.clock()
+
+    def mark_down(self, replica: Replica, reason: str = 'connection error') -> None:
+        replica.healthy = False
+        replica.down_until = self.clock() + self.retry_seconds
+        log_event(logger, logging.WARNING, "Replica unavailable, reading from the primary",
+                  replica=replica.name, reason=reason, retry_in=self.retry_seconds)
+
+    def _usable(self, replica: Replica) -> bool:
+        now = self.clock()
+        if not replica.healthy and now < replica.down_until:
+            return False
+        if replica.healthy and replica.checked_at is not None and now - replica.checked_at < self.check_interval:
+            return True
+        if not replica._lock.acquire(blocking=False):
+            # Another request is checking it; go by the last result meanwhile
+            return replica.healthy
+        try:
+            reason = replica.check(self.max_lag)
+            replica.checked_at = self.clock()
+            if reason is not None:
+                self.mark_down(replica, reason)
+                return False
+            if not replica.healthy:
+                log_event(logger, logging.INFO, "Replica back in rotation", replica=replica.name)
+            replica.healthy = True
+            return True
+        finally:
+            replica._lock.release()
+
+    def pick_replica(self) -> Optional[Replica]:
+        """The next usable replica in turn, or None"""
+        count = len(self.replicas)
+        start = next(self._turn)
+        for offset in range(count):
+            replica = self.replicas[(start + offset) % count]
+            if self._usable(replica):
+                return replica
+        return None
+
+    def route(self, request) -> Optional[Replica]:
+        """The replica to serve `request` from, or None for the primary"""
+        if not self.replicas:
+            return None
+        key = caller_key(request)
+        if request.method not in READ_METHODS:
+            self.note_write(key)
+            return None
+        if self.is_sticky(key):
+            return None
+        return self.pick_replica()
+
+    def finish(self, request) -> None:
+        """Restart the read-your-writes window once a write has been handled"""
+        if self.replicas and request.method not in READ_METHODS:
+            self.note_write(caller_key(request))
+
+session_router = SessionRouter([Replica(url) for url in REPLICA_URLS])
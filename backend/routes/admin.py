@@ -1,115 +1,121 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+import asyncio
 import os
-import requests
 from typing import List, Dict
+from uuid import UUID
 
-from dependencies import get_db
-from auth import get_current_user, require_auth
+from dependencies import get_db, get_async_db
+from auth import get_current_user, require_auth, require_auth_async
 from models import Drone, DroneBase, Schedule
-from schemas import UserResponse, UpdateRoleRequest, StatsResponse
+from schemas import (
+    UserResponse, UpdateRoleRequest, StatsResponse,
+    BatchRoleUpdateRequest, BatchRoleUpdateResponse, RoleUpdateResult
+)
+from supabase_admin import UserDirectory, SupabaseAdminError, get_user_directory
 
 router = APIRouter()
+# Read endpoints served from an AsyncSession; registered ahead of `router`
+# when ASYNC_DB is enabled
+async_router = APIRouter()
 
-SUPABASE_URL = os.getenv('SUPABASE_PROJECT_URL', '')
-SUPABASE_SERVICE_ROLE = os.getenv('SUPABASE_SERVICE_ROLE', '')
+VALID_ROLES = ['admin', 'user']
+# Maximum concurrent Supabase calls issued by a batch role update
+ADMIN_BATCH_CONCURRENCY = int(os.getenv('ADMIN_BATCH_CONCURRENCY', '10'))
 
 @router.get("/admin/users", response_model=Dict[str, List[UserResponse]])
-def get_users(
-    current_user: dict = Depends(require_auth(roles=['admin']))
+async def get_users(
+    current_user: dict = Depends(require_auth(roles=['admin'])),
+    directory: UserDirectory = Depends(get_user_directory)
 ):
-    """Get all users (admin only)"""
+    """Get all users (admin only), served from the cached user directory"""
     try:
-        if not SUPABASE_SERVICE_ROLE:
+        if not directory.client.configured:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Supabase service role not configured"
             )
         
-        # Fetch users from Supabase Admin API
-        headers = {
-            'apikey': SUPABASE_SERVICE_ROLE,
-            'Authorization': f'Bearer {SUPABASE_SERVICE_ROLE}'
-        }
-        
-        response = requests.get(
-            f'{SUPABASE_URL}/auth/v1/admin/users',
-            headers=headers,
-            timeout=10
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to fetch users from Supabase"
-            )
-        
-        users_data = response.json()
-        
-        # Format user data
-        users = []
-        for user in users_data.get('users', []):
-            users.append(UserResponse(
-                id=user.get('id'),
-                email=user.get('email'),
-                role=user.get('user_metadata', {}).get('role', 'user'),
-                created_at=user.get('created_at')
-            ))
-        
-        return {'users': users}
+        return {'users': await directory.list_users()}
     except HTTPException:
         raise
+    except SupabaseAdminError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
+@router.put("/admin/users/roles", response_model=BatchRoleUpdateResponse)
+async def update_user_roles(
+    batch: BatchRoleUpdateRequest,
+    current_user: dict = Depends(require_auth(roles=['admin'])),
+    directory: UserDirectory = Depends(get_user_directory)
+):
+    """Update many user roles concurrently (admin only)"""
+    client = directory.client
+    if not client.configured:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Supabase service role not configured"
+        )
+    
+    semaphore = asyncio.Semaphore(ADMIN_BATCH_CONCURRENCY)
+    
+    async def apply(update) -> RoleUpdateResult:
+        if update.role not in VALID_ROLES:
+            return RoleUpdateResult(
+                user_id=update.user_id,
+                role=update.role,
+                success=False,
+                detail="Invalid role. Must be 'admin' or 'user'"
+            )
+        try:
+            async with semaphore:
+                await client.update_user_role(str(update.user_id), update.role)
+        except Exception as e:
+            return RoleUpdateResult(
+                user_id=update.user_id,
+                role=update.role,
+                success=False,
+                detail=str(e)
+            )
+        directory.apply_role(str(update.user_id), update.role)
+        return RoleUpdateResult(user_id=update.user_id, role=update.role, success=True)
+    
+    results = await asyncio.gather(*(apply(update) for update in batch.updates))
+    return BatchRoleUpdateResponse(results=list(results))
+
 @router.put("/admin/users/{user_id}/role")
-def update_user_role(
-    user_id: str,
+async def update_user_role(
+    user_id: UUID,
     role_data: UpdateRoleRequest,
-    current_user: dict = Depends(require_auth(roles=['admin']))
+    current_user: dict = Depends(require_auth(roles=['admin'])),
+    directory: UserDirectory = Depends(get_user_directory)
 ):
     """Update user role (admin only)"""
     try:
-        if not SUPABASE_SERVICE_ROLE:
+        if not directory.client.configured:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Supabase service role not configured"
             )
         
         role = role_data.role
-        if role not in ['admin', 'user']:
+        if role not in VALID_ROLES:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid role. Must be 'admin' or 'user'"
             )
         
-        # Update user metadata in Supabase
-        headers = {
-            'apikey': SUPABASE_SERVICE_ROLE,
-            'Authorization': f'Bearer {SUPABASE_SERVICE_ROLE}',
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            'user_metadata': {'role': role}
-        }
-        
-        response = requests.put(
-            f'{SUPABASE_URL}/auth/v1/admin/users/{user_id}',
-            headers=headers,
-            json=payload,
-            timeout=10
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to update user role"
-            )
+        await directory.client.update_user_role(str(user_id), role)
+        directory.apply_role(str(user_id), role)
         
         return {
             'message': 'User role updated successfully',
@@ -150,3 +156,28 @@ def get_stats(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+
+@async_router.get("/admin/stats", response_model=StatsResponse)
+async def get_stats_async(
+    current_user: dict = Depends(require_auth_async(roles=['admin'])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get system statistics (admin only)"""
+    try:
+        status_counts = (await db.execute(
+            select(Drone.status, func.count(Drone.id)).group_by(Drone.status)
+        )).all()
+        
+        drones_by_status = {status: count for status, count in status_counts}
+        
+        return StatsResponse(
+            total_drones=sum(drones_by_status.values()),
+            total_bases=await db.scalar(select(func.count(DroneBase.id))),
+            total_schedules=await db.scalar(select(func.count(Schedule.id))),
+            drones_by_status=drones_by_status
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
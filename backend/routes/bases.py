@@ -1,42 +1,164 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import uuid
 
-from dependencies import get_db
-from auth import get_current_user
+from dependencies import get_db, get_async_db
+from auth import get_current_user, get_current_user_async
+from pagination import PageParams, paginate, page_items, PAGE_SIZE_MAX
+from etags import collection_state, request_etag, etag_matches, not_modified, set_etag
+from write_queue import run_write
 from models import DroneBase, Drone
-from schemas import BaseCreate, BaseUpdate, BaseResponse
+from schemas import BaseCreate, BaseUpdate, BaseResponse, BaseDistanceResponse
+import spatial
 
 router = APIRouter()
+# Read endpoints served from an AsyncSession; registered ahead of `router`
+# when ASYNC_DB is enabled
+async_router = APIRouter()
+
+# Listing order; matches idx_base_created
+BASE_PAGE_KEY = (DroneBase.created_at, DroneBase.id)
 
 @router.get("/bases", response_model=List[BaseResponse])
 def get_bases(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """List bases a page at a time"""
+    state = db.execute(collection_state(select(DroneBase), DroneBase.updated_at, 'bases')).one()
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    query = paginate(select(DroneBase), BASE_PAGE_KEY, page)
+    return page_items(db.execute(query).scalars().all(), BASE_PAGE_KEY, page, request, response)
+
+@async_router.get("/bases", response_model=List[BaseResponse])
+async def get_bases_async(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """List bases a page at a time"""
+    state = (await db.execute(collection_state(select(DroneBase), DroneBase.updated_at, 'bases'))).one()
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    result = await db.execute(paginate(select(DroneBase), BASE_PAGE_KEY, page))
+    return page_items(result.scalars().all(), BASE_PAGE_KEY, page, request, response)
+
+def _near(db: Session, lat: float, lng: float, k: int) -> List[dict]:
+    return [
+        {**BaseResponse.model_validate(base).model_dump(), 'distance_m': round(distance, 1)}
+        for base, distance in spatial.bases_near(db, lat, lng, k)
+    ]
+
+# Registered before /bases/{base_id} so "near" and "within" aren't taken for ids
+@router.get("/bases/near", response_model=List[BaseDistanceResponse])
+def get_bases_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=PAGE_SIZE_MAX),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The k bases nearest to a point, nearest first"""
+    return _near(db, lat, lng, k)
+
+@async_router.get("/bases/near", response_model=List[BaseDistanceResponse])
+async def get_bases_near_async(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=PAGE_SIZE_MAX),
+    current_user: dict = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """The k bases nearest to a point, nearest first"""
+    return await db.run_sync(_near, lat, lng, k)
+
+@router.get("/bases/within", response_model=List[BaseResponse])
+def get_bases_within(
+    bbox: str = Query(..., description="west,south,east,north"),
+    limit: int = Query(PAGE_SIZE_MAX, ge=1, le=PAGE_SIZE_MAX),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all bases"""
-    bases = db.query(DroneBase).all()
-    return bases
+    """Bases inside a bounding box (at most `limit`)"""
+    return spatial.bases_within(db, spatial.parse_bbox(bbox), limit)
+
+@async_router.get("/bases/within", response_model=List[BaseResponse])
+async def get_bases_within_async(
+    bbox: str = Query(..., description="west,south,east,north"),
+    limit: int = Query(PAGE_SIZE_MAX, ge=1, le=PAGE_SIZE_MAX),
+    current_user: dict = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Bases inside a bounding box (at most `limit`)"""
+    return await db.run_sync(spatial.bases_within, spatial.parse_bbox(bbox), limit)
+
+def _base_state_query(base_id: str):
+    """Last change of a base, for its ETag"""
+    return select(DroneBase.id, DroneBase.updated_at).where(DroneBase.id == base_id)
 
 @router.get("/bases/{base_id}", response_model=BaseResponse)
 def get_base(
     base_id: str,
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get a single base by ID"""
-    # IDs are now strings, no UUID parsing needed
-    base = db.query(DroneBase).filter(DroneBase.id == base_id).first()
+    state = db.execute(_base_state_query(base_id)).first()
+    
+    if not state:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Base not found"
+        )
+    
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    return db.get(DroneBase, base_id)
+
+@async_router.get("/bases/{base_id}", response_model=BaseResponse)
+async def get_base_async(
+    base_id: str,
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a single base by ID"""
+    state = (await db.execute(_base_state_query(base_id))).first()
     
-    if not base:
+    if not state:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Base not found"
         )
     
-    return base
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    return await db.get(DroneBase, base_id)
 
 @router.post("/bases", response_model=BaseResponse, status_code=status.HTTP_201_CREATED)
 def create_base(
@@ -45,16 +167,17 @@ def create_base(
     db: Session = Depends(get_db)
 ):
     """Create a new base"""
-    try:
+    def create(session: Session) -> DroneBase:
         base = DroneBase(
             name=base_data.name,
             lat=base_data.lat,
             lng=base_data.lng
         )
-        db.add(base)
-        db.commit()
-        db.refresh(base)
+        session.add(base)
         return base
+
+    try:
+        return run_write(db, create)
     except IntegrityError:
         db.rollback()
         raise HTTPException(
@@ -76,29 +199,29 @@ def update_base(
     db: Session = Depends(get_db)
 ):
     """Update a base"""
-    # IDs are now strings, no UUID parsing needed
-    base = db.query(DroneBase).filter(DroneBase.id == base_id).first()
-    
-    if not base:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Base not found"
-        )
-    
-    # Update fields
-    if base_data.name is not None:
-        base.name = base_data.name
-    
-    if base_data.lat is not None or base_data.lng is not None:
-        lat = base_data.lat if base_data.lat is not None else base.lat
-        lng = base_data.lng if base_data.lng is not None else base.lng
+    def update(session: Session) -> DroneBase:
+        # IDs are now strings, no UUID parsing needed
+        base = session.query(DroneBase).filter(DroneBase.id == base_id).first()
+        
+        if not base:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Base not found"
+            )
         
-        base.lat = lat
-        base.lng = lng
+        # Update fields
+        if base_data.name is not None:
+            base.name = base_data.name
+        
+        if base_data.lat is not None or base_data.lng is not None:
+            lat = base_data.lat if base_data.lat is not None else base.lat
+            lng = base_data.lng if base_data.lng is not None else base.lng
+            
+            base.lat = lat
+            base.lng = lng
+        return base
     
-    db.commit()
-    db.refresh(base)
-    return base
+    return run_write(db, update)
 
 @router.delete("/bases/{base_id}")
 def delete_base(
@@ -107,23 +230,25 @@ def delete_base(
     db: Session = Depends(get_db)
 ):
     """Delete a base"""
-    # IDs are now strings, no UUID parsing needed
-    base = db.query(DroneBase).filter(DroneBase.id == base_id).first()
-    
-    if not base:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Base not found"
-        )
-    
-    # Check if base has drones assigned
-    drone_count = db.query(Drone).filter(Drone.base_id == base_id).count()
-    if drone_count > 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot delete base: {drone_count} drone(s) are assigned to it"
-        )
+    def delete(session: Session):
+        # IDs are now strings, no UUID parsing needed
+        base = session.query(DroneBase).filter(DroneBase.id == base_id).first()
+        
+        if not base:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Base not found"
+            )
+        
+        # Check if base has drones assigned
+        drone_count = session.query(Drone).filter(Drone.base_id == base_id).count()
+        if drone_count > 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot delete base: {drone_count} drone(s) are assigned to it"
+            )
+        
+        session.delete(base)
     
-    db.delete(base)
-    db.commit()
+    run_write(db, delete)
     return {"message": "Base deleted successfully"}
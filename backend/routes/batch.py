@@ -0,0 +1,315 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
+from typing import Dict, List, Optional, Set
+import os
+import uuid
+
+from dependencies import get_db
+from write_queue import run_write
+from auth import get_current_user
+from models import Drone, DroneBase, Schedule
+from scheduling import find_batch_conflicts
+import paths
+import viewport
+from schemas import (
+    DroneCreate, DroneUpdate, BaseCreate, BaseUpdate, ScheduleCreate, ScheduleUpdate,
+    BatchRequest, BatchResponse, BatchItemResult, window_error
+)
+
+router = APIRouter()
+
+MAX_BATCH_OPERATIONS = int(os.getenv('MAX_BATCH_OPERATIONS', '5000'))
+
+MODELS = {'drone': Drone, 'base': DroneBase, 'schedule': Schedule}
+CREATE_SCHEMAS = {'drone': DroneCreate, 'base': BaseCreate, 'schedule': ScheduleCreate}
+UPDATE_SCHEMAS = {'drone': DroneUpdate, 'base': BaseUpdate, 'schedule': ScheduleUpdate}
+RESULT_STATUS = {'create': 'created', 'update': 'updated', 'delete': 'deleted'}
+
+def _in(column, ids: Set[str]):
+    """IN clause with a stable parameter order"""
+    return column.in_(sorted(ids))
+
+class _BatchPlan:
+    """Parsed operations plus the entity state resolved for validating them"""
+
+    def __init__(self, operations):
+        self.operations = operations
+        self.errors: Dict[int, str] = {}
+        self.ids: List[Optional[str]] = [op.id for op in operations]
+        self.payloads: List[Optional[dict]] = [None] * len(operations)
+        # (op, entity) -> indexes
+        self.groups: Dict[tuple, List[int]] = {}
+        # base id -> (lat, lng) after the batch, for placing new drones
+        self.base_positions: Dict[str, tuple] = {}
+
+    def fail(self, index: int, detail: str):
+        self.errors.setdefault(index, detail)
+
+    def indexes(self, op: str, entity: str) -> List[int]:
+        return [i for i in self.groups.get((op, entity), []) if i not in self.errors]
+
+    def ids_for(self, op: str, entity: str) -> Set[str]:
+        return {self.ids[i] for i in self.groups.get((op, entity), []) if self.ids[i]}
+
+def _parse(plan: _BatchPlan):
+    """Validate payloads and reject duplicate targets"""
+    seen = {}
+    for i, operation in enumerate(plan.operations):
+        key = (operation.op, operation.entity)
+        plan.groups.setdefault(key, []).append(i)
+        try:
+            if operation.op == 'create':
+                data = CREATE_SCHEMAS[operation.entity].model_validate(operation.data or {})
+                plan.payloads[i] = data.model_dump()
+                plan.ids[i] = operation.id or str(uuid.uuid4())
+            elif operation.op == 'update':
+                data = UPDATE_SCHEMAS[operation.entity].model_validate(operation.data or {})
+                plan.payloads[i] = data.model_dump(exclude_none=True)
+        except ValidationError as e:
+            error = e.errors()[0]
+            # Model-level checks (e.g. the schedule window) have no field location
+            where = f" ({'.'.join(map(str, error['loc']))})" if error['loc'] else ''
+            plan.fail(i, f"Invalid data: {error['msg']}{where}")
+            continue
+
+        if operation.op != 'create' and not operation.id:
+            plan.fail(i, "id is required for update and delete")
+            continue
+
+        target = (operation.entity, plan.ids[i])
+        if target in seen:
+            plan.fail(i, f"Duplicate operation on {operation.entity} {plan.ids[i]} (see item {seen[target]})")
+        else:
+            seen[target] = i
+
+def _resolve(plan: _BatchPlan, db: Session, current_user: dict):
+    """Check references and permissions with one IN query per table"""
+    user_id = current_user.get('sub')
+    role = current_user.get('user_metadata', {}).get('role', 'user')
+
+    def can_access(owner_id) -> bool:
+        return role == 'admin' or str(owner_id) == user_id
+
+    # Everything the batch references, by table
+    base_refs = plan.ids_for('create', 'base') | plan.ids_for('update', 'base') | plan.ids_for('delete', 'base')
+    drone_refs = plan.ids_for('create', 'drone') | plan.ids_for('update', 'drone') | plan.ids_for('delete', 'drone')
+    schedule_refs = plan.ids_for('create', 'schedule') | plan.ids_for('update', 'schedule') | plan.ids_for('delete', 'schedule')
+    for i in plan.groups.get(('create', 'drone'), []) + plan.groups.get(('update', 'drone'), []):
+        if plan.payloads[i] and plan.payloads[i].get('base_id'):
+            base_refs.add(str(plan.payloads[i]['base_id']))
+    for i in plan.groups.get(('create', 'schedule'), []):
+        if plan.payloads[i]:
+            drone_refs.add(plan.payloads[i]['drone_id'])
+
+    existing_bases = {base_id: (lat, lng) for base_id, lat, lng in db.execute(
+        select(DroneBase.id, DroneBase.lat, DroneBase.lng).where(_in(DroneBase.id, base_refs))
+    )} if base_refs else {}
+    drone_owners = dict(db.execute(select(Drone.id, Drone.user_id).where(_in(Drone.id, drone_refs))).all()) if drone_refs else {}
+    stored_schedules = {row.id: row for row in db.execute(
+        select(Schedule.id, Drone.user_id, Schedule.drone_id, Schedule.start_time, Schedule.end_time)
+        .outerjoin(Drone, Drone.id == Schedule.drone_id)
+        .where(_in(Schedule.id, schedule_refs))
+    )} if schedule_refs else {}
+    schedule_owners = {schedule_id: row.user_id for schedule_id, row in stored_schedules.items()}
+
+    plan.base_positions = dict(existing_bases)
+    for i in plan.indexes('create', 'base') + plan.indexes('update', 'base'):
+        lat, lng = plan.base_positions.get(plan.ids[i], (None, None))
+        payload = plan.payloads[i] or {}
+        plan.base_positions[plan.ids[i]] = (payload.get('lat', lat), payload.get('lng', lng))
+
+    deleted_bases = plan.ids_for('delete', 'base')
+    deleted_drones = plan.ids_for('delete', 'drone')
+    created_bases = {plan.ids[i] for i in plan.indexes('create', 'base')}
+    created_drones = {plan.ids[i]: user_id for i in plan.indexes('create', 'drone')}
+
+    def check_base_ref(i: int):
+        base_id = plan.payloads[i].get('base_id')
+        if not base_id:
+            return
+        base_id = str(base_id)
+        if base_id in deleted_bases:
+            plan.fail(i, f"Base {base_id} is deleted in this batch")
+        elif base_id not in existing_bases and base_id not in created_bases:
+            plan.fail(i, "Base not found")
+
+    for entity, existing in (('base', existing_bases), ('drone', drone_owners), ('schedule', schedule_owners)):
+        for i in plan.indexes('create', entity):
+            if plan.ids[i] in existing:
+                plan.fail(i, f"{entity.capitalize()} {plan.ids[i]} already exists")
+
+    for i in plan.indexes('create', 'drone'):
+        plan.payloads[i]['user_id'] = user_id
+        check_base_ref(i)
+
+    for i in plan.indexes('update', 'base') + plan.indexes('delete', 'base'):
+        if plan.ids[i] not in existing_bases:
+            plan.fail(i, "Base not found")
+
+    for i in plan.indexes('update', 'drone') + plan.indexes('delete', 'drone'):
+        if plan.ids[i] not in drone_owners:
+            plan.fail(i, "Drone not found")
+        elif not can_access(drone_owners[plan.ids[i]]):
+            plan.fail(i, "Access denied")
+        elif plan.operations[i].op == 'update':
+            check_base_ref(i)
+
+    for i in plan.indexes('create', 'schedule'):
+        drone_id = plan.payloads[i]['drone_id']
+        owner = drone_owners.get(drone_id, created_drones.get(drone_id))
+        if drone_id in deleted_drones:
+            plan.fail(i, f"Drone {drone_id} is deleted in this batch")
+        elif owner is None:
+            plan.fail(i, "Drone not found")
+        elif not can_access(owner):
+            plan.fail(i, "Access denied")
+
+    for i in plan.indexes('update', 'schedule') + plan.indexes('delete', 'schedule'):
+        if plan.ids[i] not in schedule_owners:
+            plan.fail(i, "Schedule not found")
+        elif not can_access(schedule_owners[plan.ids[i]]):
+            plan.fail(i, "Access denied")
+
+    # A drone can't be booked twice (see scheduling.py); one query for the whole batch
+    bookings, rebooked = [], set()
+    for i in plan.indexes('create', 'schedule'):
+        payload = plan.payloads[i]
+        bookings.append((i, payload['drone_id'], payload['start_time'], payload.get('end_time')))
+    for i in plan.indexes('update', 'schedule'):
+        payload, stored = plan.payloads[i] or {}, stored_schedules[plan.ids[i]]
+        if 'start_time' in payload or 'end_time' in payload:
+            start, end = payload.get('start_time', stored.start_time), payload.get('end_time', stored.end_time)
+            error = window_error(start, end)
+            if error:
+                plan.fail(i, error)
+                continue
+            rebooked.add(plan.ids[i])
+            bookings.append((i, stored.drone_id, start, end))
+    for i, detail in find_batch_conflicts(db, bookings, rebooked | plan.ids_for('delete', 'schedule')).items():
+        plan.fail(i, detail)
+
+    # Bases can only be deleted once no drone is assigned to them
+    if deleted_bases:
+        assigned = db.execute(
+            select(Drone.id, Drone.base_id).where(_in(Drone.base_id, deleted_bases))
+        ).all()
+        reassigned = {plan.ids[i] for i in plan.groups.get(('update', 'drone'), []) if plan.payloads[i] and 'base_id' in plan.payloads[i]}
+        remaining: Dict[str, int] = {}
+        for drone_id, base_id in assigned:
+            if drone_id not in deleted_drones and drone_id not in reassigned:
+                remaining[base_id] = remaining.get(base_id, 0) + 1
+        for i in plan.indexes('delete', 'base'):
+            if remaining.get(plan.ids[i]):
+                plan.fail(i, f"Cannot delete base: {remaining[plan.ids[i]]} drone(s) are assigned to it")
+
+def _row(plan: _BatchPlan, i: int) -> dict:
+    row = {key: (str(value) if isinstance(value, uuid.UUID) else value) for key, value in plan.payloads[i].items()}
+    row['id'] = plan.ids[i]
+    if 'path_json' in row:
+        # Bulk statements write columns, not the Schedule.path_json property
+        row.update(paths.pack_document(row.pop('path_json')))
+    return row
+
+def _place_at_bases(plan: _BatchPlan, rows: List[dict]):
+    """Give new drones without a position their base's location"""
+    for row in rows:
+        if row.get('base_id') and (row.get('last_lat') is None or row.get('last_lng') is None):
+            row['last_lat'], row['last_lng'] = plan.base_positions[row['base_id']]
+
+def _apply(plan: _BatchPlan, db: Session):
+    """Apply every operation with executemany-style statements, parents first"""
+    for entity in ('base', 'drone', 'schedule'):
+        rows = [_row(plan, i) for i in plan.indexes('create', entity)]
+        if entity == 'drone':
+            _place_at_bases(plan, rows)
+        if rows:
+            db.execute(insert(MODELS[entity]), rows)
+
+    for entity in ('base', 'drone', 'schedule'):
+        rows = [_row(plan, i) for i in plan.indexes('update', entity) if plan.payloads[i]]
+        if rows:
+            db.execute(update(MODELS[entity]), rows)
+
+    # Bulk updates skip the ORM events that keep geohashes current
+    for entity, position in (('base', {'lat', 'lng'}), ('drone', {'last_lat', 'last_lng'})):
+        moved = {plan.ids[i] for i in plan.indexes('update', entity) if position & set(plan.payloads[i] or ())}
+        if moved:
+            viewport.rehash(db, MODELS[entity], moved)
+
+    schedule_ids = plan.ids_for('delete', 'schedule')
+    drone_ids = plan.ids_for('delete', 'drone')
+    base_ids = plan.ids_for('delete', 'base')
+    if schedule_ids:
+        db.execute(delete(Schedule).where(_in(Schedule.id, schedule_ids)))
+    if drone_ids:
+        # Bulk deletes bypass the ORM cascade, so remove dependent schedules here
+        db.execute(delete(Schedule).where(_in(Schedule.drone_id, drone_ids)))
+        db.execute(delete(Drone).where(_in(Drone.id, drone_ids)))
+    if base_ids:
+        db.execute(delete(DroneBase).where(_in(DroneBase.id, base_ids)))
+
+def _results(plan: _BatchPlan, committed: bool) -> List[BatchItemResult]:
+    results = []
+    for i, operation in enumerate(plan.operations):
+        if i in plan.errors:
+            item_status, detail = 'error', plan.errors[i]
+        elif committed:
+            item_status, detail = RESULT_STATUS[operation.op], None
+        else:
+            item_status, detail = 'not_applied', None
+        results.append(BatchItemResult(
+            index=i, op=operation.op, entity=operation.entity,
+            id=plan.ids[i], status=item_status, detail=detail
+        ))
+    return results
+
+@router.post("/batch", response_model=BatchResponse)
+def apply_batch(
+    batch: BatchRequest,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Apply many create/update/delete operations in a single transaction
+
+    Every operation is validated first (references resolved with one IN query
+    per table); if any fails, nothing is written and the response is a 400
+    listing the per-item errors.
+    """
+    if len(batch.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch exceeds {MAX_BATCH_OPERATIONS} operations"
+        )
+
+    plan = _BatchPlan(batch.operations)
+    _parse(plan)
+
+    def apply(session: Session):
+        # Checked in the same transaction as the writes, so they still hold
+        _resolve(plan, session, current_user)
+        if not plan.errors:
+            _apply(plan, session)
+
+    try:
+        run_write(db, apply)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Database integrity error"
+        )
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+    if plan.errors:
+        response = BatchResponse(committed=False, results=_results(plan, committed=False))
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=response.model_dump(mode='json'))
+    return BatchResponse(committed=True, results=_results(plan, committed=True))
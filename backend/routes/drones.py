@@ -1,66 +1,139 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+import time
 import uuid
-import random
-import math
-from datetime import datetime
+from datetime import datetime, timezone
 
-from dependencies import get_db
-from auth import get_current_user
+from dependencies import get_db, get_async_db
+from auth import get_current_user, get_current_user_async
+from pagination import PageParams, paginate, page_items
+from write_queue import run_write
+from etags import collection_state, request_etag, etag_matches, not_modified, set_etag
 from models import Drone, DroneBase
+import simulation
+import timeseries
 from schemas import (
     DroneCreate, DroneUpdate, DroneResponse,
-    SimulatePathRequest, SimulatePathResponse, TelemetryResponse,
-    DroneActionRequest
+    SimulatePathRequest, SimulatePathResponse, SimulateBatchRequest, SimulateBatchResult,
+    DroneActionRequest, TelemetryHistoryResponse
 )
 
 router = APIRouter()
+# Read endpoints served from an AsyncSession; registered ahead of `router`
+# when ASYNC_DB is enabled
+async_router = APIRouter()
 
-@router.get("/drones", response_model=List[DroneResponse])
-def get_drones(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Get all drones (user sees own, admin sees all)"""
-    user_id = current_user.get('sub')
-    role = current_user.get('user_metadata', {}).get('role', 'user')
-    
-    if role == 'admin':
-        drones = db.query(Drone).all()
-    else:
-        drones = db.query(Drone).filter(Drone.user_id == user_id).all()
-    
-    return drones
+# Listing order; matches idx_drone_created / idx_drone_user_created
+DRONE_PAGE_KEY = (Drone.created_at, Drone.id)
 
-@router.get("/drones/{drone_id}", response_model=DroneResponse)
-def get_drone(
-    drone_id: str,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Get a single drone by ID"""
+def _drones_query(current_user: dict):
+    """Build the drone listing query (user sees own, admin sees all)"""
     user_id = current_user.get('sub')
     role = current_user.get('user_metadata', {}).get('role', 'user')
     
-    # IDs are now strings, no UUID parsing needed
-    drone = db.query(Drone).filter(Drone.id == drone_id).first()
-    
+    query = select(Drone)
+    if role != 'admin':
+        query = query.where(Drone.user_id == user_id)
+    return query
+
+def _drone_state_query(drone_id: str):
+    """Owner and last change of a drone, for access checks and its ETag"""
+    return select(Drone.user_id, Drone.updated_at).where(Drone.id == drone_id)
+
+def _check_drone_access(drone, current_user: dict):
+    """Raise 404/403 unless the current user may access the drone"""
     if not drone:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Drone not found"
         )
     
-    # Check authorization
+    user_id = current_user.get('sub')
+    role = current_user.get('user_metadata', {}).get('role', 'user')
     if role != 'admin' and str(drone.user_id) != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
-    
-    return drone
+
+@router.get("/drones", response_model=List[DroneResponse])
+def get_drones(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """List drones a page at a time (user sees own, admin sees all)"""
+    query = _drones_query(current_user)
+    state = db.execute(collection_state(query, Drone.updated_at, 'drones')).one()
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    query = paginate(query, DRONE_PAGE_KEY, page)
+    return page_items(db.execute(query).scalars().all(), DRONE_PAGE_KEY, page, request, response)
+
+@async_router.get("/drones", response_model=List[DroneResponse])
+async def get_drones_async(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """List drones a page at a time (user sees own, admin sees all)"""
+    query = _drones_query(current_user)
+    state = (await db.execute(collection_state(query, Drone.updated_at, 'drones'))).one()
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    result = await db.execute(paginate(query, DRONE_PAGE_KEY, page))
+    return page_items(result.scalars().all(), DRONE_PAGE_KEY, page, request, response)
+
+@router.get("/drones/{drone_id}", response_model=DroneResponse)
+def get_drone(
+    drone_id: str,
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a single drone by ID"""
+    state = db.execute(_drone_state_query(drone_id)).first()
+    _check_drone_access(state, current_user)
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    return db.get(Drone, drone_id)
+
+@async_router.get("/drones/{drone_id}", response_model=DroneResponse)
+async def get_drone_async(
+    drone_id: str,
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a single drone by ID"""
+    state = (await db.execute(_drone_state_query(drone_id))).first()
+    _check_drone_access(state, current_user)
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    return await db.get(Drone, drone_id)
 
 @router.post("/drones", response_model=DroneResponse, status_code=status.HTTP_201_CREATED)
 def create_drone(
@@ -69,29 +142,36 @@ def create_drone(
     db: Session = Depends(get_db)
 ):
     """Create a new drone"""
-    try:
+    def create(session: Session) -> Drone:
         # Validate base_id if provided
         base_id = None
+        last_lat, last_lng = drone_data.last_lat, drone_data.last_lng
         if drone_data.base_id:
-            base = db.query(DroneBase).filter(DroneBase.id == drone_data.base_id).first()
+            base = session.query(DroneBase).filter(DroneBase.id == drone_data.base_id).first()
             if not base:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Base not found"
                 )
             base_id = drone_data.base_id
+            # A drone that hasn't reported a position is at its base
+            if last_lat is None or last_lng is None:
+                last_lat, last_lng = base.lat, base.lng
         
         drone = Drone(
             name=drone_data.name,
             model=drone_data.model,
             user_id=current_user.get('sub'),  # user_id is now a string
             base_id=base_id,
-            status=drone_data.status or 'simulated'
+            status=drone_data.status or 'simulated',
+            last_lat=last_lat,
+            last_lng=last_lng
         )
-        db.add(drone)
-        db.commit()
-        db.refresh(drone)
+        session.add(drone)
         return drone
+
+    try:
+        return run_write(db, create)
     except IntegrityError:
         db.rollback()
         raise HTTPException(
@@ -113,47 +193,36 @@ def update_drone(
     db: Session = Depends(get_db)
 ):
     """Update a drone"""
-    user_id = current_user.get('sub')
-    role = current_user.get('user_metadata', {}).get('role', 'user')
-    
-    # IDs are now strings, no UUID parsing needed
-    drone = db.query(Drone).filter(Drone.id == drone_id).first()
-    
-    if not drone:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Drone not found"
-        )
-    
-    # Check authorization
-    if role != 'admin' and str(drone.user_id) != user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
-    
-    # Update fields
-    if drone_data.name is not None:
-        drone.name = drone_data.name
-    if drone_data.model is not None:
-        drone.model = drone_data.model
-    if drone_data.status is not None:
-        drone.status = drone_data.status
-    if drone_data.base_id is not None:
-        if drone_data.base_id:
-            base = db.query(DroneBase).filter(DroneBase.id == drone_data.base_id).first()
-            if not base:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Base not found"
-                )
-            drone.base_id = drone_data.base_id
-        else:
-            drone.base_id = None
+    def update(session: Session) -> Drone:
+        # IDs are now strings, no UUID parsing needed
+        drone = session.query(Drone).filter(Drone.id == drone_id).first()
+        _check_drone_access(drone, current_user)
+        
+        # Update fields
+        if drone_data.name is not None:
+            drone.name = drone_data.name
+        if drone_data.model is not None:
+            drone.model = drone_data.model
+        if drone_data.status is not None:
+            drone.status = drone_data.status
+        if drone_data.base_id is not None:
+            if drone_data.base_id:
+                base = session.query(DroneBase).filter(DroneBase.id == drone_data.base_id).first()
+                if not base:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail="Base not found"
+                    )
+                drone.base_id = drone_data.base_id
+            else:
+                drone.base_id = None
+        if drone_data.last_lat is not None:
+            drone.last_lat = drone_data.last_lat
+        if drone_data.last_lng is not None:
+            drone.last_lng = drone_data.last_lng
+        return drone
     
-    db.commit()
-    db.refresh(drone)
-    return drone
+    return run_write(db, update)
 
 @router.delete("/drones/{drone_id}")
 def delete_drone(
@@ -162,27 +231,13 @@ def delete_drone(
     db: Session = Depends(get_db)
 ):
     """Delete a drone"""
-    user_id = current_user.get('sub')
-    role = current_user.get('user_metadata', {}).get('role', 'user')
-    
-    # IDs are now strings, no UUID parsing needed
-    drone = db.query(Drone).filter(Drone.id == drone_id).first()
-    
-    if not drone:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Drone not found"
-        )
-    
-    # Check authorization
-    if role != 'admin' and str(drone.user_id) != user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    def delete(session: Session):
+        # IDs are now strings, no UUID parsing needed
+        drone = session.query(Drone).filter(Drone.id == drone_id).first()
+        _check_drone_access(drone, current_user)
+        session.delete(drone)
     
-    db.delete(drone)
-    db.commit()
+    run_write(db, delete)
     return {"message": "Drone deleted successfully"}
 
 @router.post("/drones/{drone_id}/simulate_path", response_model=SimulatePathResponse)
@@ -211,100 +266,151 @@ def simulate_path(
             detail="Access denied"
         )
     
-    path_data = path_request.path or []
-    
-    # If no path provided, generate a default path
-    if not path_data:
-        base_lng, base_lat = -122.4, 37.79
-        path_data = [
-            [base_lng, base_lat],
-            [base_lng + 0.01, base_lat],
-            [base_lng + 0.01, base_lat + 0.01],
-            [base_lng, base_lat + 0.01],
-            [base_lng, base_lat]
-        ]
-    
-    # Calculate distance and ETA
-    total_distance = 0
-    for i in range(len(path_data) - 1):
-        lat1, lng1 = path_data[i][1], path_data[i][0]
-        lat2, lng2 = path_data[i+1][1], path_data[i+1][0]
-        # Haversine distance approximation
-        distance = math.sqrt((lat2-lat1)**2 + (lng2-lng1)**2) * 111000  # meters
-        total_distance += distance
-    
-    speed_mps = random.uniform(10, 15)  # 10-15 m/s
-    eta_seconds = int(total_distance / speed_mps) if speed_mps > 0 else 0
-    
-    # Generate mock telemetry
-    telemetry = TelemetryResponse(
-        battery_level=float(random.randint(60, 100)),
-        altitude_m=random.uniform(50, 150),
-        heading_deg=random.uniform(0, 360),
-        signal_strength=float(random.randint(70, 100))
-    )
-    
-    return SimulatePathResponse(
-        speed_mps=round(speed_mps, 2),
-        eta_seconds=eta_seconds,
-        distance_m=round(total_distance, 2),
-        telemetry=telemetry
-    )
+    try:
+        return simulation.simulate(path_request.path)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="path must be a list of [lng, lat] points"
+        )
 
-@router.post("/drones/{drone_id}/action")
-def drone_action(
-    drone_id: str,
-    action_request: DroneActionRequest,
+@router.post("/drones/simulate_batch", response_class=StreamingResponse,
+             responses={200: {"content": {"application/x-ndjson": {}},
+                              "description": "One SimulateBatchResult per line, in completion order"}})
+def simulate_batch(
+    batch: SimulateBatchRequest,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Trigger simulated drone action"""
-    # IDs are now strings, no UUID parsing needed
-    drone = db.query(Drone).filter(Drone.id == drone_id).first()
-    
-    if not drone:
+    """Simulate many (drone_id, path) pairs on the worker pool, streaming results as NDJSON
+
+    The drones are authorized with one query; items that fail (404/403) are
+    streamed first, then the simulations as they complete.
+    """
+    if len(batch.items) > simulation.MAX_SIMULATION_BATCH:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Drone not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {simulation.MAX_SIMULATION_BATCH} items per batch"
         )
-    
-    # Check authorization
     user_id = current_user.get('sub')
     role = current_user.get('user_metadata', {}).get('role', 'user')
-    if role != 'admin' and str(drone.user_id) != user_id:
+    owners = dict(db.execute(
+        select(Drone.id, Drone.user_id).where(Drone.id.in_(sorted({item.drone_id for item in batch.items})))
+    ).all())
+
+    failed, runnable = [], []
+    for index, item in enumerate(batch.items):
+        if item.drone_id not in owners:
+            failed.append(SimulateBatchResult(index=index, drone_id=item.drone_id, status=404, detail="Drone not found"))
+        elif role != 'admin' and str(owners[item.drone_id]) != user_id:
+            failed.append(SimulateBatchResult(index=index, drone_id=item.drone_id, status=403, detail="Access denied"))
+        else:
+            runnable.append((index, item.path))
+
+    async def lines():
+        for result in failed:
+            yield result.model_dump_json() + '\n'
+        async for index, result, error in simulation.simulate_many(runnable):
+            yield SimulateBatchResult(
+                index=index, drone_id=batch.items[index].drone_id,
+                status=400 if error else 200, result=result, detail=error,
+            ).model_dump_json() + '\n'
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+HistoryResolution = Literal['auto', 'raw', '1s', '1m', '1h']
+
+def _epoch(value: datetime) -> float:
+    """Seconds since the epoch; naive times are UTC"""
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+@router.get("/drones/{drone_id}/telemetry", response_model=TelemetryHistoryResponse)
+def get_telemetry_history(
+    drone_id: str,
+    start: datetime = Query(..., description="First instant of the range"),
+    end: Optional[datetime] = Query(None, description="End of the range, exclusive (default: now)"),
+    resolution: HistoryResolution = Query('auto', description="raw samples or 1s/1m/1h rollups; auto picks the finest within limit"),
+    limit: int = Query(5000, ge=1, le=100_000),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """A drone's telemetry over a time range, from the history store (columns of equal length)"""
+    state = db.execute(_drone_state_query(drone_id)).first()
+    _check_drone_access(state, current_user)
+    store = timeseries.default_store()
+    if store is None:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Telemetry history is not enabled"
         )
-    
-    action = action_request.action
-    valid_actions = ['return_to_base', 'intercept', 'end_early', 'pause', 'resume']
-    
-    if action not in valid_actions:
+    start_ts = _epoch(start)
+    end_ts = _epoch(end) if end is not None else time.time()
+    if end_ts <= start_ts:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid action. Valid actions: {', '.join(valid_actions)}"
+            detail="end must be after start"
         )
+
+    if resolution == 'auto':
+        # The finest resolution that fits, else the coarsest (truncated)
+        resolution = next((name for name in ('raw', '1s', '1m')
+                           if store.count(drone_id, start_ts, end_ts, name) <= limit), '1h')
+    columns = store.query(drone_id, start_ts, end_ts, resolution, limit=limit + 1)
+    truncated = len(columns['ts']) > limit
+    return {
+        'drone_id': drone_id,
+        'resolution': resolution,
+        'start': start_ts,
+        'end': end_ts,
+        'truncated': truncated,
+        # Missing readings are NaN in the store and null here
+        'columns': {name: [None if value != value else value for value in values[:limit].tolist()]
+                    for name, values in columns.items()},
+    }
+
+@router.post("/drones/{drone_id}/action")
+def drone_action(
+    drone_id: str,
+    action_request: DroneActionRequest,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Trigger simulated drone action"""
+    action = action_request.action
+    valid_actions = ['return_to_base', 'intercept', 'end_early', 'pause', 'resume']
     
-    # Update drone status based on action
-    if action == 'return_to_base':
-        drone.status = 'returning'
-    elif action == 'intercept':
-        drone.status = 'intercepting'
-    elif action == 'end_early':
-        drone.status = 'completed'
-    elif action == 'pause':
-        drone.status = 'paused'
-    elif action == 'resume':
-        drone.status = 'active'
+    def apply_action(session: Session) -> str:
+        # IDs are now strings, no UUID parsing needed
+        drone = session.query(Drone).filter(Drone.id == drone_id).first()
+        _check_drone_access(drone, current_user)
+        
+        if action not in valid_actions:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid action. Valid actions: {', '.join(valid_actions)}"
+            )
+        
+        # Update drone status based on action
+        if action == 'return_to_base':
+            drone.status = 'returning'
+        elif action == 'intercept':
+            drone.status = 'intercepting'
+        elif action == 'end_early':
+            drone.status = 'completed'
+        elif action == 'pause':
+            drone.status = 'paused'
+        elif action == 'resume':
+            drone.status = 'active'
+        
+        drone.last_check_in = datetime.utcnow()
+        return drone.status
     
-    drone.last_check_in = datetime.utcnow()
-    db.commit()
+    drone_status = run_write(db, apply_action)
     
     return {
         'status': 'success',
         'action': action,
         'drone_id': drone_id,
-        'drone_status': drone.status,
+        'drone_status': drone_status,
         'message': f'Action {action} executed for drone {drone_id}'
     }
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends
+
+from auth import get_current_user
+from schemas import FleetLiveResponse
+import fleet
+
+router = APIRouter()
+
+@router.get("/fleet/live", response_model=FleetLiveResponse)
+def get_fleet_live(current_user: dict = Depends(get_current_user)):
+    """Positions and telemetry of the caller's drones in flight, from the latest simulation tick"""
+    state = fleet.current_state()
+    return {'tick': state.tick, 'time': state.at, 'drones': state.visible_to(current_user)}
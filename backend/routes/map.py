@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from dependencies import get_db, get_async_db
+from auth import get_current_user, get_current_user_async
+from etags import request_etag, etag_matches, not_modified, set_etag
+from schemas import ViewportResponse
+from viewport import Viewport
+import spatial
+
+router = APIRouter()
+# Read endpoints served from an AsyncSession; registered ahead of `router`
+# when ASYNC_DB is enabled
+async_router = APIRouter()
+
+def _viewport(db: Session, request: Request, response: Response, bbox: str, zoom: int, current_user: dict):
+    view = Viewport(db, spatial.parse_bbox(bbox), zoom)
+    etag = request_etag(request, current_user, *view.state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    return view.read(db, current_user)
+
+@router.get("/map/viewport", response_model=ViewportResponse)
+def get_viewport(
+    request: Request,
+    response: Response,
+    bbox: str = Query(..., description="west,south,east,north"),
+    zoom: int = Query(..., ge=0, le=24),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Bases and drones inside a map viewport (crowded tiles as clusters)"""
+    return _viewport(db, request, response, bbox, zoom, current_user)
+
+@async_router.get("/map/viewport", response_model=ViewportResponse)
+async def get_viewport_async(
+    request: Request,
+    response: Response,
+    bbox: str = Query(..., description="west,south,east,north"),
+    zoom: int = Query(..., ge=0, le=24),
+    current_user: dict = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Bases and drones inside a map viewport (crowded tiles as clusters)"""
+    return await db.run_sync(_viewport, request, response, bbox, zoom, current_user)
@@ -1,62 +1,208 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+import logging
 import uuid
 
-from dependencies import get_db
-from auth import get_current_user
+from dependencies import get_db, get_async_db
+from auth import get_current_user, get_current_user_async
+from pagination import PageParams, paginate, page_items
+from write_queue import run_write
+from etags import collection_state, table_version, request_etag, etag_matches, not_modified, set_etag
 from models import Schedule, Drone
-from schemas import ScheduleCreate, ScheduleUpdate, ScheduleResponse
+from scheduling import WindowParams, apply_window, check_no_conflict, lock_drone
+from schemas import ScheduleCreate, ScheduleUpdate, ScheduleResponse, window_error
+from structured_logging import get_logger, log_event
 
 router = APIRouter()
+logger = get_logger('schedules')
+# Read endpoints served from an AsyncSession; registered ahead of `router`
+# when ASYNC_DB is enabled
+async_router = APIRouter()
 
-@router.get("/schedules", response_model=List[ScheduleResponse])
-def get_schedules(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Get all schedules (user sees own, admin sees all)"""
+# Listing order; matches idx_schedule_start_id
+SCHEDULE_PAGE_KEY = (Schedule.start_time, Schedule.id)
+
+def _schedules_query(current_user: dict):
+    """Build the schedule listing query (user sees own, admin sees all)"""
     user_id = current_user.get('sub')
     role = current_user.get('user_metadata', {}).get('role', 'user')
     
-    if role == 'admin':
-        schedules = db.query(Schedule).all()
-    else:
+    query = select(Schedule)
+    if role != 'admin':
         # Get schedules for user's drones (user_id is now a string)
-        schedules = db.query(Schedule).join(Drone).filter(
-            Drone.user_id == user_id
-        ).all()
-    
-    return schedules
+        query = query.join(Drone).where(Drone.user_id == user_id)
+    return query
 
-@router.get("/schedules/{schedule_id}", response_model=ScheduleResponse)
-def get_schedule(
-    schedule_id: str,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Get a single schedule by ID"""
-    user_id = current_user.get('sub')
+class PathLengthParams:
+    """?min_length_m and ?max_length_m for a schedule listing (stored path metrics, indexed)"""
+
+    def __init__(
+        self,
+        min_length_m: Optional[float] = Query(None, ge=0, description="Paths at least this long"),
+        max_length_m: Optional[float] = Query(None, ge=0, description="Paths at most this long"),
+    ):
+        self.min_length_m = min_length_m
+        self.max_length_m = max_length_m
+
+def _window_query(current_user: dict, window: WindowParams, length: PathLengthParams):
+    """The listing query narrowed to ?drone_id, the ?from/?to window and the path length range"""
     role = current_user.get('user_metadata', {}).get('role', 'user')
-    
-    # IDs are now strings, no UUID parsing needed
-    schedule = db.query(Schedule).filter(Schedule.id == schedule_id).first()
-    
-    if not schedule:
+    query = apply_window(
+        _schedules_query(current_user), window.start, window.end,
+        drone_ids=[window.drone_id] if window.drone_id else None,
+        owner_id=None if role == 'admin' else current_user.get('sub'),
+    )
+    if length.min_length_m is not None:
+        query = query.where(Schedule.path_length_m >= length.min_length_m)
+    if length.max_length_m is not None:
+        query = query.where(Schedule.path_length_m <= length.max_length_m)
+    return query
+
+# ?path: the coordinates a response carries (see paths.py)
+PathDetail = Literal['full', 'simplified', 'none']
+PATH_QUERY = Query('full', description="Path coordinates: full, simplified (Douglas-Peucker) or none")
+
+def _with_path_detail(schedules, detail: PathDetail):
+    """Have the schedules' path_json decode the requested variant"""
+    for schedule in schedules:
+        schedule.path_detail = detail
+    return schedules
+
+def _schedule_with_owner_query(schedule_id: str):
+    """Fetch a schedule and its drone's owner in one round trip"""
+    return (
+        select(Schedule, Drone.user_id)
+        .outerjoin(Drone, Drone.id == Schedule.drone_id)
+        .where(Schedule.id == schedule_id)
+    )
+
+def _schedule_state_query(schedule_id: str):
+    """Owner and change markers of a schedule, for access checks and its ETag
+
+    Schedules have no updated_at, so the table's change counter stands in.
+    """
+    return (
+        select(Schedule.id, Drone.user_id, Schedule.created_at, table_version('schedules'))
+        .outerjoin(Drone, Drone.id == Schedule.drone_id)
+        .where(Schedule.id == schedule_id)
+    )
+
+def _check_schedule_access(row, current_user: dict) -> Schedule:
+    """Raise 404/403 unless the current user may access the schedule"""
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Schedule not found"
         )
     
-    # Check authorization
-    drone = db.query(Drone).filter(Drone.id == schedule.drone_id).first()
-    if role != 'admin' and str(drone.user_id) != user_id:
+    user_id = current_user.get('sub')
+    role = current_user.get('user_metadata', {}).get('role', 'user')
+    schedule, owner_id = row[0], row[1]
+    if role != 'admin' and str(owner_id) != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
-    
+    return schedule
+
+@router.get("/schedules", response_model=List[ScheduleResponse])
+def get_schedules(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    window: WindowParams = Depends(),
+    length: PathLengthParams = Depends(),
+    path: PathDetail = PATH_QUERY,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """List schedules by start time, a page at a time (user sees own, admin sees all)
+
+    ?from/?to keep the schedules overlapping that window, ?drone_id one drone's,
+    ?min_length_m/?max_length_m those whose path length is in range;
+    ?path picks the full or simplified path, or none.
+    """
+    query = _window_query(current_user, window, length)
+    state = db.execute(collection_state(query, Schedule.created_at, 'schedules')).one()
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    query = paginate(query, SCHEDULE_PAGE_KEY, page)
+    schedules = _with_path_detail(db.execute(query).scalars().all(), path)
+    return page_items(schedules, SCHEDULE_PAGE_KEY, page, request, response)
+
+@async_router.get("/schedules", response_model=List[ScheduleResponse])
+async def get_schedules_async(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    window: WindowParams = Depends(),
+    length: PathLengthParams = Depends(),
+    path: PathDetail = PATH_QUERY,
+    current_user: dict = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """List schedules by start time, a page at a time (user sees own, admin sees all)
+
+    ?from/?to keep the schedules overlapping that window, ?drone_id one drone's,
+    ?min_length_m/?max_length_m those whose path length is in range;
+    ?path picks the full or simplified path, or none.
+    """
+    query = _window_query(current_user, window, length)
+    state = (await db.execute(collection_state(query, Schedule.created_at, 'schedules'))).one()
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    result = await db.execute(paginate(query, SCHEDULE_PAGE_KEY, page))
+    schedules = _with_path_detail(result.scalars().all(), path)
+    return page_items(schedules, SCHEDULE_PAGE_KEY, page, request, response)
+
+@router.get("/schedules/{schedule_id}", response_model=ScheduleResponse)
+def get_schedule(
+    schedule_id: str,
+    request: Request,
+    response: Response,
+    path: PathDetail = PATH_QUERY,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a single schedule by ID (?path: full, simplified or none)"""
+    state = db.execute(_schedule_state_query(schedule_id)).first()
+    _check_schedule_access(state, current_user)
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    schedule, = _with_path_detail([db.get(Schedule, schedule_id)], path)
+    return schedule
+
+@async_router.get("/schedules/{schedule_id}", response_model=ScheduleResponse)
+async def get_schedule_async(
+    schedule_id: str,
+    request: Request,
+    response: Response,
+    path: PathDetail = PATH_QUERY,
+    current_user: dict = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a single schedule by ID (?path: full, simplified or none)"""
+    state = (await db.execute(_schedule_state_query(schedule_id))).first()
+    _check_schedule_access(state, current_user)
+    etag = request_etag(request, current_user, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    schedule, = _with_path_detail([await db.get(Schedule, schedule_id)], path)
     return schedule
 
 @router.post("/schedules", response_model=ScheduleResponse, status_code=status.HTTP_201_CREATED)
@@ -66,21 +212,24 @@ def create_schedule(
     db: Session = Depends(get_db)
 ):
     """Create a new schedule"""
-    print("[SCHEDULES] Received schedule creation request")
-    print(f"[SCHEDULES] Drone ID: {schedule_data.drone_id}")
-    print(f"[SCHEDULES] Start Time: {schedule_data.start_time}")
-    print(f"[SCHEDULES] End Time: {schedule_data.end_time}")
-    print(f"[SCHEDULES] Path JSON: {schedule_data.path_json}")
+    waypoints = (schedule_data.path_json or {}).get('coordinates')
+    if not isinstance(waypoints, list):
+        waypoints = []
+    log_event(
+        logger, logging.DEBUG, "Received schedule creation request",
+        drone_id=schedule_data.drone_id,
+        start_time=schedule_data.start_time,
+        end_time=schedule_data.end_time,
+        waypoints=len(waypoints),
+    )
     
-    try:
+    def create(session: Session) -> tuple:
         # Check authorization
         user_id = current_user.get('sub')
         role = current_user.get('user_metadata', {}).get('role', 'user')
         
-        print(f"[SCHEDULES] User ID from token: {user_id}")
-        print(f"[SCHEDULES] User role: {role}")
-        
-        drone = db.query(Drone).filter(Drone.id == schedule_data.drone_id).first()
+        # Row lock: concurrent bookings of one drone are checked one at a time
+        drone = session.query(Drone).filter(Drone.id == schedule_data.drone_id).with_for_update().first()
         
         if not drone:
             raise HTTPException(
@@ -88,72 +237,57 @@ def create_schedule(
                 detail="Drone not found"
             )
         
-        print(f"[SCHEDULES] Drone user_id: {drone.user_id}")
-        print(f"[SCHEDULES] Comparing: str('{drone.user_id}') != '{user_id}'")
-        
         # In development mode (no Supabase configured), allow all users to access any drone
         import os
         is_dev_mode = not os.getenv('SUPABASE_JWT_SECRET', '')
         
         if is_dev_mode:
-            print(f"[SCHEDULES] Development mode - skipping ownership check")
+            log_event(logger, logging.DEBUG, "Development mode - skipping ownership check",
+                      user_id=user_id, drone_user_id=drone.user_id)
         elif role != 'admin' and str(drone.user_id) != user_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Access denied"
             )
         
+        check_no_conflict(session, drone.id, schedule_data.start_time, schedule_data.end_time)
+        
         schedule = Schedule(
             drone_id=schedule_data.drone_id,
             start_time=schedule_data.start_time,
             end_time=schedule_data.end_time,
             path_json=schedule_data.path_json
         )
-        db.add(schedule)
-        db.commit()
-        db.refresh(schedule)
-        
-        # Log schedule creation to terminal
-        print("=" * 50)
-        print("=== Schedule Created ===")
-        print(f"Schedule ID: {schedule.id}")
-        print(f"Drone ID: {schedule.drone_id}")
-        print(f"Drone Name: {drone.name}")
-        print(f"Start Time: {schedule.start_time}")
-        print(f"End Time: {schedule.end_time}")
+        session.add(schedule)
+        # Drone fields for the log line are read here, while the drone is loaded
+        return schedule, drone.name, drone.base_id
+    
+    try:
+        schedule, drone_name, drone_base_id = run_write(db, create)
         
-        # Calculate duration
+        duration_minutes = None
         if schedule.start_time and schedule.end_time:
-            duration_seconds = (schedule.end_time - schedule.start_time).total_seconds()
-            duration_minutes = int(duration_seconds / 60)
-            print(f"Duration: {duration_minutes} minutes")
-        
-        # Log base information if available
-        if drone.base_id:
-            from models import DroneBase
-            base = db.query(DroneBase).filter(DroneBase.id == drone.base_id).first()
-            if base:
-                print(f"Base: {base.name} (ID: {base.id})")
-                print(f"Base Location: Latitude={base.lat}, Longitude={base.lng}")
+            duration_minutes = int((schedule.end_time - schedule.start_time).total_seconds() / 60)
         
-        # Log waypoints
-        if schedule.path_json and 'coordinates' in schedule.path_json:
-            waypoints = schedule.path_json['coordinates']
-            print(f"Waypoints: {len(waypoints)}")
-            for i, wp in enumerate(waypoints, 1):
-                if isinstance(wp, (list, tuple)) and len(wp) >= 2:
-                    print(f"  Waypoint {i}: Longitude={wp[0]}, Latitude={wp[1]}")
-                else:
-                    print(f"  Waypoint {i}: {wp}")
-        else:
-            print("Waypoints: Using default patrol route")
-        
-        print("=" * 50)
+        # One summary line per schedule; the path itself is size-capped and
+        # only emitted at DEBUG
+        log_event(
+            logger, logging.INFO, "Schedule created",
+            schedule_id=schedule.id,
+            drone_id=schedule.drone_id,
+            drone_name=drone_name,
+            base_id=drone_base_id,
+            start_time=schedule.start_time,
+            end_time=schedule.end_time,
+            duration_minutes=duration_minutes,
+            waypoints=len(waypoints),
+        )
+        log_event(logger, logging.DEBUG, "Schedule path", schedule_id=schedule.id, path=waypoints)
         
         return schedule
     except IntegrityError as e:
         db.rollback()
-        print(f"[SCHEDULES] ❌ Database integrity error: {str(e)}")
+        log_event(logger, logging.WARNING, "Database integrity error", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Database integrity error"
@@ -163,10 +297,8 @@ def create_schedule(
         raise
     except Exception as e:
         db.rollback()
-        print(f"[SCHEDULES] ❌ Unexpected error: {str(e)}")
-        print(f"[SCHEDULES] Error type: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        log_event(logger, logging.ERROR, "Unexpected error creating schedule",
+                  exc_info=True, error_type=type(e).__name__)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -180,39 +312,30 @@ def update_schedule(
     db: Session = Depends(get_db)
 ):
     """Update a schedule"""
-    user_id = current_user.get('sub')
-    role = current_user.get('user_metadata', {}).get('role', 'user')
-    
-    # IDs are now strings, no UUID parsing needed
-    schedule = db.query(Schedule).filter(Schedule.id == schedule_id).first()
-    
-    if not schedule:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Schedule not found"
-        )
-    
-    # Check authorization
-    drone = db.query(Drone).filter(Drone.id == schedule.drone_id).first()
-    if role != 'admin' and str(drone.user_id) != user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
-    
-    # Update fields
-    if schedule_data.start_time is not None:
-        schedule.start_time = schedule_data.start_time
-    
-    if schedule_data.end_time is not None:
-        schedule.end_time = schedule_data.end_time
-    
-    if schedule_data.path_json is not None:
-        schedule.path_json = schedule_data.path_json
+    def update(session: Session) -> Schedule:
+        row = session.execute(_schedule_with_owner_query(schedule_id)).first()
+        schedule = _check_schedule_access(row, current_user)
+        
+        # Update fields
+        if schedule_data.start_time is not None:
+            schedule.start_time = schedule_data.start_time
+        
+        if schedule_data.end_time is not None:
+            schedule.end_time = schedule_data.end_time
+        
+        if schedule_data.path_json is not None:
+            schedule.path_json = schedule_data.path_json
+        
+        if schedule_data.start_time is not None or schedule_data.end_time is not None:
+            error = window_error(schedule.start_time, schedule.end_time)
+            if error:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+            lock_drone(session, schedule.drone_id)
+            check_no_conflict(session, schedule.drone_id, schedule.start_time, schedule.end_time,
+                              exclude_id=schedule.id)
+        return schedule
     
-    db.commit()
-    db.refresh(schedule)
-    return schedule
+    return run_write(db, update)
 
 @router.delete("/schedules/{schedule_id}")
 def delete_schedule(
@@ -221,26 +344,9 @@ def delete_schedule(
     db: Session = Depends(get_db)
 ):
     """Delete a schedule"""
-    user_id = current_user.get('sub')
-    role = current_user.get('user_metadata', {}).get('role', 'user')
-    
-    # IDs are now strings, no UUID parsing needed
-    schedule = db.query(Schedule).filter(Schedule.id == schedule_id).first()
-    
-    if not schedule:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Schedule not found"
-        )
-    
-    # Check authorization
-    drone = db.query(Drone).filter(Drone.id == schedule.drone_id).first()
-    if role != 'admin' and str(drone.user_id) != user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    def delete(session: Session):
+        row = session.execute(_schedule_with_owner_query(schedule_id)).first()
+        session.delete(_check_schedule_access(row, current_user))
     
-    db.delete(schedule)
-    db.commit()
+    run_write(db, delete)
     return {"message": "Schedule deleted successfully"}
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from dependencies import get_db
+from auth import get_current_user, verify_token
+from fanout import WS_SEND_TIMEOUT_SECONDS, Client, hub, parse_subscription
+from models import Drone
+from schemas import TelemetryIngestResponse
+import ingest
+
+router = APIRouter()
+# WebSocket endpoints, mounted outside /api
+socket_router = APIRouter()
+
+# Rejected samples listed in an ingest response
+MAX_REPORTED_ERRORS = 100
+
+def _ingest(db: Session, current_user: dict, media_type: str, body: bytes) -> dict:
+    try:
+        samples = ingest.decode(media_type, body)
+    except ingest.UnsupportedMediaType as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not isinstance(samples, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a batch of samples")
+    if len(samples) > ingest.MAX_TELEMETRY_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {ingest.MAX_TELEMETRY_BATCH} samples per batch"
+        )
+
+    indexes, rows, errors = ingest.validate(samples, time.time())
+
+    # One query authorizes every drone in the batch
+    owners = dict(db.execute(
+        select(Drone.id, Drone.user_id).where(Drone.id.in_({row[0] for row in rows}))
+    ).all()) if rows else {}
+    is_admin = current_user.get('user_metadata', {}).get('role', 'user') == 'admin'
+    accepted = []
+    for index, row in zip(indexes, rows):
+        owner = owners.get(row[0])
+        if owner is None:
+            errors.append((index, "Drone not found"))
+        elif not is_admin and owner != current_user['sub']:
+            errors.append((index, "Access denied"))
+        else:
+            accepted.append(row)
+
+    if accepted and not ingest.buffer_for(db.get_bind()).add(accepted):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Telemetry buffer is full; retry shortly",
+            headers={'Retry-After': '1'}
+        )
+    errors.sort()
+    return {
+        'accepted': len(accepted),
+        'rejected': len(errors),
+        'errors': [{'index': index, 'detail': detail} for index, detail in errors[:MAX_REPORTED_ERRORS]],
+    }
+
+@router.post("/telemetry/ingest", response_model=TelemetryIngestResponse, status_code=status.HTTP_202_ACCEPTED)
+async def ingest_telemetry(
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Buffer a batch of telemetry samples (NDJSON or MessagePack) for the telemetry table
+
+    Invalid samples and samples for other users' drones are rejected one by
+    one; the rest are accepted. 503 when the buffer is full.
+    """
+    body = await request.body()
+    media_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    # Decoding, validation and the drone query stay off the event loop
+    return await run_in_threadpool(_ingest, db, current_user, media_type, body)
+
+def _socket_token(websocket: WebSocket, token: Optional[str]) -> Optional[str]:
+    """?token= (browsers can't set headers on WebSockets), else a Bearer Authorization header"""
+    if token:
+        return token
+    authorization = websocket.headers.get('authorization', '')
+    return authorization.split(' ', 1)[1] if authorization.startswith('Bearer ') else None
+
+async def _send_frames(websocket: WebSocket, client: Client) -> None:
+    """Drain the client's queue; returns when a send stalls past WS_SEND_TIMEOUT_SECONDS"""
+    while True:
+        message = await client.queue.get()
+        try:
+            await asyncio.wait_for(websocket.send_text(message), WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            return
+
+async def _receive_subscriptions(websocket: WebSocket, client: Client) -> None:
+    """Apply subscribe messages until the client disconnects"""
+    while True:
+        text = await websocket.receive_text()
+        try:
+            message = json.loads(text)
+            if not isinstance(message, dict):
+                raise ValueError("Expected a JSON object")
+            subscription = parse_subscription(message, client.current_user)
+        except ValidationError as e:
+            client.queue.put_control(json.dumps({'type': 'error', 'detail': e.errors(include_url=False, include_context=False)}))
+            continue
+        except ValueError as e:
+            client.queue.put_control(json.dumps({'type': 'error', 'detail': str(e)}))
+            continue
+        hub.subscribe(client, subscription)
+        client.queue.put_control(json.dumps({'type': 'subscribed', 'subscription': message}))
+
+@socket_router.websocket("/ws/telemetry")
+async def telemetry_socket(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """Live positions and telemetry of subscribed drones, one frame per fleet tick
+
+    Send {"drones": [...]}, {"base_id": ...} or {"bbox": "west,south,east,north"}
+    to (re)subscribe. Slow clients skip ticks rather than queueing them.
+    """
+    try:
+        raw_token = _socket_token(websocket, token)
+        if raw_token is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        current_user = verify_token(raw_token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    client = hub.connect(current_user)
+    receiver = asyncio.create_task(_receive_subscriptions(websocket, client))
+    sender = asyncio.create_task(_send_frames(websocket, client))
+    try:
+        done, _ = await asyncio.wait((receiver, sender), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        hub.disconnect(client)
+        receiver.cancel()
+        sender.cancel()
+    if receiver in done:
+        error = receiver.exception()
+        if error is not None and not isinstance(error, WebSocketDisconnect):
+            raise error
+    else:
+        # The sender stalled: drop the connection
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
@@ -1,17 +1,37 @@
 """
 Pydantic schemas for request/response validation
 """
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List, Dict, Any
-from datetime import datetime
+from pydantic import AfterValidator, BaseModel, Field, ConfigDict, model_validator
+from typing import Annotated, Optional, List, Dict, Any, Literal
+from datetime import datetime, timezone
 from uuid import UUID
 
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """The instant as naive UTC, the form timestamps are stored and compared in
+
+    SQLite keeps a datetime's wall-clock time and drops its offset, so an
+    aware value must be converted before it is written or queried.
+    """
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value is not None and value.tzinfo else value
+
+# Request timestamps: any offset, normalized to naive UTC
+UTCDateTime = Annotated[datetime, AfterValidator(naive_utc)]
+
+def window_error(start: datetime, end: Optional[datetime]) -> Optional[str]:
+    """Why a schedule can't run from start to end (None if it can)"""
+    if end is not None and naive_utc(end) <= naive_utc(start):
+        return "end_time must be after start_time"
+    return None
+
 # Drone Schemas
 class DroneBase(BaseModel):
     name: str
     model: Optional[str] = None
     base_id: Optional[UUID] = None
     status: Optional[str] = "simulated"
+    # Last known position; defaults to the base's location
+    last_lat: Optional[float] = Field(None, ge=-90, le=90)
+    last_lng: Optional[float] = Field(None, ge=-180, le=180)
 
 class DroneCreate(DroneBase):
     pass
@@ -21,6 +41,8 @@ class DroneUpdate(BaseModel):
     model: Optional[str] = None
     status: Optional[str] = None
     base_id: Optional[UUID] = None
+    last_lat: Optional[float] = Field(None, ge=-90, le=90)
+    last_lng: Optional[float] = Field(None, ge=-180, le=180)
 
 class DroneResponse(DroneBase):
     id: UUID
@@ -52,6 +74,37 @@ class BaseResponse(BaseBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class BaseDistanceResponse(BaseResponse):
+    distance_m: float
+
+# Map Schemas
+class MapBase(BaseModel):
+    id: UUID
+    name: str
+    lat: float
+    lng: float
+
+class MapDrone(BaseModel):
+    id: UUID
+    name: str
+    status: Optional[str] = None
+    base_id: Optional[UUID] = None
+    lat: float
+    lng: float
+
+class MapCluster(BaseModel):
+    kind: Literal['bases', 'drones']
+    tile: str
+    count: int
+    lat: float
+    lng: float
+
+class ViewportResponse(BaseModel):
+    precision: int = Field(..., description="Geohash precision of the tiles covering the viewport")
+    bases: List[MapBase]
+    drones: List[MapDrone]
+    clusters: List[MapCluster] = Field(..., description="Tiles too crowded to list, as counts and centroids")
+
 # Schedule Schemas
 class ScheduleBase(BaseModel):
     drone_id: str  # Accept string IDs for demo (e.g., 'drone-1')
@@ -60,15 +113,36 @@ class ScheduleBase(BaseModel):
     path_json: Optional[Dict[str, Any]] = None
 
 class ScheduleCreate(ScheduleBase):
-    pass
+    start_time: UTCDateTime
+    end_time: Optional[UTCDateTime] = None
+
+    @model_validator(mode='after')
+    def check_window(self) -> 'ScheduleCreate':
+        error = window_error(self.start_time, self.end_time)
+        if error:
+            raise ValueError(error)
+        return self
 
 class ScheduleUpdate(BaseModel):
-    start_time: Optional[datetime] = None
-    end_time: Optional[datetime] = None
+    start_time: Optional[UTCDateTime] = None
+    end_time: Optional[UTCDateTime] = None
     path_json: Optional[Dict[str, Any]] = None
 
+    @model_validator(mode='after')
+    def check_window(self) -> 'ScheduleUpdate':
+        # Only when both change; otherwise checked against the stored schedule
+        if self.start_time is not None:
+            error = window_error(self.start_time, self.end_time)
+            if error:
+                raise ValueError(error)
+        return self
+
 class ScheduleResponse(ScheduleBase):
     id: UUID
+    path_points: Optional[int] = Field(None, description="Points in the full path (whichever ?path was returned)")
+    path_length_m: Optional[float] = Field(None, description="Great-circle length of the full path")
+    path_duration_s: Optional[float] = Field(None, description="Time to fly the path at cruise speed")
+    path_bbox: Optional[List[float]] = Field(None, description="west, south, east, north of the full path")
     created_at: Optional[datetime] = None
     
     model_config = ConfigDict(from_attributes=True)
@@ -89,6 +163,64 @@ class SimulatePathResponse(BaseModel):
     distance_m: float
     telemetry: TelemetryResponse
 
+class SimulateBatchItem(BaseModel):
+    drone_id: str
+    path: Optional[List[List[float]]] = None
+
+class SimulateBatchRequest(BaseModel):
+    items: List[SimulateBatchItem] = Field(..., min_length=1)
+
+class SimulateBatchResult(BaseModel):
+    """One NDJSON line of the POST /drones/simulate_batch stream"""
+    index: int
+    drone_id: str
+    status: int = Field(..., description="200, or the error status: 400, 403 or 404")
+    result: Optional[SimulatePathResponse] = None
+    detail: Optional[str] = None
+
+# Fleet Schemas
+class FleetDrone(BaseModel):
+    drone_id: str
+    schedule_id: str
+    base_id: Optional[str] = None
+    lng: float
+    lat: float
+    progress: float = Field(..., description="Fraction of the schedule's path flown, 0 to 1")
+    speed_mps: float
+    eta_seconds: float
+    paused: bool
+    telemetry: TelemetryResponse
+
+class FleetLiveResponse(BaseModel):
+    tick: int = Field(..., description="Simulation tick the positions are from (0 before the first)")
+    time: float = Field(..., description="Simulated time of the tick, seconds since the epoch")
+    drones: List[FleetDrone]
+
+class TelemetrySubscription(BaseModel):
+    """A /ws/telemetry subscribe message; exactly one field is set"""
+    drones: Optional[List[str]] = None
+    base_id: Optional[str] = None
+    bbox: Optional[str] = Field(None, description="west,south,east,north")
+
+class TelemetryIngestError(BaseModel):
+    index: int = Field(..., description="Position of the sample in the batch")
+    detail: str
+
+class TelemetryIngestResponse(BaseModel):
+    accepted: int
+    rejected: int
+    errors: List[TelemetryIngestError] = Field(..., description="The first rejected samples (up to 100)")
+
+class TelemetryHistoryResponse(BaseModel):
+    drone_id: str
+    resolution: str = Field(..., description="raw, 1s, 1m or 1h")
+    start: float = Field(..., description="Seconds since the epoch")
+    end: float
+    truncated: bool = Field(..., description="More points in the range than limit")
+    columns: Dict[str, List[Optional[float]]] = Field(
+        ..., description="ts and readings (raw), or ts, count, last position and min/mean/max readings (rollups)"
+    )
+
 class DroneActionRequest(BaseModel):
     action: str = Field(..., description="Action: return_to_base, intercept, end_early, pause, resume")
 
@@ -102,6 +234,44 @@ class UserResponse(BaseModel):
 class UpdateRoleRequest(BaseModel):
     role: str = Field(..., description="Role: admin or user")
 
+class RoleUpdateItem(BaseModel):
+    user_id: UUID
+    role: str = Field(..., description="Role: admin or user")
+
+class BatchRoleUpdateRequest(BaseModel):
+    updates: List[RoleUpdateItem] = Field(..., min_length=1, max_length=500)
+
+class RoleUpdateResult(BaseModel):
+    user_id: UUID
+    role: str
+    success: bool
+    detail: Optional[str] = None
+
+class BatchRoleUpdateResponse(BaseModel):
+    results: List[RoleUpdateResult]
+
+# Batch Schemas
+class BatchOperation(BaseModel):
+    op: Literal['create', 'update', 'delete']
+    entity: Literal['drone', 'base', 'schedule']
+    id: Optional[str] = Field(None, description="Target id; optional on create (generated if omitted)")
+    data: Optional[Dict[str, Any]] = None
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1)
+
+class BatchItemResult(BaseModel):
+    index: int
+    op: str
+    entity: str
+    id: Optional[str] = None
+    status: str = Field(..., description="created, updated, deleted, error or not_applied")
+    detail: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: List[BatchItemResult]
+
 class StatsResponse(BaseModel):
     total_drones: int
     total_bases: int
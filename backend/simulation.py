@@ -0,0 +1,116 @@
+"""
+Path simulation, inline or on a pool of worker processes
+
+simulate() turns a path into distance, ETA and mock telemetry; it is what
+POST /drones/{id}/simulate_path runs in the request. POST
+/drones/simulate_batch hands many paths to a ProcessPoolExecutor instead, so
+the CPU-bound geometry of long paths runs on every core rather than holding
+the GIL of the API process. Paths are sent to the workers in chunks (a few
+per worker) to amortize pickling, and results come back as chunks complete.
+
+Workers are spawned (not forked: the API process runs logging and writer
+threads) when the first batch arrives, and shut down with the app.
+
+Environment:
+    SIMULATION_WORKERS     worker processes (the number of CPUs)
+    MAX_SIMULATION_BATCH   items accepted by one batch (1000)
+"""
+import asyncio
+import math
+import os
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+
+import geodesy
+
+SIMULATION_WORKERS = int(os.getenv('SIMULATION_WORKERS', '0')) or os.cpu_count() or 1
+MAX_SIMULATION_BATCH = int(os.getenv('MAX_SIMULATION_BATCH', '1000'))
+
+# Chunks per worker: enough to even out paths of different lengths
+CHUNKS_PER_WORKER = 4
+
+# Patrol square flown when a request gives no path
+_BASE_LNG, _BASE_LAT = -122.4, 37.79
+DEFAULT_PATH = [
+    [_BASE_LNG, _BASE_LAT],
+    [_BASE_LNG + 0.01, _BASE_LAT],
+    [_BASE_LNG + 0.01, _BASE_LAT + 0.01],
+    [_BASE_LNG, _BASE_LAT + 0.01],
+    [_BASE_LNG, _BASE_LAT],
+]
+
+def simulate(path: Optional[Sequence[Sequence[float]]]) -> dict:
+    """Speed, ETA, great-circle distance and mock telemetry for a path
+
+    Raises ValueError if the path isn't [lng, lat] points.
+    """
+    points = geodesy.as_points(path or DEFAULT_PATH)
+    # Own generator: forked or not, workers must not share a seed
+    rng = random.Random()
+    distance = geodesy.path_length_m(points)
+    speed_mps = rng.uniform(10, 15)  # 10-15 m/s
+    return {
+        'speed_mps': round(speed_mps, 2),
+        'eta_seconds': int(distance / speed_mps),
+        'distance_m': round(distance, 2),
+        'telemetry': {
+            'battery_level': float(rng.randint(60, 100)),
+            'altitude_m': rng.uniform(50, 150),
+            # Heading of the first leg
+            'heading_deg': float(geodesy.bearings_deg(points)[0]) if len(points) > 1 else rng.uniform(0, 360),
+            'signal_strength': float(rng.randint(70, 100)),
+        },
+    }
+
+# (key, result, error): exactly one of result and error is set
+Outcome = Tuple[int, Optional[dict], Optional[str]]
+
+def simulate_chunk(items: Sequence[Tuple[int, Optional[list]]]) -> List[Outcome]:
+    """Run simulate() over (key, path) pairs; runs in a worker process"""
+    outcomes = []
+    for key, path in items:
+        try:
+            outcomes.append((key, simulate(path), None))
+        except ValueError:
+            outcomes.append((key, None, "path must be a list of [lng, lat] points"))
+    return outcomes
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def simulation_pool() -> ProcessPoolExecutor:
+    """The shared worker pool, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=SIMULATION_WORKERS, mp_context=get_context('spawn'))
+        return _pool
+
+def shutdown_pool() -> None:
+    """Stop the worker processes (the next batch starts new ones)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+async def simulate_many(items: Sequence[Tuple[int, Optional[list]]]) -> AsyncIterator[Outcome]:
+    """simulate_chunk over (key, path) pairs on the pool, yielding outcomes as chunks complete"""
+    if not items:
+        return
+    pool = simulation_pool()
+    size = max(1, math.ceil(len(items) / (SIMULATION_WORKERS * CHUNKS_PER_WORKER)))
+    loop = asyncio.get_running_loop()
+    pending = [loop.run_in_executor(pool, simulate_chunk, list(items[start:start + size]))
+               for start in range(0, len(items), size)]
+    try:
+        for chunk in asyncio.as_completed(pending):
+            for outcome in await chunk:
+                yield outcome
+    finally:
+        # The client went away: drop chunks no worker has started
+        for future in pending:
+            future.cancel()
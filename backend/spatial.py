@@ -0,0 +1,278 @@
+"""
+Spatial index over base locations
+
+On SQLite the index is an R*Tree virtual table (bases_rtree) keyed through
+bases_rtree_keys, kept in sync with the bases table by triggers, so every
+write (ORM, bulk or raw SQL) updates it in the same transaction. Where the
+R*Tree isn't available (Postgres, or SQLite built without it) a packed R-tree
+is built in memory from (id, lat, lng) and rebuilt whenever the bases table
+version (see etags.py) moves.
+
+Both answer bounding-box queries. Nearest-neighbour queries search a box
+around the point that grows until it holds k bases within the search radius,
+then rank the candidates by great-circle distance.
+"""
+import heapq
+import math
+import threading
+import weakref
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import column, event, inspect, select, table, text, DDL
+from sqlalchemy.orm import Session
+
+from etags import table_version
+from geodesy import EARTH_RADIUS_M, haversine_m
+from geotiles import Box
+from models import DroneBase
+
+SQLITE_RTREE_DDL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS bases_rtree USING rtree(key, min_lat, max_lat, min_lng, max_lng)',
+    'CREATE TABLE IF NOT EXISTS bases_rtree_keys (key INTEGER PRIMARY KEY, base_id VARCHAR(36) NOT NULL UNIQUE)',
+    """CREATE TRIGGER IF NOT EXISTS bases_rtree_insert AFTER INSERT ON bases BEGIN
+        INSERT INTO bases_rtree_keys (base_id) VALUES (NEW.id);
+        INSERT INTO bases_rtree VALUES (last_insert_rowid(), NEW.lat, NEW.lat, NEW.lng, NEW.lng);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS bases_rtree_update AFTER UPDATE OF id, lat, lng ON bases BEGIN
+        UPDATE bases_rtree_keys SET base_id = NEW.id WHERE base_id = OLD.id;
+        UPDATE bases_rtree SET min_lat = NEW.lat, max_lat = NEW.lat, min_lng = NEW.lng, max_lng = NEW.lng
+            WHERE key = (SELECT key FROM bases_rtree_keys WHERE base_id = NEW.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS bases_rtree_delete AFTER DELETE ON bases BEGIN
+        DELETE FROM bases_rtree WHERE key = (SELECT key FROM bases_rtree_keys WHERE base_id = OLD.id);
+        DELETE FROM bases_rtree_keys WHERE base_id = OLD.id;
+    END""",
+)
+
+# Index rows for bases that existed before the R*Tree did
+SQLITE_RTREE_FILL = (
+    'INSERT INTO bases_rtree_keys (base_id) SELECT id FROM bases '
+    'WHERE id NOT IN (SELECT base_id FROM bases_rtree_keys)',
+    'INSERT INTO bases_rtree SELECT k.key, b.lat, b.lat, b.lng, b.lng FROM bases_rtree_keys k '
+    'JOIN bases b ON b.id = k.base_id WHERE k.key NOT IN (SELECT key FROM bases_rtree)',
+)
+
+def _sqlite_has_rtree(ddl, target, bind, **kw) -> bool:
+    return 'ENABLE_RTREE' in {row[0] for row in bind.exec_driver_sql('PRAGMA compile_options')}
+
+for _statement in SQLITE_RTREE_DDL:
+    event.listen(DroneBase.__table__, 'after_create',
+                 DDL(_statement).execute_if(dialect='sqlite', callable_=_sqlite_has_rtree))
+
+_rtree = table('bases_rtree', column('key'), column('min_lat'), column('max_lat'), column('min_lng'), column('max_lng'))
+_rtree_keys = table('bases_rtree_keys', column('key'), column('base_id'))
+
+def split_bbox(west: float, south: float, east: float, north: float) -> List[Box]:
+    """Boxes covering a bbox; one crossing the antimeridian (west > east) becomes two"""
+    if west <= east:
+        return [(south, west, north, east)]
+    return [(south, west, north, 180.0), (south, -180.0, north, east)]
+
+def parse_bbox(bbox: str) -> List[Box]:
+    """?bbox=west,south,east,north in degrees (400 if malformed); west > east crosses the antimeridian"""
+    try:
+        west, south, east, north = (float(value) for value in bbox.split(','))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must be west,south,east,north"
+        )
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox is out of range"
+        )
+    return split_bbox(west, south, east, north)
+
+def radius_boxes(lat: float, lng: float, radius_m: float) -> List[Box]:
+    """Boxes covering every point within radius_m of (lat, lng)"""
+    angle = radius_m / EARTH_RADIUS_M
+    south, north = lat - math.degrees(angle), lat + math.degrees(angle)
+    if south <= -90 or north >= 90 or angle >= math.pi / 2:
+        return [(max(south, -90.0), -180.0, min(north, 90.0), 180.0)]
+    dlng = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(math.radians(lat)))))
+    west, east = lng - dlng, lng + dlng
+    if west < -180:
+        return split_bbox(west + 360, south, east, north)
+    if east > 180:
+        return split_bbox(west, south, east - 360, north)
+    return [(south, west, north, east)]
+
+class PackedRTree:
+    """Static R-tree over points, bulk-loaded with Sort-Tile-Recursive packing"""
+
+    NODE_SIZE = 16
+
+    def __init__(self, points: Sequence[Tuple[str, float, float]]):
+        # Leaf entries: (south, west, north, east, id); inner entries: (..., child list)
+        level = [(lat, lng, lat, lng, base_id) for base_id, lat, lng in points]
+        self.size = len(level)
+        while len(level) > self.NODE_SIZE:
+            level = [self._node(group) for group in self._tiles(level)]
+        self.root = level
+        node, depth = level, 0
+        while node and not isinstance(node[0][4], str):
+            node, depth = node[0][4], depth + 1
+        self._leaf_depth = depth
+
+    def _tiles(self, entries):
+        count = math.ceil(len(entries) / self.NODE_SIZE)
+        slices = math.ceil(math.sqrt(count))
+        per_slice = slices * self.NODE_SIZE
+        entries = sorted(entries, key=lambda e: e[1] + e[3])
+        for i in range(0, len(entries), per_slice):
+            vertical = sorted(entries[i:i + per_slice], key=lambda e: e[0] + e[2])
+            for j in range(0, len(vertical), self.NODE_SIZE):
+                yield vertical[j:j + self.NODE_SIZE]
+
+    @staticmethod
+    def _node(children):
+        return (min(c[0] for c in children), min(c[1] for c in children),
+                max(c[2] for c in children), max(c[3] for c in children), children)
+
+    def search(self, box: Box) -> List[str]:
+        return [point[0] for point in self.search_points(box)]
+
+    def search_points(self, box: Box) -> List[Tuple[str, float, float]]:
+        """(id, lat, lng) of the points inside box"""
+        south, west, north, east = box
+        found, stack = [], [(self.root, 0)]
+        while stack:
+            entries, depth = stack.pop()
+            for s, w, n, e, item in entries:
+                if n < south or s > north or e < west or w > east:
+                    continue
+                if depth == self._leaf_depth:
+                    found.append((item, s, w))
+                else:
+                    stack.append((item, depth + 1))
+        return found
+
+class _MemoryIndex:
+    """PackedRTree of all bases per database, rebuilt when the bases table version changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trees = weakref.WeakKeyDictionary()  # engine -> (version, tree)
+
+    def tree(self, db: Session) -> PackedRTree:
+        bind = db.get_bind()
+        version = db.execute(select(table_version('bases'))).scalar()
+        cached = self._trees.get(bind)
+        if cached is None or cached[0] != version:
+            with self._lock:
+                cached = self._trees.get(bind)
+                if cached is None or cached[0] != version:
+                    rows = db.execute(select(DroneBase.id, DroneBase.lat, DroneBase.lng)).all()
+                    cached = (version, PackedRTree([(str(base_id), lat, lng) for base_id, lat, lng in rows]))
+                    self._trees[bind] = cached
+        return cached[1]
+
+memory_index = _MemoryIndex()
+_has_rtree = weakref.WeakKeyDictionary()
+
+def uses_rtree(db: Session) -> bool:
+    """Whether the session's database has the R*Tree (looked up once per engine)"""
+    bind = db.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return False
+    if bind not in _has_rtree:
+        _has_rtree[bind] = inspect(bind).has_table('bases_rtree')
+    return _has_rtree[bind]
+
+def _in_box(box: Box):
+    south, west, north, east = box
+    return (DroneBase.lat.between(south, north), DroneBase.lng.between(west, east))
+
+def _box_query(db: Session, box: Box, limit: Optional[int]):
+    """SELECT of the bases inside box (exact bounds; the R*Tree stores float32)"""
+    if uses_rtree(db):
+        south, west, north, east = box
+        query = (
+            select(DroneBase)
+            .join(_rtree_keys, _rtree_keys.c.base_id == DroneBase.id)
+            .join(_rtree, _rtree.c.key == _rtree_keys.c.key)
+            .where(_rtree.c.max_lat >= south, _rtree.c.min_lat <= north,
+                   _rtree.c.max_lng >= west, _rtree.c.min_lng <= east)
+        )
+    else:
+        ids = memory_index.tree(db).search(box)
+        if limit is not None:
+            ids = ids[:limit]
+        query = select(DroneBase).where(DroneBase.id.in_(ids))
+    query = query.where(*_in_box(box))
+    return query.limit(limit) if limit is not None else query
+
+def bases_within(db: Session, boxes: List[Box], limit: int) -> List[DroneBase]:
+    bases = []
+    for box in boxes:
+        if len(bases) >= limit:
+            break
+        bases += db.execute(_box_query(db, box, limit - len(bases))).scalars().all()
+    return bases
+
+_RTREE_POINTS = text(
+    'SELECT b.id, b.lat, b.lng FROM bases_rtree r '
+    'JOIN bases_rtree_keys k ON k.key = r.key JOIN bases b ON b.id = k.base_id '
+    'WHERE r.max_lat >= :south AND r.min_lat <= :north AND r.max_lng >= :west AND r.min_lng <= :east'
+)
+
+def _box_points(db: Session, box: Box) -> List[Tuple[str, float, float]]:
+    """(id, lat, lng) of the bases inside box, without loading them"""
+    if not uses_rtree(db):
+        return memory_index.tree(db).search_points(box)
+    south, west, north, east = box
+    # Plain SQL on the connection: this runs a few times per lookup
+    return db.connection().execute(_RTREE_POINTS, {'south': south, 'west': west, 'north': north, 'east': east}).all()
+
+def _start_radius(db: Session, k: int) -> float:
+    """Radius expected to hold about 2k bases if they were spread evenly"""
+    if uses_rtree(db):
+        count = db.connection().execute(text('SELECT max(key) FROM bases_rtree_keys')).scalar() or 0
+    else:
+        count = memory_index.tree(db).size
+    if not count:
+        return math.pi * EARTH_RADIUS_M
+    return EARTH_RADIUS_M * math.sqrt(8 * k / count)
+
+def nearest(db: Session, lat: float, lng: float, k: int,
+            radius_m: Optional[float] = None) -> List[Tuple[float, str]]:
+    """(distance in meters, id) of the k bases closest to (lat, lng), nearest first"""
+    radius_m = min(radius_m or _start_radius(db, k), math.pi * EARTH_RADIUS_M)
+    while True:
+        candidates = {}
+        for box in radius_boxes(lat, lng, radius_m):
+            for base_id, base_lat, base_lng in _box_points(db, box):
+                candidates[base_id] = haversine_m(lat, lng, base_lat, base_lng)
+        ranked = heapq.nsmallest(k, ((distance, base_id) for base_id, distance in candidates.items()))
+        # Done once the k-th candidate is inside the searched circle (anything
+        # nearer would have been in the box) or the whole globe was searched
+        if (len(ranked) == k and ranked[-1][0] <= radius_m) or radius_m >= math.pi * EARTH_RADIUS_M:
+            break
+        radius_m = min(radius_m * 4, math.pi * EARTH_RADIUS_M)
+    return ranked
+
+def bases_near(db: Session, lat: float, lng: float, k: int) -> List[Tuple[DroneBase, float]]:
+    """The k bases closest to (lat, lng) with their distances in meters, nearest first"""
+    ranked = nearest(db, lat, lng, k)
+    bases = {base.id: base for base in db.execute(
+        select(DroneBase).where(DroneBase.id.in_([base_id for _, base_id in ranked]))
+    ).scalars()}
+    return [(bases[base_id], distance) for distance, base_id in ranked if base_id in bases]
+
+def install_rtree(conn) -> bool:
+    """Create the SQLite R*Tree, its triggers and its rows for existing bases"""
+    if conn.dialect.name != 'sqlite' or not _sqlite_has_rtree(None, None, conn):
+        return False
+    for statement in SQLITE_RTREE_DDL + SQLITE_RTREE_FILL:
+        conn.execute(text(statement))
+    return True
+
+def drop_rtree(conn) -> None:
+    if conn.dialect.name != 'sqlite':
+        return
+    for name in ('bases_rtree_insert', 'bases_rtree_update', 'bases_rtree_delete'):
+        conn.execute(text(f'DROP TRIGGER IF EXISTS {name}'))
+    conn.execute(text('DROP TABLE IF EXISTS bases_rtree_keys'))
+    conn.execute(text('DROP TABLE IF EXISTS bases_rtree'))
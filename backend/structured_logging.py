@@ -0,0 +1,177 @@
+"""
+Structured, non-blocking logging for the API
+
+Request handlers log through category loggers (`drone_api.<category>`). Records
+are pushed onto a bounded in-memory queue and a background listener thread does
+the JSON formatting and terminal I/O, so handlers never wait on stdout. When the
+queue is full, records are dropped and counted instead of blocking the caller.
+
+Environment:
+    LOG_LEVEL            default level for every category (INFO)
+    LOG_CATEGORY_LEVELS  per-category overrides, e.g. "auth=WARNING,schedules=DEBUG"
+    LOG_MAX_FIELD_CHARS  size cap applied to each structured field (512)
+    LOG_QUEUE_SIZE       records buffered before new ones are dropped (10000)
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import date, datetime, time as dt_time, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+ROOT_LOGGER = 'drone_api'
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_CATEGORY_LEVELS = os.getenv('LOG_CATEGORY_LEVELS', '')
+LOG_MAX_FIELD_CHARS = int(os.getenv('LOG_MAX_FIELD_CHARS', '512'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+def _plain(value: Any) -> Any:
+    """The JSON form of a value json can't encode: ISO 8601 for dates, else str()"""
+    if isinstance(value, (date, datetime, dt_time)):
+        return value.isoformat()
+    return str(value)
+
+def truncate(value: Any, limit: int = LOG_MAX_FIELD_CHARS) -> Any:
+    """Cap a field's serialized size
+
+    Numbers pass through, and dicts and lists stay structured while their JSON
+    fits the limit; longer ones become that JSON, truncated. Anything else is
+    rendered as text (see _plain) and truncated.
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (dict, list, tuple)):
+        try:
+            encoded = json.dumps(value, default=_plain, ensure_ascii=False)
+        except (TypeError, ValueError):
+            encoded = repr(value)
+        else:
+            if len(encoded) <= limit:
+                return value
+        value = encoded
+    elif not isinstance(value, str):
+        value = _plain(value)
+    if len(value) > limit:
+        return f"{value[:limit]}...(+{len(value) - limit} chars)"
+    return value
+
+class JsonFormatter(logging.Formatter):
+    """Render a record and its structured fields as one JSON line"""
+
+    def __init__(self, max_field_chars: int = LOG_MAX_FIELD_CHARS):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'category': record.name.split('.', 1)[-1],
+            'msg': record.getMessage(),
+        }
+        for key, value in getattr(record, 'fields', {}).items():
+            entry[key] = truncate(value, self.max_field_chars)
+        if record.exc_info:
+            entry['exc'] = truncate(self.formatException(record.exc_info), self.max_field_chars * 8)
+        return json.dumps(entry, default=_plain, ensure_ascii=False)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks and defers formatting to the listener"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default implementation formats in the calling thread; the
+        # listener's formatter does that work instead
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_atexit_registered = False
+
+def parse_category_levels(spec: str) -> Dict[str, int]:
+    """Parse "auth=WARNING,schedules=DEBUG" into {category: level}"""
+    levels = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        category, level = (part.strip() for part in item.split('=', 1))
+        if category and level:
+            levels[category] = logging.getLevelName(level.upper())
+    return levels
+
+def configure_logging(stream=None) -> None:
+    """Install the queue handler and start the listener thread (idempotent)"""
+    global _listener, _queue_handler, _atexit_registered
+    with _lock:
+        if _listener is not None:
+            return
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        _listener = QueueListener(log_queue, output, respect_handler_level=False)
+        _listener.start()
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_queue_handler)
+        root.propagate = False
+        if not any(isinstance(h, logging.NullHandler) for h in root.handlers):
+            # Keeps records from reaching logging.lastResort after shutdown
+            root.addHandler(logging.NullHandler())
+        for category, level in parse_category_levels(LOG_CATEGORY_LEVELS).items():
+            logging.getLogger(f'{ROOT_LOGGER}.{category}').setLevel(level)
+
+        if not _atexit_registered:
+            atexit.register(shutdown_logging)
+            _atexit_registered = True
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        logging.getLogger(ROOT_LOGGER).removeHandler(_queue_handler)
+        _listener = None
+        _queue_handler = None
+
+def dropped_records() -> int:
+    """Number of records dropped because the queue was full"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+def get_logger(category: str) -> logging.Logger:
+    """Return the logger for a category (e.g. "auth", "schedules")"""
+    return logging.getLogger(f'{ROOT_LOGGER}.{category}')
+
+def log_event(logger: logging.Logger, level: int, msg: str, sample: float = 1.0,
+              exc_info: bool = False, **fields: Any) -> None:
+    """Log a message with structured fields
+
+    Disabled levels return before any work is done. `sample` keeps roughly
+    that fraction of calls, for messages emitted at high volume.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sample < 1.0 and random.random() >= sample:
+        return
+    if sample < 1.0:
+        fields['sample'] = sample
+    logger.log(level, msg, exc_info=exc_info, extra={'fields': fields})
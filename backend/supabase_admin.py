@@ -0,0 +1,243 @@
+"""
+Async Supabase Admin API client and a cached user directory
+
+The admin routes used to make a blocking requests call per API hit. This module
+keeps one pooled httpx.AsyncClient for the process and serves GET /admin/users
+from an in-memory directory that is refreshed a few pages at a time in the
+background.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+import httpx
+
+from structured_logging import get_logger, log_event
+
+logger = get_logger('admin')
+
+SUPABASE_URL = os.getenv('SUPABASE_PROJECT_URL', '')
+SUPABASE_SERVICE_ROLE = os.getenv('SUPABASE_SERVICE_ROLE', '')
+
+SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', '10'))
+SUPABASE_MAX_CONNECTIONS = int(os.getenv('SUPABASE_MAX_CONNECTIONS', '20'))
+SUPABASE_USERS_PER_PAGE = int(os.getenv('SUPABASE_USERS_PER_PAGE', '100'))
+USER_DIRECTORY_TTL = float(os.getenv('USER_DIRECTORY_TTL', '60'))
+USER_DIRECTORY_REFRESH_PAGES = int(os.getenv('USER_DIRECTORY_REFRESH_PAGES', '1'))
+
+class SupabaseAdminError(Exception):
+    """Raised when the Supabase Admin API returns an unexpected response"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+def format_user(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a Supabase user record to the fields served by the API"""
+    return {
+        'id': user.get('id'),
+        'email': user.get('email'),
+        'role': (user.get('user_metadata') or {}).get('role', 'user'),
+        'created_at': user.get('created_at'),
+    }
+
+class SupabaseAdminClient:
+    """Thin async wrapper around the Supabase Admin API with a keep-alive pool"""
+
+    def __init__(
+        self,
+        base_url: str = SUPABASE_URL,
+        service_role: str = SUPABASE_SERVICE_ROLE,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        timeout: float = SUPABASE_TIMEOUT,
+        max_connections: int = SUPABASE_MAX_CONNECTIONS,
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.service_role = service_role
+        self._transport = transport
+        self._timeout = timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.service_role)
+
+    def _client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the running event loop
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    'apikey': self.service_role,
+                    'Authorization': f'Bearer {self.service_role}',
+                },
+                timeout=self._timeout,
+                limits=self._limits,
+                transport=self._transport,
+            )
+        return self._http
+
+    async def list_users_page(self, page: int, per_page: int = SUPABASE_USERS_PER_PAGE) -> List[Dict[str, Any]]:
+        """Fetch one page of users"""
+        response = await self._client().get(
+            '/auth/v1/admin/users',
+            params={'page': page, 'per_page': per_page},
+        )
+        if response.status_code != 200:
+            raise SupabaseAdminError("Failed to fetch users from Supabase", response.status_code)
+        return response.json().get('users', [])
+
+    async def update_user_role(self, user_id: str, role: str) -> Dict[str, Any]:
+        """Set user_metadata.role for a single user and return the updated record"""
+        # Only a UUID goes into the path of a service-role request: anything
+        # else could carry ../ segments to another admin endpoint
+        try:
+            user_id = str(UUID(str(user_id)))
+        except ValueError:
+            raise SupabaseAdminError("Invalid user id", 400)
+        response = await self._client().put(
+            f'/auth/v1/admin/users/{user_id}',
+            json={'user_metadata': {'role': role}},
+        )
+        if response.status_code != 200:
+            raise SupabaseAdminError("Failed to update user role", response.status_code)
+        return response.json()
+
+    async def aclose(self) -> None:
+        """Close the connection pool"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+class UserDirectory:
+    """Local cache of the Supabase user list
+
+    The first read loads every page; afterwards reads are served from memory
+    and a stale directory is refreshed in the background (stale-while-
+    revalidate). A refresh fetches only the next `refresh_pages` pages and
+    merges them in, so each TTL costs a page or two rather than the whole
+    user list; users missing from a completed sweep of the pages are dropped.
+    Role updates made through this process patch the cache directly so admins
+    see their own changes immediately, and the patch wins over any page
+    requested before it was made.
+    """
+
+    def __init__(self, client: SupabaseAdminClient, ttl: float = USER_DIRECTORY_TTL,
+                 per_page: int = SUPABASE_USERS_PER_PAGE,
+                 refresh_pages: int = USER_DIRECTORY_REFRESH_PAGES):
+        self.client = client
+        self.ttl = ttl
+        self.per_page = per_page
+        self.refresh_pages = refresh_pages
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Position in the current sweep and the users it has seen so far
+        self._next_page = 1
+        self._seen: Set[str] = set()
+        # user id -> (role, when it was applied)
+        self._patches: Dict[str, Tuple[str, float]] = {}
+        self._generation = 0
+
+    @property
+    def stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    async def load(self) -> None:
+        """Load every page, starting a new sweep"""
+        await self._fetch(None)
+
+    async def refresh(self) -> None:
+        """Fetch the next pages of the current sweep and merge them in"""
+        await self._fetch(self.refresh_pages)
+
+    async def _fetch(self, max_pages: Optional[int]) -> None:
+        generation = self._generation
+        if max_pages is None or self._next_page == 1:
+            self._next_page, self._seen = 1, set()
+        fetched = 0
+        while max_pages is None or fetched < max_pages:
+            requested_at = time.monotonic()
+            batch = await self.client.list_users_page(self._next_page, self.per_page)
+            if generation != self._generation:
+                # Invalidated while the page was in flight
+                return
+            for user in batch:
+                self._merge(format_user(user), requested_at)
+            fetched += 1
+            if len(batch) < self.per_page:
+                # End of the sweep: anyone it didn't see has been deleted
+                for user_id in self._users.keys() - self._seen:
+                    del self._users[user_id]
+                self._next_page, self._seen = 1, set()
+                break
+            self._next_page += 1
+        self._loaded_at = time.monotonic()
+
+    def _merge(self, user: Dict[str, Any], requested_at: float) -> None:
+        self._seen.add(user['id'])
+        patch = self._patches.get(user['id'])
+        if patch is not None:
+            role, applied_at = patch
+            if applied_at >= requested_at:
+                user = {**user, 'role': role}
+            else:
+                # The page already reflects the update
+                del self._patches[user['id']]
+        self._users[user['id']] = user
+
+    def _refresh_in_background(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._safe_refresh())
+
+    async def _safe_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            # Keep serving the previous snapshot; the next stale read retries
+            log_event(logger, logging.WARNING, "User directory refresh failed",
+                      page=self._next_page, status_code=getattr(e, 'status_code', None), error=str(e))
+
+    async def list_users(self) -> List[Dict[str, Any]]:
+        """Return every cached user, loading or refreshing as needed"""
+        if self._loaded_at is None:
+            # Concurrent cold reads share one load and all see its error
+            while self._loaded_at is None:
+                if self._refresh_task is None or self._refresh_task.done():
+                    self._refresh_task = asyncio.create_task(self.load())
+                await asyncio.shield(self._refresh_task)
+        elif self.stale:
+            self._refresh_in_background()
+        return list(self._users.values())
+
+    def apply_role(self, user_id: str, role: str) -> None:
+        """Patch a cached user's role after a successful update"""
+        self._patches[user_id] = (role, time.monotonic())
+        user = self._users.get(user_id)
+        if user is not None:
+            self._users[user_id] = {**user, 'role': role}
+
+    def invalidate(self) -> None:
+        """Force the next read to reload the directory"""
+        self._generation += 1
+        self._users = {}
+        self._loaded_at = None
+        self._next_page, self._seen = 1, set()
+
+admin_client = SupabaseAdminClient()
+user_directory = UserDirectory(admin_client)
+
+def get_supabase_admin() -> SupabaseAdminClient:
+    """Dependency returning the shared Supabase admin client"""
+    return admin_client
+
+def get_user_directory() -> UserDirectory:
+    """Dependency returning the shared user directory"""
+    return user_directory
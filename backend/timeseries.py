@@ -0,0 +1,452 @@
+"""
+Append-only telemetry history on disk
+
+Ingested telemetry (see ingest.py) is also appended to a store of segment
+files, one per drone per time window, which GET /drones/{id}/telemetry reads
+without touching the database. A segment is a 16-byte header (magic,
+capacity, row count) followed by one fixed-width block per column, each
+`capacity` values long:
+
+    <root>/<resolution>/<drone id>/<window start>.seg
+
+Reads memory-map the file and take NumPy views of the columns, so a range
+query is a binary search on the ts column and slices of the others; only
+ranges spanning several segments are copied (concatenated). Appends write
+each column's new values at the end of its block and then bump the row
+count, so a reader sees either the old rows or all the new ones. A full
+segment, or a late sample older than the segment's last, rewrites the file
+(to a temporary file, then renamed over it: open maps keep the old one).
+
+A background job rolls raw samples up into 1s buckets, 1s into 1m and 1m into
+1h: sample count, last position and heading, and min/mean/max of altitude,
+battery and signal. Buckets are rolled up once they are
+TELEMETRY_ROLLUP_LAG_SECONDS old; samples arriving later than that reach the
+raw segments but not the rollups. The same job deletes segments past their
+resolution's retention.
+
+Appends and rewrites take an exclusive flock on the segment (where fcntl
+exists), and rolling up a drone's level takes one on <root>/locks/<resolution>/
+<drone id>.lock, so several API worker processes can share a store.
+
+Environment:
+    TELEMETRY_STORE_DIR            store location (./telemetry_store; empty disables the store)
+    TELEMETRY_SEGMENT_SECONDS      time window of one raw segment (3600)
+    TELEMETRY_ROLLUP_SECONDS       time between rollup and retention runs (60; 0: no job)
+    TELEMETRY_ROLLUP_LAG_SECONDS   age at which a bucket is final (10)
+    TELEMETRY_RETENTION_RAW_DAYS   days of raw samples kept (7; 0 keeps everything)
+    TELEMETRY_RETENTION_1S_DAYS    days of 1s rollups kept (30)
+    TELEMETRY_RETENTION_1M_DAYS    days of 1m rollups kept (365)
+    TELEMETRY_RETENTION_1H_DAYS    days of 1h rollups kept (0)
+"""
+import logging
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from structured_logging import get_logger, log_event
+
+try:
+    import fcntl
+except ImportError:  # Windows: one writer process per store
+    fcntl = None
+
+TELEMETRY_STORE_DIR = os.getenv('TELEMETRY_STORE_DIR', './telemetry_store')
+TELEMETRY_SEGMENT_SECONDS = int(os.getenv('TELEMETRY_SEGMENT_SECONDS', '3600'))
+TELEMETRY_ROLLUP_SECONDS = float(os.getenv('TELEMETRY_ROLLUP_SECONDS', '60'))
+TELEMETRY_ROLLUP_LAG_SECONDS = float(os.getenv('TELEMETRY_ROLLUP_LAG_SECONDS', '10'))
+
+DAY = 86400
+
+logger = get_logger('telemetry')
+
+class Schema:
+    """Columns of a segment file: names and fixed-width dtypes, ts first"""
+
+    def __init__(self, columns: Sequence[Tuple[str, str]]):
+        self.columns = [(name, np.dtype(dtype)) for name, dtype in columns]
+        self.names = [name for name, _ in self.columns]
+        self.row_size = sum(dtype.itemsize for _, dtype in self.columns)
+
+    def offsets(self, capacity: int) -> Dict[str, int]:
+        """Byte offset of each column's block in a segment of `capacity` rows"""
+        offsets, position = {}, HEADER.size
+        for name, dtype in self.columns:
+            offsets[name] = position
+            position += capacity * dtype.itemsize
+        return offsets
+
+    def file_size(self, capacity: int) -> int:
+        return HEADER.size + capacity * self.row_size
+
+RAW = Schema((
+    ('ts', '<f8'), ('lng', '<f8'), ('lat', '<f8'),
+    ('altitude_m', '<f4'), ('heading_deg', '<f4'), ('battery_level', '<f4'), ('signal_strength', '<f4'),
+))
+ROLLUP = Schema((
+    ('ts', '<f8'), ('count', '<u4'), ('lng', '<f8'), ('lat', '<f8'), ('heading_deg', '<f4'),
+    ('altitude_min', '<f4'), ('altitude_mean', '<f4'), ('altitude_max', '<f4'),
+    ('battery_min', '<f4'), ('battery_mean', '<f4'), ('battery_max', '<f4'),
+    ('signal_min', '<f4'), ('signal_mean', '<f4'), ('signal_max', '<f4'),
+))
+# Raw reading -> rollup column prefix
+ROLLED_UP = (('altitude_m', 'altitude'), ('battery_level', 'battery'), ('signal_strength', 'signal'))
+
+class Resolution:
+    """One level of the store: its bucket size, the level it is rolled up from, segment span and retention"""
+
+    def __init__(self, name: str, bucket: int, source: Optional[str], span: int, retention_days: float):
+        self.name = name
+        self.bucket = bucket
+        self.source = source
+        self.schema = RAW if source is None else ROLLUP
+        self.span = span
+        self.retention = retention_days * DAY
+
+    def floor(self, ts: float) -> float:
+        """Start of the bucket holding ts (ts itself for raw samples)"""
+        return float(np.floor(ts / self.bucket) * self.bucket) if self.bucket else ts
+
+def _retention(name: str, default: str) -> float:
+    return float(os.getenv(f'TELEMETRY_RETENTION_{name}_DAYS', default))
+
+RESOLUTIONS = {
+    resolution.name: resolution for resolution in (
+        Resolution('raw', 0, None, TELEMETRY_SEGMENT_SECONDS, _retention('RAW', '7')),
+        Resolution('1s', 1, 'raw', DAY, _retention('1S', '30')),
+        Resolution('1m', 60, '1s', 30 * DAY, _retention('1M', '365')),
+        Resolution('1h', 3600, '1m', 366 * DAY, _retention('1H', '0')),
+    )
+}
+
+@contextmanager
+def _flock(path: str):
+    """Hold an exclusive flock on a lock file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+# magic, capacity, rows
+HEADER = struct.Struct('<4sII4x')
+MAGIC = b'TSG1'
+INITIAL_CAPACITY = 1024
+
+class Segment:
+    """One segment file"""
+
+    def __init__(self, path: str, schema: Schema):
+        self.path = path
+        self.schema = schema
+
+    def _locked(self):
+        return _flock(self.path + '.lock')
+
+    def _map(self) -> Tuple[np.memmap, int, int]:
+        """A read-only map of the file, its capacity and row count"""
+        data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        magic, capacity, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a telemetry segment")
+        return data, capacity, count
+
+    def read(self) -> Dict[str, np.ndarray]:
+        """Read-only views of the columns over a memory map of the file"""
+        data, capacity, count = self._map()
+        offsets = self.schema.offsets(capacity)
+        return {name: data[offsets[name]:offsets[name] + count * dtype.itemsize].view(dtype)
+                for name, dtype in self.schema.columns}
+
+    def append(self, columns: Dict[str, np.ndarray]) -> None:
+        """Add rows (sorted by ts) to the segment, creating it if needed"""
+        with self._locked():
+            if not os.path.exists(self.path):
+                self._rewrite(columns)
+                return
+            _, capacity, count = self._map()
+            existing = self.read()
+            added = len(columns['ts'])
+            if count and columns['ts'][0] < existing['ts'][-1]:
+                # Late rows: merge them in order
+                merged = {name: np.concatenate((existing[name], columns[name].astype(dtype)))
+                          for name, dtype in self.schema.columns}
+                order = np.argsort(merged['ts'], kind='stable')
+                self._rewrite({name: values[order] for name, values in merged.items()})
+            elif count + added > capacity:
+                self._rewrite({name: np.concatenate((existing[name], columns[name].astype(dtype)))
+                               for name, dtype in self.schema.columns})
+            else:
+                offsets = self.schema.offsets(capacity)
+                with open(self.path, 'r+b') as f:
+                    for name, dtype in self.schema.columns:
+                        f.seek(offsets[name] + count * dtype.itemsize)
+                        f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+                    f.flush()
+                    # The new rows become visible with the count
+                    f.seek(0)
+                    f.write(HEADER.pack(MAGIC, capacity, count + added))
+
+    def _rewrite(self, columns: Dict[str, np.ndarray]) -> None:
+        count = len(columns['ts'])
+        capacity = max(INITIAL_CAPACITY, 1 << (count - 1).bit_length())
+        offsets = self.schema.offsets(capacity)
+        temporary = f'{self.path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            # Blocks are written sparse: unused capacity takes no disk space
+            f.truncate(self.schema.file_size(capacity))
+            f.write(HEADER.pack(MAGIC, capacity, count))
+            for name, dtype in self.schema.columns:
+                f.seek(offsets[name])
+                f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        os.replace(temporary, self.path)
+
+def _bucket_starts(ts: np.ndarray, bucket: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Each bucket's start time and the index of its first row (ts sorted)"""
+    buckets = np.floor(ts / bucket) * bucket
+    first = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    return buckets[first], first
+
+def _mean(sums: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    return np.divide(sums, weights, out=np.full(len(sums), np.nan), where=weights > 0)
+
+def roll_up(source: Dict[str, np.ndarray], bucket: int, from_raw: bool) -> Dict[str, np.ndarray]:
+    """Aggregate sorted rows (raw samples or finer rollups) into buckets"""
+    starts, first = _bucket_starts(source['ts'], bucket)
+    last = np.r_[first[1:], len(source['ts'])] - 1
+    counts = np.ones(len(source['ts'])) if from_raw else source['count'].astype(np.float64)
+    rolled = {
+        'ts': starts,
+        'count': np.add.reduceat(counts, first),
+        'lng': source['lng'][last],
+        'lat': source['lat'][last],
+        'heading_deg': source['heading_deg'][last],
+    }
+    for raw_name, prefix in ROLLED_UP:
+        if from_raw:
+            low = high = values = source[raw_name].astype(np.float64)
+            weights = counts * ~np.isnan(values)
+        else:
+            low, high = source[f'{prefix}_min'], source[f'{prefix}_max']
+            values = source[f'{prefix}_mean'].astype(np.float64)
+            weights = counts * ~np.isnan(values)
+        # fmin/fmax skip NaN (missing readings) unless a whole bucket is NaN
+        rolled[f'{prefix}_min'] = np.fmin.reduceat(low, first)
+        rolled[f'{prefix}_max'] = np.fmax.reduceat(high, first)
+        rolled[f'{prefix}_mean'] = _mean(np.add.reduceat(np.nan_to_num(values) * weights, first),
+                                         np.add.reduceat(weights, first))
+    return rolled
+
+class TelemetryStore:
+    """Segments of every drone, at every resolution, under one directory"""
+
+    def __init__(self, root: str, resolutions: Dict[str, Resolution] = RESOLUTIONS):
+        self.root = root
+        self.resolutions = resolutions
+
+    def _drone_dir(self, resolution: str, drone_id: str) -> str:
+        # Ids become directory names: escape anything but [A-Za-z0-9_.~-]
+        return os.path.join(self.root, resolution, quote(drone_id, safe=''))
+
+    def _segment(self, resolution: Resolution, drone_id: str, window: int) -> Segment:
+        return Segment(os.path.join(self._drone_dir(resolution.name, drone_id), f'{window}.seg'), resolution.schema)
+
+    def _windows(self, resolution: Resolution, drone_id: str) -> List[int]:
+        try:
+            names = os.listdir(self._drone_dir(resolution.name, drone_id))
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-4]) for name in names if name.endswith('.seg'))
+
+    def drones(self, resolution: str = 'raw') -> List[str]:
+        try:
+            return [unquote(name) for name in os.listdir(os.path.join(self.root, resolution))]
+        except FileNotFoundError:
+            return []
+
+    def append(self, resolution: str, drone_id: str, columns: Dict[str, np.ndarray]) -> None:
+        """Add one drone's rows, split over the segments of their windows"""
+        level = self.resolutions[resolution]
+        order = np.argsort(columns['ts'], kind='stable')
+        columns = {name: np.asarray(values)[order] for name, values in columns.items()}
+        windows = (columns['ts'] // level.span).astype(np.int64) * level.span
+        _, first = np.unique(windows, return_index=True)
+        for start, end in zip(first, np.r_[first[1:], len(windows)]):
+            self._segment(level, drone_id, int(windows[start])).append(
+                {name: values[start:end] for name, values in columns.items()})
+
+    def append_samples(self, rows: Sequence[tuple]) -> None:
+        """Add ingest rows: (drone_id, ts, lng, lat, altitude_m, heading_deg, battery_level, signal_strength)"""
+        if not rows:
+            return
+        drone_ids = np.array([row[0] for row in rows], dtype=object)
+        values = np.array([row[1:] for row in rows], dtype=np.float64)
+        for drone_id in np.unique(drone_ids):
+            mine = values[drone_ids == drone_id]
+            self.append('raw', drone_id, {name: mine[:, i] for i, name in enumerate(RAW.names)})
+
+    def query(self, drone_id: str, start: float, end: float, resolution: str = 'raw',
+              limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Rows with start <= ts < end, oldest first (at most `limit`)
+
+        A rollup row is included when its bucket overlaps the range. Within one
+        segment the columns are views of its memory map.
+        """
+        level = self.resolutions[resolution]
+        start = level.floor(start)
+        parts = []
+        remaining = limit
+        for window in self._windows(level, drone_id):
+            if window + level.span <= start or window >= end:
+                continue
+            try:
+                columns = self._segment(level, drone_id, window).read()
+            except FileNotFoundError:  # removed by retention meanwhile
+                continue
+            low, high = np.searchsorted(columns['ts'], (start, end), side='left')
+            if remaining is not None:
+                high = min(high, low + remaining)
+                remaining -= high - low
+            if high > low:
+                parts.append({name: values[low:high] for name, values in columns.items()})
+            if remaining == 0:
+                break
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return {name: np.empty(0, dtype) for name, dtype in level.schema.columns}
+        return {name: np.concatenate([part[name] for part in parts]) for name in level.schema.names}
+
+    def count(self, drone_id: str, start: float, end: float, resolution: str = 'raw') -> int:
+        """Rows query() would return without a limit (binary searches only)"""
+        level = self.resolutions[resolution]
+        start = level.floor(start)
+        total = 0
+        for window in self._windows(level, drone_id):
+            if window + level.span <= start or window >= end:
+                continue
+            try:
+                ts = self._segment(level, drone_id, window).read()['ts']
+            except FileNotFoundError:
+                continue
+            low, high = np.searchsorted(ts, (start, end), side='left')
+            total += int(high - low)
+        return total
+
+    def roll_up(self, now: float) -> int:
+        """Bring every drone's rollups up to the buckets finished by now; rows written"""
+        written = 0
+        for level in self.resolutions.values():
+            if level.source is None:
+                continue
+            source = self.resolutions[level.source]
+            until = level.floor(now - TELEMETRY_ROLLUP_LAG_SECONDS)
+            for drone_id in self.drones(source.name):
+                # Another worker rolling up the same drone would read the
+                # same last bucket and append the same rows
+                with _flock(self._rollup_lock(level, drone_id)):
+                    rolled = self._last_ts(level, drone_id)
+                    since = rolled + level.bucket if rolled is not None else 0.0
+                    if since >= until:
+                        continue
+                    rows = self.query(drone_id, since, until, source.name)
+                    if len(rows['ts']):
+                        rollup = roll_up(rows, level.bucket, from_raw=source.source is None)
+                        self.append(level.name, drone_id, rollup)
+                        written += len(rollup['ts'])
+        return written
+
+    def _rollup_lock(self, level: Resolution, drone_id: str) -> str:
+        # Outside the resolution directories, which hold only drone directories
+        return os.path.join(self.root, 'locks', level.name, quote(drone_id, safe='') + '.lock')
+
+    def _last_ts(self, level: Resolution, drone_id: str) -> Optional[float]:
+        for window in reversed(self._windows(level, drone_id)):
+            ts = self._segment(level, drone_id, window).read()['ts']
+            if len(ts):
+                return float(ts[-1])
+        return None
+
+    def enforce_retention(self, now: float) -> int:
+        """Delete segments older than their resolution keeps; segments removed"""
+        removed = 0
+        for level in self.resolutions.values():
+            if level.retention <= 0:
+                continue
+            for drone_id in self.drones(level.name):
+                directory = self._drone_dir(level.name, drone_id)
+                for window in self._windows(level, drone_id):
+                    if window + level.span > now - level.retention:
+                        break
+                    segment = self._segment(level, drone_id, window)
+                    with segment._locked():
+                        os.remove(segment.path)
+                    os.remove(segment.path + '.lock')
+                    removed += 1
+                if not os.listdir(directory):
+                    os.rmdir(directory)
+        return removed
+
+    def maintain(self, now: float) -> None:
+        rolled = self.roll_up(now)
+        removed = self.enforce_retention(now)
+        if rolled or removed:
+            log_event(logger, logging.DEBUG, "Telemetry store maintained", rollup_rows=rolled, segments_removed=removed)
+
+_store: Optional[TelemetryStore] = None
+_store_lock = threading.Lock()
+
+def default_store() -> Optional[TelemetryStore]:
+    """The store at TELEMETRY_STORE_DIR (None when the store is disabled)"""
+    global _store
+    with _store_lock:
+        if _store is None and TELEMETRY_STORE_DIR:
+            _store = TelemetryStore(TELEMETRY_STORE_DIR)
+        return _store
+
+class MaintenanceJob:
+    """Thread running TelemetryStore.maintain() every TELEMETRY_ROLLUP_SECONDS"""
+
+    def __init__(self, store: TelemetryStore, interval: float = TELEMETRY_ROLLUP_SECONDS):
+        self.store = store
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='telemetry-rollups', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.store.maintain(time.time())
+            except Exception as e:
+                log_event(logger, logging.ERROR, "Telemetry rollup failed", exc_info=True, error_type=type(e).__name__)
+
+_job: Optional[MaintenanceJob] = None
+
+def start_maintenance() -> None:
+    global _job
+    store = default_store()
+    if store is not None and TELEMETRY_ROLLUP_SECONDS > 0 and _job is None:
+        _job = MaintenanceJob(store)
+        _job.start()
+
+def stop_maintenance() -> None:
+    global _job
+    job, _job = _job, None
+    if job is not None:
+        job.stop()
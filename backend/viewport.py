@@ -0,0 +1,278 @@
+"""
+Map viewport queries over geohash tiles
+
+Bases, and drones at their last known position, carry the geohash of where
+they are (kept current by models.py). GET /map/viewport covers the requested
+bbox with geohash tiles whose precision follows the zoom level, capped at
+MAX_VIEWPORT_TILES tiles, and reads them with prefix range scans on
+idx_base_geohash / idx_drone_geohash (geohash >= tile AND geohash < tile||'~').
+A tile holding more than MAP_TILE_LIMIT entities of a kind comes back as one
+cluster (count and centroid) instead, so a response holds at most
+tiles x limit entities whatever the size of the fleet.
+
+Tile contents are cached per database (and per owner, for drones) and
+invalidated per tile, not per table: tile_versions keeps a change counter per
+kind and precision-4 cell (about 39 x 20 km), bumped in the same transaction
+as every ORM write that adds, changes, moves or removes an entity there (a
+move bumps both its old and new cell). A request reads the counters of its
+tiles with one grouped query, which also makes its ETag, and refetches only the
+tiles whose counter moved. Bulk statements (routes/batch.py) don't say where
+their rows are, so they bump the kind's wildcard counter, which every tile of
+that kind includes.
+
+Environment:
+    MAP_TILE_LIMIT       entities of a kind per tile before it is clustered (200)
+    MAP_TILE_CACHE_SIZE  tiles cached per database (4096)
+"""
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, event, func, inspect, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import geotiles
+from geotiles import Box, RANGE_END
+from models import Drone, DroneBase, TileVersion
+
+MAP_TILE_LIMIT = int(os.getenv('MAP_TILE_LIMIT', '200'))
+MAP_TILE_CACHE_SIZE = int(os.getenv('MAP_TILE_CACHE_SIZE', '4096'))
+
+MAX_VIEWPORT_TILES = 64
+
+# Precision of the cells tile_versions counts changes in
+TILE_VERSION_PRECISION = 4
+# Counter bumped by bulk statements
+WILDCARD = ''
+
+class MapLayer:
+    """One kind of entity on the map: its position columns and what a marker carries"""
+
+    def __init__(self, kind: str, model, lat, lng, columns: dict, owner=None):
+        self.kind = kind
+        self.model = model
+        self.lat = lat
+        self.lng = lng
+        self.columns = {**columns, 'lat': lat, 'lng': lng}
+        self.owner = owner
+
+    def scope(self, current_user: dict) -> Tuple[str, tuple]:
+        """Cache scope and row filter for what current_user may see"""
+        role = current_user.get('user_metadata', {}).get('role', 'user')
+        if self.owner is None or role == 'admin':
+            return '*', ()
+        user_id = current_user.get('sub')
+        return user_id, (self.owner == user_id,)
+
+LAYERS = (
+    MapLayer('bases', DroneBase, DroneBase.lat, DroneBase.lng,
+             {'id': DroneBase.id, 'name': DroneBase.name}),
+    MapLayer('drones', Drone, Drone.last_lat, Drone.last_lng,
+             {'id': Drone.id, 'name': Drone.name, 'status': Drone.status, 'base_id': Drone.base_id},
+             owner=Drone.user_id),
+)
+_LAYER_BY_MODEL = {layer.model: layer for layer in LAYERS}
+_LAYER_BY_TABLE = {layer.model.__tablename__: layer for layer in LAYERS}
+
+_versions = TileVersion.__table__
+_PENDING = 'tile_wildcards'
+
+def _cells(obj, layer: MapLayer) -> Set[str]:
+    """Version cells of an entity's position before and after the flush"""
+    state = inspect(obj)
+    lat, lng = state.attrs[layer.lat.key].history, state.attrs[layer.lng.key].history
+    positions = (
+        ((lat.deleted or lat.unchanged or [None])[0], (lng.deleted or lng.unchanged or [None])[0]),
+        ((lat.added or lat.unchanged or [None])[0], (lng.added or lng.unchanged or [None])[0]),
+    )
+    return {geotiles.encode(y, x, TILE_VERSION_PRECISION) for y, x in positions if y is not None and x is not None}
+
+def bump_tiles(connection, cells: Iterable[Tuple[str, str]]) -> None:
+    """Add one to the counters of (kind, cell) pairs, creating missing rows"""
+    rows = [{'tile': tile, 'kind': kind, 'version': 1} for kind, tile in sorted(set(cells))]
+    if not rows:
+        return
+    dialect_insert = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}.get(connection.dialect.name)
+    if dialect_insert is None:
+        for row in rows:
+            bumped = connection.execute(
+                update(_versions)
+                .where(_versions.c.tile == row['tile'], _versions.c.kind == row['kind'])
+                .values(version=_versions.c.version + 1)
+            )
+            if not bumped.rowcount:
+                connection.execute(_versions.insert(), row)
+        return
+    statement = dialect_insert(_versions)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=[_versions.c.tile, _versions.c.kind],
+            set_={'version': _versions.c.version + 1},
+        ),
+        rows,
+    )
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    # new/dirty/deleted and attribute history still show the pre-flush state here
+    cells = set()
+    dirty = session.dirty
+    for obj in list(session.new) + list(dirty) + list(session.deleted):
+        layer = _LAYER_BY_MODEL.get(type(obj))
+        if layer is None or (obj in dirty and not session.is_modified(obj)):
+            continue
+        cells |= {(layer.kind, cell) for cell in _cells(obj, layer)}
+    bump_tiles(session.connection(), cells)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _do_orm_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        layer = _LAYER_BY_TABLE.get(orm_execute_state.statement.table.name)
+        if layer is not None:
+            orm_execute_state.session.info.setdefault(_PENDING, set()).add(layer.kind)
+
+@event.listens_for(Session, 'before_commit')
+def _before_commit(session):
+    kinds = session.info.pop(_PENDING, None)
+    if kinds:
+        bump_tiles(session.connection(), [(kind, WILDCARD) for kind in kinds])
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+def rehash(db: Session, model, ids: Iterable[str]) -> None:
+    """Recompute geohashes after a bulk UPDATE of positions (which skips the ORM events)"""
+    layer = _LAYER_BY_MODEL[model]
+    rows = db.execute(select(model.id, layer.lat, layer.lng).where(model.id.in_(sorted(ids)))).all()
+    if rows:
+        db.execute(update(model), [
+            {'id': key, 'geohash': None if lat is None or lng is None else geotiles.encode(lat, lng)}
+            for key, lat, lng in rows
+        ])
+
+def _in_tiles(key, tiles: Iterable[str]):
+    return or_(*(and_(key >= tile, key < tile + RANGE_END) for tile in tiles))
+
+def tile_versions(db: Session, tiles: List[str], precision: int) -> Dict[Tuple[str, str], int]:
+    """Version of each (kind, tile): its cells' counters summed, plus the kind's wildcard
+
+    Counters only grow, so the sum changes whenever anything in the tile does.
+    """
+    depth = min(precision, TILE_VERSION_PRECISION)
+    prefix = func.substr(_versions.c.tile, 1, depth)
+    cells = sorted({tile[:TILE_VERSION_PRECISION] for tile in tiles})
+    rows = db.execute(
+        select(_versions.c.kind, prefix, func.sum(_versions.c.version))
+        .where(or_(_versions.c.tile == WILDCARD, _in_tiles(_versions.c.tile, cells)))
+        .group_by(_versions.c.kind, prefix)
+    ).all()
+    sums = {(kind, cell): int(total) for kind, cell, total in rows}
+    return {
+        (layer.kind, tile): sums.get((layer.kind, tile[:depth]), 0) + sums.get((layer.kind, WILDCARD), 0)
+        for layer in LAYERS for tile in tiles
+    }
+
+# Tile contents: (markers, None) or, past MAP_TILE_LIMIT entities, ([], cluster)
+TileContent = Tuple[List[dict], Optional[dict]]
+
+def read_tiles(db: Session, layer: MapLayer, tiles: List[str], precision: int, where=()) -> Dict[str, TileContent]:
+    """Contents of tiles, with two queries whatever the number of tiles"""
+    key = layer.model.geohash
+    prefix = func.substr(key, 1, precision)
+    counts = db.execute(
+        select(prefix, func.count(), func.avg(layer.lat), func.avg(layer.lng))
+        .where(_in_tiles(key, tiles), *where)
+        .group_by(prefix)
+    ).all()
+    contents = {tile: ([], None) for tile in tiles}
+    small = []
+    for tile, count, lat, lng in counts:
+        if count > MAP_TILE_LIMIT:
+            contents[tile] = ([], {'kind': layer.kind, 'tile': tile, 'count': count, 'lat': lat, 'lng': lng})
+        else:
+            small.append(tile)
+    if small:
+        columns = [column.label(name) for name, column in layer.columns.items()]
+        for row in db.execute(select(*columns, key).where(_in_tiles(key, small), *where)):
+            item = dict(row._mapping)
+            contents[item.pop('geohash')[:precision]][0].append(item)
+    return contents
+
+class _TileCache:
+    """LRU of tile contents per database, each tagged with the tile version it was read at"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = threading.Lock()
+        self._tiles = weakref.WeakKeyDictionary()  # engine -> OrderedDict((kind, scope, tile) -> (version, content))
+
+    def get(self, bind, key: tuple, version: int) -> Optional[TileContent]:
+        with self._lock:
+            tiles = self._tiles.get(bind)
+            entry = tiles.get(key) if tiles is not None else None
+            if entry is None or entry[0] != version:
+                return None
+            tiles.move_to_end(key)
+            return entry[1]
+
+    def put(self, bind, key: tuple, version: int, content: TileContent) -> None:
+        with self._lock:
+            tiles = self._tiles.setdefault(bind, OrderedDict())
+            tiles[key] = (version, content)
+            tiles.move_to_end(key)
+            while len(tiles) > self.size:
+                tiles.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tiles.clear()
+
+tile_cache = _TileCache(MAP_TILE_CACHE_SIZE)
+
+def _inside(item: dict, boxes: List[Box]) -> bool:
+    return any(south <= item['lat'] <= north and west <= item['lng'] <= east
+               for south, west, north, east in boxes)
+
+class Viewport:
+    """The tiles covering a map viewport, at the versions current when it was planned"""
+
+    def __init__(self, db: Session, boxes: List[Box], zoom: int):
+        self.boxes = boxes
+        self.precision = geotiles.viewport_precision(boxes, zoom, MAX_VIEWPORT_TILES)
+        self.tiles = geotiles.cover(boxes, self.precision)
+        self.versions = tile_versions(db, self.tiles, self.precision)
+
+    @property
+    def state(self) -> tuple:
+        """What the response depends on besides the viewer, for its ETag"""
+        return (self.precision, sorted(self.versions.items()))
+
+    def read(self, db: Session, current_user: dict) -> dict:
+        """Markers inside the viewport and clusters of the crowded tiles"""
+        bind = db.get_bind()
+        result = {'precision': self.precision, 'bases': [], 'drones': [], 'clusters': []}
+        for layer in LAYERS:
+            scope, where = layer.scope(current_user)
+            contents, stale = {}, []
+            for tile in self.tiles:
+                cached = tile_cache.get(bind, (layer.kind, scope, tile), self.versions[(layer.kind, tile)])
+                if cached is None:
+                    stale.append(tile)
+                else:
+                    contents[tile] = cached
+            if stale:
+                # Tagged with the planned version: a write since then only makes
+                # the entry look stale to the next request
+                for tile, content in read_tiles(db, layer, stale, self.precision, where).items():
+                    tile_cache.put(bind, (layer.kind, scope, tile), self.versions[(layer.kind, tile)], content)
+                    contents[tile] = content
+            for tile in self.tiles:
+                items, cluster = contents[tile]
+                if cluster is not None:
+                    result['clusters'].append(cluster)
+                result[layer.kind] += [item for item in items if _inside(item, self.boxes)]
+        return result
@@ -0,0 +1,189 @@
+"""
+Optional single-writer queue for database writes
+
+With WRITE_QUEUE=1, write handlers hand their unit of work (a function taking a
+Session) to one dedicated writer thread instead of committing on their own
+request session. The writer drains whatever has queued up, runs each unit in
+its own SAVEPOINT (a failing unit is rolled back alone), commits the whole
+group once and resolves each caller's future. Only one connection ever asks
+for SQLite's write lock, so writers stop contending for it; readers keep
+running in parallel on WAL snapshots (see the sqlite-production profile).
+
+Every database write made while serving requests goes through run_write():
+the drone, base and schedule handlers, /batch and the telemetry buffer's
+flushes (see ingest.py).
+
+Without WRITE_QUEUE, run_write() runs the unit on the request's session and
+commits it there, so handlers are written the same way in both modes.
+
+The writer is a single Python thread, so it gets only its share of the GIL:
+when many threads are busy serving reads it commits fewer units per second
+than free-for-all writers would, even though tail latency is far lower (see
+benchmarks/bench_write_queue.py).
+
+Units run on the writer's session, which does not expire objects on commit:
+returned ORM objects keep the values loaded while the unit ran and can be
+serialized by the caller, but must not lazy-load relationships.
+
+Environment:
+    WRITE_QUEUE              enable the writer thread (off)
+    WRITE_QUEUE_MAX_BATCH    units committed together at most (64)
+    WRITE_QUEUE_MAX_WAIT_MS  extra time to wait for a batch to fill (0)
+    WRITE_QUEUE_TIMEOUT      seconds a caller waits for its result (30)
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from structured_logging import get_logger, log_event
+
+WRITE_QUEUE = os.getenv('WRITE_QUEUE', '').lower() in ('1', 'true', 'yes')
+WRITE_QUEUE_MAX_BATCH = int(os.getenv('WRITE_QUEUE_MAX_BATCH', '64'))
+WRITE_QUEUE_MAX_WAIT_MS = float(os.getenv('WRITE_QUEUE_MAX_WAIT_MS', '0'))
+WRITE_QUEUE_TIMEOUT = float(os.getenv('WRITE_QUEUE_TIMEOUT', '30'))
+
+logger = get_logger('writes')
+
+T = TypeVar('T')
+_STOP = object()
+
+def enable_sqlite_savepoints(engine: Engine) -> None:
+    """Let pysqlite run SAVEPOINTs, and take the write lock when a transaction begins
+
+    pysqlite defers BEGIN until the first DML statement, which breaks
+    SAVEPOINT; the writer emits BEGIN IMMEDIATE itself instead.
+    """
+    @event.listens_for(engine, 'connect')
+    def _autocommit_driver(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def _begin_immediate(conn):
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+
+class WriteQueue:
+    """One writer thread that group-commits units of work"""
+
+    def __init__(self, session_factory: Callable[[], Session],
+                 max_batch: int = WRITE_QUEUE_MAX_BATCH, max_wait: float = WRITE_QUEUE_MAX_WAIT_MS / 1000):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.units = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+
+    def start(self) -> 'WriteQueue':
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Finish the queued units, then stop the thread"""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def submit(self, unit: Callable[[Session], T]) -> 'Future[T]':
+        future: Future = Future()
+        self._queue.put((unit, future))
+        return future
+
+    def _next_batch(self) -> tuple:
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._commit_batch(batch)
+
+    def _commit_batch(self, batch: list) -> None:
+        done = []
+        session = self.session_factory()
+        try:
+            for unit, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                savepoint = session.begin_nested()
+                try:
+                    result = unit(session)
+                    savepoint.commit()
+                except BaseException as e:
+                    savepoint.rollback()
+                    future.set_exception(e)
+                else:
+                    done.append((future, result))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            log_event(logger, logging.ERROR, "Group commit failed", units=len(done), error=str(e))
+            for future, _ in done:
+                future.set_exception(e)
+            done = []
+        finally:
+            session.close()
+
+        self.batches += 1
+        self.units += len(batch)
+        # Results are released only once they are durable
+        for future, result in done:
+            future.set_result(result)
+
+_writer: Optional[WriteQueue] = None
+
+def start_write_queue(session_factory: Optional[Callable[[], Session]] = None) -> WriteQueue:
+    """Start the writer thread (on its own engine unless a factory is given)"""
+    global _writer
+    if _writer is not None:
+        return _writer
+    if session_factory is None:
+        from models import DATABASE_URL, DB_PROFILE
+        from db_profiles import create_profiled_engine
+        writer_engine = create_profiled_engine(DATABASE_URL, DB_PROFILE)
+        if writer_engine.dialect.name == 'sqlite':
+            enable_sqlite_savepoints(writer_engine)
+        session_factory = sessionmaker(bind=writer_engine, autoflush=False, expire_on_commit=False)
+    _writer = WriteQueue(session_factory).start()
+    return _writer
+
+def stop_write_queue() -> None:
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+def run_write(db: Session, unit: Callable[[Session], T]) -> T:
+    """Run `unit(session)` and commit it; raises whatever the unit raised
+
+    Goes through the writer thread when the write queue is running, otherwise
+    uses `db` directly.
+    """
+    writer = _writer
+    if writer is None:
+        result = unit(db)
+        db.commit()
+        return result
+    return writer.submit(unit).result(timeout=WRITE_QUEUE_TIMEOUT)
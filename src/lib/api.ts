@@ -20,11 +20,11 @@ function createTimeoutController(timeoutMs: number = 1000): AbortController {
   return controller
 }
 
-export async function apiRequest(
+async function apiResponse(
   endpoint: string,
   options: RequestInit = {},
   timeoutMs: number = 10000
-): Promise<any> {
+): Promise<Response> {
   const fullUrl = `${API_BASE_URL}${endpoint}`
   console.log(`[API] ${options.method || 'GET'} ${fullUrl}`)
   
@@ -52,7 +52,7 @@ export async function apiRequest(
       throw error
     }
 
-    return response.json()
+    return response
   } catch (error) {
     if (error instanceof Error) {
       // Handle timeout/abort errors
@@ -83,21 +83,96 @@ export async function apiRequest(
   }
 }
 
+export async function apiRequest(
+  endpoint: string,
+  options: RequestInit = {},
+  timeoutMs: number = 10000
+): Promise<any> {
+  const response = await apiResponse(endpoint, options, timeoutMs)
+  return response.json()
+}
+
+// NDJSON streams (e.g. POST /api/drones/simulate_batch): one callback per line as it arrives
+export async function apiStream(
+  endpoint: string,
+  options: RequestInit,
+  onLine: (line: any) => void,
+  timeoutMs: number = 60000
+): Promise<void> {
+  const response = await apiResponse(endpoint, options, timeoutMs)
+  const reader = response.body!.getReader()
+  const decoder = new TextDecoder()
+  let buffered = ''
+  for (;;) {
+    const { done, value } = await reader.read()
+    buffered += decoder.decode(value, { stream: !done })
+    const lines = buffered.split('\n')
+    buffered = lines.pop() ?? ''
+    lines.filter(line => line.trim()).forEach(line => onLine(JSON.parse(line)))
+    if (done) break
+  }
+  if (buffered.trim()) onLine(JSON.parse(buffered))
+}
+
+export type TelemetrySubscription = { drones: string[] } | { base_id: string } | { bbox: string }
+
+// Live fleet frames from /ws/telemetry; returns the socket (send() a new
+// subscription to change what it watches, close() to stop)
+export async function openTelemetrySocket(
+  subscription: TelemetrySubscription,
+  onFrame: (frame: any) => void
+): Promise<WebSocket> {
+  const token = await getAccessToken()
+  const url = new URL('/ws/telemetry', API_BASE_URL.replace(/^http/, 'ws'))
+  if (token) url.searchParams.set('token', token)
+  const socket = new WebSocket(url)
+  socket.onopen = () => socket.send(JSON.stringify(subscription))
+  socket.onmessage = event => {
+    const message = JSON.parse(event.data)
+    if (message.type === 'tick') onFrame(message)
+    else if (message.type === 'error') console.error('[API] telemetry subscription:', message.detail)
+  }
+  return socket
+}
+
+// Listing endpoints are cursor-paginated; follow X-Next-Cursor to the last page
+export async function apiRequestAll(endpoint: string, timeoutMs: number = 10000): Promise<any[]> {
+  const items: any[] = []
+  let cursor: string | null = null
+  do {
+    const separator = endpoint.includes('?') ? '&' : '?'
+    const page = cursor ? `${endpoint}${separator}cursor=${encodeURIComponent(cursor)}` : endpoint
+    const response = await apiResponse(page, {}, timeoutMs)
+    items.push(...(await response.json()))
+    cursor = response.headers.get('X-Next-Cursor')
+  } while (cursor)
+  return items
+}
+
 // API methods
 export const api = {
   // Drones
-  getDrones: () => apiRequest('/api/drones'),
+  getDrones: () => apiRequestAll('/api/drones'),
   getDrone: (id: string) => apiRequest(`/api/drones/${id}`),
-  createDrone: (data: { name: string; model?: string; base_id?: string; status?: string }) =>
+  createDrone: (data: { name: string; model?: string; base_id?: string; status?: string; last_lat?: number; last_lng?: number }) =>
     apiRequest('/api/drones', { method: 'POST', body: JSON.stringify(data) }),
-  updateDrone: (id: string, data: Partial<{ name: string; model: string; status: string; base_id: string }>) =>
+  updateDrone: (id: string, data: Partial<{ name: string; model: string; status: string; base_id: string; last_lat: number; last_lng: number }>) =>
     apiRequest(`/api/drones/${id}`, { method: 'PUT', body: JSON.stringify(data) }),
   deleteDrone: (id: string) =>
     apiRequest(`/api/drones/${id}`, { method: 'DELETE' }),
+  // Telemetry history as columns; resolution 'auto' picks the finest that fits in limit
+  getTelemetryHistory: (id: string, range: { start: string; end?: string; resolution?: 'auto' | 'raw' | '1s' | '1m' | '1h'; limit?: number }) => {
+    const query = new URLSearchParams(Object.entries(range).filter(([, value]) => value).map(([key, value]) => [key, String(value)])).toString()
+    return apiRequest(`/api/drones/${id}/telemetry?${query}`)
+  },
   
   // Bases
-  getBases: () => apiRequest('/api/bases'),
+  getBases: () => apiRequestAll('/api/bases'),
   getBase: (id: string) => apiRequest(`/api/bases/${id}`),
+  getBasesNear: (lat: number, lng: number, k = 10) =>
+    apiRequest(`/api/bases/near?lat=${lat}&lng=${lng}&k=${k}`),
+  getBasesWithin: (west: number, south: number, east: number, north: number) =>
+    apiRequest(`/api/bases/within?bbox=${[west, south, east, north].join(',')}`),
   createBase: (data: { name: string; lat: number; lng: number }) =>
     apiRequest('/api/bases', { method: 'POST', body: JSON.stringify(data) }),
   updateBase: (id: string, data: Partial<{ name: string; lat: number; lng: number }>) =>
@@ -105,9 +180,17 @@ export const api = {
   deleteBase: (id: string) =>
     apiRequest(`/api/bases/${id}`, { method: 'DELETE' }),
   
+  // Map: only what is inside the viewport; crowded tiles come back as clusters
+  getViewport: (west: number, south: number, east: number, north: number, zoom: number) =>
+    apiRequest(`/api/map/viewport?bbox=${[west, south, east, north].join(',')}&zoom=${Math.round(zoom)}`),
+
   // Schedules
-  getSchedules: () => apiRequest('/api/schedules'),
-  getSchedule: (id: string) => apiRequest(`/api/schedules/${id}`),
+  getSchedules: (window: { from?: string; to?: string; drone_id?: string; min_length_m?: number; max_length_m?: number; path?: 'full' | 'simplified' | 'none' } = {}) => {
+    const query = new URLSearchParams(Object.entries(window).filter(([, value]) => value != null && value !== '').map(([key, value]) => [key, String(value)])).toString()
+    return apiRequestAll(query ? `/api/schedules?${query}` : '/api/schedules')
+  },
+  getSchedule: (id: string, path: 'full' | 'simplified' | 'none' = 'full') =>
+    apiRequest(`/api/schedules/${id}?path=${path}`),
   createSchedule: (data: { drone_id: string; start_time: string; end_time?: string; path_json?: any }) =>
     apiRequest('/api/schedules', { method: 'POST', body: JSON.stringify(data) }),
   updateSchedule: (id: string, data: Partial<{ start_time: string; end_time: string; path_json: any }>) =>
@@ -121,9 +204,20 @@ export const api = {
       method: 'POST',
       body: JSON.stringify(path || {}),
     }),
+  simulateBatch: (items: { drone_id: string; path?: [number, number][] }[], onResult: (result: any) => void) =>
+    apiStream('/api/drones/simulate_batch', { method: 'POST', body: JSON.stringify({ items }) }, onResult),
   droneAction: (droneId: string, action: string) =>
     apiRequest(`/api/drones/${droneId}/action`, {
       method: 'POST',
       body: JSON.stringify({ action }),
     }),
+
+  // Fleet
+  getFleetLive: () => apiRequest('/api/fleet/live'),
+  ingestTelemetry: (samples: Record<string, unknown>[]) =>
+    apiRequest('/api/telemetry/ingest', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/x-ndjson' },
+      body: samples.map(sample => JSON.stringify(sample)).join('\n'),
+    }),
 }
@@ -8,6 +8,8 @@ export interface Drone {
   base_id?: string
   user_id?: string
   last_check_in?: string
+  last_lat?: number
+  last_lng?: number
   created_at?: string
 }
 
@@ -25,6 +27,10 @@ export interface Schedule {
   start_time: string
   end_time?: string
   path_json?: any
+  path_points?: number
+  path_length_m?: number
+  path_duration_s?: number
+  path_bbox?: [number, number, number, number]
   created_at?: string
 }
 